@@ -34,8 +34,20 @@ class APIMonitor:
         try:
             # Використовуємо zadarma_api для отримання балансу
             from zadarma_api import zadarma_api
+            from circuit_breaker import CircuitOpenError
             
-            response = zadarma_api.call('/v1/info/balance/', {}, 'GET')
+            # Запит іде через запобіжник: поки Zadarma лежить - відмова без звернення до API,
+            # після паузи цей запит стає пробним і закриває запобіжник
+            try:
+                response = zadarma_api.call('/v1/info/balance/', {}, 'GET')
+            except CircuitOpenError as e:
+                self.results['zadarma'] = {
+                    'status': 'ERROR',
+                    'message': f'Запобіжник відкрито, повтор через {e.retry_after:.0f}с',
+                    'breakers': self._tripped_breakers(zadarma_api)
+                }
+                logger.warning(f"⛔ Zadarma API: {e}")
+                return False
             result = json.loads(response.text)
             
             if result.get("status") == "success":
@@ -55,7 +67,8 @@ class APIMonitor:
                 return True
             else:
                 error_msg = result.get("message", "Невідома помилка API")
-                self.results['zadarma'] = {'status': 'ERROR', 'message': f'API помилка: {error_msg}'}
+                self.results['zadarma'] = {'status': 'ERROR', 'message': f'API помилка: {error_msg}',
+                                           'breakers': self._tripped_breakers(zadarma_api)}
                 logger.error(f"❌ Zadarma API помилка: {error_msg}")
                 return False
                 
@@ -65,6 +78,12 @@ class APIMonitor:
             logger.error(f"❌ Zadarma API виключення: {error_msg}")
             return False
     
+    @staticmethod
+    def _tripped_breakers(zadarma_api):
+        """Відкриті запобіжники Zadarma (endpoint -> стан)"""
+        return {name: state for name, state in zadarma_api.breaker_status().items()
+                if state['state'] != 'closed'}
+
     def test_wlaunch_api(self):
         """Тестування WLaunch API з додатковою інформацією"""
         try:
@@ -305,6 +324,9 @@ class APIMonitor:
             }.get(result['status'], '❓')
             
             report.append(f"{status_emoji} {api_name.upper()}: {result['message']}")
+            for endpoint, breaker in result.get('breakers', {}).items():
+                report.append(f"   ⛔ {endpoint}: {breaker['state']}, помилок {breaker['failures']}, "
+                              f"повтор через {breaker['retry_after']:.0f}с")
         
         return "\n".join(report)
 
@@ -1,9 +1,9 @@
 # auth.py - Enhanced version with better logging
 import logging
-import requests
 from telegram import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from user_db import store_user, is_authorized_user
 from config import ADMIN_USER_ID, TELEGRAM_TOKEN
+import telegram_sender
 
 logger = logging.getLogger(__name__)
 
@@ -73,16 +73,9 @@ def is_authenticated(telegram_id: int) -> bool:
     return result
 
 def send_admin_error(message):
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": ADMIN_USER_ID,
-        "text": message
-    }
     try:
-        response = requests.post(url, data=payload, timeout=10)
-        if response.status_code == 200:
-            logger.info(f"📤 Повідомлення адміну відправлено: {message}")
-        else:
-            logger.error(f"❌ Помилка відправки адміну (код {response.status_code}): {message}")
+        # Не блокуємо обробник бота - відправка через чергу telegram_sender
+        if telegram_sender.send_message(ADMIN_USER_ID, message, parse_mode=None, token=TELEGRAM_TOKEN):
+            logger.info(f"📤 Повідомлення адміну в черзі: {message}")
     except Exception as e:
         logger.error(f"❌ Помилка надсилання повідомлення адміну: {e}")
\ No newline at end of file
@@ -0,0 +1,84 @@
+# auth_cache.py - Кеш авторизації користувачів у пам'яті процесу
+"""
+telegram_id → (phone, client_id, authorized) з TTL та LRU витісненням.
+
+Кеш скидається функціями запису user_db (store_user, update_clients,
+add_or_update_client, force_full_sync, cleanup_duplicate_phones).
+Зміни з інших процесів (cron синхронізація) user_db помічає через
+PRAGMA data_version і теж скидає кеш.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_SIZE = 5000
+DEFAULT_TTL = 300  # секунд
+
+
+class AuthCache:
+    """LRU + TTL кеш результатів авторизації"""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Змінюється при кожному invalidate(), щоб не зберегти результат,
+        # прочитаний з БД до зміни
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, telegram_id):
+        """
+        Повертає (phone, client_id, authorized) або None, якщо запису немає/протух
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < now:
+                del self._entries[telegram_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(telegram_id)
+            self.hits += 1
+            return value
+
+    def put(self, telegram_id, phone, client_id, authorized, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[telegram_id] = (time.time() + self.ttl, (phone, client_id, authorized))
+            self._entries.move_to_end(telegram_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, telegram_id=None):
+        """Скидає один запис або (без аргументу) весь кеш"""
+        with self._lock:
+            if telegram_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(telegram_id, None)
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total * 100) if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
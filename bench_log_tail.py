@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк log_tail.tail на згенерованих логах до 1 ГБ: час і пікова пам'ять
+
+- tail(50)            - останні 50 рядків (/logs, check_and_run_bot.sh)
+- tail(3, ERROR)      - останні 3 помилки, що трапляються раз на ~1 МБ (/diagnostic)
+- tail(1, не існує)   - найгірший випадок: predicate не збігається, файл читається до початку
+- readlines()[-50:]   - як було в /logs; лише для найменшого файлу, бо тримає весь файл у пам'яті
+
+Пам'ять - пік RSS процесу (ru_maxrss) після кожного виклику: для tail він не
+росте з розміром файлу; readlines запускається останнім, бо піднімає пік.
+Запуск: python3 bench_log_tail.py [розмір найбільшого файлу в МБ, за замовчуванням 1024]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import resource
+
+from log_tail import tail
+
+ERROR_EVERY = 5000  # рядків між помилками (~1 МБ)
+
+
+def generate(path, size_mb):
+    """JSON-lines лог заданого розміру; пишемо великими шматками"""
+    lines = []
+    for i in range(ERROR_EVERY):
+        level = 'ERROR' if i == 0 else 'INFO'
+        lines.append(json.dumps({
+            'ts': 1700000000 + i, 'time': '2023-11-14 22:13:20', 'level': level,
+            'module': 'zadarma_api_webhook', 'msg': f"📞 Дзвінок {i} на ворота 0930063585: відчинено ✅",
+        }, ensure_ascii=False))
+    chunk = ('\n'.join(lines) + '\n').encode('utf-8')
+    target = size_mb * 1024 * 1024
+    with open(path, 'wb') as f:
+        written = 0
+        while written < target:
+            f.write(chunk)
+            written += len(chunk)
+    return os.path.getsize(path)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: КБ
+
+
+def measure(label, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"   {label:<22} {elapsed * 1000:10.2f} мс   пік RSS {peak_rss_mb():7.1f} МБ   рядків: {len(result)}")
+
+
+def main():
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    sizes = sorted({min(16, largest), min(256, largest), largest})
+    workdir = tempfile.mkdtemp()
+    is_error = lambda line: '"level": "ERROR"' in line
+
+    first = None
+    for size_mb in sizes:
+        path = os.path.join(workdir, f'bot_{size_mb}mb.log')
+        size = generate(path, size_mb)
+        print(f"📄 {size / 1024 / 1024:.0f} МБ")
+        measure('tail(50)', lambda: tail(path, 50))
+        measure('tail(3, ERROR)', lambda: tail(path, 3, is_error))
+        measure('tail(1, не існує)', lambda: tail(path, 1, lambda line: False))
+        if first is None:
+            first = path
+        else:
+            os.remove(path)
+
+    def readlines():
+        with open(first, 'r', encoding='utf-8') as f:
+            return f.readlines()[-50:]
+
+    print(f"📄 {os.path.getsize(first) / 1024 / 1024:.0f} МБ, як було в /logs")
+    measure('readlines()[-50:]', readlines)
+    os.remove(first)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк логування на шляху відкриття воріт: затримка одного натискання
+/vorota (авторизація + make_zadarma_call_with_tracking + ZadarmaAPI.call)
+
+до    - logging.basicConfig з FileHandler: кожен рядок пишеться у файл синхронно
+після - setup_logging(): QueueHandler, файл пише фоновий QueueListener
+
+Два сценарії: локальний диск і повільний диск (затримка на кожен запис, як
+на завантаженому shared hosting). На швидкому диску черга не виграє -
+форматування лише переїжджає в інший потік; виграш - коли запис блокує.
+
+Мережі немає: ZadarmaAPI._send одразу повертає успішну відповідь, БД -
+тимчасові файли. Запуск: python3 bench_logging.py [кількість натискань] [затримка запису, мс]
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+
+import user_db
+import zadarma_api_webhook as zw
+from circuit_breaker import BreakerRegistry
+from config import VOROTA_NUMBER
+from logging_setup import LOG_FORMAT, setup_logging, stop_logging
+from zadarma_api_webhook import CallTracker
+from zadarma_client import ZadarmaAPI
+
+USER_ID = 111
+SLOW_WRITE_DELAY = 1.0  # мс на запис у сценарії "повільний диск"
+
+
+class SlowStream:
+    """Файл, кожен flush якого чекає delay секунд (імітація повільного диска)"""
+
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, data):
+        return self.stream.write(data)
+
+    def flush(self):
+        if self.delay:
+            time.sleep(self.delay)
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        # seek/tell/fileno - для ротації і індексу JsonLinesFileHandler
+        return getattr(self.stream, name)
+
+
+class FakeResponse:
+    status_code = 200
+    text = '{"status": "success", "from": "0733103110", "to": "0930063585", "time": 1700000000}'
+
+
+def prepare():
+    workdir = tempfile.mkdtemp()
+    user_db.DB_PATH = os.path.join(workdir, 'users.db')
+    user_db.init_db()
+    user_db.add_or_update_client('c1', 'Іван', 'Петренко', '380501112233')
+    user_db.store_user(USER_ID, '380501112233', 'ivan', 'Іван')
+
+    zw.call_tracker = CallTracker(os.path.join(workdir, 'call_tracking.db'))
+    zw.zadarma_api = ZadarmaAPI('key', 'secret', breakers=BreakerRegistry())
+    zw.zadarma_api._send = lambda request_type, url, params, auth_str: FakeResponse()
+    return workdir
+
+
+def press():
+    """Одне натискання /vorota; повертає затримку в секундах"""
+    started = time.perf_counter()
+    assert user_db.is_authorized_user_simple(USER_ID)
+    result = zw.make_zadarma_call_with_tracking(VOROTA_NUMBER, USER_ID, USER_ID, 'vorota')
+    elapsed = time.perf_counter() - started
+    # NOTIFY_END - наступне натискання знову робить callback, а не приєднується
+    zw.call_tracker.update_call_status(result['call_id'], 'success')
+    return elapsed
+
+
+def measure(label, count):
+    press()  # прогрів: з'єднання пулу, кеш авторизації
+    latencies = sorted(press() for _ in range(count))
+    mean = sum(latencies) / count * 1000
+    p95 = latencies[int(count * 0.95)] * 1000
+    print(f"{label:<36} середня {mean:7.3f} мс   p95 {p95:7.3f} мс")
+    return mean
+
+
+def run_sync(workdir, label, count, delay):
+    root = logging.getLogger()
+    handler = logging.FileHandler(os.path.join(workdir, 'sync.log'), encoding='utf-8')
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.stream = SlowStream(handler.stream, delay)
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    try:
+        return measure(label, count)
+    finally:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def run_queue(workdir, label, count, delay):
+    listener = setup_logging(os.path.join(workdir, 'queue.log'))
+    for handler in listener.handlers:
+        handler.stream = SlowStream(handler.stream, delay)
+    try:
+        return measure(label, count)
+    finally:
+        stop_logging()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    slow = (float(sys.argv[2]) if len(sys.argv) > 2 else SLOW_WRITE_DELAY) / 1000
+    workdir = prepare()
+
+    run_sync(workdir, 'до (FileHandler)', count, 0)
+    with open(os.path.join(workdir, 'sync.log'), encoding='utf-8') as f:
+        lines = sum(1 for _ in f) / (count + 1)
+    run_queue(workdir, 'після (QueueListener)', count, 0)
+    print(f"📝 Рядків логу на натискання: {lines:.1f}")
+
+    before = run_sync(workdir, f'до, диск {slow * 1000:g} мс/запис', count, slow)
+    after = run_queue(workdir, f'після, диск {slow * 1000:g} мс/запис', count, slow)
+    print(f"📉 Затримка натискання на повільному диску: -{(1 - after / before) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Мікробенчмарк підпису запитів Zadarma: підписів/с до і після RequestSigner
+
+до    - офіційний user_api/zadarma/api.py (OrderedDict + новий HMAC на кожен запит)
+після - build_params_string + RequestSigner (шаблон HMAC, без кешу і з кешем)
+
+Заголовки звіряються байт у байт перед вимірюванням.
+Запуск: python3 bench_signing.py [кількість підписів]
+"""
+
+import sys
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from user_api.zadarma.api import ZadarmaAPI as OfficialZadarmaAPI
+from zadarma_client import RequestSigner, build_params_string
+
+KEY = 'a248a6a984459935b569'
+SECRET = '8a8e91d214fb728889c7'
+METHOD = '/v1/request/callback/'
+
+
+def requests_to_sign(count):
+    """Callback-и на два пристрої від 50 номерів - як /vorota і /hvirtka"""
+    targets = ('0930063585', '0637442017')
+    return [{'from': f'38067{i % 50:07d}', 'to': targets[i % 2], 'format': 'json'} for i in range(count)]
+
+
+def run(label, sign, batch):
+    started = time.perf_counter()
+    for params in batch:
+        sign(params)
+    elapsed = time.perf_counter() - started
+    rate = len(batch) / elapsed
+    print(f"{label:<28} {rate:>12,.0f} підписів/с")
+    return rate
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch = requests_to_sign(count)
+
+    official = OfficialZadarmaAPI(KEY, SECRET)._ZadarmaAPI__get_auth_string_for_header
+    signer = RequestSigner(KEY, SECRET, cache_size=0)
+    cached = RequestSigner(KEY, SECRET)
+
+    def before(params):
+        return official(METHOD, urlencode(OrderedDict(sorted(params.items()))))
+
+    def after(params):
+        return signer.sign(METHOD, build_params_string(params))
+
+    def after_cached(params):
+        return cached.sign(METHOD, build_params_string(params))
+
+    for params in batch[:1000]:
+        assert before(params) == after(params) == after_cached(params), params
+    print("✅ Заголовки збігаються з офіційним user_api байт у байт")
+
+    base = run('до (user_api)', before, batch)
+    rate = run('після (шаблон HMAC)', after, batch)
+    cached_rate = run('після (шаблон + LRU кеш)', after_cached, batch)
+    print(f"📈 Прискорення: x{rate / base:.2f}, з кешем x{cached_rate / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,18 +13,16 @@ from zadarma_call import handle_door_command, handle_gate_command, handle_admin_
 #    handle_sync_status_command, handle_sync_clean_command, handle_sync_full_command,
 #    handle_sync_test_command, handle_sync_user_command, handle_sync_help_command
 #)
+from logging_setup import setup_logging
+from log_query import query, format_record, log_files_size, ERROR_LEVELS
 from config import TELEGRAM_TOKEN, ADMIN_USER_ID, MAP_URL, SCHEME_URL, validate_config
 ADMIN_USER_IDS = [ADMIN_USER_ID, 7930079513]
+LOGS_DIR = '/home/gomoncli/zadarma'
 
 is_authenticated = is_authorized_user_simple
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
-)
+# Запис у bot.log - у фоновому потоці, обробники команд не чекають на диск
+setup_logging('bot.log')
 
 logger = logging.getLogger(__name__)
 
@@ -300,6 +298,21 @@ def test_command(bot, update):
         logger.exception(f"❌ Помилка в test_command: {e}")
         bot.send_message(chat_id=update.message.chat_id, text="❌ Помилка тестування")
 
+def zadarma_status_line():
+    """Стан запобіжників Zadarma API для /status"""
+    try:
+        from zadarma_api_webhook import zadarma_api
+        tripped = {name: state for name, state in zadarma_api.breaker_status().items()
+                   if state['state'] != 'closed'}
+    except Exception as e:
+        logger.error(f"❌ Помилка отримання стану Zadarma API: {e}")
+        return "📞 Zadarma API: ❓ Невідомо"
+    if not tripped:
+        return "📞 Zadarma API: ✅ Доступне"
+    details = ", ".join(f"{name} ({state['state']}, повтор через {state['retry_after']:.0f}с)"
+                        for name, state in tripped.items())
+    return f"📞 Zadarma API: ⛔ {details}"
+
 def status_command(bot, update):
     user_id = update.effective_user.id
     logger.info(f"📊 /status викликано користувачем: {user_id}")
@@ -312,7 +325,8 @@ def status_command(bot, update):
         status_text += f"👤 Користувач: {user_id}\n"
         status_text += f"🔐 Авторизований: {'✅ Так' if auth_status else '❌ Ні'}\n"
         status_text += f"🤖 Бот: ✅ Працює\n"
-        status_text += f"📅 Час: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        status_text += f"📅 Час: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+        status_text += zadarma_status_line() + "\n\n"
         
         if user_info:
             status_text += f"💾 База даних:\n"
@@ -581,6 +595,16 @@ def diagnostic_command(bot, update):
         except:
             pass
         
+        # Кеш авторизації
+        try:
+            from user_db import get_auth_cache_stats
+            cache_stats = get_auth_cache_stats()
+            diagnostic_info.append("🔐 КЕШ АВТОРИЗАЦІЇ:")
+            diagnostic_info.append(f"   Записів: {cache_stats['size']}, hits: {cache_stats['hits']}, "
+                                   f"misses: {cache_stats['misses']} ({cache_stats['hit_rate']:.0f}%)")
+        except:
+            pass
+
         # Файли конфігурації
         diagnostic_info.append("📁 ФАЙЛИ:")
         config_files = ['config.py', 'users.db', 'bot.log']
@@ -598,17 +622,16 @@ def diagnostic_command(bot, update):
             else:
                 diagnostic_info.append(f"   ❌ {file} відсутній")
         
-        # Останні помилки з логу
+        # Останні помилки з логу - читаємо з кінця файлу, лише за добу
         try:
-            with open('/home/gomoncli/zadarma/bot.log', 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                error_lines = [line for line in lines[-50:] if 'ERROR' in line]
-                if error_lines:
-                    diagnostic_info.append("🚨 ОСТАННІ ПОМИЛКИ:")
-                    for error in error_lines[-3:]:  # Останні 3 помилки
-                        diagnostic_info.append(f"   {error.strip()[:100]}...")
-                else:
-                    diagnostic_info.append("✅ Помилок не знайдено")
+            errors = query(f'{LOGS_DIR}/bot.log', levels=ERROR_LEVELS,
+                           since=time.time() - 24 * 3600, limit=3)
+            if errors:
+                diagnostic_info.append("🚨 ОСТАННІ ПОМИЛКИ:")
+                for error in errors:
+                    diagnostic_info.append(f"   {format_record(error)}")
+            else:
+                diagnostic_info.append("✅ Помилок не знайдено")
         except:
             diagnostic_info.append("⚠️ Не вдалося прочитати лог")
         
@@ -654,20 +677,13 @@ def logs_command(bot, update):
         ]
         
         for log_file, title in log_files:
-            log_path = f'/home/gomoncli/zadarma/{log_file}'
+            log_path = f'{LOGS_DIR}/{log_file}'
             if os.path.exists(log_path):
                 try:
-                    with open(log_path, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                        recent_lines = lines[-5:]  # Останні 5 рядків
-                        
+                    recent = query(log_path, limit=5)  # Останні 5 записів
                     logs_info.append(f"\n{title} ({log_file}):")
-                    for line in recent_lines:
-                        # Скоротити довгі рядки
-                        clean_line = line.strip()
-                        if len(clean_line) > 100:
-                            clean_line = clean_line[:95] + "..."
-                        logs_info.append(f"  {clean_line}")
+                    for record in recent:
+                        logs_info.append(f"  {format_record(record)}")
                         
                 except Exception as e:
                     logs_info.append(f"\n{title}: ❌ Помилка читання ({e})")
@@ -676,13 +692,7 @@ def logs_command(bot, update):
         
         # Додати загальну інформацію про логи
         try:
-            total_size = 0
-            log_count = 0
-            for file in os.listdir('/home/gomoncli/zadarma/'):
-                if file.endswith('.log'):
-                    total_size += os.path.getsize(f'/home/gomoncli/zadarma/{file}')
-                    log_count += 1
-            
+            log_count, total_size = log_files_size(LOGS_DIR)
             size_mb = total_size / (1024 * 1024)
             logs_info.append(f"\n📊 ЗАГАЛОМ: {log_count} файлів, {size_mb:.1f}MB")
         except:
@@ -750,7 +760,15 @@ def main():
         
         init_db()
         logger.info("✅ База даних ініціалізована")
-        
+
+        # /hvirtka та /vorota йдуть через zadarma_api_webhook - прогріваємо його сесію,
+        # щоб перший callback не платив за DNS + TCP + TLS
+        from zadarma_api_webhook import zadarma_api
+        if zadarma_api.warm_up(keepalive=True):
+            logger.info("✅ З'єднання з Zadarma API прогріто")
+        # Поки запобіжник відкритий - фонова проба закриває його, щойно API оживе
+        zadarma_api.start_health_probe()
+
         logger.info("📞 Тестуємо підключення до Zadarma API...")
         from zadarma_api import test_zadarma_auth
         if test_zadarma_auth():
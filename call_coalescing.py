@@ -0,0 +1,57 @@
+# call_coalescing.py - Об'єднання одночасних запитів на один пристрій
+"""
+Кілька користувачів натискають /vorota за кілька секунд - замість окремого
+callback-а на кожного (пристрій отримує дзвінки внахлест і відповідає busy)
+робиться один, а решта приєднується до нього і отримує той самий результат
+NOTIFY_END.
+
+Тут - лише спільні для zadarma_api_webhook і zadarma_api частини: лок на
+цільовий номер, під яким перевіряється "чи вже є дзвінок" і робиться запит
+callback, та лічильники.
+"""
+
+import logging
+import threading
+
+from phone_utils import national_number
+
+logger = logging.getLogger(__name__)
+
+COALESCE_WINDOW = 60  # секунд - до якого віку дзвінка без NOTIFY_END можна приєднатися
+
+
+class TargetLocks:
+    """Лок на NSN цільового номера (пристроїв одиниці - словник не росте)"""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks = {}
+        self._stats = {'callbacks': 0, 'joined': 0}
+
+    def lock(self, target_number):
+        nsn = national_number(target_number)
+        with self._guard:
+            lock = self._locks.get(nsn)
+            if lock is None:
+                lock = self._locks[nsn] = threading.Lock()
+            return lock
+
+    def count(self, key):
+        with self._guard:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._guard:
+            return dict(self._stats)
+
+
+target_locks = TargetLocks()
+
+
+def subscriber_chats(call, joined_calls):
+    """chat_id для розсилки результату: ініціатор і ті, хто приєднався (без повторів)"""
+    chats = [call['chat_id']]
+    for joined in joined_calls:
+        if joined['chat_id'] not in chats:
+            chats.append(joined['chat_id'])
+    return chats
@@ -0,0 +1,185 @@
+# call_poller.py - Один планувальник перевірки статусу для всіх дзвінків
+"""
+Замість окремого потоку на кожен дзвінок (N потоків і N×10 запитів
+/v1/statistics/) усі дзвінки в очікуванні живуть в одній купі (heap)
+за часом наступної перевірки.
+
+На кожному такті один потік робить ОДИН запит статистики за об'єднаним
+вікном [найраніший start_time, now] і зіставляє записи з усіма
+дзвінками в пам'яті. Дзвінок з отриманим результатом знімається
+через resolve() і більше не опитується.
+"""
+
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 3   # секунд між перевірками
+MAX_WAIT_TIME = 30   # секунд до таймауту
+
+# Фінальні disposition, після яких опитування дзвінка припиняється
+FINAL_DISPOSITIONS = ('rejected', 'busy', 'failed', 'no-answer', 'cancel', 'answered')
+
+
+def record_key(record):
+    """Ідентифікатор запису статистики (id, якщо Zadarma його повернула)"""
+    for field in ('id', 'call_id', 'pbx_call_id'):
+        if record.get(field):
+            return (field, record[field])
+    return tuple(sorted((k, str(v)) for k, v in record.items()))
+
+
+class CallStatusPoller:
+    """
+    Планувальник опитування статусу дзвінків
+
+    fetch_calls(start, end) -> list записів статистики Zadarma
+    match(pending, record) -> bool чи належить запис дзвінку
+    on_result(call_id, disposition) - фінальний статус знайдено
+    on_timeout(call_id) - статус не знайдено за max_wait_time
+    """
+
+    def __init__(self, fetch_calls, match, on_result, on_timeout,
+                 check_interval=CHECK_INTERVAL, max_wait_time=MAX_WAIT_TIME):
+        self.fetch_calls = fetch_calls
+        self.match = match
+        self.on_result = on_result
+        self.on_timeout = on_timeout
+        self.check_interval = check_interval
+        self.max_wait_time = max_wait_time
+
+        self._pending = {}  # call_id -> {'target_number', 'start_time', 'deadline'}
+        self._heap = []     # (next_check, call_id)
+        self._cond = threading.Condition()
+        self._consumed = {}  # ключ запису статистики -> час, коли його віддали дзвінку
+        self._thread = None
+        self._running = False
+        self.stats = {'ticks': 0, 'requests': 0, 'resolved': 0, 'timeouts': 0, 'errors': 0}
+
+    def add(self, call_id, target_number, start_time=None):
+        """Додає дзвінок до опитування (потік планувальника стартує ліниво)"""
+        start_time = start_time or time.time()
+        with self._cond:
+            self._pending[call_id] = {
+                'call_id': call_id,
+                'target_number': target_number,
+                'start_time': start_time,
+                'deadline': start_time + self.max_wait_time,
+            }
+            heapq.heappush(self._heap, (start_time + self.check_interval, call_id))
+            self._ensure_thread()
+            self._cond.notify()
+        logger.debug(f"📋 Дзвінок {call_id} додано до планувальника ({len(self._pending)} в очікуванні)")
+
+    def resolve(self, call_id):
+        """Знімає дзвінок з опитування (статус отримано або дзвінок більше не відстежується)"""
+        with self._cond:
+            removed = self._pending.pop(call_id, None) is not None
+        if removed:
+            logger.debug(f"🔕 Дзвінок {call_id} знято з опитування")
+        return removed
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='call-status-poller')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _next_due(self):
+        """Чекає до найближчої перевірки; повертає список дзвінків, які пора перевірити"""
+        with self._cond:
+            while self._running:
+                # Пропускаємо записи купи для вже вирішених дзвінків
+                while self._heap and self._heap[0][1] not in self._pending:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+
+                now = time.time()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    _, call_id = heapq.heappop(self._heap)
+                    pending = self._pending.get(call_id)
+                    if pending and pending not in due:
+                        due.append(pending)
+                return due
+            return None
+
+    def _run(self):
+        while True:
+            due = self._next_due()
+            if due is None:
+                return
+            if due:
+                self._tick(due)
+
+    def _tick(self, due):
+        """Один запит статистики на всі дзвінки, яким настав час перевірки"""
+        self.stats['ticks'] += 1
+        now = time.time()
+        window_start = min(call['start_time'] for call in due)
+
+        records = None
+        try:
+            self.stats['requests'] += 1
+            records = self.fetch_calls(window_start, now)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Помилка запиту статистики для {len(due)} дзвінків: {e}")
+
+        # Запис, вже відданий одному дзвінку, не може вирішити інший дзвінок на той самий номер
+        expired = now - 2 * self.max_wait_time
+        for key in [k for k, at in self._consumed.items() if at < expired]:
+            del self._consumed[key]
+
+        # Найстаріші дзвінки отримують найстаріші записи - один запис на один дзвінок
+        for call in sorted(due, key=lambda c: c['start_time']):
+            disposition = None
+            for record in records or []:
+                key = record_key(record)
+                if key in self._consumed or not self.match(call, record):
+                    continue
+                if record.get('disposition', '') in FINAL_DISPOSITIONS:
+                    self._consumed[key] = now
+                    disposition = record['disposition']
+                    break
+
+            if disposition:
+                if self.resolve(call['call_id']):
+                    self.stats['resolved'] += 1
+                    self._safe(self.on_result, call['call_id'], disposition)
+            elif now >= call['deadline']:
+                if self.resolve(call['call_id']):
+                    self.stats['timeouts'] += 1
+                    self._safe(self.on_timeout, call['call_id'])
+            else:
+                with self._cond:
+                    if call['call_id'] in self._pending:
+                        heapq.heappush(self._heap, (now + self.check_interval, call['call_id']))
+
+    def _safe(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.exception(f"❌ Помилка обробки результату дзвінка {args[0]}: {e}")
@@ -10,6 +10,10 @@ BOT_SCRIPT="bot.py"
 PIDFILE="$BOT_DIR/bot.pid"
 LOGFILE="$BOT_DIR/bot_cron.log"
 BOT_LOGFILE="$BOT_DIR/bot.log"
+# stdout/stderr бота (traceback-и, print) - окремо: bot.log ротує сам бот,
+# а дескриптор shell після ротації писав би в bot.log.1
+BOT_STDERR_LOG="$BOT_DIR/bot_stderr.log"
+BOT_STDERR_MAX_BYTES=1048576
 PYTHON_EXEC="/usr/bin/python3"
 MAX_WAIT_TIME=10
 RESTART_COOLDOWN=30
@@ -227,8 +231,13 @@ start_bot() {
         return 1
     fi
     
+    # Бот ще не працює - старий stderr лог можна безпечно відкласти
+    if [[ -f "$BOT_STDERR_LOG" ]] && [[ $(stat -c %s "$BOT_STDERR_LOG" 2>/dev/null || echo 0) -gt $BOT_STDERR_MAX_BYTES ]]; then
+        mv -f "$BOT_STDERR_LOG" "$BOT_STDERR_LOG.1"
+    fi
+
     # Запуск бота
-    "$PYTHON_EXEC" "$BOT_SCRIPT" >> "$BOT_LOGFILE" 2>&1 &
+    "$PYTHON_EXEC" "$BOT_SCRIPT" >> "$BOT_STDERR_LOG" 2>&1 &
     local bot_pid=$!
     
     # Збереження PID
@@ -241,13 +250,17 @@ start_bot() {
         if is_process_running "$bot_pid" && is_bot_process "$bot_pid"; then
             log_success "Бот успішно запущений та працює (PID: $bot_pid)"
             
-            # Додаткова перевірка логу на помилки
-            if [[ -f "$BOT_LOGFILE" ]]; then
-                local recent_errors=$(tail -20 "$BOT_LOGFILE" | grep -i "error\|exception\|traceback" | wc -l)
-                if [[ $recent_errors -gt 0 ]]; then
-                    log_warning "Виявлено $recent_errors помилок в останніх логах"
+            # Додаткова перевірка логів на помилки
+            local log_file
+            for log_file in "$BOT_LOGFILE" "$BOT_STDERR_LOG"; do
+                if [[ -f "$log_file" ]]; then
+                    local recent_errors=$("$PYTHON_EXEC" "$BOT_DIR/log_tail.py" --window 20 --count \
+                        -e 'error|exception|traceback' "$log_file" 2>/dev/null || echo 0)
+                    if [[ $recent_errors -gt 0 ]]; then
+                        log_warning "Виявлено $recent_errors помилок в останніх записах $(basename "$log_file")"
+                    fi
                 fi
-            fi
+            done
             
             return 0
         fi
@@ -259,10 +272,16 @@ start_bot() {
     log_error "Бот не запустився протягом $MAX_WAIT_TIME секунд"
     rm -f "$PIDFILE"
     
-    # Показати останні рядки логу для діагностики
+    # Показати останні рядки логів для діагностики (traceback запуску - у stderr лозі)
     if [[ -f "$BOT_LOGFILE" ]]; then
         log_error "Останні записи логу:"
-        tail -5 "$BOT_LOGFILE" | while read -r line; do
+        "$PYTHON_EXEC" "$BOT_DIR/log_tail.py" -n 5 --pretty "$BOT_LOGFILE" | while read -r line; do
+            log_error "  $line"
+        done
+    fi
+    if [[ -f "$BOT_STDERR_LOG" ]]; then
+        log_error "Останні рядки stderr:"
+        "$PYTHON_EXEC" "$BOT_DIR/log_tail.py" -n 10 "$BOT_STDERR_LOG" | while read -r line; do
             log_error "  $line"
         done
     fi
@@ -298,6 +317,7 @@ show_status() {
     echo "PID файл: $PIDFILE"
     echo "Лог файл: $LOGFILE"
     echo "Лог бота: $BOT_LOGFILE"
+    echo "stderr бота: $BOT_STDERR_LOG"
     echo ""
     
     if check_bot_status; then
@@ -317,7 +337,7 @@ show_status() {
     if [[ -f "$LOGFILE" ]]; then
         echo ""
         echo "Останні записи логу:"
-        tail -5 "$LOGFILE"
+        "$PYTHON_EXEC" "$BOT_DIR/log_tail.py" -n 5 "$LOGFILE"
     fi
 }
 
@@ -344,6 +364,7 @@ show_help() {
     $PIDFILE      # PID файл
     $LOGFILE      # Лог скрипта
     $BOT_LOGFILE     # Лог бота
+    $BOT_STDERR_LOG     # stdout/stderr бота
 EOF
 }
 
@@ -50,7 +50,8 @@ log_message "Запускаю бота..."
 cd "$BOT_DIR"
 
 # Запускаємо бота і записуємо PID
-$PYTHON_EXEC "$BOT_SCRIPT" >> "$BOT_DIR/bot.log" 2>&1 &
+# bot.log пише і ротує сам бот; stdout/stderr - в окремий файл
+$PYTHON_EXEC "$BOT_SCRIPT" >> "$BOT_DIR/bot_stderr.log" 2>&1 &
 BOT_PID=$!
 
 # Записуємо PID у файл
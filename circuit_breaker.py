@@ -0,0 +1,218 @@
+# circuit_breaker.py - Запобіжник (circuit breaker) для зовнішніх API
+"""
+Поки Zadarma недоступна, кожен запит чекав таймаут і закінчувався
+"❌ Сталася помилка", а api_monitor з cron знову і знову бив у мертвий
+endpoint. Запобіжник на кожен endpoint:
+
+- closed: запити йдуть; FAILURE_THRESHOLD помилок поспіль - open
+- open: запити одразу відхиляються (CircuitOpenError) RESET_TIMEOUT секунд
+- half_open: після паузи пропускається один пробний запит - успіх
+  закриває запобіжник, помилка знову відкриває
+
+Стан зберігається у JSON файлі (tmp + rename), тож бот, webhook_worker і
+api_monitor з cron бачать той самий стан без власних проб.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+FAILURE_THRESHOLD = 3   # помилок поспіль до відкриття
+RESET_TIMEOUT = 30      # секунд у стані open до пробного запиту
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Запит відхилено без звернення до API - запобіжник відкритий"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit breaker {name} відкрито, повтор через {retry_after:.0f}с")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Запобіжник одного endpoint-а (потокобезпечний)"""
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT,
+                 clock=time.time, on_change=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._on_change = on_change
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started = 0.0
+        self._stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def _set_state(self, state):
+        """Змінює стан під локом; True - стан змінився (викликати _changed після локу)"""
+        if state == self.state:
+            return False
+        logger.warning(f"🔌 Запобіжник {self.name}: {self.state} → {state}")
+        self.state = state
+        return True
+
+    def _changed(self, changed):
+        # Поза локом запобіжника: on_change бере лок реєстру, а реєстр - локи запобіжників
+        if changed and self._on_change:
+            self._on_change(self)
+
+    def retry_after(self):
+        """Секунд до пробного запиту (0 - запит дозволено)"""
+        with self._lock:
+            return self._retry_after(self._clock())
+
+    def _retry_after(self, now):
+        if self.state == OPEN:
+            return max(0.0, self.opened_at + self.reset_timeout - now)
+        if self.state == HALF_OPEN:
+            # Пробний запит вже йде; якщо він завис - через паузу дозволяємо ще один
+            return max(0.0, self._probe_started + self.reset_timeout - now)
+        return 0.0
+
+    def allow(self):
+        """Чи можна робити запит; в half_open пропускає лише один пробний"""
+        now = self._clock()
+        with self._lock:
+            if self.state == CLOSED:
+                self._stats['calls'] += 1
+                return True
+            if self._retry_after(now) > 0:
+                self._stats['rejected'] += 1
+                return False
+            self._probe_started = now
+            changed = self._set_state(HALF_OPEN)
+            self._stats['calls'] += 1
+        self._changed(changed)
+        return True
+
+    def check(self):
+        """allow() або CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            changed = self._set_state(CLOSED)
+        self._changed(changed)
+
+    def record_failure(self):
+        changed = False
+        with self._lock:
+            self.failures += 1
+            self._stats['failures'] += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = self._clock()
+                if self.state != OPEN:
+                    self._stats['opened'] += 1
+                changed = self._set_state(OPEN)
+        self._changed(changed)
+
+    def restore(self, state, failures, opened_at):
+        """Стан, прочитаний з файлу іншого процесу"""
+        with self._lock:
+            self.state = state
+            self.failures = failures
+            self.opened_at = opened_at
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                'state': self.state,
+                'failures': self.failures,
+                'opened_at': self.opened_at,
+                'retry_after': round(self._retry_after(self._clock()), 1),
+            })
+            return snapshot
+
+
+class BreakerRegistry:
+    """Запобіжники за назвою endpoint-а зі спільним файлом стану"""
+
+    def __init__(self, state_file=None, failure_threshold=FAILURE_THRESHOLD,
+                 reset_timeout=RESET_TIMEOUT, clock=time.time):
+        self.state_file = state_file
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._breakers = {}
+        self._loaded_mtime = None
+
+    def get(self, name):
+        with self._lock:
+            self._load()
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(
+                    name, self.failure_threshold, self.reset_timeout, self._clock, self._save)
+            return breaker
+
+    def any_open(self):
+        with self._lock:
+            self._load()
+            return any(breaker.state != CLOSED for breaker in self._breakers.values())
+
+    def close_all(self):
+        """Health probe підтвердив, що API доступне"""
+        with self._lock:
+            for breaker in list(self._breakers.values()):
+                breaker.record_success()
+
+    def snapshot(self):
+        with self._lock:
+            self._load()
+            return {name: breaker.snapshot() for name, breaker in sorted(self._breakers.items())}
+
+    def _load(self):
+        if not self.state_file:
+            return
+        try:
+            mtime = os.stat(self.state_file).st_mtime
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Стан запобіжників не прочитано: {e}")
+            return
+        self._loaded_mtime = mtime
+        for name, state in data.items():
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(
+                    name, self.failure_threshold, self.reset_timeout, self._clock, self._save)
+            breaker.restore(state['state'], state['failures'], state['opened_at'])
+
+    def _save(self, breaker=None):
+        if not self.state_file:
+            return
+        with self._lock:
+            data = {name: {'state': b.state, 'failures': b.failures, 'opened_at': b.opened_at}
+                    for name, b in self._breakers.items()}
+            tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.state_file)
+                self._loaded_mtime = os.stat(self.state_file).st_mtime
+            except OSError as e:
+                logger.debug(f"Стан запобіжників не збережено: {e}")
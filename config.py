@@ -55,11 +55,11 @@ def format_phone_for_zadarma(phone):
         "0991234567" -> "0991234567"
         "991234567" -> "0991234567"
     """
-    logger.debug(f"📞 Форматування номеру: вхід = '{phone}'")
+    logger.debug("📞 Форматування номеру: вхід = '%s'", phone)
     
     # Видаляємо всі символи крім цифр
     clean_phone = re.sub(r'\D', '', phone)
-    logger.debug(f"📞 Після очищення: '{clean_phone}'")
+    logger.debug("📞 Після очищення: '%s'", clean_phone)
     
     # Правила конвертації
     if clean_phone.startswith('380'):
@@ -67,7 +67,7 @@ def format_phone_for_zadarma(phone):
         if len(clean_phone) == 12:  # 380 + 9 цифр
             result = '0' + clean_phone[3:]
         else:
-            logger.warning(f"⚠️ Незвична довжина номеру з 380: {len(clean_phone)}")
+            logger.warning("⚠️ Незвична довжина номеру з 380: %d", len(clean_phone))
             result = clean_phone
             
     elif len(clean_phone) == 9:
@@ -80,21 +80,21 @@ def format_phone_for_zadarma(phone):
         
     elif len(clean_phone) == 10 and not clean_phone.startswith('0'):
         # Номер з 10 цифр але не починається з 0 - можливо помилка
-        logger.warning(f"⚠️ Номер з 10 цифр не починається з 0: {clean_phone}")
+        logger.warning("⚠️ Номер з 10 цифр не починається з 0: %s", clean_phone)
         result = clean_phone
         
     else:
         # Інші випадки - залишаємо як є але логуємо попередження
-        logger.warning(f"⚠️ Незвичний формат номеру: {phone} -> {clean_phone} (довжина: {len(clean_phone)})")
+        logger.warning("⚠️ Незвичний формат номеру: %s -> %s (довжина: %d)", phone, clean_phone, len(clean_phone))
         result = clean_phone
     
     # Валідація результату
     if len(result) != 10:
-        logger.error(f"❌ ПОМИЛКА: результат має неправильну довжину: '{result}' (довжина: {len(result)})")
+        logger.error("❌ ПОМИЛКА: результат має неправильну довжину: '%s' (довжина: %d)", result, len(result))
     elif not result.startswith('0'):
-        logger.warning(f"⚠️ УВАГА: результат не починається з 0: '{result}'")
+        logger.warning("⚠️ УВАГА: результат не починається з 0: '%s'", result)
     
-    logger.info(f"📞 Фінальне форматування: '{phone}' -> '{result}'")
+    logger.debug("📞 Фінальне форматування: '%s' -> '%s'", phone, result)
     return result
 
 def validate_phone_number(phone):
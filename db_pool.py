@@ -0,0 +1,131 @@
+# db_pool.py - Спільний шар з'єднань SQLite (з'єднання на потік, WAL)
+"""
+Кожен потік отримує власне постійне з'єднання з БД замість
+sqlite3.connect() на кожен виклик.
+
+- journal_mode=WAL: читачі не чекають на запис синхронізації
+- synchronous=NORMAL: безпечно для WAL і значно швидше за FULL
+- busy_timeout: замість миттєвого "database is locked" чекаємо на writer
+- cached_statements: sqlite3 кешує підготовлені запити на з'єднанні
+
+Запис йде через transaction() - BEGIN IMMEDIATE під локом writer-а,
+тому два записи з одного процесу не конкурують за блокування SQLite.
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+SYNCHRONOUS = 'NORMAL'
+
+
+class SQLitePool:
+    """Пул з'єднань SQLite: одне з'єднання на потік + один writer"""
+
+    def __init__(self, db_path, busy_timeout_ms=BUSY_TIMEOUT_MS,
+                 cached_statements=CACHED_STATEMENTS, synchronous=SYNCHRONOUS):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.synchronous = synchronous
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            isolation_level=None,  # транзакції керуються явно через transaction()
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+        if mode.lower() != 'wal':
+            logger.warning(f"⚠️ SQLite {self.db_path}: WAL недоступний, journal_mode={mode}")
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+
+        with self._connections_lock:
+            self._connections.append(conn)
+        logger.debug(f"🔌 Нове з'єднання SQLite {self.db_path} для потоку {threading.current_thread().name}")
+        return conn
+
+    def connection(self):
+        """Повертає з'єднання поточного потоку (відкриває при першому виклику)"""
+        if self._pid != os.getpid():
+            # Після fork з'єднання батьківського процесу використовувати не можна
+            self._local = threading.local()
+            with self._connections_lock:
+                self._connections = []
+            self._pid = os.getpid()
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Транзакція запису: BEGIN IMMEDIATE ... COMMIT / ROLLBACK
+
+        Вкладені виклики в тому ж потоці виконуються в зовнішній транзакції.
+        """
+        conn = self.connection()
+        with self._write_lock:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            else:
+                conn.execute('COMMIT')
+
+    def close_all(self):
+        """Закриває всі з'єднання пулу"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    """Повертає спільний пул для файлу БД (один на процес)"""
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = SQLitePool(db_path)
+                _pools[db_path] = pool
+    return pool
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
@@ -47,7 +47,7 @@ if [ $? -eq 0 ]; then
     echo "✅ Конфігурація валідна"
     
     # Запустити бота
-    nohup python3 bot.py > bot.log 2>&1 &
+    nohup python3 bot.py >> bot_stderr.log 2>&1 &
     
     sleep 3
     
@@ -131,7 +131,7 @@ if [[ -f "bot.pid" ]]; then
             log "🔄 Перезапускаємо бота..."
             kill $BOT_PID
             sleep 2
-            nohup python3 bot.py > bot.log 2>&1 &
+            nohup python3 bot.py >> bot_stderr.log 2>&1 &
             echo $! > bot.pid
             log "✅ Бот перезапущено"
         fi
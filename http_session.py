@@ -0,0 +1,66 @@
+# http_session.py - Спільні HTTP сесії з пулом keep-alive з'єднань
+"""
+Модульні requests.get/post відкривають нове TCP+TLS з'єднання на кожен
+запит. Сесія з HTTPAdapter тримає пул з'єднань до хоста відкритим,
+тому повторні запити платять лише за час відповіді сервера.
+"""
+
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_KEEPALIVE_INTERVAL = 50  # секунд - менше за типовий idle timeout сервера (60с)
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, headers=None):
+    """
+    Створює requests.Session з пулом з'єднань pool_size на хост
+
+    Повторні спроби тут вимкнені - ними керує код, що викликає.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def warm_up(session, url, timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)):
+    """
+    Відкриває з'єднання заздалегідь (DNS + TCP + TLS), щоб перший
+    справжній запит не платив за handshake
+
+    Будь-яка HTTP відповідь (навіть 404) означає, що з'єднання готове.
+    """
+    started = time.time()
+    try:
+        response = session.head(url, timeout=timeout, allow_redirects=False)
+        elapsed_ms = (time.time() - started) * 1000
+        logger.debug(f"🔥 З'єднання з {url} прогріто за {elapsed_ms:.0f}мс (HTTP {response.status_code})")
+        return True
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"⚠️ Не вдалося прогріти з'єднання з {url}: {e}")
+        return False
+
+
+def start_keepalive(session, url, interval=DEFAULT_KEEPALIVE_INTERVAL):
+    """Фоновий потік, що періодично прогріває з'єднання, поки бот простоює"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            warm_up(session, url)
+
+    thread = threading.Thread(target=loop, name='http-keepalive')
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,95 @@
+# ivr_calls.py - Сховище очікуваних IVR дзвінків (SQLite)
+"""
+Замість /tmp/pending_ivr_calls.json, який PHP і Python читали цілком,
+перебирали лінійно і перезаписували без блокувань:
+
+- таблиця pending_ivr_calls з індексом (target_nsn, status, timestamp) -
+  пошук за номером у будь-якому форматі йде через B-tree
+- зміна статусу - один UPDATE ... WHERE status = 'pending', тож дзвінок
+  закриває рівно один обробник (PHP або Python)
+- записи старші за IVR_CALL_TTL видаляються при кожній реєстрації
+
+Ту саму схему створює webhooks/ivr_pending_store.php - обидві сторони
+працюють з одним файлом БД у режимі WAL.
+"""
+
+import time
+import logging
+
+from db_pool import get_pool
+from phone_utils import national_number
+
+logger = logging.getLogger(__name__)
+
+PENDING_IVR_DB = '/home/gomoncli/zadarma/pending_ivr_calls.db'
+IVR_MATCH_WINDOW = 120    # 2 хвилини - як у старому JSON пошуку
+IVR_CALL_TTL = 24 * 3600  # доба історії для діагностики
+
+_IVR_COLUMNS = ('call_id', 'target_number', 'caller_id', 'action_type', 'timestamp', 'status', 'completed_at')
+
+
+class PendingIvrCalls:
+    """Очікувані IVR дзвінки: реєстрація, пошук за номером, атомарне закриття"""
+
+    def __init__(self, db_path=PENDING_IVR_DB, ttl=IVR_CALL_TTL):
+        self.pool = get_pool(db_path)
+        self.ttl = ttl
+        self.init_db()
+
+    def init_db(self):
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS pending_ivr_calls (
+                    call_id TEXT PRIMARY KEY,
+                    target_number TEXT,
+                    target_nsn TEXT,
+                    caller_id TEXT,
+                    action_type TEXT,
+                    timestamp INTEGER,
+                    status TEXT DEFAULT 'pending',
+                    completed_at INTEGER
+                )
+            ''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS idx_pending_ivr_match
+                            ON pending_ivr_calls(target_nsn, status, timestamp)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_pending_ivr_time ON pending_ivr_calls(timestamp)')
+
+    def add(self, call_id, target_number, caller_id, action_type, timestamp=None):
+        """Реєструє дзвінок у статусі pending і прибирає прострочені записи"""
+        now = int(time.time())
+        with self.pool.transaction() as conn:
+            conn.execute('DELETE FROM pending_ivr_calls WHERE timestamp < ?', (now - self.ttl,))
+            conn.execute('''
+                INSERT OR REPLACE INTO pending_ivr_calls
+                (call_id, target_number, target_nsn, caller_id, action_type, timestamp, status)
+                VALUES (?, ?, ?, ?, ?, ?, 'pending')
+            ''', (call_id, target_number, national_number(target_number), caller_id, action_type,
+                  int(timestamp) if timestamp is not None else now))
+
+    def find_pending(self, target_number, window=IVR_MATCH_WINDOW):
+        """Найновіший pending дзвінок на номер не старший за window секунд"""
+        row = self.pool.connection().execute(f'''
+            SELECT {', '.join(_IVR_COLUMNS)} FROM pending_ivr_calls
+            WHERE target_nsn = ? AND status = 'pending' AND timestamp >= ?
+            ORDER BY timestamp DESC LIMIT 1
+        ''', (national_number(target_number), int(time.time()) - window)).fetchone()
+        return dict(zip(_IVR_COLUMNS, row)) if row else None
+
+    def update_status(self, call_id, status):
+        """
+        Закриває pending дзвінок; False якщо його вже закрив інший обробник
+
+        Перевірка і запис - один UPDATE, тож гонки між PHP і Python немає.
+        """
+        with self.pool.transaction() as conn:
+            updated = conn.execute('''
+                UPDATE pending_ivr_calls SET status = ?, completed_at = ?
+                WHERE call_id = ? AND status = 'pending'
+            ''', (status, int(time.time()), call_id)).rowcount
+        return updated > 0
+
+    def cleanup(self):
+        """Видаляє записи старші за ttl; повертає кількість видалених"""
+        with self.pool.transaction() as conn:
+            return conn.execute('DELETE FROM pending_ivr_calls WHERE timestamp < ?',
+                                (int(time.time()) - self.ttl,)).rowcount
@@ -0,0 +1,110 @@
+# json_stream.py - Потоковий розбір великих JSON відповідей
+"""
+Розбір відповіді виду {"content": [{...}, {...}, ...], "page": {...}} по частинах:
+елементи масиву віддаються по одному, щойно вони повністю прочитані,
+тож у пам'яті одночасно лише поточний шматок тексту і один елемент,
+а не вся відповідь і список з тисяч словників.
+
+    stream = JSONArrayStream(response.iter_content(STREAM_CHUNK_SIZE), "content")
+    for client in stream:
+        ...
+    total_pages = stream.fields["page"]["total_pages"]
+
+Решта полів верхнього рівня (page тощо) доступні в stream.fields; поля,
+що йдуть після масиву, - лише після завершення ітерації.
+"""
+
+import json
+import codecs
+
+STREAM_CHUNK_SIZE = 16 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+class JSONArrayStream:
+    """Ітератор по елементах масиву array_key в JSON об'єкті верхнього рівня"""
+
+    def __init__(self, chunks, array_key="content"):
+        self.fields = {}
+        self._chunks = iter(chunks)
+        self._array_key = array_key
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read(self):
+        """Дочитує наступний шматок; False - дані закінчились"""
+        if self._eof:
+            return False
+        # Прочитане відкидаємо, щоб буфер не ріс разом з відповіддю
+        self._buf = self._buf[self._pos:]
+        self._pos = 0
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                self._buf += text
+                return True
+        self._buf += self._utf8.decode(b"", final=True)
+        self._eof = True
+        return False
+
+    def _peek(self):
+        """Перший непробільний символ (None - кінець даних)"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._read():
+                return None
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char is None or char not in chars:
+            raise ValueError(f"Очікувався один з {chars!r} на позиції {self._pos}, отримано {char!r}")
+        self._pos += 1
+        return char
+
+    def _value(self):
+        """
+        Одне повне JSON значення з поточної позиції
+
+        Незавершене значення в кінці буфера (обірваний об'єкт, рядок або
+        число, що може продовжуватись) - дочитуємо і пробуємо знову.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except ValueError:
+                if self._eof:
+                    raise
+            self._read()
+
+    def __iter__(self):
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == self._array_key and self._peek() == "[":
+                self._pos += 1
+                if self._peek() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                self.fields[key] = self._value()
+            if self._expect(",}") == "}":
+                return
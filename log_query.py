@@ -0,0 +1,152 @@
+# log_query.py - Пошук записів у логах з кінця файлу для /logs і /diagnostic
+"""
+/logs і /diagnostic читали bot.log цілком (readlines) заради останніх 5-50
+рядків - на логу за кілька місяців це сотні МБ у пам'яті бота.
+
+Тут файл читається блоками з кінця (log_tail), записи фільтруються за рівнем,
+модулем і часом, а читання зупиняється, щойно знайдено limit записів або
+вичерпано бюджет MAX_SCAN_BYTES - відповідь не залежить від розміру файлу.
+Для until погодинний індекс <файл>.idx (його веде JsonLinesFileHandler)
+дає offset, з якого починати, без сканування новіших записів.
+
+Розуміє і JSON-lines (logging_setup), і старий текстовий формат
+"2024-01-01 10:00:00,123 - name - LEVEL - msg" та рядки shell скриптів.
+"""
+
+import os
+import re
+import json
+import time
+
+from logging_setup import INDEX_SUFFIX
+from log_tail import iter_lines_backwards, BLOCK_SIZE
+
+MAX_SCAN_BYTES = 8 * 1024 * 1024   # максимум байт з кінця на один запит
+DEFAULT_LIMIT = 50
+ERROR_LEVELS = ('ERROR', 'CRITICAL')
+
+_TEXT_LINE = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)(?:,\d+)? - (\S+) - ([A-Z]+) - (.*)$')
+
+
+def parse_line(line):
+    """Запис з рядка логу: dict з ts, time, level, module, msg (None - порожній рядок)"""
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if isinstance(record, dict) and 'msg' in record:
+            return record
+
+    match = _TEXT_LINE.match(line)
+    if match:
+        stamp = match.group(1)
+        try:
+            ts = time.mktime(time.strptime(stamp, '%Y-%m-%d %H:%M:%S'))
+        except ValueError:
+            ts = None
+        return {'ts': ts, 'time': stamp, 'level': match.group(3),
+                'module': match.group(2), 'msg': match.group(4)}
+
+    # Рядок traceback, shell скрипта тощо - без часу і рівня
+    return {'ts': None, 'time': None, 'level': None, 'module': None, 'msg': line}
+
+
+def read_lines_backwards(path, end=None, max_bytes=MAX_SCAN_BYTES, block_size=BLOCK_SIZE):
+    """Рядки файлу від end (за замовчуванням - кінець) до початку, не більше max_bytes"""
+    return iter_lines_backwards(path, end, max_bytes, block_size)
+
+
+def load_index(path):
+    """{година_epoch: найменший offset} з <path>.idx; порожньо, якщо індексу немає"""
+    index = {}
+    try:
+        with open(path + INDEX_SUFFIX, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) != 2:
+                    continue
+                try:
+                    hour, offset = int(parts[0]), int(parts[1])
+                except ValueError:
+                    continue
+                if hour not in index or offset < index[hour]:
+                    index[hour] = offset
+    except OSError:
+        pass
+    return index
+
+
+def offset_after(index, until):
+    """Offset першої години після until - звідти читаємо назад (None - з кінця файлу)"""
+    later = [offset for hour, offset in index.items() if hour > until]
+    return min(later) if later else None
+
+
+def query(path, levels=None, module=None, since=None, until=None, limit=DEFAULT_LIMIT,
+          max_bytes=MAX_SCAN_BYTES):
+    """
+    Останні limit записів, що пройшли фільтри, у хронологічному порядку
+
+    Args:
+        levels: рівні, напр. ERROR_LEVELS (None - всі)
+        module: префікс імені logger-а ('zadarma' - zadarma_api, zadarma_client...)
+        since, until: межі часу, epoch секунди
+    """
+    end = offset_after(load_index(path), until) if until is not None else None
+    matched = []
+    for line in read_lines_backwards(path, end, max_bytes):
+        record = parse_line(line)
+        if record is None:
+            continue
+        ts = record.get('ts')
+        if ts is None:
+            if since is not None or until is not None:
+                continue
+        else:
+            if until is not None and ts > until:
+                continue
+            if since is not None and ts < since:
+                break  # далі - лише старіші записи
+        if levels and record.get('level') not in levels:
+            continue
+        if module and not (record.get('module') or '').startswith(module):
+            continue
+        matched.append(record)
+        if len(matched) >= limit:
+            break
+    matched.reverse()
+    return matched
+
+
+def format_record(record, width=100):
+    """Короткий рядок для Telegram: '10:00:00 ERROR bot: повідомлення'"""
+    parts = []
+    if record.get('time'):
+        parts.append(record['time'][-8:])
+    if record.get('level'):
+        parts.append(record['level'])
+    if record.get('module'):
+        parts.append(record['module'] + ':')
+    parts.append(record.get('msg', ''))
+    text = ' '.join(parts)
+    if len(text) > width:
+        text = text[:width - 3] + '...'
+    return text
+
+
+def log_files_size(directory):
+    """(кількість, байт) файлів логів у directory, включно з ротованими bot.log.N"""
+    count = 0
+    total = 0
+    for entry in os.scandir(directory):
+        name = entry.name
+        if name.endswith(INDEX_SUFFIX):
+            continue
+        if name.endswith('.log') or '.log.' in name:
+            count += 1
+            total += entry.stat().st_size
+    return count, total
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# log_tail.py - Останні рядки файлу без читання його цілком
+"""
+tail(path, n, predicate) читає файл блоками фіксованого розміру з кінця
+(os.pread - без seek і без відображення гігабайтного файлу в пам'ять) і
+зупиняється, щойно знайдено n рядків, що пройшли predicate. Пам'ять -
+один блок плюс знайдені рядки, незалежно від розміру файлу.
+
+Блок ріжемо за першим b'\\n' до декодування: байт переводу рядка не
+трапляється всередині багатобайтових символів UTF-8, тож символ, розрізаний
+межею блоку, декодується лише разом з рештою рядка з наступного блоку.
+
+Для shell скриптів (check_and_run_bot.sh):
+    python3 log_tail.py -n 5 bot.log
+    python3 log_tail.py --window 20 --count -e 'error|exception' bot.log
+"""
+
+import os
+import re
+import sys
+import argparse
+
+BLOCK_SIZE = 64 * 1024
+
+
+def iter_lines_backwards(path, end=None, max_bytes=None, block_size=BLOCK_SIZE):
+    """
+    Рядки файлу від end (за замовчуванням - кінець) до початку, без '\\n'
+
+    max_bytes обмежує, скільки байт з кінця прочитати; неповний перший
+    рядок такого вікна відкидається.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        pos = size if end is None else min(end, size)
+        limit = max(0, pos - max_bytes) if max_bytes else 0
+        tail = b''
+        while pos > limit:
+            chunk = min(block_size, pos - limit)
+            pos -= chunk
+            data = os.pread(fd, chunk, pos) + tail
+            cut = data.find(b'\n')
+            if cut < 0:
+                tail = data
+                continue
+            # Початок блоку до першого '\n' - хвіст рядка з попереднього блоку;
+            # решта - цілі рядки, декодуємо одним викликом
+            tail = data[:cut]
+            for line in reversed(data[cut + 1:].decode('utf-8', 'replace').split('\n')):
+                if line:
+                    yield line.rstrip('\r')
+        if tail and limit == 0:
+            yield tail.rstrip(b'\r').decode('utf-8', 'replace')
+    finally:
+        os.close(fd)
+
+
+def tail(path, n=10, predicate=None, window=None, max_bytes=None, block_size=BLOCK_SIZE):
+    """
+    Останні n рядків (у порядку файлу), для яких predicate(line) істинний
+
+    Args:
+        window: переглядати лише стільки останніх рядків (None - без обмеження)
+        max_bytes: не читати більше стільки байт з кінця (None - до початку файлу)
+    """
+    found = []
+    if n <= 0:
+        return found
+    for seen, line in enumerate(iter_lines_backwards(path, max_bytes=max_bytes, block_size=block_size)):
+        if window is not None and seen >= window:
+            break
+        if predicate is None or predicate(line):
+            found.append(line)
+            if len(found) >= n:
+                break
+    found.reverse()
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Останні рядки логу з кінця файлу')
+    parser.add_argument('path')
+    parser.add_argument('-n', '--lines', type=int, default=10, help='скільки рядків вивести')
+    parser.add_argument('-e', '--grep', help='лише рядки, що містять regex (без урахування регістру)')
+    parser.add_argument('--window', type=int, help='переглядати лише N останніх рядків')
+    parser.add_argument('--count', action='store_true', help='вивести кількість знайдених рядків')
+    parser.add_argument('--pretty', action='store_true', help='JSON-lines записи - коротким рядком')
+    args = parser.parse_args(argv)
+
+    predicate = None
+    if args.grep:
+        pattern = re.compile(args.grep, re.IGNORECASE)
+        predicate = lambda line: pattern.search(line) is not None
+
+    n = args.window if args.count and args.window else args.lines
+    try:
+        lines = tail(args.path, n, predicate, window=args.window)
+    except OSError as e:
+        print(f"❌ {args.path}: {e}", file=sys.stderr)
+        return 1
+
+    if args.count:
+        print(len(lines))
+        return 0
+    if args.pretty:
+        from log_query import parse_line, format_record
+        records = [parse_line(line) for line in lines]
+        lines = [format_record(record, width=200) for record in records if record]
+    for line in lines:
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# logging_setup.py - Спільне налаштування логування для бота і webhook процесів
+"""
+logging.basicConfig з FileHandler писав кожен рядок у файл синхронно - у
+потоці, що обробляє /vorota, між перевіркою авторизації і запитом callback.
+
+setup_logging() натомість ставить на root logger QueueHandler: виклик
+logger.info лише кладе запис у чергу, а файл і консоль обслуговує фоновий
+QueueListener. Рівні можна задати окремо для модулів - через аргумент або
+змінну оточення ZADARMA_LOG_LEVELS="user_db=DEBUG,zadarma_client=WARNING".
+
+Файл логу - JSON-lines (один запис на рядок: ts, time, level, module, msg)
+з ротацією за розміром і sidecar індексом <файл>.idx: на першому записі
+кожної години - рядок "година_epoch offset". log_query читає файл з кінця
+і за індексом переходить до потрібної години без сканування всього файлу.
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_LEVELS_ENV = 'ZADARMA_LOG_LEVELS'
+LOG_MAX_BYTES = 10 * 1024 * 1024   # ротація bot.log при 10 МБ
+LOG_BACKUP_COUNT = 5               # bot.log.1 ... bot.log.5
+INDEX_SUFFIX = '.idx'
+REOPEN_CHECK_INTERVAL = 1.0        # секунд між перевірками ротації іншим процесом
+
+# Бібліотеки на INFO пишуть рядок на кожен запит до Telegram/API
+MODULE_LEVELS = {
+    'urllib3': logging.WARNING,
+    'telegram': logging.WARNING,
+    'apscheduler': logging.WARNING,
+}
+
+_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Один запис - один рядок JSON; traceback - у полі exc"""
+
+    def __init__(self):
+        super().__init__()
+        self._second = None
+        self._stamp = None
+
+    def format(self, record):
+        # strftime - раз на секунду, а не на кожен запис
+        second = int(record.created)
+        if second != self._second:
+            self._stamp = time.strftime('%Y-%m-%d %H:%M:%S', self.converter(second))
+            self._second = second
+        entry = {
+            'ts': round(record.created, 3),
+            'time': self._stamp,
+            'level': record.levelname,
+            'module': record.name,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class JsonLinesFileHandler(RotatingFileHandler):
+    """
+    JSON-lines файл з ротацією і погодинним індексом offset-ів
+
+    webhook_processor.log пишуть і webhook_worker, і process_webhook_working:
+    якщо файл уже ротував інший процес, перевідкриваємо його, а не пишемо в архів.
+    """
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.setFormatter(JsonLinesFormatter())
+        self.index_path = self.baseFilename + INDEX_SUFFIX
+        self._indexed_hour = None
+        self._checked_at = 0.0
+        self._size = 0
+
+    def emit(self, record):
+        # Форматуємо один раз (RotatingFileHandler.shouldRollover форматує ще раз)
+        try:
+            msg = self.format(record) + self.terminator
+            # maxBytes - у байтах, а кирилиця в UTF-8 - 2 байти на символ
+            size = len(msg.encode('utf-8'))
+            self._reopen_if_rotated()
+            if self.stream is None:
+                self._reopen()
+            if self.maxBytes > 0 and self._size + size >= self.maxBytes:
+                # Можливо, файл уже ротував інший процес - тоді лише перевідкриваємо
+                self._checked_at = 0.0
+                self._reopen_if_rotated()
+                if self._size + size >= self.maxBytes:
+                    self.doRollover()
+                    self._size = 0
+            hour = int(record.created // 3600) * 3600
+            if hour != self._indexed_hour:
+                self._index_hour(hour)
+            self.stream.write(msg)
+            self.flush()
+            self._size += size
+        except Exception:
+            self.handleError(record)
+
+    def _reopen_if_rotated(self):
+        """Раз на REOPEN_CHECK_INTERVAL: чужа ротація і розмір з урахуванням інших процесів"""
+        if self.stream is None:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < REOPEN_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            current = os.stat(self.baseFilename).st_ino
+        except OSError:
+            current = None
+        stat = os.fstat(self.stream.fileno())
+        if current != stat.st_ino:
+            self.stream.close()
+            self._reopen()
+        else:
+            self._size = stat.st_size
+
+    def _reopen(self):
+        self.stream = self._open()
+        self._size = os.fstat(self.stream.fileno()).st_size
+        self._indexed_hour = None
+
+    def _index_hour(self, hour):
+        """Offset, з якого в файлі починаються записи години hour"""
+        offset = os.fstat(self.stream.fileno()).st_size
+        with open(self.index_path, 'a') as f:
+            f.write(f"{hour} {offset}\n")
+        self._indexed_hour = hour
+
+    def doRollover(self):
+        super().doRollover()
+        # Індекс їде разом з файлом: bot.log.1 -> bot.log.1.idx
+        for i in range(self.backupCount - 1, 0, -1):
+            source = f"{self.baseFilename}.{i}{INDEX_SUFFIX}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.baseFilename}.{i + 1}{INDEX_SUFFIX}")
+        if os.path.exists(self.index_path):
+            if self.backupCount > 0:
+                os.replace(self.index_path, f"{self.baseFilename}.1{INDEX_SUFFIX}")
+            else:
+                os.remove(self.index_path)
+        self._indexed_hour = None
+
+
+def parse_module_levels(spec):
+    """'user_db=DEBUG,zadarma_client=WARNING' -> {'user_db': 10, 'zadarma_client': 30}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        name, level = name.strip(), level.strip().upper()
+        if not sep or not name:
+            continue
+        value = logging.getLevelName(level) if not level.isdigit() else int(level)
+        if isinstance(value, int):
+            levels[name] = value
+    return levels
+
+
+def setup_logging(log_file=None, level=logging.INFO, console=False, module_levels=None):
+    """
+    Запускає фоновий запис логів; повторний виклик повертає той самий QueueListener
+
+    Args:
+        log_file: JSON-lines файл логу з ротацією (None - без файлу)
+        level: рівень root logger-а
+        console: дублювати в stderr
+        module_levels: {ім'я logger-а: рівень} поверх MODULE_LEVELS;
+                       ZADARMA_LOG_LEVELS має пріоритет над обома
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        handlers = []
+        if log_file:
+            handlers.append(JsonLinesFileHandler(log_file))
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers.append(console_handler)
+
+        log_queue = queue.Queue(-1)
+        _queue_handler = QueueHandler(log_queue)
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+
+        levels = dict(MODULE_LEVELS)
+        levels.update(module_levels or {})
+        levels.update(parse_module_levels(os.environ.get(LOG_LEVELS_ENV)))
+        for name, module_level in levels.items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return _listener
+
+
+def stop_logging():
+    """Дописує чергу у файл і зупиняє фоновий потік (atexit, тести)"""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        _queue_handler = None
@@ -0,0 +1,171 @@
+# pending_calls.py - Індекс очікуваних дзвінків у пам'яті
+"""
+Зіставлення webhook події з дзвінком користувача без SQL каскаду:
+дзвінки тримаються в пам'яті з ключами call_id, pbx_call_id та NSN
+цільового номера (останні 9 цифр), тож NOTIFY_START/NOTIFY_END
+знаходять свій дзвінок одним зверненням до словника.
+
+Записи живуть ttl секунд від start_time; прострочені прибираються
+ліниво (купа за часом закінчення) при кожній операції.
+Таблиця call_tracking лишається журналом: з неї індекс
+відновлюється після перезапуску процесу.
+"""
+
+import time
+import heapq
+import logging
+import threading
+
+from phone_utils import national_number
+
+logger = logging.getLogger(__name__)
+
+PENDING_TTL = 600  # 10 хвилин - як найширше вікно старого каскаду пошуку
+
+# Статуси, в яких дзвінок ще чекає на webhook за номером
+MATCHABLE_STATUSES = ('api_success',)
+
+
+class PendingCallIndex:
+    """Потокобезпечний індекс дзвінків: call_id / pbx_call_id / NSN → дзвінок"""
+
+    def __init__(self, ttl=PENDING_TTL, clock=time.time):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls = {}      # call_id -> dict дзвінка
+        self._by_pbx = {}     # pbx_call_id -> call_id
+        self._by_target = {}  # NSN -> [call_id, ...] у порядку реєстрації
+        self._expiry = []     # купа (expires_at, call_id)
+        self._stats = {'added': 0, 'expired': 0, 'pbx_hits': 0, 'target_hits': 0, 'misses': 0}
+
+    def _purge(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, call_id = heapq.heappop(self._expiry)
+            call = self._calls.get(call_id)
+            # Перереєстрований дзвінок має новий термін - старий запис купи ігноруємо
+            if call is not None and call['start_time'] + self.ttl == expires_at:
+                self._drop(call_id)
+                self._stats['expired'] += 1
+
+    def _drop(self, call_id):
+        call = self._calls.pop(call_id, None)
+        if call is None:
+            return
+        if call.get('pbx_call_id') and self._by_pbx.get(call['pbx_call_id']) == call_id:
+            del self._by_pbx[call['pbx_call_id']]
+        target = self._by_target.get(call['target_nsn'])
+        if target is not None:
+            target.remove(call_id)
+            if not target:
+                del self._by_target[call['target_nsn']]
+
+    def _put(self, call, now):
+        """Додає/замінює дзвінок; повертає False для вже простроченого"""
+        call = dict(call)
+        call['target_nsn'] = national_number(call.get('target_number'))
+        if call['start_time'] + self.ttl <= now:
+            return False
+        self._drop(call['call_id'])
+        self._calls[call['call_id']] = call
+        if call.get('pbx_call_id'):
+            self._by_pbx[call['pbx_call_id']] = call['call_id']
+        self._by_target.setdefault(call['target_nsn'], []).append(call['call_id'])
+        heapq.heappush(self._expiry, (call['start_time'] + self.ttl, call['call_id']))
+        return True
+
+    def add(self, call):
+        """Реєструє дзвінок (потрібні call_id, target_number, start_time)"""
+        now = self._clock()
+        with self._lock:
+            self._purge(now)
+            if self._put(call, now):
+                self._stats['added'] += 1
+
+    def merge(self, calls, skip=()):
+        """
+        Підтягує дзвінки з журналу (рестарт або запис іншим процесом)
+
+        skip - call_id з ще не записаними локальними змінами: їхній стан у
+        пам'яті новіший за журнал.
+        """
+        now = self._clock()
+        with self._lock:
+            self._purge(now)
+            for call in calls:
+                if call['call_id'] in skip:
+                    continue
+                current = self._calls.get(call['call_id'])
+                if current is not None and all(current.get(key) == call.get(key) for key in call):
+                    continue
+                self._put(call, now)
+
+    def update(self, call_id, status=None, pbx_call_id=None):
+        """Оновлює статус і/або прив'язує pbx_call_id; повертає копію дзвінка або None"""
+        with self._lock:
+            self._purge(self._clock())
+            call = self._calls.get(call_id)
+            if call is None:
+                return None
+            if status is not None:
+                call['status'] = status
+            if pbx_call_id:
+                old = call.get('pbx_call_id')
+                if old and self._by_pbx.get(old) == call_id:
+                    del self._by_pbx[old]
+                call['pbx_call_id'] = pbx_call_id
+                self._by_pbx[pbx_call_id] = call_id
+            return dict(call)
+
+    def get(self, call_id):
+        with self._lock:
+            self._purge(self._clock())
+            call = self._calls.get(call_id)
+            return dict(call) if call else None
+
+    def by_pbx_id(self, pbx_call_id):
+        """Дзвінок, до якого прив'язано pbx_call_id"""
+        with self._lock:
+            self._purge(self._clock())
+            call_id = self._by_pbx.get(pbx_call_id) if pbx_call_id else None
+            if call_id is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['pbx_hits'] += 1
+            return dict(self._calls[call_id])
+
+    def by_target(self, target_number, window=None, statuses=MATCHABLE_STATUSES):
+        """
+        Найновіший дзвінок на номер (будь-який формат) у статусі statuses
+
+        window - максимальний вік дзвінка в секундах (за замовчуванням ttl)
+        """
+        now = self._clock()
+        nsn = national_number(target_number)
+        with self._lock:
+            self._purge(now)
+            # На один номер одночасно - одиниці дзвінків
+            best = None
+            for call_id in self._by_target.get(nsn, ()):
+                call = self._calls[call_id]
+                if window is not None and call['start_time'] <= now - window:
+                    continue
+                if call.get('status') in statuses and (best is None or call['start_time'] >= best['start_time']):
+                    best = call
+            if best is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['target_hits'] += 1
+            return dict(best)
+
+    def __len__(self):
+        with self._lock:
+            self._purge(self._clock())
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            self._purge(self._clock())
+            stats = dict(self._stats)
+            stats['size'] = len(self._calls)
+            return stats
@@ -0,0 +1,52 @@
+# phone_utils.py - Єдина нормалізація телефонних номерів
+"""
+Національний значущий номер (NSN) - останні 9 цифр українського номера:
+    +380 50 111 22 33 / 380501112233 / 0501112233 → 501112233
+
+Зберігається в окремих колонках (clients.phone_nsn, call_tracking.target_nsn)
+з B-tree індексом, тому пошук за номером - це завжди `WHERE nsn = ?`
+замість `LIKE '%...%'` по всій таблиці.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+NSN_LENGTH = 9
+
+
+def national_number(phone):
+    """Повертає останні 9 цифр номера (або '' для порожнього значення)"""
+    if phone is None:
+        return ''
+    digits = ''.join(ch for ch in str(phone) if ch.isdigit())
+    return digits[-NSN_LENGTH:]
+
+
+def ensure_nsn_column(conn, table, source_column, nsn_column, index_name):
+    """
+    Міграція: додає NSN колонку, заповнює існуючі рядки та створює індекс
+
+    Безпечно викликати при кожному старті - повторно нічого не змінює,
+    лише дозаповнює рядки, вставлені без NSN.
+    """
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if nsn_column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {nsn_column} TEXT')
+        logger.info(f"🔧 Додано колонку {table}.{nsn_column}")
+
+    conn.create_function('national_number', 1, national_number)
+    updated = conn.execute(
+        f'UPDATE {table} SET {nsn_column} = national_number({source_column}) '
+        f'WHERE {nsn_column} IS NULL AND {source_column} IS NOT NULL'
+    ).rowcount
+    if updated > 0:
+        logger.info(f"🔧 Заповнено {nsn_column} для {updated} рядків {table}")
+
+    # Індекс міг бути створений під іншим ім'ям (user_db.force_full_sync чергує імена)
+    indexed = any(
+        [info[2] for info in conn.execute(f'PRAGMA index_info({index[1]})')] == [nsn_column]
+        for index in conn.execute(f'PRAGMA index_list({table})').fetchall()
+    )
+    if not indexed:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table}({nsn_column})')
@@ -7,6 +7,18 @@ logging.basicConfig(filename='/home/gomoncli/zadarma/webhook_processor.log', lev
                    format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def process_call_result(data):
+    """Логує результат дзвінка; True - успішний (викликається також з webhook_worker.py)"""
+    duration = int(data.get('duration', 0))
+    disposition = data.get('disposition', '').upper()
+    
+    if duration > 0 or disposition == 'ANSWERED':
+        logger.info('Успішний дзвінок: duration={}, disposition={}'.format(duration, disposition))
+        return True
+    else:
+        logger.info('Неуспішний дзвінок: duration={}, disposition={}'.format(duration, disposition))
+        return False
+
 def main():
     if len(sys.argv) < 2:
         print("ERROR")
@@ -14,15 +26,10 @@ def main():
     
     try:
         data = json.loads(sys.argv[1])
-        duration = int(data.get('duration', 0))
-        disposition = data.get('disposition', '').upper()
-        
-        if duration > 0 or disposition == 'ANSWERED':
-            logger.info('Успішний дзвінок: duration={}, disposition={}'.format(duration, disposition))
+        if process_call_result(data):
             print("SUCCESS")
             return 0
         else:
-            logger.info('Неуспішний дзвінок: duration={}, disposition={}'.format(duration, disposition))
             print("ERROR") 
             return 1
     except Exception as e:
@@ -8,24 +8,28 @@ process_webhook.py - ВИПРАВЛЕНИЙ обробник webhook-ів для
 import sys
 import json
 import logging
-import os
 import time
 
 # Додаємо шлях до нашого проекту
 sys.path.append('/home/gomoncli/zadarma')
 
 # Налаштування логування
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/home/gomoncli/zadarma/webhook_processor.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+from logging_setup import setup_logging
+
+setup_logging('/home/gomoncli/zadarma/webhook_processor.log', console=True)
 
 logger = logging.getLogger('webhook_processor_fixed')
 
+from phone_utils import national_number
+from pending_calls import PENDING_TTL
+from ivr_calls import PendingIvrCalls, IVR_MATCH_WINDOW
+
+# NSN номерів хвіртки і воріт - з них приходить webhook дзвінка
+GATE_NUMBERS = {
+    '637442017': 'hvirtka',
+    '930063585': 'vorota',
+}
+
 def normalize_phone_number(phone):
     """Нормалізує номер телефону для порівняння"""
     if not phone:
@@ -44,79 +48,88 @@ def normalize_phone_number(phone):
 
 def find_tracked_call_enhanced(pbx_call_id, caller_id, call_tracker):
     """
-    Покращений пошук відстежуваного дзвінка
-    Використовує кілька стратегій пошуку
+    Пошук відстежуваного дзвінка через індекс очікуваних дзвінків
+
+    Спершу за PBX ID, потім за NSN номера з webhook - по одному зверненню
+    до індексу замість перебору форматів номера і часових вікон у SQL.
     """
-    logger.info(f"🔍 ПОКРАЩЕНИЙ пошук дзвінка:")
-    logger.info(f"   PBX ID: {pbx_call_id}")
-    logger.info(f"   Caller ID: {caller_id}")
-    
-    current_time = time.time()
+    logger.info(f"🔍 Пошук дзвінка: PBX ID {pbx_call_id}, Caller ID {caller_id}")
     
     # Стратегія 1: Пошук по PBX ID
     if pbx_call_id:
-        try:
-            call_data = call_tracker.get_call_by_pbx_id(pbx_call_id)
-            if call_data:
-                logger.info(f"✅ ЗНАЙДЕНО ПО PBX ID: {pbx_call_id}")
-                return call_data
-        except:
-            pass
+        call_data = call_tracker.get_call_by_pbx_id(pbx_call_id)
+        if call_data:
+            logger.info(f"✅ ЗНАЙДЕНО ПО PBX ID: {pbx_call_id}")
+            return call_data
     
-    # Стратегія 2: Аналіз номера з webhook для визначення типу дзвінка
-    target_numbers = []
-    action_type = None
-    
-    # Визначаємо тип дзвінка по caller_id
-    if '637442017' in caller_id:
-        target_numbers = ['0637442017', '637442017', '380637442017']
-        action_type = 'hvirtka'
-        logger.info("🚪 Тип: Хвіртка")
-    elif '930063585' in caller_id:
-        target_numbers = ['0930063585', '930063585', '380930063585']
-        action_type = 'vorota'
-        logger.info("🏠 Тип: Ворота")
-    else:
+    # Стратегія 2: Пошук по номеру - будь-який формат зводиться до NSN
+    action_type = GATE_NUMBERS.get(national_number(caller_id))
+    if action_type is None:
         logger.warning(f"⚠️ Невідомий номер: {caller_id}")
         return None
+    logger.info(f"🚪 Тип: {action_type}")
     
-    # Стратегія 3: Пошук по номеру та часу з розширеними інтервалами
-    for target_number in target_numbers:
-        for time_window in [30, 60, 120, 300, 600]:  # від 30 секунд до 10 хвилин
-            try:
-                if hasattr(call_tracker, 'get_call_by_target_and_time'):
-                    call_data = call_tracker.get_call_by_target_and_time(target_number, time_window)
-                else:
-                    # Fallback метод
-                    call_data = call_tracker.get_call_by_target(target_number, time_window)
-                
-                if call_data:
-                    time_diff = current_time - call_data.get('timestamp', 0)
-                    logger.info(f"✅ ЗНАЙДЕНО ПО НОМЕРУ: {target_number} (час: {time_diff:.1f}с)")
-                    return call_data
-            except Exception as e:
-                logger.debug(f"   Помилка пошуку по {target_number}: {e}")
-                continue
+    call_data = call_tracker.get_call_by_target_and_time(caller_id, PENDING_TTL)
+    if call_data:
+        time_diff = time.time() - call_data.get('start_time', 0)
+        logger.info(f"✅ ЗНАЙДЕНО ПО НОМЕРУ: {call_data['call_id']} (час: {time_diff:.1f}с)")
+        return call_data
     
-    # Стратегія 4: Пошук останнього дзвінка правильного типу
+    logger.warning(f"❌ Дзвінок НЕ ЗНАЙДЕНО")
+    return None
+
+_ivr_calls = None
+
+def get_ivr_calls():
+    """Сховище pending IVR дзвінків (відкривається при першому зверненні)"""
+    global _ivr_calls
+    if _ivr_calls is None:
+        _ivr_calls = PendingIvrCalls()
+    return _ivr_calls
+
+def check_pending_ivr_calls(caller_id, disposition, duration):
+    """Перевіряє чи є pending IVR дзвінки для цього номера"""
     try:
-        if hasattr(call_tracker, 'get_recent_calls'):
-            recent_calls = call_tracker.get_recent_calls(600)
-        else:
-            # Fallback
-            recent_calls = []
-        
-        for call in recent_calls:
-            if call.get('action_type') == action_type:
-                time_diff = current_time - call.get('timestamp', 0)
-                if time_diff < 600:  # 10 хвилин
-                    logger.info(f"✅ ЗНАЙДЕНО ПО ТИПУ: {call['call_id']} (час: {time_diff:.1f}с)")
-                    return call
+        return get_ivr_calls().find_pending(caller_id, IVR_MATCH_WINDOW)
+    except Exception as e:
+        logger.error(f"❌ Помилка пошуку pending IVR дзвінка: {e}")
+        return None
+
+def update_ivr_call_status(call_id, status):
+    """Оновлює статус IVR дзвінка (лише якщо він ще pending)"""
+    try:
+        return get_ivr_calls().update_status(call_id, status)
     except Exception as e:
-        logger.error(f"❌ Помилка пошуку нещодавніх дзвінків: {e}")
+        logger.error(f"❌ Помилка оновлення IVR дзвінка {call_id}: {e}")
+        return False
+
+def process_ivr_webhook_result(call_data, disposition, duration):
+    """Обробляє результат IVR webhook і повертає повідомлення для логу"""
+    action_name = call_data['action_type']
+    call_id = call_data['call_id']
     
-    logger.warning(f"❌ Дзвінок НЕ ЗНАЙДЕНО жодним способом")
-    return None
+    if disposition == 'cancel' and duration > 0:
+        message = f"✅ {action_name.capitalize()} відкрито!"
+        status = 'success'
+        update_ivr_call_status(call_id, 'success')
+    elif disposition == 'busy':
+        message = f"❌ {action_name.capitalize()}: номер зайнятий"
+        status = 'busy'
+        update_ivr_call_status(call_id, 'busy')
+    elif disposition in ['no-answer', 'noanswer'] and duration == 0:
+        message = f"❌ {action_name.capitalize()}: номер не відповідає"
+        status = 'no_answer' 
+        update_ivr_call_status(call_id, 'no_answer')
+    elif disposition == 'answered' and duration > 0:
+        message = f"⚠️ {action_name.capitalize()}: дзвінок прийнято (потрібна перевірка)"
+        status = 'answered'
+        update_ivr_call_status(call_id, 'answered')
+    else:
+        message = f"❌ {action_name.capitalize()}: невдача ({disposition})"
+        status = 'failed'
+        update_ivr_call_status(call_id, 'failed')
+    
+    return message, status
 
 def main():
     """Головна функція обробки webhook"""
@@ -238,15 +251,14 @@ def main():
                 }
                 
             else:
-
-            # Перевірити чи є pending IVR дзвінки
-            ivr_call = check_pending_ivr_calls(caller_id, disposition, duration)
-            if ivr_call:
-                logger.info(f"📞 Знайдено pending IVR дзвінок: {ivr_call["call_id"]}")
-                message, status = process_ivr_webhook_result(ivr_call, disposition, duration)
-                logger.info(f"📋 IVR результат: {message}")
-                print(json.dumps({"success": True, "message": message, "call_id": ivr_call["call_id"], "status": status}))
-                return
+                # Перевірити чи є pending IVR дзвінки
+                ivr_call = check_pending_ivr_calls(caller_id, disposition, duration)
+                if ivr_call:
+                    logger.info(f"📞 Знайдено pending IVR дзвінок: {ivr_call['call_id']}")
+                    message, status = process_ivr_webhook_result(ivr_call, disposition, duration)
+                    logger.info(f"📋 IVR результат: {message}")
+                    print(json.dumps({"success": True, "message": message, "call_id": ivr_call["call_id"], "status": status}))
+                    return
 
                 logger.warning(f"ℹ️ Дзвінок {pbx_call_id} ({caller_id}) НЕ ВІДСТЕЖУЄТЬСЯ")
                 
@@ -255,6 +267,8 @@ def main():
                 logger.info(f"   Нормалізований caller: {normalize_phone_number(caller_id)}")
                 
                 try:
+                    if hasattr(call_tracker, 'pending'):
+                        logger.info(f"   Індекс очікуваних дзвінків: {call_tracker.pending.stats()}")
                     if hasattr(call_tracker, 'get_recent_calls'):
                         recent_calls = call_tracker.get_recent_calls(300)
                         logger.info(f"   Активних дзвінків: {len(recent_calls)}")
@@ -290,87 +304,5 @@ def main():
 
 if __name__ == "__main__":
     main()
-import json
-import os
-import time
-
-def check_pending_ivr_calls(caller_id, disposition, duration):
-    """Перевіряє чи є pending IVR дзвінки для цього номера"""
-    pending_file = '/tmp/pending_ivr_calls.json'
-    
-    if not os.path.exists(pending_file):
-        return None
-    
-    try:
-        with open(pending_file, 'r') as f:
-            data = json.load(f)
-    except:
-        return None
-    
-    # Нормалізуємо номер
-    normalized_caller = caller_id.replace('+', '').replace('380', '0')
-    
-    # Шукаємо pending дзвінок для цього номера
-    for call in data:
-        if (call['target_number'] == normalized_caller and 
-            call['status'] == 'pending' and
-            (time.time() - call['timestamp']) <= 120):  # 2 хвилини
-            
-            return call
-    
-    return None
-
-def update_ivr_call_status(call_id, status):
-    """Оновлює статус IVR дзвінка"""
-    pending_file = '/tmp/pending_ivr_calls.json'
-    
-    if not os.path.exists(pending_file):
-        return False
-    
-    try:
-        with open(pending_file, 'r') as f:
-            data = json.load(f)
-        
-        for call in data:
-            if call['call_id'] == call_id:
-                call['status'] = status
-                call['completed_at'] = int(time.time())
-                break
-        
-        with open(pending_file, 'w') as f:
-            json.dump(data, f, indent=2)
-        
-        return True
-    except:
-        return False
-
-def process_ivr_webhook_result(call_data, disposition, duration):
-    """Обробляє результат IVR webhook і повертає повідомлення для логу"""
-    action_name = call_data['action_type']
-    call_id = call_data['call_id']
-    
-    if disposition == 'cancel' and duration > 0:
-        message = f"✅ {action_name.capitalize()} відкрито!"
-        status = 'success'
-        update_ivr_call_status(call_id, 'success')
-    elif disposition == 'busy':
-        message = f"❌ {action_name.capitalize()}: номер зайнятий"
-        status = 'busy'
-        update_ivr_call_status(call_id, 'busy')
-    elif disposition in ['no-answer', 'noanswer'] and duration == 0:
-        message = f"❌ {action_name.capitalize()}: номер не відповідає"
-        status = 'no_answer' 
-        update_ivr_call_status(call_id, 'no_answer')
-    elif disposition == 'answered' and duration > 0:
-        message = f"⚠️ {action_name.capitalize()}: дзвінок прийнято (потрібна перевірка)"
-        status = 'answered'
-        update_ivr_call_status(call_id, 'answered')
-    else:
-        message = f"❌ {action_name.capitalize()}: невдача ({disposition})"
-        status = 'failed'
-        update_ivr_call_status(call_id, 'failed')
-    
-    return message, status
-
 # ВИПРАВЛЕННЯ 2025-08-06: Змінено логіку успішності дзвінків
 # Успіх тепер = duration > 0 (були гудки) AND disposition = 'cancel' (скинули)
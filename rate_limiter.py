@@ -0,0 +1,149 @@
+# rate_limiter.py - Обмеження дзвінків на ворота/хвіртку
+"""
+Замість словника user_last_call, який ріс без меж і не був потокобезпечним:
+
+- token bucket на користувача (як раніше: один дзвінок на CALL_COOLDOWN секунд)
+- token bucket на цільовий номер - спільний ліміт callback-ів на пристрій
+- ліміт одночасних callback-ів на пристрій (in-flight), поки запит до
+  Zadarma ще виконується
+- записи зберігаються в LRU порядку; повністю відновлений bucket нічим не
+  відрізняється від відсутнього, тож такі записи видаляються, а кількість
+  записів обмежена MAX_ENTRIES
+
+Всі операції під одним локом - бот обробляє команди в кількох потоках.
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from phone_utils import national_number
+
+logger = logging.getLogger(__name__)
+
+CALL_COOLDOWN = 10        # секунд між дзвінками одного користувача
+TARGET_BURST = 2          # callback-ів на пристрій підряд
+TARGET_INTERVAL = 5       # секунд на відновлення одного callback-а пристрою
+MAX_IN_FLIGHT = 1         # одночасних запитів callback на пристрій
+MAX_ENTRIES = 10000
+
+# reason: None, 'user', 'target' або 'in_flight'
+RateDecision = namedtuple('RateDecision', ['allowed', 'retry_after', 'reason'])
+
+
+class RateLimiter:
+    """Token bucket на користувача і на пристрій + ліміт in-flight callback-ів"""
+
+    def __init__(self, user_interval=CALL_COOLDOWN, target_burst=TARGET_BURST,
+                 target_interval=TARGET_INTERVAL, max_in_flight=MAX_IN_FLIGHT,
+                 max_entries=MAX_ENTRIES, clock=time.monotonic):
+        # (місткість, токенів за секунду) для кожного виду ключа
+        self._limits = {
+            'user': (1.0, 1.0 / user_interval),
+            'target': (float(target_burst), 1.0 / target_interval),
+        }
+        self.max_in_flight = max_in_flight
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # (вид, ключ) -> [токени, час оновлення]
+        self._in_flight = {}           # NSN пристрою -> кількість callback-ів
+        self._stats = {'allowed': 0, 'rejected_user': 0, 'rejected_target': 0,
+                       'rejected_in_flight': 0, 'evicted': 0}
+
+    def _tokens(self, key, now):
+        capacity, rate = self._limits[key[0]]
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return capacity
+        return min(capacity, bucket[0] + (now - bucket[1]) * rate)
+
+    def _wait_time(self, key, now):
+        """Секунд до появи одного токена (0 - токен є)"""
+        rate = self._limits[key[0]][1]
+        return max(0.0, (1.0 - self._tokens(key, now)) / rate)
+
+    def _take(self, key, now):
+        self._buckets[key] = [self._tokens(key, now) - 1.0, now]
+        self._buckets.move_to_end(key)
+
+    def _evict(self, now):
+        # Найдавніше оновлені записи - спереду; відновлені видаляємо
+        while self._buckets:
+            key = next(iter(self._buckets))
+            if self._tokens(key, now) < self._limits[key[0]][0] and len(self._buckets) <= self.max_entries:
+                break
+            del self._buckets[key]
+            self._stats['evicted'] += 1
+
+    def acquire(self, user_id, target_number):
+        """
+        Перевіряє всі ліміти і, якщо дзвінок дозволено, списує токени
+        та займає in-flight слот пристрою (звільнити через release)
+        """
+        now = self._clock()
+        user_key = ('user', user_id)
+        target = national_number(target_number)
+        target_key = ('target', target)
+        with self._lock:
+            self._evict(now)
+            wait = self._wait_time(user_key, now)
+            if wait > 0:
+                self._stats['rejected_user'] += 1
+                return RateDecision(False, wait, 'user')
+            wait = self._wait_time(target_key, now)
+            if wait > 0:
+                self._stats['rejected_target'] += 1
+                return RateDecision(False, wait, 'target')
+            if self._in_flight.get(target, 0) >= self.max_in_flight:
+                self._stats['rejected_in_flight'] += 1
+                return RateDecision(False, 0.0, 'in_flight')
+
+            self._take(user_key, now)
+            self._take(target_key, now)
+            self._in_flight[target] = self._in_flight.get(target, 0) + 1
+            self._stats['allowed'] += 1
+            return RateDecision(True, 0.0, None)
+
+    def release(self, target_number):
+        """Звільняє in-flight слот пристрою після завершення запиту callback"""
+        target = national_number(target_number)
+        with self._lock:
+            count = self._in_flight.get(target, 0) - 1
+            if count > 0:
+                self._in_flight[target] = count
+            else:
+                self._in_flight.pop(target, None)
+
+    @contextmanager
+    def slot(self, user_id, target_number):
+        """with limiter.slot(...) as decision: - release лише для дозволеного дзвінка"""
+        decision = self.acquire(user_id, target_number)
+        try:
+            yield decision
+        finally:
+            if decision.allowed:
+                self.release(target_number)
+
+    def stats(self):
+        with self._lock:
+            self._evict(self._clock())
+            stats = dict(self._stats)
+            stats['entries'] = len(self._buckets)
+            stats['in_flight'] = dict(self._in_flight)
+            return stats
+
+
+def rejection_message(decision):
+    """Текст для користувача, якому відмовлено в дзвінку"""
+    if decision.reason == 'in_flight':
+        return "⏳ Дзвінок на цей пристрій вже виконується, зачекайте кілька секунд"
+    if decision.reason == 'target':
+        return f"⏳ Пристрій зайнятий, спробуйте через {int(decision.retry_after) + 1} секунд"
+    return f"⏳ Зачекайте {int(decision.retry_after) + 1} секунд перед наступним дзвінком"
+
+
+# Спільний лімітер процесу бота (zadarma_call і zadarma_call_webhook)
+call_limiter = RateLimiter()
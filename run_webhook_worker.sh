@@ -0,0 +1,16 @@
+#!/bin/bash
+# Запуск webhook_worker.py, якщо він ще не працює (для cron кожну хвилину)
+
+WORKER_DIR="/home/gomoncli/zadarma"
+PIDFILE="$WORKER_DIR/webhook_worker.pid"
+LOGFILE="$WORKER_DIR/webhook_worker_cron.log"
+PYTHON_EXEC="/usr/bin/python3"
+
+cd "$WORKER_DIR" || exit 1
+
+if [[ -f "$PIDFILE" ]] && kill -0 "$(cat "$PIDFILE" 2>/dev/null)" 2>/dev/null; then
+    exit 0
+fi
+
+echo "[$(date '+%Y-%m-%d %H:%M:%S')] Запускаю webhook_worker.py" >> "$LOGFILE"
+nohup "$PYTHON_EXEC" webhook_worker.py >> "$LOGFILE" 2>&1 &
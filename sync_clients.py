@@ -1,18 +1,46 @@
 # sync_clients.py - Unified version with logging
-import requests
-import logging
 import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from user_db import update_clients, add_or_update_client
+from user_db import bulk_upsert_clients, get_sync_state, set_sync_state
 from config import COMPANY_ID, WLAUNCH_API_KEY, ADMIN_USER_ID, TELEGRAM_TOKEN
+import telegram_sender
+from http_session import create_session, DEFAULT_CONNECT_TIMEOUT
+from json_stream import JSONArrayStream, STREAM_CHUNK_SIZE
 
 logger = logging.getLogger(__name__)
 
 API_BASE = "https://api.wlaunch.net/v1"
+# Застарілий прапорець першого синку - лише для міграції у sync_state
 FIRST_SYNC_FLAG_FILE = "/home/gomoncli/zadarma/.first_sync_done"
 
-def get_clients(created_start=None, created_end=None, page=0, size=1000):
-    """Отримує клієнтів з API з можливістю пагінації"""
+CURSOR_STATE = "wlaunch_clients_cursor"        # кінець вікна останнього успішного синку (UTC)
+FULL_SYNC_STATE = "wlaunch_clients_full_sync"  # час останнього повного синку (UTC)
+CURSOR_OVERLAP = timedelta(hours=1)            # перекриття вікон - клієнти, що з'явились із запізненням
+FULL_SYNC_INTERVAL = timedelta(days=7)         # API фільтрує лише за created - зміни старих клієнтів ловить повний синк
+
+PAGE_SIZE = 500        # сирий JSON сторінки не тримається цілком - у пам'яті лише 4 поля кожного клієнта
+FETCH_WORKERS = 4       # одночасних запитів сторінок
+MAX_BUFFERED_PAGES = 8  # завантажених, але ще не записаних у БД сторінок
+READ_TIMEOUT = 30
+
+_session = create_session(FETCH_WORKERS)
+
+def _compact_client(client):
+    """Лише поля, які записуються в clients - решта запису Wlaunch одразу звільняється"""
+    return {
+        "id": client.get("id"),
+        "first_name": client.get("first_name"),
+        "last_name": client.get("last_name"),
+        "phone": client.get("phone"),
+    }
+
+def _fetch_page(page, size, created_start=None, created_end=None):
+    """Одна сторінка клієнтів з API (винятки прокидаються далі)"""
     headers = {
         "Authorization": f"Bearer {WLAUNCH_API_KEY}",
         "Accept": "application/json"
@@ -22,129 +50,197 @@ def get_clients(created_start=None, created_end=None, page=0, size=1000):
         "page": page,
         "size": size,
     }
-    
+
     if created_start and created_end:
         params["createdStart"] = created_start
         params["createdEnd"] = created_end
-        
+
     logger.info(f"🌐 Запит до API: page={page}, size={size}, period={created_start} to {created_end}")
-    
-    try:
-        response = requests.get(f"{API_BASE}/company/{COMPANY_ID}/client", headers=headers, params=params, timeout=30)
+
+    started = time.time()
+    response = _session.get(f"{API_BASE}/company/{COMPANY_ID}/client", headers=headers, params=params,
+                            timeout=(DEFAULT_CONNECT_TIMEOUT, READ_TIMEOUT), stream=True)
+    with response:
         response.raise_for_status()
-        data = response.json()
-        
-        content = data.get("content", [])
-        page_info = data.get("page", {})
-        total_pages = page_info.get("total_pages", 1)
-        current_page = page_info.get("number", 0)
-        
-        logger.info(f"✅ Отримано {len(content)} клієнтів (сторінка {current_page + 1}/{total_pages})")
-        
-        return {
-            "content": content,
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total_elements": page_info.get("total_elements", 0)
-        }
-        
+        # Клієнти розбираються по одному з потоку; сторінка - список лише потрібних полів
+        # (пам'ять конвеєра - до max_buffered + workers таких сторінок)
+        stream = JSONArrayStream(response.iter_content(STREAM_CHUNK_SIZE), "content")
+        content = [_compact_client(client) for client in stream]
+
+    page_info = stream.fields.get("page", {})
+    total_pages = page_info.get("total_pages", 1)
+    current_page = page_info.get("number", 0)
+
+    logger.info(f"✅ Отримано {len(content)} клієнтів (сторінка {current_page + 1}/{total_pages})")
+
+    return {
+        "content": content,
+        "total_pages": total_pages,
+        "current_page": current_page,
+        "total_elements": page_info.get("total_elements", 0),
+        "latency": time.time() - started
+    }
+
+def get_clients(created_start=None, created_end=None, page=0, size=1000):
+    """Отримує клієнтів з API з можливістю пагінації"""
+    try:
+        return _fetch_page(page, size, created_start, created_end)
+
     except Exception as e:
         logger.exception(f"❌ Помилка API запиту: {e}")
         send_admin_error(f"❌ Не вдалося отримати клієнтів з wlaunch: {e}")
         return {"content": [], "total_pages": 0, "current_page": 0, "total_elements": 0}
 
+def sync_pages(created_start=None, created_end=None, size=PAGE_SIZE, workers=FETCH_WORKERS,
+               max_buffered=MAX_BUFFERED_PAGES, apply_page=None):
+    """
+    Конвеєрна синхронізація: сторінки завантажуються паралельно, а запис у БД
+    попередніх сторінок іде одночасно з мережею
+
+    Перша сторінка дає total_pages; решта завантажується не більше ніж
+    workers запитами одночасно через спільну keep-alive сесію. Сторінки
+    записуються (apply_page, за замовчуванням bulk_upsert_clients) у порядку
+    номерів, як і раніше. Завантажених, але ще не записаних сторінок - не
+    більше max_buffered, тож пам'ять обмежена навіть для великої бази.
+
+    Повертає статистику: pages, clients, counts, failed_pages, page_latency, elapsed, clients_per_sec
+    """
+    apply_page = apply_page or bulk_upsert_clients
+    started = time.time()
+    stats = {"pages": 0, "clients": 0, "counts": {}, "failed_pages": [], "page_latency": {}}
+
+    def apply(page, result):
+        stats["page_latency"][page] = result["latency"]
+        if not result["content"]:
+            return
+        try:
+            counts = apply_page(result["content"])
+        except Exception as e:
+            logger.error(f"❌ Помилка збереження сторінки {page + 1}: {e}")
+            stats["failed_pages"].append(page)
+            return
+        stats["pages"] += 1
+        stats["clients"] += len(result["content"])
+        for key, value in (counts or {}).items():
+            stats["counts"][key] = stats["counts"].get(key, 0) + value
+        logger.info(f"📥 Сторінка {page + 1}: {len(result['content'])} клієнтів, "
+                    f"мережа {result['latency']:.2f}с, {counts}")
+
+    first = _fetch_page(0, size, created_start, created_end)
+    total_pages = first["total_pages"]
+
+    results = queue.Queue()
+    slots = threading.BoundedSemaphore(max_buffered)
+
+    def fetch(page):
+        try:
+            results.put((page, _fetch_page(page, size, created_start, created_end), None))
+        except Exception as e:
+            results.put((page, None, e))
+
+    def produce(executor):
+        for page in range(1, total_pages):
+            slots.acquire()  # не випереджаємо запис у БД більше ніж на max_buffered сторінок
+            executor.submit(fetch, page)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        producer = threading.Thread(target=produce, args=(executor,))
+        producer.daemon = True
+        producer.start()
+
+        apply(0, first)
+        buffered = {}
+        next_page = 1
+        while next_page < total_pages:
+            page, result, error = results.get()
+            buffered[page] = (result, error)
+            while next_page in buffered:
+                result, error = buffered.pop(next_page)
+                if error is not None:
+                    logger.error(f"❌ Не вдалося завантажити сторінку {next_page + 1}: {error}")
+                    stats["failed_pages"].append(next_page)
+                else:
+                    apply(next_page, result)
+                slots.release()
+                next_page += 1
+        producer.join()
+
+    stats["elapsed"] = time.time() - started
+    stats["clients_per_sec"] = stats["clients"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+    latencies = sorted(stats["page_latency"].values())
+    logger.info(f"✅ Синхронізовано {stats['clients']} клієнтів ({stats['pages']}/{total_pages} сторінок) "
+                f"за {stats['elapsed']:.2f}с - {stats['clients_per_sec']:.0f} клієнтів/с, "
+                f"медіана сторінки {latencies[len(latencies) // 2] if latencies else 0:.2f}с")
+    return stats
+
+def _format_time(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def _parse_time(value):
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.000Z')
+
+def _migrate_flag_file():
+    """Переносить застарілий прапорець .first_sync_done у таблицю sync_state"""
+    if get_sync_state(FULL_SYNC_STATE) is None and os.path.exists(FIRST_SYNC_FLAG_FILE):
+        flag_time = datetime.utcfromtimestamp(os.path.getmtime(FIRST_SYNC_FLAG_FILE))
+        set_sync_state(FULL_SYNC_STATE, _format_time(flag_time))
+        os.remove(FIRST_SYNC_FLAG_FILE)
+        logger.info("🔧 Прапорець першого синку перенесено у sync_state")
+
+def _changed(stats):
+    counts = stats["counts"]
+    return sum(counts.get(key, 0) for key in ("inserted", "updated", "moved", "deleted"))
+
 def fetch_all_clients_first_time():
-    """Завантажує всіх клієнтів при першому запуску"""
-    logger.info("🔄 Перший запуск: завантаження всіх клієнтів...")
+    """Повна синхронізація всіх клієнтів (перший запуск або раз на FULL_SYNC_INTERVAL)"""
+    first_time = get_sync_state(FULL_SYNC_STATE) is None
+    logger.info("🔄 Повна синхронізація: завантаження всіх клієнтів...")
     
     try:
-        page = 0
-        size = 100  # Менший розмір для надійності
-        total_clients = 0
-        
-        while True:
-            result = get_clients(page=page, size=size)
-            clients = result["content"]
-            total_pages = result["total_pages"]
-            
-            if not clients:
-                break
-                
-            # Оновлюємо клієнтів у базі
-            for client in clients:
-                try:
-                    add_or_update_client(
-                        client_id=client.get("id"),
-                        first_name=client.get("first_name") or "",
-                        last_name=client.get("last_name") or "",
-                        phone=client.get("phone") or ""
-                    )
-                    total_clients += 1
-                except Exception as e:
-                    logger.error(f"❌ Помилка додавання клієнта {client.get('id')}: {e}")
-            
-            logger.info(f"📥 Оброблено {len(clients)} клієнтів на сторінці {page + 1}/{total_pages}")
-            
-            page += 1
-            if page >= total_pages:
-                break
+        run_started = datetime.utcnow()
+        stats = sync_pages(size=PAGE_SIZE)
+        total_clients = stats["clients"]
+        if stats["failed_pages"]:
+            raise RuntimeError(f"не завантажено сторінки {stats['failed_pages']}")
         
-        # Позначаємо, що перший синк виконано
-        with open(FIRST_SYNC_FLAG_FILE, 'w') as f:
-            f.write(datetime.now().isoformat())
+        # Курсор і час повного синку - лише після успішного завершення
+        set_sync_state(FULL_SYNC_STATE, _format_time(run_started))
+        set_sync_state(CURSOR_STATE, _format_time(run_started))
             
-        logger.info(f"✅ Перший синк завершено: завантажено {total_clients} клієнтів")
-        send_admin_error(f"✅ Перший синк завершено: завантажено {total_clients} клієнтів")
+        message = f"✅ Повний синк завершено: завантажено {total_clients} клієнтів, змінено {_changed(stats)}"
+        logger.info(message)
+        if first_time or _changed(stats):
+            send_admin_error(message)
         
     except Exception as e:
-        logger.exception(f"❌ Помилка при першому синку: {e}")
-        send_admin_error(f"❌ Помилка при першому синку: {e}")
+        logger.exception(f"❌ Помилка при повному синку: {e}")
+        send_admin_error(f"❌ Помилка при повному синку: {e}")
 
 def fetch_recent_clients():
-    """Завантажує клієнтів за останню добу"""
-    logger.info("🔄 Оновлення клієнтів за останню добу...")
+    """Завантажує клієнтів, створених після збереженого курсора (з перекриттям)"""
+    logger.info("🔄 Інкрементальне оновлення клієнтів...")
     
     try:
         now = datetime.utcnow()
-        yesterday = now - timedelta(days=1)
-        created_start = yesterday.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        cursor = get_sync_state(CURSOR_STATE)
+        since = _parse_time(cursor) if cursor else now - timedelta(days=1)
+        created_start = _format_time(since - CURSOR_OVERLAP)
         created_end = now.strftime('%Y-%m-%dT%H:%M:%S.999Z')
         
         logger.info(f"📅 Період: {created_start} - {created_end}")
         
-        page = 0
-        total_new_clients = 0
+        stats = sync_pages(created_start, created_end, size=PAGE_SIZE)
+        if stats["failed_pages"]:
+            # Курсор не рухаємо - наступний запуск повторить те саме вікно
+            raise RuntimeError(f"не завантажено сторінки {stats['failed_pages']}")
+        set_sync_state(CURSOR_STATE, _format_time(now))
         
-        while True:
-            result = get_clients(created_start, created_end, page=page, size=100)
-            clients = result["content"]
-            total_pages = result["total_pages"]
-            
-            if not clients:
-                break
-                
-            # Оновлюємо клієнтів
-            for client in clients:
-                try:
-                    add_or_update_client(
-                        client_id=client.get("id"),
-                        first_name=client.get("first_name") or "",
-                        last_name=client.get("last_name") or "",
-                        phone=client.get("phone") or ""
-                    )
-                    total_new_clients += 1
-                except Exception as e:
-                    logger.error(f"❌ Помилка оновлення клієнта {client.get('id')}: {e}")
-            
-            page += 1
-            if page >= total_pages:
-                break
-        
-        if total_new_clients > 0:
-            logger.info(f"✅ Оновлено {total_new_clients} клієнтів за останню добу")
-            send_admin_error(f"✅ Оновлено {total_new_clients} клієнтів за останню добу")
+        changed = _changed(stats)
+        if changed > 0:
+            logger.info(f"✅ Оновлено {changed} клієнтів з {stats['clients']} отриманих")
+            send_admin_error(f"✅ Оновлено {changed} клієнтів з {created_start}")
         else:
-            logger.info("ℹ️  Нових клієнтів за останню добу не знайдено")
+            logger.info(f"ℹ️  Змін не знайдено ({stats['clients']} клієнтів у вікні)")
             
     except Exception as e:
         logger.exception(f"❌ Помилка оновлення клієнтів: {e}")
@@ -152,18 +248,18 @@ def fetch_recent_clients():
 
 def is_first_sync_done():
     """Перевіряє, чи виконувався перший синк"""
-    return os.path.exists(FIRST_SYNC_FLAG_FILE)
+    return get_sync_state(FULL_SYNC_STATE) is not None
+
+def is_full_sync_due():
+    """Повний синк: ще не виконувався або останній старший за FULL_SYNC_INTERVAL"""
+    full_sync_at = get_sync_state(FULL_SYNC_STATE)
+    return full_sync_at is None or datetime.utcnow() - _parse_time(full_sync_at) > FULL_SYNC_INTERVAL
 
 def send_admin_error(message):
-    """Відправляє повідомлення адміну"""
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {"chat_id": ADMIN_USER_ID, "text": message}
+    """Ставить повідомлення адміну в чергу (доставка до виходу з cron процесу)"""
     try:
-        response = requests.post(url, data=payload, timeout=10)
-        if response.status_code == 200:
-            logger.info(f"📤 Повідомлення адміну відправлено: {message}")
-        else:
-            logger.error(f"❌ Помилка відправки адміну (код {response.status_code})")
+        if telegram_sender.send_message(ADMIN_USER_ID, message, parse_mode=None, token=TELEGRAM_TOKEN):
+            logger.info(f"📤 Повідомлення адміну в черзі: {message}")
     except Exception as e:
         logger.error(f"❌ Помилка надсилання повідомлення адміну: {e}")
 
@@ -172,11 +268,12 @@ def sync_clients():
     logger.info("🔄 Запуск синхронізації клієнтів...")
     
     try:
-        if not is_first_sync_done():
-            logger.info("🆕 Перший запуск - завантажуємо всіх клієнтів")
+        _migrate_flag_file()
+        if is_full_sync_due():
+            logger.info("🆕 Повний синк - завантажуємо всіх клієнтів")
             fetch_all_clients_first_time()
         else:
-            logger.info("🔄 Звичайне оновлення - завантажуємо нових клієнтів")
+            logger.info("🔄 Звичайне оновлення - завантажуємо клієнтів після курсора")
             fetch_recent_clients()
             
         logger.info("✅ Синхронізація завершена")
@@ -189,12 +286,11 @@ def force_full_sync():
     """Примусова повна синхронізація (для тестування)"""
     logger.info("🔄 Примусова повна синхронізація...")
     
-    if os.path.exists(FIRST_SYNC_FLAG_FILE):
-        os.remove(FIRST_SYNC_FLAG_FILE)
-        logger.info("🗑️  Видалено флаг першого синку")
+    set_sync_state(FULL_SYNC_STATE, None)
+    logger.info("🗑️  Скинуто стан повного синку")
     
     sync_clients()
 
 if __name__ == "__main__":
     # Для тестування
-    sync_clients()
\ No newline at end of file
+    sync_clients()
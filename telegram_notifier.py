@@ -4,12 +4,12 @@
 telegram_notifier.py - Покращений Telegram сповіщувач з інформацією про баланси
 """
 
-import requests
 import json
 import logging
 import os
 from datetime import datetime
 from config import TELEGRAM_TOKEN, ADMIN_USER_ID
+import telegram_sender
 
 logger = logging.getLogger(__name__)
 
@@ -24,15 +24,9 @@ class TelegramNotifier:
     def send_message(self, message, parse_mode="HTML"):
         """Відправити повідомлення адміністратору"""
         try:
-            url = f"{self.api_url}/sendMessage"
-            data = {
-                'chat_id': self.admin_id,
-                'text': message,
-                'parse_mode': parse_mode
-            }
-            
-            response = requests.post(url, json=data, timeout=10)
-            return response.status_code == 200
+            # Черга з rate limiting; cron процес чекає на доставку при виході
+            return telegram_sender.send_message(self.admin_id, message, parse_mode,
+                                                disable_web_page_preview=False, token=self.token)
             
         except Exception as e:
             logger.error(f"Помилка відправки Telegram: {e}")
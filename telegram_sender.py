@@ -0,0 +1,304 @@
+# telegram_sender.py - Єдина черга вихідних повідомлень Telegram
+"""
+Усі відправки в Telegram (send_telegram_message, send_admin_error,
+TelegramNotifier, simple_webhook) ставлять повідомлення в обмежену
+чергу і одразу повертаються - обробник бота/webhook не блокується
+на HTTP запиті та time.sleep() між повторами.
+
+Фоновий потік відправляє повідомлення через одну keep-alive сесію:
+- token bucket на весь бот (~30 повідомлень/с) і на кожен чат (~1/с)
+- 429 Too Many Requests: чекаємо parameters.retry_after і повторюємо
+- мережеві помилки: повтор з наростаючою паузою, до MAX_ATTEMPTS спроб
+- лічильники доставки: get_sender().stats()
+
+Короткі процеси (cron sync_clients.py, api_monitor.py) перед виходом
+чекають на доставку черги через atexit (не довше EXIT_FLUSH_TIMEOUT).
+"""
+
+import time
+import heapq
+import queue
+import atexit
+import logging
+import itertools
+import threading
+from collections import OrderedDict, deque
+
+from http_session import create_session, DEFAULT_CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 1000
+GLOBAL_RATE = 30        # повідомлень/с на бота (ліміт Telegram)
+GLOBAL_BURST = 30
+CHAT_RATE = 1.0         # повідомлень/с в один чат
+CHAT_BURST = 3
+MAX_CHAT_BUCKETS = 10000
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 2    # секунд, подвоюється з кожною спробою
+READ_TIMEOUT = 15
+EXIT_FLUSH_TIMEOUT = 20
+
+
+class TokenBucket:
+    """Token bucket: rate токенів/с, не більше capacity одночасно"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.time()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, now=None):
+        """Забирає токен і повертає 0, або повертає скільки секунд чекати"""
+        now = time.time() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def block(self, seconds, now=None):
+        """Порожній bucket на seconds секунд (після 429 retry_after)"""
+        now = time.time() if now is None else now
+        self.tokens = -seconds * self.rate
+        self.updated = now
+
+
+class TelegramSender:
+    """Обмежена черга + один фоновий потік відправки з rate limiting"""
+
+    def __init__(self, token, session=None, queue_size=QUEUE_SIZE,
+                 global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST,
+                 chat_rate=CHAT_RATE, chat_burst=CHAT_BURST,
+                 max_attempts=MAX_ATTEMPTS, retry_base_delay=RETRY_BASE_DELAY,
+                 api_url='https://api.telegram.org'):
+        self.url = f"{api_url}/bot{token}/sendMessage"
+        self.session = session or create_session()
+        self.timeout = (DEFAULT_CONNECT_TIMEOUT, READ_TIMEOUT)
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._delayed = []  # (ready_at, seq, chat_id) - коли будити перше повідомлення чату
+        self._waiting = {}  # chat_id -> deque повідомлень, що чекають
+        self._seq = itertools.count()
+        self._global_bucket = TokenBucket(global_rate, global_burst)
+        self._chat_buckets = OrderedDict()
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._counters = {'queued': 0, 'sent': 0, 'failed': 0, 'dropped': 0,
+                          'retried': 0, 'rate_limited': 0}
+        self._latency_total = 0.0
+
+    def send(self, chat_id, text, parse_mode='HTML', disable_web_page_preview=True):
+        """Ставить повідомлення в чергу; False - черга переповнена (повідомлення відкинуто)"""
+        payload = {'chat_id': chat_id, 'text': text}
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
+        if disable_web_page_preview:
+            payload['disable_web_page_preview'] = True
+        message = {'payload': payload, 'attempt': 0, 'queued_at': time.time()}
+
+        with self._pending_cond:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            with self._pending_cond:
+                self._counters['dropped'] += 1
+            self._done()
+            logger.error(f"❌ Черга Telegram переповнена, повідомлення в чат {chat_id} відкинуто")
+            return False
+
+        with self._pending_cond:
+            self._counters['queued'] += 1
+        self._ensure_thread()
+        return True
+
+    def flush(self, timeout=None):
+        """Чекає, поки всі повідомлення з черги будуть відправлені або відкинуті"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._pending_cond:
+            while self._pending > 0:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._pending_cond.wait(remaining)
+        return True
+
+    def stats(self):
+        stats = dict(self._counters)
+        stats['queue_depth'] = self._queue.qsize() + sum(len(w) for w in list(self._waiting.values()))
+        stats['avg_latency'] = self._latency_total / stats['sent'] if stats['sent'] else 0.0
+        return stats
+
+    def _done(self):
+        with self._pending_cond:
+            self._pending -= 1
+            if self._pending <= 0:
+                self._pending_cond.notify_all()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='telegram-sender')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.pop(chat_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._chat_buckets.popitem(last=False)
+        self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _next_message(self):
+        """
+        Наступне повідомлення: перше з чату, час якого настав, або нове з черги
+
+        Повідомлення, що чекають (ліміт чату, 429, повтор), стоять у FIFO
+        черзі свого чату - порядок у чаті зберігається, інші чати не чекають.
+        """
+        while True:
+            now = time.time()
+            if self._delayed and self._delayed[0][0] <= now:
+                chat_id = heapq.heappop(self._delayed)[2]
+                return self._waiting[chat_id].popleft()
+            wait = self._delayed[0][0] - now if self._delayed else None
+            try:
+                message = self._queue.get(timeout=wait)
+            except queue.Empty:
+                continue
+            waiting = self._waiting.get(message['payload']['chat_id'])
+            if waiting:
+                waiting.append(message)
+                continue
+            return message
+
+    def _park(self, message, seconds):
+        """Повертає повідомлення на початок черги його чату на seconds секунд"""
+        chat_id = message['payload']['chat_id']
+        self._waiting.setdefault(chat_id, deque()).appendleft(message)
+        heapq.heappush(self._delayed, (time.time() + seconds, next(self._seq), chat_id))
+
+    def _finish(self, message):
+        """Повідомлення доставлено або відкинуто - будимо наступне в його чаті"""
+        chat_id = message['payload']['chat_id']
+        waiting = self._waiting.get(chat_id)
+        if waiting:
+            heapq.heappush(self._delayed, (time.time(), next(self._seq), chat_id))
+        else:
+            self._waiting.pop(chat_id, None)
+        self._done()
+
+    def _run(self):
+        while True:
+            message = self._next_message()
+            try:
+                self._process(message)
+            except Exception as e:
+                logger.exception(f"❌ Помилка черги Telegram: {e}")
+                self._counters['failed'] += 1
+                self._finish(message)
+
+    def _process(self, message):
+        chat_id = message['payload']['chat_id']
+
+        # Ліміт чату: не блокуємо інші чати, а відкладаємо лише це повідомлення
+        wait = self._chat_bucket(chat_id).acquire()
+        if wait > 0:
+            self._park(message, wait)
+            return
+        wait = self._global_bucket.acquire()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._global_bucket.acquire()
+
+        message['attempt'] += 1
+        try:
+            response = self.session.post(self.url, data=message['payload'], timeout=self.timeout)
+        except Exception as e:
+            self._retry(message, f"мережева помилка: {e}")
+            return
+
+        if response.status_code == 200:
+            self._counters['sent'] += 1
+            self._latency_total += time.time() - message['queued_at']
+            logger.info(f"📤 Повідомлення відправлено в чат {chat_id}")
+            self._finish(message)
+        elif response.status_code == 429:
+            retry_after = self._retry_after(response)
+            self._counters['rate_limited'] += 1
+            logger.warning(f"⏳ Telegram 429 для чату {chat_id}, retry_after={retry_after}с")
+            # 429 не рахується як невдала спроба - Telegram прямо каже, коли повторити
+            message['attempt'] -= 1
+            self._chat_bucket(chat_id).block(retry_after)
+            self._park(message, retry_after)
+        elif response.status_code >= 500:
+            self._retry(message, f"код {response.status_code}")
+        else:
+            # 400/403: неправильний чат, бот заблоковано - повтор не допоможе
+            self._counters['failed'] += 1
+            logger.error(f"❌ Помилка відправки в чат {chat_id} (код {response.status_code}): {response.text[:200]}")
+            self._finish(message)
+
+    def _retry(self, message, reason):
+        chat_id = message['payload']['chat_id']
+        if message['attempt'] >= self.max_attempts:
+            self._counters['failed'] += 1
+            logger.error(f"❌ Не вдалося відправити повідомлення в чат {chat_id} після {message['attempt']} спроб: {reason}")
+            self._finish(message)
+            return
+        delay = self.retry_base_delay * (2 ** (message['attempt'] - 1))
+        self._counters['retried'] += 1
+        logger.warning(f"⚠️ Помилка відправки в чат {chat_id} (спроба {message['attempt']}): {reason}, повтор через {delay}с")
+        self._park(message, delay)
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.json().get('parameters', {}).get('retry_after', 1))
+        except Exception:
+            return float(response.headers.get('Retry-After', 1))
+
+
+_senders = {}
+_senders_lock = threading.Lock()
+
+
+def get_sender(token=None):
+    """Спільний відправник на процес для токена (за замовчуванням config.TELEGRAM_TOKEN)"""
+    if token is None:
+        from config import TELEGRAM_TOKEN
+        token = TELEGRAM_TOKEN
+    with _senders_lock:
+        sender = _senders.get(token)
+        if sender is None:
+            sender = TelegramSender(token)
+            _senders[token] = sender
+        return sender
+
+
+def send_message(chat_id, text, parse_mode='HTML', disable_web_page_preview=True, token=None):
+    """Ставить повідомлення в чергу і одразу повертається (True - поставлено)"""
+    return get_sender(token).send(chat_id, text, parse_mode, disable_web_page_preview)
+
+
+@atexit.register
+def _flush_on_exit():
+    for sender in list(_senders.values()):
+        if not sender.flush(EXIT_FLUSH_TIMEOUT):
+            logger.warning(f"⚠️ Не всі повідомлення Telegram відправлено до виходу: {sender.stats()}")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Тест кешу авторизації: TTL, LRU витіснення, скидання та лічильники
+"""
+
+import os
+import time
+import sqlite3
+import tempfile
+
+import user_db
+import wlaunch_api
+from auth_cache import AuthCache
+
+
+def test_hit_and_miss():
+    cache = AuthCache()
+    assert cache.get(1) is None
+    cache.put(1, '380501112233', 'c1', True)
+    assert cache.get(1) == ('380501112233', 'c1', True)
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1, stats
+
+
+def test_ttl_expiry():
+    cache = AuthCache(ttl=0.05)
+    cache.put(1, '380501112233', 'c1', True)
+    time.sleep(0.1)
+    assert cache.get(1) is None
+
+
+def test_lru_eviction():
+    cache = AuthCache(max_size=2)
+    cache.put(1, 'p1', 'c1', True)
+    cache.put(2, 'p2', 'c2', True)
+    cache.get(1)  # 1 тепер найсвіжіший
+    cache.put(3, 'p3', 'c3', False)
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_invalidate_drops_stale_put():
+    cache = AuthCache()
+    generation = cache.generation
+    cache.invalidate()
+    # Результат, прочитаний до invalidate(), не повинен потрапити в кеш
+    cache.put(1, 'p1', 'c1', True, generation)
+    assert cache.get(1) is None
+
+
+# === Інтеграція з user_db (тимчасова БД) ===
+
+def fresh_db():
+    """Порожня БД з клієнтом 380501112233 та користувачем 111"""
+    user_db.DB_PATH = os.path.join(tempfile.mkdtemp(), 'users.db')
+    # Зовнішні зміни перевіряємо лише в test_external_write_detected
+    user_db.DATA_VERSION_CHECK_INTERVAL = 3600
+    user_db._data_version.checked_at = time.time()
+    user_db.init_db()
+    user_db.add_or_update_client('c1', 'Іван', 'Петренко', '380501112233')
+    user_db.store_user(111, '380501112233', 'ivan', 'Іван')
+    user_db.invalidate_auth_cache()
+    assert user_db.is_authorized_user_simple(111)
+    return user_db._auth_cache
+
+
+def assert_invalidated(cache, action):
+    generation = cache.generation
+    action()
+    assert cache.generation != generation, action
+    assert cache.get(111) is None
+
+
+def test_unchanged_sync_keeps_cache():
+    cache = fresh_db()
+    generation = cache.generation
+    # store_user замінює ID клієнта на telegram_id - синхронізуємо запис у тому ж вигляді
+    user_db.add_or_update_client('111', 'Іван', 'Петренко', '380501112233')
+    user_db.update_clients([{'id': '111', 'first_name': 'Іван', 'last_name': 'Петренко', 'phone': '380501112233'}])
+    # Зміна лише імені не впливає на авторизацію
+    user_db.add_or_update_client('111', 'Іван', 'Петренко-Новий', '380501112233')
+    assert cache.generation == generation
+    assert cache.get(111) is not None
+
+
+def test_writers_invalidate():
+    cache = fresh_db()
+    assert_invalidated(cache, lambda: user_db.store_user(111, '380501112233', 'ivan', 'Іван'))
+    user_db.is_authorized_user_simple(111)
+    assert_invalidated(cache, lambda: user_db.add_or_update_client('c2', 'Олена', 'Коваль', '380671112233'))
+    user_db.is_authorized_user_simple(111)
+    assert_invalidated(cache, lambda: user_db.update_clients([{'id': 'c2', 'phone': '380931112233'}]))
+    user_db.is_authorized_user_simple(111)
+    assert_invalidated(cache, user_db.cleanup_duplicate_phones)
+    user_db.is_authorized_user_simple(111)
+
+    original = wlaunch_api.fetch_all_clients
+    wlaunch_api.fetch_all_clients = lambda table: user_db.bulk_upsert_clients([
+        {'id': 'c1', 'first_name': 'Іван', 'last_name': 'Петренко', 'phone': '380501112233'},
+        {'id': 'c2', 'first_name': 'Олена', 'last_name': 'Коваль', 'phone': '380931112233'},
+    ], table)
+    try:
+        assert_invalidated(cache, user_db.force_full_sync)
+    finally:
+        wlaunch_api.fetch_all_clients = original
+    assert user_db.is_authorized_user_simple(111)
+
+
+def test_external_write_detected():
+    cache = fresh_db()
+    user_db.DATA_VERSION_CHECK_INTERVAL = 0
+    user_db._data_version.checked_at = 0
+    assert user_db.is_authorized_user_simple(111)
+    assert cache.get(111) is not None
+
+    # Інший процес (cron синхронізація) видаляє клієнта
+    conn = sqlite3.connect(user_db.DB_PATH)
+    conn.execute("DELETE FROM clients WHERE phone = '380501112233'")
+    conn.commit()
+    conn.close()
+
+    assert not user_db.is_authorized_user_simple(111)
+
+
+def main():
+    tests = [
+        test_hit_and_miss,
+        test_ttl_expiry,
+        test_lru_eviction,
+        test_invalidate_drops_stale_put,
+        test_unchanged_sync_keeps_cache,
+        test_writers_invalidate,
+        test_external_write_detected,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести кешу авторизації пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Тест пакетного імпорту клієнтів: bulk_upsert_clients дає той самий
+вміст таблиці clients, що й послідовні add_or_update_client
+"""
+
+import os
+import time
+import random
+import tempfile
+
+import user_db
+
+
+def use_fresh_db(rows=()):
+    user_db.DB_PATH = os.path.join(tempfile.mkdtemp(), 'users.db')
+    user_db.init_db()
+    for row in rows:
+        user_db.add_or_update_client(*row)
+
+
+def snapshot():
+    return sorted(user_db._db().connection().execute(
+        'SELECT id, first_name, last_name, phone, phone_nsn FROM clients'))
+
+
+def random_page(rng, size):
+    """Мала множина ID і телефонів - багато конфліктів ID/телефону"""
+    return [{
+        'id': str(rng.randint(1, 8)),
+        'first_name': rng.choice(['Іван', 'Олена', None]),
+        'last_name': rng.choice(['Петренко', 'Коваль']),
+        'phone': rng.choice(['380501112233', '0671112233', '+380931112233', '380661112233', '380991112233']),
+    } for _ in range(size)]
+
+
+def test_matches_sequential_add_or_update():
+    rng = random.Random(7)
+    for _ in range(200):
+        initial = [(c['id'], c['first_name'] or '', c['last_name'], c['phone']) for c in random_page(rng, 5)]
+        page = random_page(rng, rng.randint(1, 8))
+
+        use_fresh_db(initial)
+        for client in page:
+            user_db.add_or_update_client(client['id'], client['first_name'] or '',
+                                         client['last_name'] or '', client['phone'] or '')
+        expected = snapshot()
+
+        use_fresh_db(initial)
+        user_db.bulk_upsert_clients(page)
+        assert snapshot() == expected, (initial, page, snapshot(), expected)
+
+
+def test_counts():
+    use_fresh_db([('1', 'Іван', 'Петренко', '380501112233'),
+                  ('2', 'Олена', 'Коваль', '380671112233'),
+                  ('3', 'Петро', 'Мельник', '380931112233')])
+    counts = user_db.bulk_upsert_clients([
+        {'id': '1', 'first_name': 'Іван', 'last_name': 'Петренко', 'phone': '380501112233'},  # без змін
+        {'id': '2', 'first_name': 'Олена', 'last_name': 'Шевченко', 'phone': '380671112233'},  # ім'я
+        {'id': '4', 'first_name': 'Андрій', 'last_name': 'Бойко', 'phone': '380931112233'},  # телефон клієнта 3
+        {'id': '5', 'first_name': 'Марія', 'last_name': 'Ткач', 'phone': '380661112233'},  # новий
+    ])
+    assert counts == {'inserted': 2, 'updated': 1, 'moved': 0, 'deleted': 1, 'unchanged': 1}, counts
+
+    counts = user_db.bulk_upsert_clients([
+        {'id': '1', 'first_name': 'Іван', 'last_name': 'Петренко', 'phone': '380661112233'},
+        {'id': '5', 'first_name': 'Марія', 'last_name': 'Ткач', 'phone': '380501112233'},
+    ])
+    # Обмін номерами між двома клієнтами не порушує UNIQUE(phone)
+    assert counts['moved'] == 2, counts
+    assert user_db.find_client_by_phone('0661112233')['id'] == '1'
+
+
+def test_cache_kept_when_only_names_change():
+    use_fresh_db([('1', 'Іван', 'Петренко', '380501112233')])
+    generation = user_db._auth_cache.generation
+    user_db.bulk_upsert_clients([{'id': '1', 'first_name': 'Іван', 'last_name': 'Нове', 'phone': '380501112233'}])
+    assert user_db._auth_cache.generation == generation
+    user_db.bulk_upsert_clients([{'id': '2', 'first_name': 'Олена', 'last_name': 'Коваль', 'phone': '380671112233'}])
+    assert user_db._auth_cache.generation != generation
+
+
+def test_unchanged_hash_skips_writes():
+    use_fresh_db()
+    page = [{'id': str(i), 'first_name': 'Клієнт', 'last_name': str(i), 'phone': '38050{:07d}'.format(i)}
+            for i in range(5)]
+    assert user_db.bulk_upsert_clients(page)['inserted'] == 5
+    conn = user_db._db().connection()
+    changes = conn.total_changes
+
+    counts = user_db.bulk_upsert_clients(page)
+    assert counts['unchanged'] == 5 and conn.total_changes == changes, counts
+
+    # Зміна в обхід синку (store_user переписує ID) - хеш не дає пропустити клієнта
+    conn.execute("UPDATE clients SET id = '999' WHERE id = '0'")
+    page[1]['last_name'] = 'Нове'
+    counts = user_db.bulk_upsert_clients(page)
+    assert counts['unchanged'] == 3 and counts['updated'] == 1, counts
+    assert user_db.find_client_by_phone('380500000000')['id'] == '0'
+
+
+def test_bulk_faster_than_per_client():
+    page = [{'id': str(i), 'first_name': 'Клієнт', 'last_name': str(i), 'phone': '38050{:07d}'.format(i)}
+            for i in range(1000)]
+
+    use_fresh_db()
+    started = time.time()
+    for client in page:
+        user_db.add_or_update_client(client['id'], client['first_name'], client['last_name'], client['phone'])
+    sequential = time.time() - started
+
+    use_fresh_db()
+    started = time.time()
+    counts = user_db.bulk_upsert_clients(page)
+    bulk = time.time() - started
+
+    assert counts['inserted'] == 1000, counts
+    print(f"📊 1000 клієнтів: по одному {sequential:.3f}с, пакетом {bulk:.3f}с ({sequential / bulk:.0f}x)")
+    assert bulk < sequential
+
+
+def main():
+    tests = [
+        test_matches_sequential_add_or_update,
+        test_counts,
+        test_cache_kept_when_only_names_change,
+        test_unchanged_hash_skips_writes,
+        test_bulk_faster_than_per_client,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести пакетного імпорту пройдено")
+
+
+if __name__ == "__main__":
+    main()
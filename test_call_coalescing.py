@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Тест об'єднання запитів: одночасні /vorota від кількох користувачів -
+один callback, результат NOTIFY_END розсилається всім чатам
+"""
+
+import os
+import time
+import tempfile
+import threading
+import contextlib
+
+import zadarma_api_webhook as zw
+import zadarma_api
+from zadarma_api_webhook import CallTracker
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeZadarma:
+    """Замість ZadarmaAPI: рахує callback-и, відповідає із затримкою"""
+
+    def __init__(self, status='success', delay=0.2):
+        self.status = status
+        self.delay = delay
+        self.calls = []
+
+    def call(self, method, params, request_type='GET'):
+        self.calls.append((method, dict(params)))
+        time.sleep(self.delay)
+        return FakeResponse('{"status": "%s"}' % self.status)
+
+
+@contextlib.contextmanager
+def patched(module, **values):
+    """Тимчасово підміняє глобальні імена модуля і відновлює їх після тесту"""
+    originals = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(module, name, value)
+
+
+@contextlib.contextmanager
+def setup(status='success'):
+    sent = []
+    with patched(zw, call_tracker=CallTracker(os.path.join(tempfile.mkdtemp(), 'call_tracking.db')),
+                 zadarma_api=FakeZadarma(status),
+                 send_telegram_message=lambda chat_id, message: sent.append((chat_id, message)) or True):
+        yield sent
+
+
+def press_concurrently(users, action='vorota', number='0930063585'):
+    results = {}
+    barrier = threading.Barrier(len(users))
+
+    def press(user):
+        barrier.wait()
+        results[user] = zw.make_zadarma_call_with_tracking(number, user, user * 10, action)
+
+    threads = [threading.Thread(target=press, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_presses_make_one_callback():
+    with setup() as sent:
+        results = press_concurrently([1, 2, 3, 4, 5])
+
+        assert len(zw.zadarma_api.calls) == 1, zw.zadarma_api.calls
+        assert all(result['success'] for result in results.values()), results
+        leaders = [r['call_id'] for r in results.values() if 'joined' not in r]
+        assert len(leaders) == 1 and sum('joined' in r for r in results.values()) == 4, results
+
+        zw.process_webhook_call_status({'event': 'NOTIFY_END', 'pbx_call_id': 'pbx-1', 'caller_id': '0930063585',
+                                        'disposition': 'cancel', 'duration': '4'})
+        assert sorted(chat for chat, _ in sent) == [10, 20, 30, 40, 50], sent
+        assert {message for _, message in sent} == {'✅ Ворота відчинено!'}
+
+        # Результат отримано - наступне натискання робить новий callback
+        zw.call_tracker.flush()
+        statuses = zw.call_tracker.pool.connection().execute('SELECT DISTINCT status FROM call_tracking').fetchall()
+        assert statuses == [('success',)], statuses
+        assert 'joined' not in zw.make_zadarma_call_with_tracking('0930063585', 6, 60, 'vorota')
+        assert len(zw.zadarma_api.calls) == 2
+
+
+def test_same_chat_not_duplicated_and_devices_separate():
+    with setup() as sent:
+        first = zw.make_zadarma_call_with_tracking('0930063585', 1, 10, 'vorota')
+        again = zw.join_call_in_flight('+380930063585', 1, 10, 'vorota')
+        assert again['joined'] == first['call_id'] and zw.call_tracker.get_joined_calls(first['call_id']) == []
+        assert zw.join_call_in_flight('0637442017', 1, 10, 'hvirtka') is None  # хвіртка - окремий пристрій
+
+        zw.process_webhook_call_status({'event': 'NOTIFY_END', 'pbx_call_id': 'pbx-2', 'caller_id': '380930063585',
+                                        'disposition': 'busy', 'duration': '0'})
+        assert [chat for chat, _ in sent] == [10], sent
+
+
+def test_failed_leader_is_not_joined():
+    with setup(status='error'):
+        results = press_concurrently([1, 2])
+        # Callback ініціатора не вдався - другий запит не чекає на нього, а робить свій
+        assert len(zw.zadarma_api.calls) == 2 and not any('joined' in r for r in results.values()), results
+
+
+def test_legacy_tracker_fans_out():
+    sent = []
+    # Опитувач не звертається до справжнього /v1/statistics/
+    with patched(zadarma_api, send_telegram_message=lambda chat_id, message: sent.append(chat_id),
+                 fetch_statistics_calls=lambda start, end: []):
+        tracker = zadarma_api.CallStatusTracker()
+        try:
+            tracker.register_call('c1', 1, 10, 'hvirtka', '0637442017')
+            assert tracker.join('+380637442017', 20) == 'c1'
+            assert tracker.join('0637442017', 20) == 'c1' and tracker.join('0637442017', 10) == 'c1'
+            assert tracker.join('0930063585', 30) is None
+            tracker._handle_disposition('c1', 'rejected')
+            assert sent == [10, 20], sent
+        finally:
+            tracker.poller.stop()
+
+
+def main():
+    tests = [
+        test_concurrent_presses_make_one_callback,
+        test_same_chat_not_duplicated_and_devices_separate,
+        test_failed_leader_is_not_joined,
+        test_legacy_tracker_fans_out,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести об'єднання запитів пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Тест зіставлення webhook-ів з дзвінками: NOTIFY_START прив'язує pbx_call_id,
+NOTIFY_END знаходить дзвінок за ним; без START - пошук за номером
+"""
+
+import os
+import tempfile
+
+import zadarma_api_webhook as zw
+from zadarma_api_webhook import CallTracker
+
+
+def setup():
+    zw.call_tracker = CallTracker(os.path.join(tempfile.mkdtemp(), 'call_tracking.db'))
+    for key in zw._correlation_stats:
+        zw._correlation_stats[key] = 0
+    sent = []
+    zw.send_telegram_message = lambda chat_id, message: sent.append((chat_id, message)) or True
+    return sent
+
+
+def start_call(call_id, chat_id, target, action='vorota'):
+    zw.call_tracker.register_call(call_id, chat_id, chat_id, action, target)
+    zw.call_tracker.update_call_status(call_id, 'api_success')
+
+
+def test_start_links_pbx_and_end_matches_exactly():
+    sent = setup()
+    start_call('u_1', 11, '380930063585')
+
+    zw.process_webhook_call_status({'event': 'NOTIFY_START', 'pbx_call_id': 'pbx-1',
+                                    'caller_id': '+380930063585', 'called_did': '380441234567'})
+    assert zw.call_tracker.get_call_by_pbx_id('pbx-1')['call_id'] == 'u_1'
+    assert zw.call_tracker.flush()
+    row = zw.call_tracker.pool.connection().execute(
+        "SELECT pbx_call_id, status FROM call_tracking WHERE call_id = 'u_1'").fetchone()
+    assert row == ('pbx-1', 'api_success'), row
+
+    result = zw.process_webhook_call_status({'event': 'NOTIFY_END', 'pbx_call_id': 'pbx-1',
+                                             'caller_id': '', 'disposition': 'cancel', 'duration': '5'})
+    assert result['status'] == 'success', result
+    assert sent == [(11, '✅ Ворота відчинено!')], sent
+    stats = zw.get_correlation_stats()
+    assert stats['start_linked'] == 1 and stats['exact'] == 1 and stats['exact_ratio'] == 1.0, stats
+
+
+def test_end_without_start_falls_back_to_number():
+    sent = setup()
+    start_call('u_2', 22, '380637442017', action='hvirtka')
+    result = zw.process_webhook_call_status({'event': 'NOTIFY_END', 'pbx_call_id': 'pbx-2',
+                                             'caller_id': '0637442017', 'disposition': 'busy', 'duration': '0'})
+    assert result['status'] == 'busy' and sent[0][0] == 22, (result, sent)
+
+    zw.process_webhook_call_status({'event': 'NOTIFY_END', 'pbx_call_id': 'pbx-3',
+                                    'caller_id': '0501112233', 'disposition': 'busy', 'duration': '0'})
+    stats = zw.get_correlation_stats()
+    assert stats['fuzzy'] == 1 and stats['unmatched'] == 1 and stats['exact_ratio'] == 0.0, stats
+
+
+def test_start_does_not_relink_or_steal():
+    setup()
+    start_call('u_3', 33, '380930063585')
+    start_data = {'event': 'NOTIFY_START', 'pbx_call_id': 'pbx-4', 'caller_id': '380930063585'}
+    zw.process_webhook_call_status(start_data)
+    zw.process_webhook_call_status(start_data)  # повторний START
+    # START іншого дзвінка на той самий номер не перехоплює вже прив'язаний дзвінок
+    zw.process_webhook_call_status({'event': 'NOTIFY_START', 'pbx_call_id': 'pbx-5', 'caller_id': '380930063585'})
+    zw.process_webhook_call_status({'event': 'NOTIFY_START', 'pbx_call_id': 'pbx-6', 'caller_id': '380501112233'})
+
+    assert zw.call_tracker.get_call_by_pbx_id('pbx-4')['call_id'] == 'u_3'
+    assert zw.call_tracker.get_call_by_pbx_id('pbx-5') is None
+    stats = zw.get_correlation_stats()
+    assert stats['start_linked'] == 1 and stats['start_unmatched'] == 1, stats
+
+
+def main():
+    tests = [
+        test_start_links_pbx_and_end_matches_exactly,
+        test_end_without_start_falls_back_to_number,
+        test_start_does_not_relink_or_steal,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести зіставлення webhook-ів пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Тест планувальника статусу дзвінків: один запит статистики на такт
+для всіх дзвінків, таймаут та зняття вирішеного дзвінка
+"""
+
+import time
+
+from call_poller import CallStatusPoller
+
+
+class FakeStatistics:
+    """Замість /v1/statistics/ - записи, які з'являються через ready_after секунд"""
+
+    def __init__(self, ready_after=0.0):
+        self.ready_after = ready_after
+        self.records = []
+        self.requests = []
+        self.created = time.time()
+
+    def __call__(self, start, end):
+        self.requests.append((start, end))
+        if time.time() - self.created < self.ready_after:
+            return []
+        return list(self.records)
+
+
+def match(pending, record):
+    return record.get('to') == pending['target_number']
+
+
+def make_poller(statistics, results, timeouts, max_wait_time=2.0):
+    return CallStatusPoller(
+        statistics, match,
+        on_result=lambda call_id, disposition: results.append((call_id, disposition)),
+        on_timeout=timeouts.append,
+        check_interval=0.05, max_wait_time=max_wait_time
+    )
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_one_request_per_tick_for_many_calls():
+    statistics = FakeStatistics(ready_after=0.2)
+    results, timeouts = [], []
+    poller = make_poller(statistics, results, timeouts)
+    now = time.time()
+    for i in range(5):
+        statistics.records.append({'to': f'38050000000{i}', 'disposition': 'rejected'})
+        poller.add(f'call{i}', f'38050000000{i}', now)
+    try:
+        assert wait_for(lambda: len(results) == 5), results
+        # Потік на дзвінок робив би 5 запитів на кожен такт
+        assert poller.stats['requests'] == poller.stats['ticks'], poller.stats
+        assert all(start == now for start, _ in statistics.requests), statistics.requests
+        assert poller.pending_count() == 0
+    finally:
+        poller.stop()
+
+
+def test_same_target_records_used_once():
+    statistics = FakeStatistics()
+    statistics.records = [{'to': '380501112233', 'disposition': 'busy'}]
+    results, timeouts = [], []
+    poller = make_poller(statistics, results, timeouts, max_wait_time=0.3)
+    now = time.time()
+    poller.add('first', '380501112233', now)
+    poller.add('second', '380501112233', now + 0.01)
+    try:
+        assert wait_for(lambda: len(results) + len(timeouts) == 2), (results, timeouts)
+        # Один запис статистики - лише для найстарішого дзвінка
+        assert results == [('first', 'busy')], results
+        assert timeouts == ['second'], timeouts
+    finally:
+        poller.stop()
+
+
+def test_resolved_call_stops_polling():
+    statistics = FakeStatistics(ready_after=60)
+    results, timeouts = [], []
+    poller = make_poller(statistics, results, timeouts, max_wait_time=0.3)
+    poller.add('call', '380501112233')
+    try:
+        assert poller.resolve('call')
+        time.sleep(0.5)
+        assert statistics.requests == [], statistics.requests
+        assert results == [] and timeouts == []
+    finally:
+        poller.stop()
+
+
+def main():
+    tests = [
+        test_one_request_per_tick_for_many_calls,
+        test_same_target_records_used_once,
+        test_resolved_call_stops_polling,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести планувальника статусу дзвінків пройдено")
+
+
+if __name__ == "__main__":
+    main()
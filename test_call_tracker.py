@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Тест CallTracker на постійних з'єднаннях: пошук webhook-а через індекси,
+нещодавні дзвінки і статистика як методи, паралельний запис з потоків
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+from zadarma_api_webhook import CallTracker
+
+
+def fresh_tracker():
+    return CallTracker(os.path.join(tempfile.mkdtemp(), 'call_tracking.db'))
+
+
+def query_plan(tracker, sql, params):
+    return ' '.join(str(row) for row in tracker.pool.connection().execute('EXPLAIN QUERY PLAN ' + sql, params))
+
+
+def test_register_update_and_lookup():
+    tracker = fresh_tracker()
+    tracker.register_call('1_100', 1, 10, 'hvirtka', '380637442017')
+    assert tracker.get_call_by_target_and_time('0637442017', 60) is None  # ще не api_success
+
+    tracker.update_call_status('1_100', 'api_success')
+    call = tracker.get_call_by_target_and_time('+38 063 744 20 17', 60)
+    assert call['call_id'] == '1_100' and call['chat_id'] == 10, call
+
+    tracker.update_call_status('1_100', 'success', 'pbx-1')
+    call = tracker.get_call_by_pbx_id('pbx-1')
+    assert call['status'] == 'success' and call['action_type'] == 'hvirtka', call
+    assert tracker.get_call_by_pbx_id('pbx-x') is None
+
+
+def test_recent_calls_and_statistics():
+    tracker = fresh_tracker()
+    for i, (action, status) in enumerate([('hvirtka', 'success'), ('vorota', 'busy'), ('vorota', 'success')]):
+        tracker.register_call(f'u_{i}', i, i, action, '380930063585')
+        tracker.update_call_status(f'u_{i}', status)
+    tracker.flush()  # журнал пишеться у фоні
+    old_start = int(time.time()) - 3 * 24 * 3600
+    tracker.pool.connection().execute("UPDATE call_tracking SET start_time = ? WHERE call_id = 'u_0'", (old_start,))
+
+    recent = tracker.get_recent_calls(300)
+    assert sorted(call['call_id'] for call in recent) == ['u_1', 'u_2'], recent
+    assert all(call['timestamp'] == call['start_time'] for call in recent)
+
+    stats = tracker.get_call_statistics(days=1)
+    assert stats['total_calls'] == 2 and stats['by_action'] == {'hvirtka': 0, 'vorota': 2}, stats
+    assert stats['success_rate'] == 50.0
+    assert tracker.get_call_statistics(days=7)['total_calls'] == 3
+
+    tracker.cleanup_old_calls(24)
+    assert tracker.get_call_statistics(days=7)['total_calls'] == 2
+
+
+def test_webhook_lookups_use_indexes():
+    tracker = fresh_tracker()
+    match_plan = query_plan(tracker, '''
+        SELECT call_id FROM call_tracking
+        WHERE target_nsn = ? AND status = 'api_success' AND start_time > ?
+        ORDER BY start_time DESC LIMIT 1''', ('637442017', 0))
+    assert 'idx_call_tracking_match' in match_plan and 'TEMP B-TREE' not in match_plan, match_plan
+    pbx_plan = query_plan(tracker, 'SELECT call_id FROM call_tracking WHERE pbx_call_id = ?', ('pbx-1',))
+    assert 'idx_call_tracking_pbx' in pbx_plan, pbx_plan
+
+
+def test_concurrent_writers():
+    tracker = fresh_tracker()
+
+    def worker(n):
+        for i in range(50):
+            call_id = f'{n}_{i}'
+            tracker.register_call(call_id, n, n, 'vorota', '380930063585')
+            tracker.update_call_status(call_id, 'api_success')
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(tracker.get_recent_calls(60)) == 200
+
+
+def main():
+    tests = [
+        test_register_update_and_lookup,
+        test_recent_calls_and_statistics,
+        test_webhook_lookups_use_indexes,
+        test_concurrent_writers,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести CallTracker пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Тест шару з'єднань db_pool: WAL, з'єднання на потік, читачі не чекають writer-а
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+from db_pool import SQLitePool
+
+
+def make_pool():
+    tmp_dir = tempfile.mkdtemp()
+    pool = SQLitePool(os.path.join(tmp_dir, 'test.db'))
+    with pool.transaction() as conn:
+        conn.execute('CREATE TABLE clients (id TEXT PRIMARY KEY, phone TEXT)')
+        conn.execute("INSERT INTO clients VALUES ('1', '380501112233')")
+    return pool
+
+
+def test_wal_enabled():
+    pool = make_pool()
+    mode = pool.connection().execute('PRAGMA journal_mode').fetchone()[0]
+    assert mode == 'wal', mode
+    pool.close_all()
+
+
+def test_connection_per_thread():
+    pool = make_pool()
+    connections = []
+    thread = threading.Thread(target=lambda: connections.append(pool.connection()))
+    thread.start()
+    thread.join()
+    assert pool.connection() is pool.connection()
+    assert connections[0] is not pool.connection()
+    pool.close_all()
+
+
+def test_reader_not_blocked_by_writer():
+    pool = make_pool()
+    writer_started = threading.Event()
+    release_writer = threading.Event()
+
+    def slow_writer():
+        with pool.transaction() as conn:
+            conn.execute("INSERT INTO clients VALUES ('2', '380671112233')")
+            writer_started.set()
+            release_writer.wait(5)
+
+    thread = threading.Thread(target=slow_writer)
+    thread.start()
+    writer_started.wait(5)
+
+    started = time.time()
+    count = pool.connection().execute('SELECT COUNT(*) FROM clients').fetchone()[0]
+    elapsed = time.time() - started
+
+    release_writer.set()
+    thread.join()
+
+    # Читач бачить останній закомічений стан і не чекає на writer
+    assert count == 1, count
+    assert elapsed < 0.5, elapsed
+    assert pool.connection().execute('SELECT COUNT(*) FROM clients').fetchone()[0] == 2
+    pool.close_all()
+
+
+def test_transaction_rollback():
+    pool = make_pool()
+    try:
+        with pool.transaction() as conn:
+            conn.execute("INSERT INTO clients VALUES ('3', '380931112233')")
+            raise ValueError('boom')
+    except ValueError:
+        pass
+    count = pool.connection().execute('SELECT COUNT(*) FROM clients').fetchone()[0]
+    assert count == 1, count
+    pool.close_all()
+
+
+def main():
+    tests = [
+        test_wal_enabled,
+        test_connection_per_thread,
+        test_reader_not_blocked_by_writer,
+        test_transaction_rollback,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести db_pool пройдено")
+
+
+if __name__ == "__main__":
+    main()
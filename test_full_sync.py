@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Тест повної синхронізації через тіньову таблицю: під час завантаження
+і заміни читачі бачать повний набір клієнтів, невдала перевірка нічого не змінює
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+import user_db
+import wlaunch_api
+
+
+def clients(ids, prefix='38050'):
+    return [{'id': str(i), 'first_name': 'Клієнт', 'last_name': str(i), 'phone': '{}{:07d}'.format(prefix, i)}
+            for i in ids]
+
+
+def fresh_db(count=100):
+    user_db.DB_PATH = os.path.join(tempfile.mkdtemp(), 'users.db')
+    user_db.init_db()
+    user_db.bulk_upsert_clients(clients(range(count)))
+
+
+def count_clients():
+    conn = sqlite3.connect(user_db.DB_PATH)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM clients').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_full_sync(fetch):
+    original = wlaunch_api.fetch_all_clients
+    wlaunch_api.fetch_all_clients = fetch
+    try:
+        return user_db.force_full_sync()
+    finally:
+        wlaunch_api.fetch_all_clients = original
+
+
+def nsn_indexes():
+    conn = user_db._db().connection()
+    return [row[1] for row in conn.execute('PRAGMA index_list(clients)') if not row[1].startswith('sqlite_')]
+
+
+def test_readers_see_old_set_during_download():
+    fresh_db(100)
+    seen = []
+
+    def fetch(table):
+        for start in range(0, 120, 20):
+            user_db.bulk_upsert_clients(clients(range(start, start + 20), prefix='38067'), table)
+            seen.append(count_clients())
+            assert user_db.find_client_by_phone('380500000005')
+
+    assert run_full_sync(fetch)
+    assert seen == [100] * 6, seen
+    assert count_clients() == 120
+    assert user_db.find_client_by_phone('380670000119') and not user_db.find_client_by_phone('380500000005')
+
+
+def test_no_empty_window_for_concurrent_readers():
+    fresh_db(200)
+    stop = threading.Event()
+    counts = []
+
+    def reader():
+        conn = sqlite3.connect(user_db.DB_PATH)
+        while not stop.is_set():
+            try:
+                counts.append(conn.execute('SELECT COUNT(*) FROM clients').fetchone()[0])
+            except sqlite3.OperationalError as e:
+                counts.append(str(e))
+        conn.close()
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        for _ in range(3):
+            assert run_full_sync(lambda table: user_db.bulk_upsert_clients(clients(range(200)), table))
+    finally:
+        stop.set()
+        thread.join()
+    assert counts and set(counts) == {200}, set(counts)
+
+
+def test_validation_keeps_old_table():
+    fresh_db(100)
+    assert not run_full_sync(lambda table: user_db.bulk_upsert_clients(clients(range(10)), table))
+    assert not run_full_sync(lambda table: 0)
+    bad_phones = [dict(client, phone='12{}'.format(i)) for i, client in enumerate(clients(range(100)))]
+    assert not run_full_sync(lambda table: user_db.bulk_upsert_clients(bad_phones, table))
+
+    def broken(table):
+        raise RuntimeError('мережа впала')
+    assert not run_full_sync(broken)
+
+    assert count_clients() == 100
+    tables = [row[0] for row in user_db._db().connection().execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert user_db.SHADOW_TABLE not in tables, tables
+
+
+def test_indexes_and_hashes_survive_repeated_swaps():
+    fresh_db(50)
+    for _ in range(3):
+        assert run_full_sync(lambda table: user_db.bulk_upsert_clients(clients(range(50)), table))
+        user_db.init_db()
+        assert len(nsn_indexes()) == 1, nsn_indexes()
+    # Хеші перенесені разом з таблицею - повторний синк нічого не пише
+    assert user_db.bulk_upsert_clients(clients(range(50)))['unchanged'] == 50
+    plan = ' '.join(str(row) for row in user_db._db().connection().execute(
+        'EXPLAIN QUERY PLAN SELECT id FROM clients WHERE phone_nsn = ?', ('500000001',)))
+    assert 'INDEX' in plan, plan
+
+
+def main():
+    tests = [
+        test_readers_see_old_set_during_download,
+        test_no_empty_window_for_concurrent_readers,
+        test_validation_keeps_old_table,
+        test_indexes_and_hashes_survive_repeated_swaps,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести повної синхронізації пройдено")
+
+
+if __name__ == "__main__":
+    main()
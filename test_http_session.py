@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Тест пулу HTTP з'єднань та таймаутів клієнта Zadarma
+"""
+
+from http_session import create_session, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from zadarma_client import ZadarmaAPI
+
+
+class FakeResponse:
+    status_code = 200
+    text = '{"status": "success"}'
+
+
+def test_session_pool_size():
+    session = create_session(pool_size=7)
+    adapter = session.get_adapter('https://api.zadarma.com/')
+    assert adapter._pool_connections == 7
+    assert adapter._pool_maxsize == 7
+    assert session.get_adapter('http://example.com/') is adapter
+
+
+def test_call_passes_timeout_tuple():
+    api = ZadarmaAPI('key', 'secret', connect_timeout=1.5, read_timeout=4)
+    captured = {}
+
+    def fake_get(url, **kwargs):
+        captured['url'] = url
+        captured.update(kwargs)
+        return FakeResponse()
+
+    def fake_request(method, url, **kwargs):
+        captured['method'] = method
+        captured.update(kwargs)
+        return FakeResponse()
+
+    api.session.get = fake_get
+    api.session.request = fake_request
+
+    api.call('/v1/info/balance/', {}, 'GET')
+    assert captured['timeout'] == (1.5, 4), captured
+    assert captured['url'].startswith('https://api.zadarma.com/v1/info/balance/')
+
+    api.call('/v1/request/callback/', {'from': '1', 'to': '2'}, 'POST')
+    assert captured['method'] == 'POST'
+    assert captured['timeout'] == (1.5, 4), captured
+
+
+def test_default_timeouts():
+    api = ZadarmaAPI('key', 'secret')
+    assert api.timeout == (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+
+
+def main():
+    tests = [
+        test_session_pool_size,
+        test_call_passes_timeout_tuple,
+        test_default_timeouts,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести HTTP сесії пройдено")
+
+
+if __name__ == "__main__":
+    main()
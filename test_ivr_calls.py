@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Тест сховища pending IVR дзвінків: пошук за номером через індекс,
+одноразове закриття дзвінка, видалення прострочених записів
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+from ivr_calls import PendingIvrCalls
+
+
+def fresh_store(**kwargs):
+    return PendingIvrCalls(os.path.join(tempfile.mkdtemp(), 'pending_ivr_calls.db'), **kwargs)
+
+
+def test_find_pending_any_format():
+    store = fresh_store()
+    now = int(time.time())
+    store.add('old', '0930063585', '380933297777', 'vorota', timestamp=now - 300)
+    store.add('a', '0930063585', '380933297777', 'vorota', timestamp=now - 30)
+    store.add('b', '380930063585', '380501112233', 'vorota', timestamp=now - 5)
+    store.add('door', '0637442017', '380501112233', 'hvirtka')
+
+    assert store.find_pending('+380930063585')['call_id'] == 'b'
+    assert store.find_pending('930063585', window=10)['call_id'] == 'b'
+    assert store.find_pending('0501112233') is None
+
+    assert store.update_status('b', 'success')
+    call = store.find_pending('0930063585')
+    assert call['call_id'] == 'a' and call['action_type'] == 'vorota' and call['status'] == 'pending', call
+
+
+def test_status_closed_once():
+    store = fresh_store()
+    store.add('c', '0637442017', '380933297777', 'hvirtka')
+    results = []
+    barrier = threading.Barrier(4)
+
+    def close(status):
+        barrier.wait()
+        results.append(store.update_status('c', status))
+
+    threads = [threading.Thread(target=close, args=(status,)) for status in ('success', 'busy', 'failed', 'no_answer')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [False, False, False, True], results
+    assert store.find_pending('0637442017') is None
+    assert not store.update_status('missing', 'success')
+
+
+def test_expired_rows_removed():
+    store = fresh_store(ttl=3600)
+    now = int(time.time())
+    store.add('stale', '0930063585', '1', 'vorota', timestamp=now - 7200)
+    store.add('fresh', '0930063585', '1', 'vorota')  # реєстрація чистить прострочені
+    rows = store.pool.connection().execute('SELECT call_id FROM pending_ivr_calls').fetchall()
+    assert rows == [('fresh',)], rows
+
+    store.add('stale2', '0930063585', '1', 'vorota', timestamp=now - 7200)
+    assert store.cleanup() == 1
+
+
+def test_lookup_uses_index():
+    store = fresh_store()
+    plan = ' '.join(str(row) for row in store.pool.connection().execute('''
+        EXPLAIN QUERY PLAN SELECT call_id FROM pending_ivr_calls
+        WHERE target_nsn = ? AND status = 'pending' AND timestamp >= ?
+        ORDER BY timestamp DESC LIMIT 1''', ('930063585', 0)))
+    assert 'idx_pending_ivr_match' in plan and 'TEMP B-TREE' not in plan, plan
+
+
+def main():
+    tests = [
+        test_find_pending_any_format,
+        test_status_closed_once,
+        test_expired_rows_removed,
+        test_lookup_uses_index,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести pending IVR дзвінків пройдено")
+
+
+if __name__ == "__main__":
+    main()
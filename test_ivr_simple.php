@@ -18,10 +18,11 @@ echo "=================================\n";
 include __DIR__ . '/webhooks/zadarma_ivr_webhook.php';
 
 echo "\n=== РЕЗУЛЬТАТ ===\n";
-if (file_exists('/tmp/pending_ivr_calls.json')) {
-    echo "✅ Pending calls файл створено\n";
-    echo file_get_contents('/tmp/pending_ivr_calls.json');
+$pending = getPendingCallByTarget('0930063585');
+if ($pending) {
+    echo "✅ Pending call збережено\n";
+    echo json_encode($pending, JSON_PRETTY_PRINT) . "\n";
 } else {
-    echo "❌ Pending calls файл НЕ створено\n";
+    echo "❌ Pending call НЕ збережено\n";
 }
 ?>
@@ -3,36 +3,30 @@
 require_once 'webhooks/zadarma_ivr_webhook.php';
 
 echo "🧪 ТЕСТУВАННЯ IVR TRACKING ФУНКЦІЙ\n";
-echo "=" * 40 . "\n";
+echo str_repeat("=", 40) . "\n";
 
 // Симулювати pending call
-$test_data = [
-    'call_id' => 'test_123',
-    'target_number' => '0930063585', 
-    'caller_id' => '380933297777',
-    'action_type' => 'vorota',
-    'timestamp' => time(),
-    'status' => 'pending'
-];
-
-file_put_contents('/tmp/pending_ivr_calls.json', json_encode([$test_data], JSON_PRETTY_PRINT));
+savePendingCall('test_123', '0930063585', '380933297777', 'vorota');
 echo "✅ Створено тестовий pending call\n";
 
-// Тестувати пошук
-$found = getPendingCallByTarget('0930063585');
+// Тестувати пошук - номер у будь-якому форматі
+$found = getPendingCallByTarget('+380930063585');
 if ($found) {
     echo "✅ Знайдено pending call: " . $found['call_id'] . "\n";
 } else {
     echo "❌ Pending call не знайдено\n";
 }
 
-// Тестувати оновлення статусу
+// Тестувати оновлення статусу - вдруге дзвінок вже закрито
 $updated = updatePendingCallStatus('test_123', 'success');
 echo $updated ? "✅ Статус оновлено\n" : "❌ Помилка оновлення\n";
+$again = updatePendingCallStatus('test_123', 'busy');
+echo $again ? "❌ Дзвінок закрито двічі\n" : "✅ Повторне закриття відхилено\n";
 
 // Показати результат
-$content = file_get_contents('/tmp/pending_ivr_calls.json');
-echo "📋 Поточний стан файлу:\n$content\n";
+$stmt = ivrPendingDb()->prepare('SELECT * FROM pending_ivr_calls WHERE call_id = ?');
+$stmt->execute(['test_123']);
+echo "📋 Поточний стан запису:\n" . json_encode($stmt->fetch(), JSON_PRETTY_PRINT) . "\n";
 
 echo "🎯 Тест завершено!\n";
 ?>
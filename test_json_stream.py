@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Тест потокового JSON парсера: той самий результат, що й json.loads,
+при будь-якому розбитті на шматки, і пам'ять не росте з розміром відповіді
+"""
+
+import os
+import sys
+import json
+import random
+import subprocess
+import tracemalloc
+
+from json_stream import JSONArrayStream
+
+
+def chunked(data, sizes):
+    pos = 0
+    for size in sizes:
+        if pos >= len(data):
+            return
+        yield data[pos:pos + size]
+        pos += size
+    if pos < len(data):
+        yield data[pos:]
+
+
+def parse(data, sizes, key="content"):
+    stream = JSONArrayStream(chunked(data, sizes), key)
+    items = list(stream)
+    return items, stream.fields
+
+
+SAMPLE = {
+    "meta": {"nested": [1, 2, {"content": ["не масив верхнього рівня"]}]},
+    "content": [
+        {"id": "1", "first_name": "Іван", "last_name": "Петренко \"Ваня\"", "phone": "+380501112233"},
+        {"id": 2, "first_name": None, "last_name": "Коваль\\", "phone": "0671112233", "score": -12.5e3},
+        {"id": "3", "tags": [], "flag": True, "note": "emoji 📞 і \u0000 символи"},
+        12345,
+        "рядок",
+        [1, [2, [3]]],
+    ],
+    "page": {"number": 0, "total_pages": 7, "total_elements": 6},
+}
+
+
+def test_matches_json_loads_for_any_chunking():
+    data = json.dumps(SAMPLE, ensure_ascii=False).encode("utf-8")
+    rng = random.Random(3)
+    splits = [[1] * len(data), [2, 3, 5, 7] * len(data), [len(data)]]
+    splits += [[rng.randint(1, 40) for _ in range(len(data))] for _ in range(50)]
+    for sizes in splits:
+        items, fields = parse(data, sizes)
+        assert items == SAMPLE["content"], items
+        assert fields == {"meta": SAMPLE["meta"], "page": SAMPLE["page"]}, fields
+
+
+def test_whitespace_and_edge_cases():
+    pretty = json.dumps(SAMPLE, indent=4).encode("utf-8")
+    items, fields = parse(pretty, [7] * len(pretty))
+    assert items == SAMPLE["content"] and fields["page"]["total_pages"] == 7
+
+    assert parse(b'{}', [1]) == ([], {})
+    assert parse(b' { "content" : [ ] , "page" : {} } ', [1] * 40) == ([], {"page": {}})
+    # Числа на межі шматків не обриваються
+    assert parse(b'{"content":[12345,6789]}', [1] * 30)[0] == [12345, 6789]
+    # Масив під іншим ключем - звичайне поле
+    assert parse(b'{"other":[1,2]}', [3] * 10) == ([], {"other": [1, 2]})
+
+
+def test_invalid_json_raises():
+    for data in (b'{"content":[{"id":1}', b'[1,2]', b'{"content":[1 2]}'):
+        try:
+            parse(data, [4] * len(data))
+        except ValueError:
+            continue
+        raise AssertionError(data)
+
+
+def stream_peaks():
+    """Пік пам'яті (байт): потоково 1000 і 20000 клієнтів, json.loads 20000"""
+    def response(clients):
+        yield b'{"content":['
+        for i in range(clients):
+            client = {"id": str(i), "first_name": "Клієнт", "last_name": str(i), "phone": "38050{:07d}".format(i),
+                      "description": "x" * 200}
+            yield (b"," if i else b"") + json.dumps(client).encode("utf-8")
+        yield b'],"page":{"total_pages":1}}'
+
+    def peak(clients):
+        tracemalloc.start()
+        count = sum(1 for _ in JSONArrayStream(response(clients)))
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert count == clients
+        return peak_bytes
+
+    small, large = peak(1000), peak(20000)
+    tracemalloc.start()
+    json.loads(b"".join(response(20000)))
+    full = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return small, large, full
+
+
+def test_memory_stays_flat():
+    """Пік пам'яті потокового розбору не залежить від розміру відповіді"""
+    # tracemalloc рахує алокації всіх потоків - вимірюємо в окремому процесі,
+    # де немає фонових потоків інших тестів
+    output = subprocess.check_output(
+        [sys.executable, "-c", "import json, test_json_stream; print(json.dumps(test_json_stream.stream_peaks()))"],
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    small, large, full = json.loads(output.decode("utf-8").splitlines()[-1])
+    print(f"📊 Пік пам'яті: потоково 1000 - {small // 1024}КБ, 20000 - {large // 1024}КБ; json.loads 20000 - {full // 1024}КБ")
+    assert large < small * 2
+    assert large * 10 < full
+
+
+def main():
+    tests = [
+        test_matches_json_loads_for_any_chunking,
+        test_whitespace_and_edge_cases,
+        test_invalid_json_raises,
+        test_memory_stays_flat,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести потокового JSON пройдено")
+
+
+if __name__ == "__main__":
+    main()
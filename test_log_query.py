@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Тест JSON-lines логів і log_query: ротація з індексом, перевідкриття після
+чужої ротації, читання з кінця блоками, фільтри рівня/модуля/часу
+"""
+
+import os
+import json
+import logging
+import tempfile
+
+import log_query
+from logging_setup import JsonLinesFileHandler, INDEX_SUFFIX
+from log_query import query, read_lines_backwards, load_index, parse_line, format_record, log_files_size
+
+HOUR = 3600
+BASE = 1700000000 - 1700000000 % HOUR  # початок години
+
+
+def make_record(name, level, msg, created):
+    record = logging.LogRecord(name, level, __file__, 1, msg, None, None)
+    record.created = created
+    return record
+
+
+def write_log(path, entries, **kwargs):
+    """entries: (секунд від BASE, logger, рівень, повідомлення)"""
+    handler = JsonLinesFileHandler(path, **kwargs)
+    for offset, name, level, msg in entries:
+        handler.handle(make_record(name, level, msg, BASE + offset))
+    handler.close()
+    return handler
+
+
+def sample_entries():
+    entries = []
+    for hour in range(3):
+        for minute in range(0, 60, 10):
+            at = hour * HOUR + minute * 60
+            entries.append((at, 'zadarma_api_webhook', logging.INFO, f"📞 Дзвінок {hour}:{minute:02d}"))
+        entries.append((hour * HOUR + 30 * 60 + 1, 'bot', logging.ERROR, f"❌ Помилка години {hour}"))
+    return sorted(entries)
+
+
+def test_json_lines_and_hourly_index():
+    path = os.path.join(tempfile.mkdtemp(), 'bot.log')
+    write_log(path, sample_entries())
+    with open(path, encoding='utf-8') as f:
+        first = json.loads(f.readline())
+    assert first['level'] == 'INFO' and first['module'] == 'zadarma_api_webhook'
+    assert first['msg'] == '📞 Дзвінок 0:00' and first['ts'] == BASE
+
+    index = load_index(path)
+    assert sorted(index) == [BASE, BASE + HOUR, BASE + 2 * HOUR], index
+    with open(path, 'rb') as f:
+        f.seek(index[BASE + HOUR])
+        assert json.loads(f.readline())['msg'] == '📞 Дзвінок 1:00'
+
+
+def test_query_filters():
+    path = os.path.join(tempfile.mkdtemp(), 'bot.log')
+    write_log(path, sample_entries())
+
+    assert [r['msg'] for r in query(path, limit=2)] == ['📞 Дзвінок 2:40', '📞 Дзвінок 2:50']
+    errors = query(path, levels=log_query.ERROR_LEVELS, limit=2)
+    assert [r['msg'] for r in errors] == ['❌ Помилка години 1', '❌ Помилка години 2']
+    assert [r['module'] for r in query(path, module='bot')] == ['bot'] * 3
+
+    # Часовий діапазон: until через індекс, since зупиняє читання
+    window = query(path, since=BASE + HOUR + 45 * 60, until=BASE + 2 * HOUR + 5 * 60)
+    assert [r['msg'] for r in window] == ['📞 Дзвінок 1:50', '📞 Дзвінок 2:00'], window
+    assert query(path, levels=('ERROR',), until=BASE + 20 * 60) == []
+
+
+def test_rotation_moves_index():
+    path = os.path.join(tempfile.mkdtemp(), 'bot.log')
+    entries = [(i * 60, 'bot', logging.INFO, 'x' * 200) for i in range(40)]
+    write_log(path, entries, max_bytes=2000, backup_count=2)
+    assert os.path.exists(path + '.1') and os.path.exists(path + '.2') and not os.path.exists(path + '.3')
+    assert os.path.exists(path + INDEX_SUFFIX) and os.path.exists(path + '.1' + INDEX_SUFFIX)
+    assert os.path.getsize(path) < 2000
+    # Кожен файл має власний індекс з offset-ами в межах файлу
+    for name in (path, path + '.1'):
+        assert all(offset < os.path.getsize(name) for offset in load_index(name).values())
+
+
+def test_rotation_counts_utf8_bytes():
+    path = os.path.join(tempfile.mkdtemp(), 'bot.log')
+    entries = [(i * 60, 'bot', logging.INFO, 'Хвіртка відчинена ' * 10) for i in range(40)]
+    write_log(path, entries, max_bytes=4000, backup_count=3)
+    # Кирилиця - 2 байти на символ: ліміт у байтах не перевищено в жодному файлі
+    for name in (path, path + '.1', path + '.2'):
+        assert 0 < os.path.getsize(name) < 4000, (name, os.path.getsize(name))
+
+
+def test_reopens_after_rotation_by_other_process():
+    path = os.path.join(tempfile.mkdtemp(), 'webhook_processor.log')
+    worker = JsonLinesFileHandler(path)
+    worker.handle(make_record('webhook_worker', logging.INFO, 'до ротації', BASE))
+
+    # Інший процес (process_webhook_working) ротував файл
+    os.replace(path, path + '.1')
+    worker._checked_at = 0.0
+    worker.handle(make_record('webhook_worker', logging.INFO, 'після ротації', BASE + 1))
+    worker.close()
+    assert [r['msg'] for r in query(path)] == ['після ротації']
+    assert [r['msg'] for r in query(path + '.1')] == ['до ротації']
+
+
+def test_backwards_reader_utf8_blocks():
+    path = os.path.join(tempfile.mkdtemp(), 'bot.log')
+    lines = [f"{i} Ворота відчинено ✅ {'ї' * (i % 7)}" for i in range(200)]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))  # останній рядок без \n
+    # Блок у 7 байт ріже багатобайтові символи - рядки все одно цілі
+    assert list(read_lines_backwards(path, block_size=7)) == lines[::-1]
+    # Бюджет байт: лише повні рядки з кінця
+    budget = list(read_lines_backwards(path, max_bytes=200, block_size=16))
+    assert budget and budget == lines[::-1][:len(budget)] and len(budget) < 10
+
+
+def test_scan_budget_bounds_work():
+    path = os.path.join(tempfile.mkdtemp(), 'bot.log')
+    entries = [(0, 'bot', logging.ERROR, 'стара помилка')]
+    entries += [(i, 'bot', logging.INFO, 'шум ' * 20) for i in range(1, 5000)]
+    write_log(path, entries)
+    assert query(path, levels=('ERROR',), max_bytes=64 * 1024) == []
+    assert [r['msg'] for r in query(path, levels=('ERROR',), max_bytes=None)] == ['стара помилка']
+
+
+def test_legacy_text_and_shell_lines():
+    record = parse_line('2024-05-01 10:00:00,123 - user_db - WARNING - ⚠️ База зайнята')
+    assert (record['level'], record['module'], record['msg']) == ('WARNING', 'user_db', '⚠️ База зайнята')
+    assert record['ts'] is not None
+    shell = parse_line('[2024-05-01 10:00:00] Бот працює (PID: 123)')
+    assert shell['level'] is None and shell['msg'].startswith('[2024')
+    assert parse_line('   ') is None
+    assert format_record(record, width=30) == '10:00:00 WARNING user_db: ⚠...'
+
+
+def test_log_files_size():
+    directory = tempfile.mkdtemp()
+    for name, size in (('bot.log', 10), ('bot.log.1', 20), ('bot.log.idx', 5), ('users.db', 100)):
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(b'x' * size)
+    assert log_files_size(directory) == (2, 30)
+
+
+def main():
+    tests = [
+        test_json_lines_and_hourly_index,
+        test_query_filters,
+        test_rotation_moves_index,
+        test_rotation_counts_utf8_bytes,
+        test_reopens_after_rotation_by_other_process,
+        test_backwards_reader_utf8_blocks,
+        test_scan_budget_bounds_work,
+        test_legacy_text_and_shell_lines,
+        test_log_files_size,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести пошуку в логах пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Тест tail(): останні рядки з кінця файлу блоками, межі UTF-8, predicate,
+вікно рядків, бюджет байт і CLI для shell скриптів
+"""
+
+import io
+import os
+import tempfile
+import contextlib
+
+import log_tail
+from log_tail import tail, iter_lines_backwards
+
+
+def write(lines, ending='\n'):
+    path = os.path.join(tempfile.mkdtemp(), 'bot.log')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(ending.join(lines) + ending)
+    return path
+
+
+LINES = [f"{i} {'ERROR' if i % 10 == 0 else 'INFO'} Хвіртка відчинена ✅ {'є' * (i % 5)}" for i in range(500)]
+
+
+def test_last_lines_any_block_size():
+    path = write(LINES)
+    for block_size in (1, 3, 7, 64, 4096):
+        assert tail(path, 5, block_size=block_size) == LINES[-5:], block_size
+    assert tail(path, 1000) == LINES
+    assert tail(path, 0) == []
+
+
+def test_predicate_stops_early():
+    path = write(LINES)
+    seen = []
+
+    def is_error(line):
+        seen.append(line)
+        return ' ERROR ' in line
+
+    assert tail(path, 3, is_error) == ['470 ERROR Хвіртка відчинена ✅ ', '480 ERROR Хвіртка відчинена ✅ ',
+                                       '490 ERROR Хвіртка відчинена ✅ ']
+    assert len(seen) == 30  # рядки до 470-го вже не перевірялись
+
+
+def test_window_and_byte_budget():
+    path = write(LINES)
+    assert tail(path, 10, lambda line: ' ERROR ' in line, window=20) == [LINES[480], LINES[490]]
+    limited = tail(path, 1000, max_bytes=300)
+    assert limited and limited == LINES[-len(limited):] and len(limited) < 10
+
+
+def test_crlf_and_missing_final_newline():
+    path = write(['перший', 'другий'], ending='\r\n')
+    assert tail(path, 5) == ['перший', 'другий']
+    with open(path, 'ab') as f:
+        f.write('третій без переводу'.encode('utf-8'))
+    assert list(iter_lines_backwards(path, block_size=2)) == ['третій без переводу', 'другий', 'перший']
+
+
+def test_cli_count_and_pretty():
+    path = write(['{"ts": 1, "time": "2024-05-01 10:00:00", "level": "ERROR", "module": "bot", "msg": "❌ Збій"}']
+                 + LINES[-3:])
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        assert log_tail.main(['--window', '20', '--count', '-e', 'error|exception', path]) == 0
+        assert log_tail.main(['-n', '4', '--pretty', path]) == 0
+    lines = out.getvalue().splitlines()
+    assert lines[0] == '1'
+    assert lines[1] == '10:00:00 ERROR bot: ❌ Збій' and lines[2:] == LINES[-3:]
+    with contextlib.redirect_stderr(io.StringIO()):
+        assert log_tail.main([path + '.missing']) == 1
+
+
+def main():
+    tests = [
+        test_last_lines_any_block_size,
+        test_predicate_stops_early,
+        test_window_and_byte_budget,
+        test_crlf_and_missing_final_newline,
+        test_cli_count_and_pretty,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести tail пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Тест логування через чергу: запис у файл фоновим потоком, рівні модулів,
+ZADARMA_LOG_LEVELS і ледаче форматування аргументів
+"""
+
+import os
+import json
+import logging
+import tempfile
+import threading
+
+import logging_setup
+from logging_setup import setup_logging, stop_logging, parse_module_levels, LOG_LEVELS_ENV
+
+
+class CountingArg:
+    """Рахує, скільки разів запис перетворили на рядок"""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return 'arg'
+
+
+def run_with_logging(test, **kwargs):
+    """Запускає test(log_file) з setup_logging і відновлює стан logging після"""
+    root = logging.getLogger()
+    root_level = root.level
+    names = ['zadarma_client', 'user_db'] + list(logging_setup.MODULE_LEVELS)
+    levels = {name: logging.getLogger(name).level for name in names}
+    log_file = os.path.join(tempfile.mkdtemp(), 'bot.log')
+    try:
+        setup_logging(log_file, **kwargs)
+        test(log_file)
+    finally:
+        stop_logging()
+        root.setLevel(root_level)
+        for name, level in levels.items():
+            logging.getLogger(name).setLevel(level)
+
+
+def read(log_file):
+    with open(log_file, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_written_by_background_thread():
+    def check(log_file):
+        threads = []
+        handler = logging.Handler()
+        handler.emit = lambda record: threads.append(threading.current_thread().name)
+        logging_setup._listener.handlers += (handler,)
+
+        logging.getLogger('user_db').info("🔍 Пошук клієнта за номером: %s", '0930063585')
+        stop_logging()
+        record = json.loads(read(log_file).splitlines()[-1])
+        assert (record['level'], record['module']) == ('INFO', 'user_db')
+        assert record['msg'] == "🔍 Пошук клієнта за номером: 0930063585"
+        assert threads and threading.current_thread().name not in threads, threads
+
+    run_with_logging(check)
+
+
+def test_setup_is_idempotent():
+    def check(log_file):
+        listener = logging_setup._listener
+        assert setup_logging(log_file) is listener
+        handlers = [h for h in logging.getLogger().handlers if h is logging_setup._queue_handler]
+        assert len(handlers) == 1
+
+    run_with_logging(check)
+
+
+def test_module_levels_and_env_override():
+    os.environ[LOG_LEVELS_ENV] = 'zadarma_client=WARNING, bogus=LOUD, user_db=10'
+    try:
+        def check(log_file):
+            logging.getLogger('zadarma_client').info("📡 Response status: %s", 200)
+            logging.getLogger('zadarma_client').warning("🔁 Zadarma %s: повтор", '/v1/info/balance/')
+            logging.getLogger('user_db').debug("📞 Нормалізація номеру: '%s'", '0930063585')
+            logging.getLogger('telegram.bot').info("getUpdates")
+            stop_logging()
+            text = read(log_file)
+            assert 'Response status' not in text and '🔁 Zadarma /v1/info/balance/: повтор' in text
+            assert "Нормалізація номеру: '0930063585'" in text
+            assert 'getUpdates' not in text
+
+        run_with_logging(check, module_levels={'zadarma_client': logging.DEBUG})
+    finally:
+        del os.environ[LOG_LEVELS_ENV]
+
+
+def test_disabled_levels_not_formatted():
+    def check(log_file):
+        arg = CountingArg()
+        logging.getLogger('zadarma_client').debug("🔐 Params string: %s", arg)
+        assert arg.formatted == 0
+        logging.getLogger('zadarma_client').info("📡 Zadarma API call: %s", arg)
+        stop_logging()
+        assert arg.formatted >= 1 and 'Zadarma API call: arg' in read(log_file)
+
+    run_with_logging(check)
+
+
+def test_parse_module_levels():
+    assert parse_module_levels(None) == {}
+    assert parse_module_levels('a=debug,b = ERROR,c,=INFO,d=NOPE') == {'a': logging.DEBUG, 'b': logging.ERROR}
+
+
+def main():
+    tests = [
+        test_written_by_background_thread,
+        test_setup_is_idempotent,
+        test_module_levels_and_env_override,
+        test_disabled_levels_not_formatted,
+        test_parse_module_levels,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести налаштування логування пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Тест індексу очікуваних дзвінків: зіставлення за pbx_call_id і NSN,
+термін життя, відновлення з журналу після рестарту і з запису іншого процесу
+"""
+
+import os
+import time
+import sqlite3
+import tempfile
+
+from pending_calls import PendingCallIndex
+from zadarma_api_webhook import CallTracker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+def call(call_id, target, start_time, status='api_success', **extra):
+    data = {'call_id': call_id, 'chat_id': 1, 'action_type': 'vorota', 'target_number': target,
+            'start_time': start_time, 'status': status}
+    data.update(extra)
+    return data
+
+
+def test_index_matches_by_target_and_pbx():
+    clock = FakeClock()
+    index = PendingCallIndex(ttl=600, clock=clock)
+    index.add(call('a', '0930063585', clock.now - 50))
+    index.add(call('b', '+380930063585', clock.now - 10))
+    index.add(call('c', '380637442017', clock.now - 5, status='initiated'))
+
+    # Найновіший дзвінок на номер у будь-якому форматі
+    assert index.by_target('930063585')['call_id'] == 'b'
+    assert index.by_target('0930063585', window=30)['call_id'] == 'b'
+    assert index.by_target('0637442017') is None  # ще не api_success
+    index.update('c', 'api_success')
+    assert index.by_target('0637442017')['call_id'] == 'c'
+
+    index.update('b', 'success', pbx_call_id='pbx-b')
+    assert index.by_pbx_id('pbx-b')['call_id'] == 'b'
+    assert index.by_target('930063585')['call_id'] == 'a'  # b вже завершено
+    stats = index.stats()
+    assert stats['pbx_hits'] == 1 and stats['size'] == 3, stats
+
+
+def test_index_expiry():
+    clock = FakeClock()
+    index = PendingCallIndex(ttl=60, clock=clock)
+    index.add(call('a', '0930063585', clock.now, pbx_call_id='pbx-a'))
+    index.add(call('old', '0930063585', clock.now - 120))  # вже прострочений
+    assert len(index) == 1
+    clock.now += 61
+    assert index.by_pbx_id('pbx-a') is None and index.by_target('0930063585') is None
+    assert len(index) == 0 and index.stats()['expired'] == 1
+
+
+def test_rebuilt_from_log_after_restart():
+    db_path = os.path.join(tempfile.mkdtemp(), 'call_tracking.db')
+    tracker = CallTracker(db_path)
+    tracker.register_call('u_1', 1, 11, 'hvirtka', '380637442017')
+    tracker.update_call_status('u_1', 'api_success')
+    assert tracker.flush()
+
+    restarted = CallTracker(db_path)
+    restarted.pending = PendingCallIndex()
+    restarted._refresh_pending(force=True)
+    assert restarted.get_call_by_target_and_time('0637442017', 120)['chat_id'] == 11
+
+
+def test_sees_calls_from_other_process():
+    db_path = os.path.join(tempfile.mkdtemp(), 'call_tracking.db')
+    tracker = CallTracker(db_path)
+    assert tracker.get_call_by_target_and_time('0930063585', 120) is None
+
+    # Бот (інший процес) реєструє дзвінок - webhook_worker бачить його без рестарту
+    conn = sqlite3.connect(db_path)
+    conn.execute('''INSERT INTO call_tracking (call_id, user_id, chat_id, action_type, target_number, target_nsn,
+                    start_time, status) VALUES ('ext', 2, 22, 'vorota', '380930063585', '930063585', ?, 'api_success')''',
+                 (int(time.time()),))
+    conn.commit()
+    conn.close()
+    assert tracker.get_call_by_target_and_time('+380930063585', 120)['call_id'] == 'ext'
+
+
+def test_lookup_does_not_query_table():
+    tracker = CallTracker(os.path.join(tempfile.mkdtemp(), 'call_tracking.db'))
+    for i in range(200):
+        tracker.register_call(f'u_{i}', i, i, 'vorota', '3809300{:05d}'.format(i))
+        tracker.update_call_status(f'u_{i}', 'api_success', f'pbx-{i}')
+    assert tracker.flush()
+    tracker._refresh_pending()
+
+    statements = []
+    tracker.pool.connection().set_trace_callback(statements.append)
+    try:
+        assert tracker.get_call_by_pbx_id('pbx-150')['call_id'] == 'u_150'
+        assert tracker.get_call_by_target_and_time('0930000150', 600)['call_id'] == 'u_150'
+    finally:
+        tracker.pool.connection().set_trace_callback(None)
+    assert statements == ['PRAGMA data_version'] * 2, statements
+
+
+def main():
+    tests = [
+        test_index_matches_by_target_and_pbx,
+        test_index_expiry,
+        test_rebuilt_from_log_after_restart,
+        test_sees_calls_from_other_process,
+        test_lookup_does_not_query_table,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести індексу дзвінків пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Тест нормалізації номерів (NSN) та міграції індексованої колонки
+"""
+
+import os
+import sqlite3
+import tempfile
+
+import user_db
+from phone_utils import national_number, ensure_nsn_column
+
+
+def test_national_number_formats():
+    for phone in ('+380501112233', '380501112233', '0501112233', '+38 (050) 111-22-33'):
+        assert national_number(phone) == '501112233', phone
+    assert national_number(None) == ''
+    assert national_number('') == ''
+
+
+def test_migration_backfills_and_indexes():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE clients (id TEXT PRIMARY KEY, phone TEXT UNIQUE)')
+    conn.execute("INSERT INTO clients VALUES ('1', '380501112233')")
+    conn.execute("INSERT INTO clients VALUES ('2', '0671112233')")
+
+    ensure_nsn_column(conn, 'clients', 'phone', 'phone_nsn', 'idx_clients_phone_nsn')
+    # Повторний виклик нічого не ламає
+    ensure_nsn_column(conn, 'clients', 'phone', 'phone_nsn', 'idx_clients_phone_nsn')
+
+    rows = dict(conn.execute('SELECT id, phone_nsn FROM clients'))
+    assert rows == {'1': '501112233', '2': '671112233'}, rows
+
+    plan = ' '.join(str(row) for row in conn.execute(
+        'EXPLAIN QUERY PLAN SELECT id FROM clients WHERE phone_nsn = ?', ('501112233',)))
+    assert 'idx_clients_phone_nsn' in plan, plan
+
+
+def legacy_db():
+    """БД зі схемою до міграції (без phone_nsn), як у cron процесі без init_db()"""
+    user_db.DB_PATH = os.path.join(tempfile.mkdtemp(), 'users.db')
+    conn = sqlite3.connect(user_db.DB_PATH)
+    conn.execute('CREATE TABLE clients (id TEXT PRIMARY KEY, first_name TEXT, last_name TEXT, phone TEXT UNIQUE)')
+    conn.execute('CREATE TABLE users (telegram_id INTEGER PRIMARY KEY, phone TEXT, username TEXT, first_name TEXT)')
+    conn.execute("INSERT INTO clients VALUES ('c1', 'Олена', 'Коваль', '0671112233')")
+    conn.execute("INSERT INTO users VALUES (111, '380671112233', 'olena', 'Олена')")
+    conn.commit()
+    conn.close()
+
+
+def test_lookup_without_init_db():
+    legacy_db()
+    client = user_db.find_client_by_phone('+380671112233')
+    assert client and client['id'] == 'c1', client
+    user_db.add_or_update_client('c2', 'Іван', 'Петренко', '380501112233')
+    assert user_db.find_client_by_phone('0501112233')['id'] == 'c2'
+
+
+def test_auth_matches_by_nsn():
+    legacy_db()
+    user_db.invalidate_auth_cache()
+    # users.phone = 380671112233, clients.phone = 0671112233
+    assert user_db.is_authorized_user_simple(111)
+
+
+def main():
+    tests = [
+        test_national_number_formats,
+        test_migration_backfills_and_indexes,
+        test_lookup_without_init_db,
+        test_auth_matches_by_nsn,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести нормалізації номерів пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Тест лімітера дзвінків: bucket користувача і пристрою, ліміт одночасних
+callback-ів, обмеження кількості записів і потокобезпечність
+"""
+
+import threading
+
+from rate_limiter import RateLimiter, RateDecision, rejection_message
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_user_cooldown():
+    clock = FakeClock()
+    limiter = RateLimiter(user_interval=10, target_burst=100, target_interval=0.01, clock=clock)
+    assert limiter.acquire(1, '0930063585').allowed
+    limiter.release('0930063585')
+
+    decision = limiter.acquire(1, '0930063585')
+    assert not decision.allowed and decision.reason == 'user' and decision.retry_after == 10, decision
+    assert '10 секунд' in rejection_message(RateDecision(False, 9.5, 'user'))
+
+    clock.now += 10
+    assert limiter.acquire(1, '0930063585').allowed
+
+
+def test_target_bucket_shared_between_users():
+    clock = FakeClock()
+    limiter = RateLimiter(user_interval=10, target_burst=2, target_interval=5, max_in_flight=10, clock=clock)
+    assert limiter.acquire(1, '0930063585').allowed
+    assert limiter.acquire(2, '+380930063585').allowed  # той самий пристрій в іншому форматі
+    decision = limiter.acquire(3, '930063585')
+    assert not decision.allowed and decision.reason == 'target' and decision.retry_after == 5, decision
+    assert limiter.acquire(4, '0637442017').allowed  # інший пристрій
+    clock.now += 5
+    assert limiter.acquire(3, '0930063585').allowed
+
+
+def test_in_flight_limit():
+    limiter = RateLimiter(target_burst=10, max_in_flight=1, clock=FakeClock())
+    with limiter.slot(1, '0930063585') as first:
+        assert first.allowed
+        # Кілька користувачів одночасно - один callback, решті відмова
+        decisions = [limiter.acquire(user, '0930063585') for user in range(2, 6)]
+        assert [d.reason for d in decisions] == ['in_flight'] * 4, decisions
+    assert limiter.acquire(7, '0930063585').allowed
+    stats = limiter.stats()
+    assert stats['allowed'] == 2 and stats['rejected_in_flight'] == 4, stats
+    assert stats['in_flight'] == {'930063585': 1}, stats
+
+
+def test_entries_bounded_and_evicted():
+    clock = FakeClock()
+    limiter = RateLimiter(user_interval=10, target_burst=1000, target_interval=0.001,
+                          max_in_flight=1000, max_entries=50, clock=clock)
+    for user in range(200):
+        assert limiter.acquire(user, '0930063585').allowed
+    assert limiter.stats()['entries'] <= 51  # + сам bucket пристрою
+
+    # Відновлені bucket-и видаляються, а користувач знову може дзвонити
+    clock.now += 10
+    assert limiter.stats()['entries'] == 0
+    assert limiter.acquire(0, '0930063585').allowed
+
+
+def test_concurrent_acquire():
+    limiter = RateLimiter(target_burst=1000, target_interval=0.001, max_in_flight=1000)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        for _ in range(100):
+            results.append(limiter.acquire(42, '0930063585').allowed)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1, results.count(True)
+
+
+def main():
+    tests = [
+        test_user_cooldown,
+        test_target_bucket_shared_between_users,
+        test_in_flight_limit,
+        test_entries_bounded_and_evicted,
+        test_concurrent_acquire,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести лімітера дзвінків пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Тест підпису запитів: RequestSigner і build_params_string дають байт у байт
+ті самі рядки, що й офіційний user_api/zadarma/api.py
+"""
+
+import logging
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from user_api.zadarma.api import ZadarmaAPI as OfficialZadarmaAPI
+from zadarma_client import RequestSigner, ZadarmaAPI, build_auth_header, build_params_string, get_signer
+
+KEY = 'a248a6a984459935b569'
+SECRET = '8a8e91d214fb728889c7'
+
+SAMPLES = [
+    ('/v1/info/balance/', {'format': 'json'}),
+    ('/v1/request/callback/', {'from': '0637442017', 'to': '0930063585', 'format': 'json'}),
+    ('/v1/request/callback/', {'from': '+380637442017', 'to': '380930063585', 'predicted': 'predicted', 'format': 'json'}),
+    ('/v1/statistics/pbx/', {'start': '2024-01-01 00:00:00', 'end': '2024-01-31 23:59:59', 'format': 'json'}),
+    ('/v1/sms/send/', {'number': '380930063585', 'message': 'Ворота відчинено! & ще щось=?', 'format': 'json'}),
+    ('/v1/info/price/', {'number': '380930063585', 'caller_id': '', 'format': 'xml'}),
+]
+
+
+def official_header(method, params_string, key=KEY, secret=SECRET):
+    return OfficialZadarmaAPI(key, secret)._ZadarmaAPI__get_auth_string_for_header(method, params_string)
+
+
+def test_params_string_matches_official():
+    for _, params in SAMPLES:
+        assert build_params_string(params) == urlencode(OrderedDict(sorted(params.items())))
+    # Не-рядкові значення кодуються так само, як в urlencode
+    params = {'b': 2, 'a': 1.5, 'c': b'\xd0\x92'}
+    assert build_params_string(params) == urlencode(OrderedDict(sorted(params.items())))
+
+
+def test_headers_identical_to_official():
+    signer = RequestSigner(KEY, SECRET)
+    for method, params in SAMPLES:
+        params_string = build_params_string(params)
+        expected = official_header(method, params_string)
+        assert signer.sign(method, params_string) == expected
+        assert signer.sign(method, params_string) == expected  # з кешу
+        assert build_auth_header(KEY, SECRET, method, params_string) == expected
+        assert ZadarmaAPI(KEY, SECRET)._ZadarmaAPI__get_auth_string_for_header(method, params_string) == expected
+
+
+def test_template_not_mutated_between_requests():
+    signer = RequestSigner(KEY, SECRET, cache_size=0)
+    first = signer.sign('/v1/info/balance/', 'format=json')
+    signer.sign('/v1/request/callback/', 'format=json&from=1&to=2')
+    assert signer.sign('/v1/info/balance/', 'format=json') == first == official_header('/v1/info/balance/', 'format=json')
+
+
+def test_cache_is_bounded():
+    signer = RequestSigner(KEY, SECRET, cache_size=3)
+    for i in range(10):
+        assert signer.sign('/v1/request/callback/', f'from={i}') == official_header('/v1/request/callback/', f'from={i}')
+    assert list(signer._cache) == [('/v1/request/callback/', f'from={i}') for i in (7, 8, 9)]
+
+
+def test_signer_shared_per_key_pair():
+    assert get_signer(KEY, SECRET) is get_signer(KEY, SECRET)
+    assert get_signer(KEY, 'other') is not get_signer(KEY, SECRET)
+    assert build_auth_header(KEY, 'other', '/v1/info/balance/', 'format=json') == \
+        official_header('/v1/info/balance/', 'format=json', secret='other')
+
+
+class FakeResponse:
+    status_code = 200
+    text = '{"status": "success"}'
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_auth_header_not_logged():
+    api = ZadarmaAPI(KEY, SECRET, breakers=None)
+    headers = []
+    api._send = lambda request_type, url, params, auth_str: headers.append(auth_str) or FakeResponse()
+
+    logger = logging.getLogger('zadarma_client')
+    handler = RecordingHandler()
+    logger.addHandler(handler)
+    level = logger.level
+    try:
+        for enabled in (logging.INFO, logging.DEBUG):
+            logger.setLevel(enabled)
+            api.call('/v1/request/callback/', {'from': '0637442017', 'to': '0930063585'})
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+
+    signature = headers[0].split(':', 1)[1]
+    assert headers[0] == official_header('/v1/request/callback/', 'format=json&from=0637442017&to=0930063585')
+    assert not any(signature in message for message in handler.messages), handler.messages
+    assert any(message.startswith('🔐 Params string') for message in handler.messages)
+
+
+def main():
+    tests = [
+        test_params_string_matches_official,
+        test_headers_identical_to_official,
+        test_template_not_mutated_between_requests,
+        test_cache_is_bounded,
+        test_signer_shared_per_key_pair,
+        test_auth_header_not_logged,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести підпису запитів пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Тест конвеєрної синхронізації клієнтів на локальному фейковому Wlaunch API:
+паралельне завантаження сторінок, порядок запису, обмеження паралельності
+"""
+
+import os
+import json
+import time
+import tempfile
+from datetime import datetime, timedelta
+import threading
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import sync_clients
+import user_db
+
+
+class FakeWlaunch(ThreadingMixIn, HTTPServer):
+    """/company/{id}/client з пагінацією; кожна сторінка відповідає через latency"""
+    daemon_threads = True
+
+    def __init__(self, total_clients, latency=0.0, failing_pages=()):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeWlaunchHandler)
+        self.total_clients = total_clients
+        self.latency = latency
+        self.failing_pages = set(failing_pages)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.windows = []  # createdStart першого запиту кожного синку
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def api_base(self):
+        return 'http://127.0.0.1:{}/v1'.format(self.server_address[1])
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeWlaunchHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        page, size = int(query['page'][0]), int(query['size'][0])
+        if page == 0:
+            self.server.windows.append(query.get('createdStart', [None])[0])
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.in_flight -= 1
+
+        if page in self.server.failing_pages:
+            status, body = 500, {'error': 'boom'}
+        else:
+            ids = range(page * size, min((page + 1) * size, self.server.total_clients))
+            status, body = 200, {
+                'content': [{'id': str(i), 'first_name': 'Клієнт', 'last_name': str(i),
+                             'phone': '38050{:07d}'.format(i)} for i in ids],
+                'page': {'number': page, 'total_pages': -(-self.server.total_clients // size),
+                         'total_elements': self.server.total_clients},
+            }
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class Recorder:
+    """apply_page, що запам'ятовує порядок сторінок і імітує запис у БД"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.pages = []
+
+    def __call__(self, clients):
+        time.sleep(self.delay)
+        self.pages.append([client['id'] for client in clients])
+        return {'inserted': len(clients)}
+
+
+def run_sync(server, **kwargs):
+    sync_clients.API_BASE = server.api_base
+    recorder = Recorder(kwargs.pop('apply_delay', 0.0))
+    stats = sync_clients.sync_pages(size=10, apply_page=recorder, **kwargs)
+    return stats, recorder
+
+
+def test_all_pages_applied_in_order():
+    server = FakeWlaunch(total_clients=95, latency=0.01)
+    try:
+        stats, recorder = run_sync(server, workers=4)
+        assert [page[0] for page in recorder.pages] == [str(p * 10) for p in range(10)]
+        assert stats['clients'] == 95 and stats['pages'] == 10, stats
+        assert stats['counts'] == {'inserted': 95}, stats
+        assert len(stats['page_latency']) == 10 and stats['clients_per_sec'] > 0
+        assert stats['failed_pages'] == []
+    finally:
+        server.close()
+
+
+def test_concurrency_bounded():
+    server = FakeWlaunch(total_clients=200, latency=0.05)
+    try:
+        run_sync(server, workers=3)
+        assert 1 < server.max_in_flight <= 3, server.max_in_flight
+    finally:
+        server.close()
+
+
+def test_failed_page_reported():
+    server = FakeWlaunch(total_clients=50, failing_pages=[2])
+    try:
+        stats, recorder = run_sync(server, workers=2)
+        assert stats['failed_pages'] == [2], stats
+        assert stats['clients'] == 40 and len(recorder.pages) == 4
+    finally:
+        server.close()
+
+
+def test_pipeline_faster_than_sequential():
+    """10 сторінок по 50мс мережі + 30мс запису: послідовно ~0.8с"""
+    server = FakeWlaunch(total_clients=100, latency=0.05)
+    try:
+        sync_clients.API_BASE = server.api_base
+        started = time.time()
+        for page in range(10):
+            Recorder(0.03)(sync_clients.get_clients(page=page, size=10)['content'])
+        sequential = time.time() - started
+
+        stats, _ = run_sync(server, workers=4, apply_delay=0.03)
+        print(f"📊 10 сторінок: послідовно {sequential:.2f}с, конвеєром {stats['elapsed']:.2f}с "
+              f"({stats['clients_per_sec']:.0f} клієнтів/с)")
+        assert stats['elapsed'] < sequential * 0.75
+    finally:
+        server.close()
+
+
+def test_cursor_persisted_with_overlap():
+    user_db.DB_PATH = os.path.join(tempfile.mkdtemp(), 'users.db')
+    user_db.init_db()
+    sync_clients.FIRST_SYNC_FLAG_FILE = os.path.join(tempfile.mkdtemp(), '.first_sync_done')
+    messages = []
+    send_admin_error, sync_clients.send_admin_error = sync_clients.send_admin_error, messages.append
+    server = FakeWlaunch(total_clients=30)
+    try:
+        sync_clients.API_BASE = server.api_base
+        sync_clients.sync_clients()  # перший запуск - повний синк
+        cursor = user_db.get_sync_state(sync_clients.CURSOR_STATE)
+        assert server.windows == [None] and cursor
+        assert user_db.find_client_by_phone('380500000029')
+
+        sync_clients.sync_clients()  # далі - лише вікно після курсора з перекриттям
+        expected_start = datetime.strptime(cursor, '%Y-%m-%dT%H:%M:%S.000Z') - sync_clients.CURSOR_OVERLAP
+        assert server.windows[1] == expected_start.strftime('%Y-%m-%dT%H:%M:%S.000Z'), server.windows
+        # Ті самі клієнти у вікні - нічого не змінено, адміну не пишемо
+        assert len(messages) == 1, messages
+
+        # Повний синк раз на FULL_SYNC_INTERVAL
+        stale = datetime.utcnow() - sync_clients.FULL_SYNC_INTERVAL - timedelta(hours=1)
+        user_db.set_sync_state(sync_clients.FULL_SYNC_STATE, stale.strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+        sync_clients.sync_clients()
+        assert server.windows[2] is None
+        assert not sync_clients.is_full_sync_due()
+    finally:
+        sync_clients.send_admin_error = send_admin_error
+        server.close()
+
+
+def main():
+    tests = [
+        test_all_pages_applied_in_order,
+        test_concurrency_bounded,
+        test_failed_page_reported,
+        test_pipeline_faster_than_sequential,
+        test_cursor_persisted_with_overlap,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести конвеєрної синхронізації пройдено")
+
+
+if __name__ == "__main__":
+    main()
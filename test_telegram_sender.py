@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Тест черги відправки Telegram на локальному фейковому Bot API:
+неблокуюча відправка, 429 retry_after, ліміт на чат, повтори, переповнення
+"""
+
+import json
+import time
+import threading
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+from telegram_sender import TelegramSender, TokenBucket
+
+
+class FakeTelegram(ThreadingMixIn, HTTPServer):
+    """sendMessage: відповідь визначає responder(chat_id, n) -> (status, body)"""
+    daemon_threads = True
+
+    def __init__(self, responder=None, latency=0.0):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeTelegramHandler)
+        self.responder = responder or (lambda chat_id, n: (200, {'ok': True}))
+        self.latency = latency
+        self.received = []  # (time, chat_id, text)
+        self.lock = threading.Lock()
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def api_url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        chat_id = form['chat_id'][0]
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            attempt = sum(1 for _, c, _ in self.server.received if c == chat_id)
+            self.server.received.append((time.time(), chat_id, form['text'][0]))
+        status, body = self.server.responder(chat_id, attempt)
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = time.time()
+    assert bucket.acquire(now) == 0 and bucket.acquire(now) == 0
+    assert abs(bucket.acquire(now) - 0.5) < 1e-6
+    assert bucket.acquire(now + 0.5) == 0
+    bucket.block(3, now + 0.5)
+    assert bucket.acquire(now + 3.0) > 0 and bucket.acquire(now + 4.0) == 0
+
+
+def test_send_does_not_block():
+    server = FakeTelegram(latency=0.2)
+    try:
+        sender = TelegramSender('token', api_url=server.api_url)
+        started = time.time()
+        for chat_id in (1, 2, 3):
+            assert sender.send(chat_id, f'повідомлення {chat_id}')
+        assert time.time() - started < 0.1
+        assert sender.flush(5)
+        stats = sender.stats()
+        assert stats['sent'] == 3 and stats['queue_depth'] == 0, stats
+    finally:
+        server.close()
+
+
+def test_429_retry_after():
+    def responder(chat_id, attempt):
+        if attempt == 0:
+            return 429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 1}}
+        return 200, {'ok': True}
+
+    server = FakeTelegram(responder)
+    try:
+        sender = TelegramSender('token', api_url=server.api_url)
+        sender.send(42, 'ворота')
+        assert sender.flush(5)
+        times = [t for t, _, _ in server.received]
+        assert len(times) == 2 and times[1] - times[0] >= 0.95, times
+        stats = sender.stats()
+        assert stats['sent'] == 1 and stats['rate_limited'] == 1 and stats['failed'] == 0, stats
+    finally:
+        server.close()
+
+
+def test_per_chat_limit_does_not_block_other_chats():
+    server = FakeTelegram()
+    try:
+        sender = TelegramSender('token', api_url=server.api_url, chat_rate=5, chat_burst=1)
+        for i in range(5):
+            sender.send(1, f'спам {i}')
+        sender.send(2, 'інший чат')
+        assert sender.flush(5)
+        chat1 = [t for t, c, _ in server.received if c == '1']
+        chat2 = [t for t, c, _ in server.received if c == '2']
+        # 5 повідомлень при 5/с і burst 1 - щонайменше 0.8с
+        assert chat1[-1] - chat1[0] >= 0.75, chat1
+        # Другий чат не чекає на чергу першого
+        assert chat2[0] < chat1[1], (chat1, chat2)
+        # Порядок повідомлень у чаті зберігається
+        assert [text for _, c, text in server.received if c == '1'] == [f'спам {i}' for i in range(5)]
+    finally:
+        server.close()
+
+
+def test_server_errors_retried_client_errors_not():
+    def responder(chat_id, attempt):
+        if chat_id == 'bad':
+            return 400, {'ok': False, 'description': 'chat not found'}
+        return (502, {'ok': False}) if attempt == 0 else (200, {'ok': True})
+
+    server = FakeTelegram(responder)
+    try:
+        sender = TelegramSender('token', api_url=server.api_url, retry_base_delay=0.1)
+        sender.send('flaky', 'текст')
+        sender.send('bad', 'текст')
+        assert sender.flush(5)
+        stats = sender.stats()
+        assert stats['sent'] == 1 and stats['failed'] == 1 and stats['retried'] == 1, stats
+        assert len([c for _, c, _ in server.received if c == 'bad']) == 1
+    finally:
+        server.close()
+
+
+def test_queue_full_drops():
+    sender = TelegramSender('token', api_url='http://127.0.0.1:9', queue_size=1)
+    sender._ensure_thread = lambda: None  # відправник не запущено - черга не розвантажується
+    assert sender.send(1, 'перше')
+    assert not sender.send(1, 'друге')
+    assert sender.stats()['dropped'] == 1
+    assert not sender.flush(0.1)
+
+
+def main():
+    tests = [
+        test_token_bucket,
+        test_send_does_not_block,
+        test_429_retry_after,
+        test_per_chat_limit_does_not_block_other_chats,
+        test_server_errors_retried_client_errors_not,
+        test_queue_full_drops,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести черги Telegram пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Тест HTTP endpoint webhook_server: підпис, розбір форми, IVR маршрутизація
+"""
+
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import webhook_server as ws
+
+CALL = {
+    'event': 'NOTIFY_IVR',
+    'caller_id': '380501112233',
+    'called_did': '380733103110',
+    'call_start': '2026-01-01 10:00:00',
+}
+FORM = ('event=NOTIFY_IVR&caller_id=380501112233&called_did=380733103110'
+        '&call_start=2026-01-01+10%3A00%3A00&wait_dtmf%5Bdigits%5D={digits}'
+        '&wait_dtmf%5Bname%5D=main_menu')
+
+
+class QueueRecorder:
+    """Замість WebhookWorker - лише запам'ятовує поставлені події"""
+
+    def __init__(self):
+        self.events = []
+
+    def submit(self, webhook_data):
+        self.events.append(webhook_data)
+        return True
+
+
+def start_server(worker=None):
+    server = ws.PooledHTTPServer(('127.0.0.1', 0), ws.ZadarmaWebhookHandler, 2, worker)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:{}/'.format(server.server_address[1])
+
+
+def post(url, body, headers):
+    request = urllib.request.Request(url, body.encode('utf-8'), headers=headers)
+    try:
+        response = urllib.request.urlopen(request, timeout=5)
+        return response.status, json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode('utf-8'))
+
+
+def test_signature_roundtrip():
+    signature = ws.calculate_signature(CALL, 'secret')
+    assert ws.verify_signature(CALL, signature, 'secret')
+    assert not ws.verify_signature(CALL, signature, 'other')
+    assert not ws.verify_signature(dict(CALL, caller_id='380671112233'), signature, 'secret')
+    assert not ws.verify_signature(CALL, None, 'secret')
+    assert not ws.verify_signature({'event': 'UNKNOWN'}, signature, 'secret')
+
+
+def test_parse_form_nesting():
+    data = ws.parse_form(FORM.format(digits='1'))
+    assert data['event'] == 'NOTIFY_IVR'
+    assert data['call_start'] == '2026-01-01 10:00:00'
+    assert data['wait_dtmf'] == {'digits': '1', 'name': 'main_menu'}, data
+
+
+def test_ivr_digit_routing():
+    called = []
+    original = ws.request_callback
+    ws.request_callback = lambda number: called.append(number) or True
+    try:
+        gate = ws.handle_ivr(dict(CALL, wait_dtmf={'digits': '1'}))
+        door = ws.handle_ivr(dict(CALL, wait_dtmf={'digits': '2'}))
+        invalid = ws.handle_ivr(dict(CALL, wait_dtmf={'digits': '9'}))
+    finally:
+        ws.request_callback = original
+
+    assert called == [ws.VOROTA_NUMBER, ws.HVIRTKA_NUMBER], called
+    assert gate['hangup'] and 'ворота' in gate['ivr_say']['text'].lower()
+    assert door['hangup'] and 'хвіртк' in door['ivr_say']['text'].lower()
+    assert invalid == ws.IVR_INVALID_CHOICE
+
+
+def test_bad_signature_rejected():
+    server, url = start_server()
+    try:
+        status, body = post(url, FORM.format(digits='9'), {'Signature': 'bad'})
+        assert status == 403, (status, body)
+        status, body = post(url, FORM.format(digits='9'),
+                            {'Signature': ws.calculate_signature(CALL)})
+        assert status == 200 and body == ws.IVR_INVALID_CHOICE, (status, body)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_malformed_content_length():
+    server, url = start_server()
+    try:
+        host, port = server.server_address
+        sock = socket.create_connection((host, port), timeout=5)
+        sock.sendall(b'POST / HTTP/1.1\r\nHost: x\r\nContent-Length: abc\r\n\r\n')
+        reply = sock.recv(1024).decode('utf-8', 'replace')
+        sock.close()
+        assert reply.startswith('HTTP/1.0 400') or reply.startswith('HTTP/1.1 400'), reply
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_notify_end_is_queued():
+    worker = QueueRecorder()
+    server, url = start_server(worker)
+    try:
+        end_event = dict(CALL, event='NOTIFY_END', disposition='cancel', duration='3')
+        body = '&'.join('{}={}'.format(k, urllib.request.quote(v)) for k, v in end_event.items())
+        status, reply = post(url, body, {'Signature': ws.calculate_signature(end_event)})
+        assert status == 200 and reply == {'status': 'ok'}, (status, reply)
+        assert worker.events and worker.events[0]['event'] == 'NOTIFY_END'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    tests = [
+        test_signature_roundtrip,
+        test_parse_form_nesting,
+        test_ivr_digit_routing,
+        test_bad_signature_rejected,
+        test_malformed_content_length,
+        test_notify_end_is_queued,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести webhook сервера пройдено")
+
+
+if __name__ == "__main__":
+    main()
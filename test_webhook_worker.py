@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Тест webhook_worker: Unix socket, spool при недоступному воркері,
+відновлення .work після перезапуску, повторний spool при повній черзі
+"""
+
+import os
+import json
+import stat
+import time
+import socket
+import tempfile
+
+import webhook_worker as ww
+
+
+def setup_dirs():
+    tmp_dir = tempfile.mkdtemp()
+    return os.path.join(tmp_dir, 'worker.sock'), os.path.join(tmp_dir, 'spool')
+
+
+def use_recorder():
+    """Замість process_webhook_call_status - запам'ятовуємо оброблені події"""
+    processed = []
+    ww._processor = lambda data: processed.append(data) or {"success": True}
+    return processed
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_socket_handoff():
+    processed = use_recorder()
+    socket_path, spool_dir = setup_dirs()
+    worker = ww.WebhookWorker(socket_path, spool_dir, threads=1)
+    worker.start()
+    try:
+        via = ww.submit_event({'event': 'NOTIFY_END', 'pbx_call_id': 'a'}, socket_path, spool_dir)
+        assert via == 'socket', via
+        assert wait_for(lambda: len(processed) == 1), processed
+        assert processed[0]['pbx_call_id'] == 'a'
+    finally:
+        worker.stop()
+    assert not os.path.exists(socket_path)
+
+
+def test_spool_fallback_processed_on_start():
+    processed = use_recorder()
+    socket_path, spool_dir = setup_dirs()
+    via = ww.submit_event({'event': 'NOTIFY_END', 'pbx_call_id': 'b'}, socket_path, spool_dir)
+    assert via == 'spool', via
+    assert [n for n in os.listdir(spool_dir) if n.endswith('.json')]
+
+    worker = ww.WebhookWorker(socket_path, spool_dir, threads=1)
+    worker.start()
+    try:
+        assert wait_for(lambda: len(processed) == 1), processed
+        assert wait_for(lambda: not os.listdir(spool_dir)), os.listdir(spool_dir)
+    finally:
+        worker.stop()
+
+
+def test_work_file_recovered_after_restart():
+    processed = use_recorder()
+    socket_path, spool_dir = setup_dirs()
+    os.makedirs(spool_dir)
+    # Подія, яку попередній процес забрав (.work), але не встиг обробити
+    with open(os.path.join(spool_dir, '1.000000_1_1.work'), 'w') as f:
+        f.write(json.dumps({'event': 'NOTIFY_END', 'pbx_call_id': 'c'}))
+
+    worker = ww.WebhookWorker(socket_path, spool_dir, threads=1)
+    worker.start()
+    try:
+        assert wait_for(lambda: len(processed) == 1), processed
+        assert processed[0]['pbx_call_id'] == 'c'
+    finally:
+        worker.stop()
+
+
+def test_queue_full_respools():
+    use_recorder()
+    socket_path, spool_dir = setup_dirs()
+    os.makedirs(spool_dir)
+    # Воркер не запущено - черга на 1 подію не розвантажується
+    worker = ww.WebhookWorker(socket_path, spool_dir, threads=1, queue_size=1)
+    assert worker.submit({'event': 'NOTIFY_END', 'pbx_call_id': 'd'})
+    assert not worker.submit({'event': 'NOTIFY_END', 'pbx_call_id': 'e'})
+    assert worker.stats['spooled'] == 1
+    spooled = [n for n in os.listdir(spool_dir) if n.endswith('.json')]
+    assert len(spooled) == 1, spooled
+
+    # Файл зі spool при повній черзі повертається назад у .json
+    worker._scan_spool()
+    assert [n for n in os.listdir(spool_dir) if n.endswith('.json')] == spooled
+
+
+def test_stop_respools_queued_events():
+    use_recorder()
+    socket_path, spool_dir = setup_dirs()
+    worker = ww.WebhookWorker(socket_path, spool_dir, threads=0)
+    worker.start(listen=False)
+    # Потоків обробки немає - події прийняті, але ще в черзі
+    for call_id in ('f', 'g'):
+        assert worker.submit({'event': 'NOTIFY_END', 'pbx_call_id': call_id})
+    worker.stop()
+
+    spooled = sorted(n for n in os.listdir(spool_dir) if n.endswith('.json'))
+    assert len(spooled) == 2, spooled
+    events = []
+    for name in spooled:
+        with open(os.path.join(spool_dir, name), encoding='utf-8') as f:
+            events.append(json.loads(f.read())['pbx_call_id'])
+    assert sorted(events) == ['f', 'g']
+    # Після зупинки нові події теж ідуть у spool, а не в чергу
+    assert not worker.submit({'event': 'NOTIFY_END', 'pbx_call_id': 'h'})
+    assert worker.events.empty()
+
+
+def test_oversized_event_skipped_without_reading_whole_line():
+    processed = use_recorder()
+    socket_path, spool_dir = setup_dirs()
+    worker = ww.WebhookWorker(socket_path, spool_dir, threads=1)
+    worker.start()
+    try:
+        huge = json.dumps({'event': 'NOTIFY_END', 'junk': 'x' * (ww.MAX_EVENT_SIZE * 3)}) + '\n'
+        ok = json.dumps({'event': 'NOTIFY_END', 'pbx_call_id': 'i'}) + '\n'
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(socket_path)
+        sock.sendall((huge + ok).encode('utf-8'))
+        sock.close()
+        assert wait_for(lambda: len(processed) == 1), processed
+        assert processed[0]['pbx_call_id'] == 'i'
+    finally:
+        worker.stop()
+    assert stat.S_IMODE(os.stat(spool_dir).st_mode) == ww.SPOOL_DIR_MODE
+
+
+def test_source_routing():
+    routed = []
+    original = ww.SOURCE_ROUTES['zadarma_webhook']
+    ww.SOURCE_ROUTES['zadarma_webhook'] = lambda data: routed.append(data) or {"success": True}
+    try:
+        ww.dispatch_event({'event': 'NOTIFY_END', '_source': 'zadarma_webhook'})
+    finally:
+        ww.SOURCE_ROUTES['zadarma_webhook'] = original
+    assert routed == [{'event': 'NOTIFY_END'}], routed
+    assert not ww.dispatch_event({'event': 'NOTIFY_END', '_source': 'unknown'})['success']
+
+
+def main():
+    tests = [
+        test_socket_handoff,
+        test_spool_fallback_processed_on_start,
+        test_work_file_recovered_after_restart,
+        test_queue_full_respools,
+        test_stop_respools_queued_events,
+        test_oversized_event_skipped_without_reading_whole_line,
+        test_source_routing,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести webhook воркера пройдено")
+
+
+if __name__ == "__main__":
+    main()
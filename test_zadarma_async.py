@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Тест AsyncZadarmaAPI на локальному фейковому сервері Zadarma:
+перевірка підпису, keep-alive пул, одночасні запити, chunked відповідь,
+тіло до EOF без Content-Length, повтор на закритому keep-alive з'єднанні.
+Друкує пропускну здатність і затримку - вимірювання без мережі.
+"""
+
+import time
+import json
+import hmac
+import base64
+import asyncio
+import hashlib
+from urllib.parse import urlsplit, parse_qsl
+
+from zadarma_async import AsyncZadarmaAPI
+
+KEY = 'test_key'
+SECRET = 'test_secret'
+
+
+def expected_auth(method, params_string):
+    """Незалежна реалізація підпису з документації Zadarma"""
+    data = method + params_string + hashlib.md5(params_string.encode('utf8')).hexdigest()
+    digest = hmac.new(SECRET.encode('utf8'), data.encode('utf8'), hashlib.sha1).hexdigest()
+    return KEY + ':' + base64.b64encode(digest.encode('utf8')).decode()
+
+
+class FakeZadarma:
+    """Мінімальний HTTP/1.1 сервер з відповідями у форматі api.zadarma.com"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.server = None
+        self.handlers = []
+        self.paths = []
+        self.unframed = False      # тіло без Content-Length, частинами, до закриття з'єднання
+        self.drop_next = 0         # стільки запитів прочитати і закрити з'єднання без відповіді
+        self.close_after_reply = False
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        return 'http://127.0.0.1:{}'.format(self.server.sockets[0].getsockname()[1])
+
+    async def stop(self):
+        # Клієнт вже закрив з'єднання - чекаємо, поки обробники побачать EOF
+        await asyncio.wait_for(asyncio.gather(*self.handlers), 5)
+        self.server.close()
+        await self.server.wait_closed()
+
+    def reply(self, path, query, auth):
+        if auth != expected_auth(path, query):
+            return 401, {'status': 'error', 'message': 'Not authorized'}
+        params = dict(parse_qsl(query))
+        if path == '/v1/info/balance/':
+            return 200, {'status': 'success', 'balance': 10.5, 'currency': 'USD'}
+        if path == '/v1/request/callback/':
+            return 200, {'status': 'success', 'from': params['from'], 'to': params['to']}
+        if path == '/v1/statistics/':
+            return 200, {'status': 'success', 'start': params['start'], 'end': params['end'], 'calls': []}
+        if path == '/v1/statistics/pbx/':
+            return 200, {'status': 'success', 'stats': [{'pbx_call_id': 'in_1'}]}
+        return 404, {'status': 'error', 'message': 'Wrong method'}
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.handlers.append(asyncio.ensure_future(self.serve(reader, writer)))
+
+    async def serve(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readuntil(b'\r\n')
+                except asyncio.IncompleteReadError:
+                    return
+                headers = {}
+                while True:
+                    line = (await reader.readuntil(b'\r\n')).decode('latin-1')
+                    if line == '\r\n':
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers.get('content-length', 0)))
+
+                self.requests += 1
+                url = urlsplit(request_line.decode('latin-1').split(' ')[1])
+                self.paths.append(url.path)
+                if self.drop_next:
+                    self.drop_next -= 1
+                    return
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                self.in_flight -= 1
+
+                status, payload = self.reply(url.path, url.query, headers.get('authorization'))
+                body = json.dumps(payload).encode('utf-8')
+                head = 'HTTP/1.1 {} X\r\nContent-Type: application/json\r\n'.format(status)
+                if self.unframed:
+                    writer.write((head + 'Connection: close\r\n\r\n').encode() + body[:5])
+                    await writer.drain()
+                    await asyncio.sleep(0.05)
+                    writer.write(body[5:])
+                    await writer.drain()
+                    return
+                if url.path == '/v1/statistics/pbx/':
+                    chunks = [body[:10], body[10:]]
+                    data = b''.join(b'%x\r\n%s\r\n' % (len(c), c) for c in chunks) + b'0\r\n\r\n'
+                    writer.write((head + 'Transfer-Encoding: chunked\r\n\r\n').encode() + data)
+                else:
+                    writer.write((head + 'Content-Length: {}\r\n\r\n'.format(len(body))).encode() + body)
+                await writer.drain()
+                if self.close_after_reply:
+                    return
+        finally:
+            writer.close()
+
+
+def run(coroutine_factory, latency=0.0):
+    """Запускає фейковий сервер і coroutine_factory(server, api) в новому циклі"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def scenario():
+        server = FakeZadarma(latency)
+        base_url = await server.start()
+        api = AsyncZadarmaAPI(KEY, SECRET, max_connections=4, base_url=base_url)
+        try:
+            return await coroutine_factory(server, api)
+        finally:
+            api.close()
+            await server.stop()
+
+    try:
+        return loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+
+
+def test_all_endpoints_signed():
+    async def scenario(server, api):
+        balance = await api.balance()
+        callback = await api.callback('0733103110', '380501112233')
+        statistics = await api.statistics('2026-01-01 00:00:00', '2026-01-01 01:00:00')
+        pbx = await api.pbx_statistics('2026-01-01 00:00:00', '2026-01-01 01:00:00')
+        assert balance['status'] == 'success' and balance['balance'] == 10.5, balance
+        assert callback['to'] == '380501112233', callback
+        assert statistics['start'] == '2026-01-01 00:00:00', statistics
+        assert pbx['stats'] == [{'pbx_call_id': 'in_1'}], pbx  # chunked відповідь
+        # Послідовні запити йдуть по одному keep-alive з'єднанню
+        assert server.connections == 1, server.connections
+        assert api.pool.stats['reused'] == 3, api.pool.stats
+
+    run(scenario)
+
+
+def test_bad_secret_rejected():
+    async def scenario(server, api):
+        api.secret = 'wrong'
+        response = await api.call('/v1/info/balance/')
+        assert response.status_code == 401, response.status_code
+
+    run(scenario)
+
+
+def test_body_until_eof_without_length():
+    async def scenario(server, api):
+        server.unframed = True
+        statistics = await api.statistics('2026-01-01 00:00:00', '2026-01-01 01:00:00')
+        # Тіло прийшло двома частинами - обидві прочитані
+        assert statistics['start'] == '2026-01-01 00:00:00', statistics
+        assert api.pool._idle == []
+
+    run(scenario)
+
+
+def test_stale_connection_retry_skips_callback():
+    async def scenario(server, api):
+        await api.balance()
+        # З'єднання обірвалось після відправки: balance повторюється на новому
+        server.drop_next = 1
+        assert (await api.balance())['status'] == 'success'
+        assert server.paths[1:] == ['/v1/info/balance/'] * 2, server.paths
+
+        # ... а callback - ні: сервер міг уже почати дзвінок
+        server.drop_next = 1
+        try:
+            await api.callback('0733103110', '380501112233')
+            assert False, 'callback повторено'
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        assert server.paths.count('/v1/request/callback/') == 1, server.paths
+
+        # З'єднання, закрите сервером заздалегідь, відкидається до відправки
+        server.close_after_reply = True
+        await api.balance()
+        await asyncio.sleep(0.05)
+        server.close_after_reply = False
+        callback = await api.callback('0733103110', '380501112233')
+        assert callback['status'] == 'success', callback
+        assert server.paths.count('/v1/request/callback/') == 2, server.paths
+
+    run(scenario)
+
+
+def test_concurrent_requests_bounded_pool():
+    latency = 0.05
+    total = 40
+
+    async def scenario(server, api):
+        latencies = []
+
+        async def one():
+            started = time.time()
+            result = await api.balance()
+            latencies.append(time.time() - started)
+            return result
+
+        started = time.time()
+        results = await asyncio.gather(*[one() for _ in range(total)])
+        elapsed = time.time() - started
+
+        assert all(r['status'] == 'success' for r in results)
+        assert server.connections <= 4, server.connections
+        assert server.max_in_flight == 4, server.max_in_flight
+        # Послідовно це було б total * latency = 2с; пул з 4 з'єднань - ~0.5с
+        assert elapsed < total * latency / 2, elapsed
+        latencies.sort()
+        print(f"📊 {total} запитів за {elapsed:.3f}с ({total / elapsed:.0f} req/s), "
+              f"p50 {latencies[total // 2] * 1000:.0f}мс, p95 {latencies[int(total * 0.95)] * 1000:.0f}мс, "
+              f"з'єднань: {server.connections}")
+
+    run(scenario, latency)
+
+
+def main():
+    tests = [
+        test_all_endpoints_signed,
+        test_bad_secret_rejected,
+        test_body_until_eof_without_length,
+        test_stale_connection_retry_skips_callback,
+        test_concurrent_requests_bounded_pool,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести асинхронного клієнта Zadarma пройдено")
+
+
+if __name__ == "__main__":
+    main()
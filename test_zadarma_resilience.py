@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Тест повторів і запобіжника ZadarmaAPI: GET повторюється, callback - ні,
+відкритий запобіжник відмовляє без запиту, health probe його закриває,
+стан спільний для процесів через файл
+"""
+
+import os
+import tempfile
+
+import requests
+
+from circuit_breaker import BreakerRegistry, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from zadarma_client import ZadarmaAPI, backoff_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text='{"status": "success"}'):
+        self.status_code = status_code
+        self.text = text
+
+
+class ScriptedSession:
+    """Відповідає за сценарієм: виняток або код статусу на кожен запит"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.urls = []
+
+    def _next(self, url):
+        self.urls.append(url)
+        outcome = self.script.pop(0) if self.script else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    def get(self, url, **kwargs):
+        return self._next(url)
+
+    def request(self, method, url, **kwargs):
+        return self._next(url)
+
+
+def make_api(script, clock=None, state_file=None, threshold=3):
+    registry = BreakerRegistry(state_file, failure_threshold=threshold, reset_timeout=30, clock=clock or FakeClock())
+    api = ZadarmaAPI('key', 'secret', breakers=registry)
+    api.session = ScriptedSession(script)
+    api._sleep = lambda delay: None
+    return api
+
+
+def test_get_retried_on_transient_errors():
+    api = make_api([requests.exceptions.ReadTimeout('slow'), 503, 200])
+    assert api.call('/v1/info/balance/', {}, 'GET').status_code == 200
+    assert len(api.session.urls) == 3
+    assert api.breaker_status()['/v1/info/balance/']['state'] == CLOSED
+
+
+def test_callback_not_retried_after_send():
+    api = make_api([requests.exceptions.ReadTimeout('slow')])
+    try:
+        api.call('/v1/request/callback/', {'from': '1', 'to': '2'}, 'GET')
+        assert False, 'ReadTimeout мав пройти до викликача'
+    except requests.exceptions.ReadTimeout:
+        pass
+    assert len(api.session.urls) == 1  # можливо, дзвінок вже пішов - не дублюємо
+
+    # З'єднання не встановилось - запит точно не відправлено, повтор безпечний
+    api = make_api([requests.exceptions.ConnectTimeout('no route'), 200])
+    assert api.call('/v1/request/callback/', {'from': '1', 'to': '2'}, 'GET').status_code == 200
+    assert len(api.session.urls) == 2
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    clock = FakeClock()
+    down = requests.exceptions.ConnectionError('down')
+    api = make_api([down] * 9, clock=clock)
+    api.retry_attempts = 1
+    for _ in range(3):
+        try:
+            api.call('/v1/info/balance/', {}, 'GET')
+        except requests.exceptions.ConnectionError:
+            pass
+    assert api.breaker_status()['/v1/info/balance/']['state'] == OPEN
+
+    sent = len(api.session.urls)
+    try:
+        api.call('/v1/info/balance/', {}, 'GET')
+        assert False, 'очікувався CircuitOpenError'
+    except CircuitOpenError as e:
+        assert e.retry_after == 30
+    assert len(api.session.urls) == sent  # запит не відправлявся
+
+    # Після паузи - один пробний запит; невдача знову відкриває
+    clock.now += 30
+    try:
+        api.call('/v1/info/balance/', {}, 'GET')
+    except requests.exceptions.ConnectionError:
+        pass
+    assert api.breaker_status()['/v1/info/balance/']['state'] == OPEN
+
+    clock.now += 30
+    api.session.script = [200]
+    assert api.call('/v1/info/balance/', {}, 'GET').status_code == 200
+    assert api.breaker_status()['/v1/info/balance/']['state'] == CLOSED
+
+
+def test_half_open_allows_single_probe():
+    registry = BreakerRegistry(failure_threshold=1, reset_timeout=30, clock=FakeClock())
+    breaker = registry.get('/v1/request/callback/')
+    breaker.record_failure()
+    breaker._clock.now += 30
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # пробний запит уже йде
+
+
+def test_health_probe_closes_breakers():
+    api = make_api([requests.exceptions.ConnectionError('down')], threshold=1)
+    try:
+        api.call('/v1/request/callback/', {'from': '1', 'to': '2'}, 'GET')
+    except requests.exceptions.ConnectionError:
+        pass
+    assert api.breakers.any_open()
+    assert api.health_probe()
+    assert not api.breakers.any_open()
+    assert api.session.urls[-1].startswith('https://api.zadarma.com/v1/info/balance/')
+
+
+def test_state_shared_through_file():
+    state_file = os.path.join(tempfile.mkdtemp(), 'zadarma_breaker.json')
+    clock = FakeClock()
+    bot = make_api([requests.exceptions.ConnectionError('down')], clock=clock, state_file=state_file, threshold=1)
+    bot.retry_attempts = 1
+    try:
+        bot.call('/v1/info/balance/', {}, 'GET')
+    except requests.exceptions.ConnectionError:
+        pass
+
+    # api_monitor з cron - інший процес, бачить відкритий запобіжник і не б'є в API
+    monitor = make_api([], clock=clock, state_file=state_file)
+    assert monitor.breaker_status()['/v1/info/balance/']['state'] == OPEN
+    try:
+        monitor.call('/v1/info/balance/', {}, 'GET')
+        assert False, 'очікувався CircuitOpenError'
+    except CircuitOpenError:
+        pass
+    assert monitor.session.urls == []
+
+
+def test_backoff_is_bounded_jitter():
+    for attempt in range(6):
+        delay = backoff_delay(attempt, base=0.5, cap=4.0)
+        assert 0 <= delay <= min(4.0, 0.5 * 2 ** attempt)
+
+
+def main():
+    tests = [
+        test_get_retried_on_transient_errors,
+        test_callback_not_retried_after_send,
+        test_breaker_opens_fails_fast_and_recovers,
+        test_half_open_allows_single_probe,
+        test_health_probe_closes_breakers,
+        test_state_shared_through_file,
+        test_backoff_is_bounded_jitter,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("🎉 Всі тести стійкості Zadarma API пройдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,162 @@
 # user_db.py - Enhanced version with logging
 import sqlite3
-import threading
+import time
+import hashlib
 import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+from db_pool import get_pool
+from auth_cache import AuthCache
+from phone_utils import national_number, ensure_nsn_column
 
 logger = logging.getLogger(__name__)
 
 DB_PATH = "/home/gomoncli/zadarma/users.db"
-_lock = threading.Lock()
+
+# Як часто перевіряти PRAGMA data_version на зміни з інших процесів (секунди)
+DATA_VERSION_CHECK_INTERVAL = 2.0
+
+# Повна синхронізація будує тіньову таблицю і підміняє нею clients лише після перевірки
+SHADOW_TABLE = "clients_next"
+FULL_SYNC_MIN_RATIO = 0.8        # нова таблиця - не менше 80% рядків старої
+FULL_SYNC_MIN_VALID_PHONES = 0.9 # частка рядків з повним 9-значним номером
+_HASH_TABLES = {"clients": "client_sync_hashes", SHADOW_TABLE: "client_sync_hashes_next"}
+_NSN_INDEX_NAMES = ("idx_clients_phone_nsn", "idx_clients_next_phone_nsn")
+
+_auth_cache = AuthCache()
+_data_version = threading.local()
+_migrated_paths = set()
+_migration_lock = threading.Lock()
+
+def _db():
+    """Спільний пул з'єднань для DB_PATH (WAL, з'єднання на потік)"""
+    pool = get_pool(DB_PATH)
+    if DB_PATH not in _migrated_paths:
+        _migrate(pool, DB_PATH)
+    return pool
+
+def _migrate(pool, db_path):
+    """
+    Одноразова міграція схеми при першому використанні пулу в процесі
+
+    Cron скрипти (sync_clients.py, wlaunch_api.py) не викликають init_db(),
+    тому колонку phone_nsn додаємо тут, а не лише при старті бота.
+    """
+    with _migration_lock:
+        if db_path in _migrated_paths:
+            return
+        _migrated_paths.add(db_path)
+        try:
+            with pool.transaction() as conn:
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clients'"
+                ).fetchone()
+                if exists:
+                    ensure_nsn_column(conn, 'clients', 'phone', 'phone_nsn', 'idx_clients_phone_nsn')
+                _ensure_sync_tables(conn)
+        except Exception as e:
+            _migrated_paths.discard(db_path)
+            logger.exception(f"❌ Помилка міграції {db_path}: {e}")
+
+def _check_external_changes():
+    """Скидає кеш авторизації, якщо БД змінив інший процес (напр. cron синхронізація)"""
+    now = time.time()
+    if now - getattr(_data_version, 'checked_at', 0) < DATA_VERSION_CHECK_INTERVAL:
+        return
+    _data_version.checked_at = now
+
+    version = _db().connection().execute('PRAGMA data_version').fetchone()[0]
+    previous = getattr(_data_version, 'version', None)
+    _data_version.version = version
+    if previous is not None and previous != version:
+        logger.debug("🔄 БД змінена іншим з'єднанням, скидаємо кеш авторизації")
+        _auth_cache.invalidate()
+
+def invalidate_auth_cache(telegram_id=None):
+    _auth_cache.invalidate(telegram_id)
+
+def get_auth_cache_stats():
+    """Лічильники кешу авторизації (hits/misses/size)"""
+    return _auth_cache.stats()
+
+def _ensure_sync_tables(conn):
+    """Стан інкрементальної синхронізації: курсори та хеші вмісту клієнтів"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS client_sync_hashes (
+            id TEXT PRIMARY KEY,
+            hash TEXT NOT NULL
+        )
+    ''')
+
+def get_sync_state(name):
+    """Значення зі стану синхронізації (None, якщо ще не записувалось)"""
+    row = _db().connection().execute('SELECT value FROM sync_state WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else None
+
+def set_sync_state(name, value):
+    """Записує значення стану синхронізації (None - видаляє)"""
+    with _db().transaction() as conn:
+        if value is None:
+            conn.execute('DELETE FROM sync_state WHERE name = ?', (name,))
+        else:
+            conn.execute('''
+                INSERT INTO sync_state (name, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at
+            ''', (name, value, datetime.now().isoformat()))
+
+def _client_hash(first_name, last_name, phone):
+    """Хеш вмісту клієнта з Wlaunch - для пропуску незмінених записів"""
+    return hashlib.sha1("\x1f".join((first_name, last_name, phone)).encode("utf-8")).hexdigest()
+
+def _skip_unchanged(conn, page, table="clients"):
+    """
+    Відкидає клієнтів, чий хеш збігається з останнім записаним
+
+    Хеш перевіряється разом з наявністю рядка з тим самим ID і телефоном
+    (store_user чи force_full_sync могли змінити таблицю в обхід синку).
+    Клієнти, чий ID або телефон зустрічається на сторінці більше одного
+    разу, не відкидаються - для них важливий порядок застосування.
+    """
+    ids = Counter(row[0] for row in page)
+    phones = Counter(row[3] for row in page)
+    known = {}
+    page_ids = list(ids)
+    for start in range(0, len(page_ids), 500):
+        chunk = page_ids[start:start + 500]
+        known.update((row[0], row[1:]) for row in conn.execute(
+            'SELECT h.id, h.hash, c.phone FROM {} h JOIN {} c ON c.id = h.id '
+            'WHERE h.id IN ({})'.format(_HASH_TABLES[table], table, ','.join('?' * len(chunk))), chunk))
+
+    remaining = []
+    for row in page:
+        client_id, first_name, last_name, phone = row
+        if (known.get(client_id) == (_client_hash(first_name, last_name, phone), phone)
+                and ids[client_id] == 1 and phones[phone] == 1):
+            continue
+        remaining.append(row)
+    return remaining
 
 def init_db():
     logger.info("🔄 Ініціалізація бази даних...")
-    with _lock:
-        try:
-            conn = sqlite3.connect(DB_PATH)
+    try:
+        with _db().transaction() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS clients (
                     id TEXT PRIMARY KEY,
                     first_name TEXT,
                     last_name TEXT,
-                    phone TEXT UNIQUE
+                    phone TEXT UNIQUE,
+                    phone_nsn TEXT
                 )
             ''')
             cursor.execute('''
@@ -30,30 +167,35 @@ def init_db():
                     first_name TEXT
                 )
             ''')
-            conn.commit()
-            conn.close()
-            logger.info("✅ База даних успішно ініціалізована")
-        except Exception as e:
-            logger.exception(f"❌ Помилка ініціалізації бази даних: {e}")
-            raise
+            # Індексований пошук за останніми 9 цифрами замість LIKE '%...%'
+            ensure_nsn_column(conn, 'clients', 'phone', 'phone_nsn', 'idx_clients_phone_nsn')
+            _ensure_sync_tables(conn)
+        logger.info("✅ База даних успішно ініціалізована")
+    except Exception as e:
+        logger.exception(f"❌ Помилка ініціалізації бази даних: {e}")
+        raise
 
 def normalize_phone(phone):
     normalized = ''.join(filter(str.isdigit, phone))
-    logger.debug(f"📞 Нормалізація номеру: '{phone}' → '{normalized}'")
+    logger.debug("📞 Нормалізація номеру: '%s' → '%s'", phone, normalized)
     return normalized
 
 def add_or_update_client(client_id, first_name, last_name, phone):
     """Покращена версія з правильною обробкою оновлень"""
     logger.info(f"👤 Додавання/оновлення клієнта: {client_id} ({first_name} {last_name}), телефон: {phone}")
     
-    with _lock:
-        try:
-            conn = sqlite3.connect(DB_PATH)
+    try:
+        with _db().transaction() as conn:
             cursor = conn.cursor()
             phone_norm = normalize_phone(phone)
+            phone_nsn = national_number(phone_norm)
+            
+            # Кеш авторизації залежить лише від телефону/ID клієнта - скидаємо його
+            # тільки коли вони змінились (синхронізація викликає цю функцію для кожного клієнта)
+            phone_changed = True
             
             # КРОК 1: Перевіряємо, чи існує клієнт з таким ID
-            cursor.execute('SELECT phone FROM clients WHERE id = ?', (client_id,))
+            cursor.execute('SELECT phone, first_name, last_name FROM clients WHERE id = ?', (client_id,))
             existing_by_id = cursor.fetchone()
             
             # КРОК 2: Перевіряємо, чи існує клієнт з таким телефоном
@@ -63,25 +205,29 @@ def add_or_update_client(client_id, first_name, last_name, phone):
             if existing_by_id and existing_by_phone:
                 # Випадок: є записи з тим же ID і з тим же телефоном
                 if existing_by_id[0] == phone_norm:
-                    # Це той же клієнт - просто оновлюємо
-                    cursor.execute('''
-                        UPDATE clients SET first_name=?, last_name=?, phone=? WHERE id=?
-                    ''', (first_name, last_name, phone_norm, client_id))
-                    logger.info(f"✅ Оновлено існуючого клієнта {client_id}")
+                    # Це той же клієнт - оновлюємо лише якщо змінилось ім'я
+                    phone_changed = False
+                    if existing_by_id[1:] != (first_name, last_name):
+                        cursor.execute('''
+                            UPDATE clients SET first_name=?, last_name=? WHERE id=?
+                        ''', (first_name, last_name, client_id))
+                        logger.info(f"✅ Оновлено існуючого клієнта {client_id}")
+                    else:
+                        logger.debug(f"ℹ️ Клієнт {client_id} без змін")
                 else:
                     # Клієнт змінив номер - видаляємо старий запис з таким телефоном
                     cursor.execute('DELETE FROM clients WHERE phone = ? AND id != ?', (phone_norm, client_id))
                     cursor.execute('''
-                        UPDATE clients SET first_name=?, last_name=?, phone=? WHERE id=?
-                    ''', (first_name, last_name, phone_norm, client_id))
+                        UPDATE clients SET first_name=?, last_name=?, phone=?, phone_nsn=? WHERE id=?
+                    ''', (first_name, last_name, phone_norm, phone_nsn, client_id))
                     logger.info(f"🔄 Клієнт {client_id} змінив номер: {existing_by_id[0]} → {phone_norm}")
                     
             elif existing_by_id:
                 # Існує клієнт з таким ID, але телефон інший
                 old_phone = existing_by_id[0]
                 cursor.execute('''
-                    UPDATE clients SET first_name=?, last_name=?, phone=? WHERE id=?
-                ''', (first_name, last_name, phone_norm, client_id))
+                    UPDATE clients SET first_name=?, last_name=?, phone=?, phone_nsn=? WHERE id=?
+                ''', (first_name, last_name, phone_norm, phone_nsn, client_id))
                 logger.info(f"📞 Клієнт {client_id} оновив телефон: {old_phone} → {phone_norm}")
                 
             elif existing_by_phone:
@@ -89,111 +235,98 @@ def add_or_update_client(client_id, first_name, last_name, phone):
                 old_id = existing_by_phone[0]
                 cursor.execute('DELETE FROM clients WHERE phone = ?', (phone_norm,))
                 cursor.execute('''
-                    INSERT INTO clients (id, first_name, last_name, phone)
-                    VALUES (?, ?, ?, ?)
-                ''', (client_id, first_name, last_name, phone_norm))
+                    INSERT INTO clients (id, first_name, last_name, phone, phone_nsn)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (client_id, first_name, last_name, phone_norm, phone_nsn))
                 logger.info(f"🆔 Телефон {phone_norm} перейшов від клієнта {old_id} до {client_id}")
                 
             else:
                 # Новий клієнт
                 cursor.execute('''
-                    INSERT INTO clients (id, first_name, last_name, phone)
-                    VALUES (?, ?, ?, ?)
-                ''', (client_id, first_name, last_name, phone_norm))
+                    INSERT INTO clients (id, first_name, last_name, phone, phone_nsn)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (client_id, first_name, last_name, phone_norm, phone_nsn))
                 logger.info(f"🆕 Додано нового клієнта {client_id}")
             
-            conn.commit()
-            conn.close()
             logger.info(f"✅ Клієнт {client_id} успішно оброблено")
+        if phone_changed:
+            _auth_cache.invalidate()
             
-        except Exception as e:
-            logger.exception(f"❌ Помилка при обробці клієнта {client_id}: {e}")
-            raise
+    except Exception as e:
+        logger.exception(f"❌ Помилка при обробці клієнта {client_id}: {e}")
+        raise
 
 def find_client_by_phone(phone):
-    logger.info(f"🔍 Пошук клієнта за номером: {phone}")
-    with _lock:
-        try:
-            conn = sqlite3.connect(DB_PATH, timeout=10.0)  # Додаємо таймаут
-            cursor = conn.cursor()
-            phone_norm = normalize_phone(phone)
-            search_pattern = f'%{phone_norm[-9:]}%'
-            logger.info(f"🔍 Нормалізований номер: {phone_norm}")
-            logger.info(f"🔍 Шукаємо за патерном: {search_pattern}")
-            
-            # Спочатку подивимося, скільки взагалі клієнтів в базі
-            cursor.execute('SELECT COUNT(*) FROM clients')
-            total_clients = cursor.fetchone()[0]
-            logger.info(f"📊 Загальна кількість клієнтів в базі: {total_clients}")
-            
-            if total_clients == 0:
-                logger.warning("⚠️  Таблиця clients пуста!")
-                conn.close()
-                return None
-            
-            # Перевіримо, чи є точний збіг
-            logger.info(f"🔍 Шукаємо точний збіг для: {phone_norm}")
-            cursor.execute('''
-                SELECT id, first_name, last_name, phone FROM clients
-                WHERE phone = ?
-                LIMIT 1
-            ''', (phone_norm,))
-            exact_match = cursor.fetchone()
-            
-            if exact_match:
-                result = {
-                    "id": exact_match[0],
-                    "first_name": exact_match[1],
-                    "last_name": exact_match[2],
-                    "phone": exact_match[3]
-                }
-                logger.info(f"✅ Знайдено точний збіг: {result}")
-                conn.close()
-                return result
-            
-            # Якщо точного збігу немає, шукаємо за патерном
-            logger.info(f"🔍 Точного збігу немає, шукаємо за патерном: {search_pattern}")
-            cursor.execute('''
-                SELECT id, first_name, last_name, phone FROM clients
-                WHERE phone LIKE ?
-                LIMIT 1
-            ''', (search_pattern,))
-            row = cursor.fetchone()
-            
-            if row:
-                result = {
-                    "id": row[0],
-                    "first_name": row[1],
-                    "last_name": row[2],
-                    "phone": row[3]
-                }
-                logger.info(f"✅ Знайдено клієнта за патерном: {result}")
-                conn.close()
-                return result
-            else:
-                # Покажемо приклади номерів для діагностики
+    logger.info("🔍 Пошук клієнта за номером: %s", phone)
+    try:
+        conn = _db().connection()
+        cursor = conn.cursor()
+        phone_norm = normalize_phone(phone)
+        phone_nsn = national_number(phone_norm)
+        logger.debug("🔍 Нормалізований номер: %s (NSN %s)", phone_norm, phone_nsn)
+        
+        # Перевіримо, чи є точний збіг
+        logger.debug("🔍 Шукаємо точний збіг для: %s", phone_norm)
+        cursor.execute('''
+            SELECT id, first_name, last_name, phone FROM clients
+            WHERE phone = ?
+            LIMIT 1
+        ''', (phone_norm,))
+        exact_match = cursor.fetchone()
+        
+        if exact_match:
+            result = {
+                "id": exact_match[0],
+                "first_name": exact_match[1],
+                "last_name": exact_match[2],
+                "phone": exact_match[3]
+            }
+            logger.info("✅ Знайдено точний збіг: %s", result)
+            return result
+        
+        # Якщо точного збігу немає, шукаємо за останніми 9 цифрами (індекс)
+        logger.debug("🔍 Точного збігу немає, шукаємо за NSN: %s", phone_nsn)
+        cursor.execute('''
+            SELECT id, first_name, last_name, phone FROM clients
+            WHERE phone_nsn = ?
+            LIMIT 1
+        ''', (phone_nsn,))
+        row = cursor.fetchone()
+        
+        if row:
+            result = {
+                "id": row[0],
+                "first_name": row[1],
+                "last_name": row[2],
+                "phone": row[3]
+            }
+            logger.info("✅ Знайдено клієнта за NSN: %s", result)
+            return result
+        else:
+            if logger.isEnabledFor(logging.DEBUG):
+                # Діагностика лише в DEBUG - не робимо зайвих запитів на кожен пошук
+                cursor.execute('SELECT COUNT(*) FROM clients')
+                total_clients = cursor.fetchone()[0]
                 cursor.execute('SELECT phone FROM clients LIMIT 5')
                 sample_phones = cursor.fetchall()
-                logger.info(f"📋 Приклади номерів в базі: {[p[0] for p in sample_phones]}")
-                
-                logger.info(f"❌ Клієнта за номером {phone} (патерн {search_pattern}) не знайдено")
-                conn.close()
-                return None
-                
-        except sqlite3.OperationalError as e:
-            logger.error(f"❌ Помилка SQL операції: {e}")
-            if 'database is locked' in str(e):
-                logger.error("🔒 База даних заблокована! Можливо, іде синхронізація.")
-            return None
-        except Exception as e:
-            logger.exception(f"❌ Помилка пошуку клієнта за номером {phone}: {e}")
+                logger.debug("📋 Клієнтів в базі: %s, приклади номерів: %s", total_clients, [p[0] for p in sample_phones])
+            
+            logger.info("❌ Клієнта за номером %s (NSN %s) не знайдено", phone, phone_nsn)
             return None
+            
+    except sqlite3.OperationalError as e:
+        logger.error(f"❌ Помилка SQL операції: {e}")
+        if 'database is locked' in str(e):
+            logger.error("🔒 База даних заблокована! Можливо, іде синхронізація.")
+        return None
+    except Exception as e:
+        logger.exception(f"❌ Помилка пошуку клієнта за номером {phone}: {e}")
+        return None
 
 def store_user(telegram_id, phone, username, first_name):
     logger.info(f"💾 Збереження користувача: {telegram_id} (@{username}, {first_name}), телефон: {phone}")
-    with _lock:
-        try:
-            conn = sqlite3.connect(DB_PATH)
+    try:
+        with _db().transaction() as conn:
             cursor = conn.cursor()
             phone_norm = normalize_phone(phone)
 
@@ -205,11 +338,11 @@ def store_user(telegram_id, phone, username, first_name):
             logger.info(f"✅ Користувач {telegram_id} збережений в таблицю users")
 
             # шукаємо відповідного клієнта
-            search_pattern = f'%{phone_norm[-9:]}%'
+            phone_nsn = national_number(phone_norm)
             cursor.execute('''
-                SELECT id FROM clients WHERE phone LIKE ?
+                SELECT id FROM clients WHERE phone_nsn = ?
                 LIMIT 1
-            ''', (search_pattern,))
+            ''', (phone_nsn,))
             row = cursor.fetchone()
 
             # якщо знайдено — оновлюємо telegram_id як id клієнта
@@ -218,25 +351,23 @@ def store_user(telegram_id, phone, username, first_name):
                 cursor.execute('''
                     UPDATE clients
                     SET id = ?
-                    WHERE phone LIKE ?
-                ''', (client_id, search_pattern))
+                    WHERE phone_nsn = ?
+                ''', (client_id, phone_nsn))
                 logger.info(f"✅ Оновлено ID клієнта на {client_id} для номеру {phone}")
             else:
                 logger.info(f"ℹ️  Клієнта з номером {phone} не знайдено в базі")
 
-            conn.commit()
-            conn.close()
             logger.info(f"✅ Користувач {telegram_id} успішно збережений")
+        _auth_cache.invalidate()
             
-        except Exception as e:
-            logger.exception(f"❌ Помилка збереження користувача {telegram_id}: {e}")
-            raise
+    except Exception as e:
+        logger.exception(f"❌ Помилка збереження користувача {telegram_id}: {e}")
+        raise
 
 def update_clients(clients):
     logger.info(f"🔄 Оновлення {len(clients)} клієнтів...")
-    with _lock:
-        try:
-            conn = sqlite3.connect(DB_PATH)
+    try:
+        with _db().transaction() as conn:
             cursor = conn.cursor()
             updated_count = 0
             
@@ -247,26 +378,170 @@ def update_clients(clients):
                 phone = normalize_phone(client.get("phone", ""))
                 
                 cursor.execute('''
-                    INSERT INTO clients(id, first_name, last_name, phone)
-                    VALUES (?, ?, ?, ?)
+                    INSERT INTO clients(id, first_name, last_name, phone, phone_nsn)
+                    VALUES (?, ?, ?, ?, ?)
                     ON CONFLICT(id) DO UPDATE SET
                         first_name=excluded.first_name,
                         last_name=excluded.last_name,
-                        phone=excluded.phone
-                ''', (client_id, first_name, last_name, phone))
-                updated_count += 1
+                        phone=excluded.phone,
+                        phone_nsn=excluded.phone_nsn
+                    WHERE clients.first_name IS NOT excluded.first_name
+                       OR clients.last_name IS NOT excluded.last_name
+                       OR clients.phone IS NOT excluded.phone
+                ''', (client_id, first_name, last_name, phone, national_number(phone)))
+                updated_count += cursor.rowcount
                 
-            conn.commit()
-            conn.close()
             logger.info(f"✅ Оновлено {updated_count} клієнтів")
+        if updated_count > 0:
+            _auth_cache.invalidate()
             
-        except Exception as e:
-            logger.exception(f"❌ Помилка оновлення клієнтів: {e}")
-            raise
+    except Exception as e:
+        logger.exception(f"❌ Помилка оновлення клієнтів: {e}")
+        raise
+
+def _reconcile_clients(page, existing):
+    """
+    Повторює послідовні add_or_update_client для сторінки в пам'яті
+
+    existing - {id: (first_name, last_name, phone)} лише для ID і телефонів
+    сторінки. Клієнт, чий телефон в ході сторінки отримав інший ID, видаляється
+    (як DELETE ... WHERE phone = ? у add_or_update_client), навіть якщо той ID
+    пізніше знову змінить номер.
+    Повертає (фінальні рядки {id: (first_name, last_name, phone)}, видалені ID)
+    """
+    rows = dict(existing)
+    owner_by_phone = {phone: client_id for client_id, (_, _, phone) in existing.items()}
+    deleted = set()
+
+    for client_id, first_name, last_name, phone in page:
+        owner = owner_by_phone.get(phone)
+        if owner is not None and owner != client_id:
+            del rows[owner]
+            deleted.add(owner)
+        previous = rows.get(client_id)
+        if previous and previous[2] != phone:
+            del owner_by_phone[previous[2]]
+        rows[client_id] = (first_name, last_name, phone)
+        owner_by_phone[phone] = client_id
+        deleted.discard(client_id)
+
+    return rows, deleted
+
+def bulk_upsert_clients(clients, table="clients"):
+    """
+    Масове додавання/оновлення сторінки клієнтів однією транзакцією
+
+    Замість add_or_update_client на кожного клієнта (окремий BEGIN/COMMIT
+    і 2-4 запити) сторінка потрапляє у тимчасову таблицю, пов'язані записи
+    читаються одним запитом, а зміни застосовуються executemany та
+    INSERT ... SELECT. Результат у таблиці clients такий самий, як після
+    послідовних add_or_update_client.
+
+    Клієнти, чий хеш вмісту не змінився з минулого синку, відкидаються ще до
+    запису (рахуються як unchanged).
+
+    table=SHADOW_TABLE - запис у тіньову таблицю повної синхронізації.
+
+    Повертає лічильники: inserted, updated (ім'я), moved (телефон),
+    deleted (записи, що втратили телефон), unchanged
+    """
+    page = []
+    for client in clients:
+        if client.get("id") is None:
+            logger.warning(f"⚠️ Пропущено клієнта без ID: {client}")
+            continue
+        page.append((str(client["id"]), client.get("first_name") or "", client.get("last_name") or "",
+                     normalize_phone(client.get("phone") or "")))
+
+    counts = {"inserted": 0, "updated": 0, "moved": 0, "deleted": 0, "unchanged": 0}
+    if not page:
+        return counts
+
+    try:
+        with _db().transaction() as conn:
+            total = len(page)
+            page = _skip_unchanged(conn, page, table)
+            counts["unchanged"] = total - len(page)
+            if not page:
+                logger.info(f"ℹ️ Пакет {total} клієнтів без змін")
+                return counts
+
+            conn.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS clients_stage (
+                    id TEXT,
+                    first_name TEXT,
+                    last_name TEXT,
+                    phone TEXT,
+                    phone_nsn TEXT
+                )
+            ''')
+            conn.execute('DELETE FROM clients_stage')
+            conn.executemany('INSERT INTO clients_stage (id, first_name, last_name, phone) VALUES (?, ?, ?, ?)', page)
+
+            # Усі записи, яких може торкнутися сторінка - один індексований запит
+            existing = {row[0]: row[1:] for row in conn.execute('''
+                SELECT id, first_name, last_name, phone FROM {}
+                WHERE id IN (SELECT id FROM clients_stage)
+                   OR phone IN (SELECT phone FROM clients_stage)
+            '''.format(table))}
+            rows, deleted = _reconcile_clients(page, existing)
+
+            changed = []
+            for client_id, (first_name, last_name, phone) in rows.items():
+                before = existing.get(client_id)
+                if before is None:
+                    counts["inserted"] += 1
+                elif before[2] != phone:
+                    counts["moved"] += 1
+                elif before[:2] != (first_name, last_name):
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+                    continue
+                changed.append((client_id, first_name, last_name, phone, national_number(phone)))
+            counts["deleted"] = len(deleted)
+
+            conn.executemany('DELETE FROM {} WHERE id = ?'.format(table), [(client_id,) for client_id in deleted])
+            conn.execute('DELETE FROM clients_stage')
+            conn.executemany('INSERT INTO clients_stage VALUES (?, ?, ?, ?, ?)', changed)
+            # Телефони клієнтів, що змінили номер, тимчасово звільняємо -
+            # інакше обмін номерами між двома клієнтами порушить UNIQUE(phone)
+            conn.execute('''
+                UPDATE {0} SET phone = NULL
+                WHERE id IN (SELECT id FROM clients_stage)
+                  AND phone NOT IN (SELECT phone FROM clients_stage WHERE clients_stage.id = {0}.id)
+            '''.format(table))
+            conn.execute('''
+                INSERT INTO {} (id, first_name, last_name, phone, phone_nsn)
+                SELECT id, first_name, last_name, phone, phone_nsn FROM clients_stage WHERE true
+                ON CONFLICT(id) DO UPDATE SET
+                    first_name=excluded.first_name,
+                    last_name=excluded.last_name,
+                    phone=excluded.phone,
+                    phone_nsn=excluded.phone_nsn
+            '''.format(table))
+            conn.execute('DELETE FROM clients_stage')
+
+            page_ids = set(row[0] for row in page)
+            hash_table = _HASH_TABLES[table]
+            conn.executemany('DELETE FROM {} WHERE id = ?'.format(hash_table), [(client_id,) for client_id in deleted])
+            conn.executemany('INSERT OR REPLACE INTO {} (id, hash) VALUES (?, ?)'.format(hash_table),
+                             [(client_id, _client_hash(*row)) for client_id, row in rows.items()
+                              if client_id in page_ids])
+
+        logger.info(f"✅ Пакет {total} клієнтів: {counts}")
+        # Ім'я не впливає на авторизацію - кеш скидаємо лише при зміні телефонів/ID
+        if table == "clients" and (counts["inserted"] or counts["moved"] or counts["deleted"]):
+            _auth_cache.invalidate()
+        return counts
+
+    except Exception as e:
+        logger.exception(f"❌ Помилка пакетного оновлення {len(page)} клієнтів: {e}")
+        raise
 
 def is_authorized_user_simple(telegram_id):
     """Спрощена версія авторизації без складних пошуків"""
-    logger.info(f"🔍 Спрощена перевірка авторизації для користувача: {telegram_id}")
+    logger.debug("🔍 Спрощена перевірка авторизації для користувача: %s", telegram_id)
     
     # КРИТИЧНО: Перевірка адмінів в першу чергу!
     try:
@@ -278,11 +553,18 @@ def is_authorized_user_simple(telegram_id):
         admin_list = [ADMIN_USER_ID]
     
     if telegram_id in admin_list:
-        logger.info(f"👑 Користувач {telegram_id} є АДМІНОМ - доступ дозволено")
+        logger.debug("👑 Користувач %s є АДМІНОМ - доступ дозволено", telegram_id)
         return True
     
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=3.0)
+        _check_external_changes()
+        cached = _auth_cache.get(telegram_id)
+        if cached is not None:
+            logger.debug("⚡ Авторизація %s з кешу: %s", telegram_id, '✅' if cached[2] else '❌')
+            return cached[2]
+        generation = _auth_cache.generation
+        
+        conn = _db().connection()
         cursor = conn.cursor()
         
         # Отримуємо телефон користувача
@@ -290,24 +572,25 @@ def is_authorized_user_simple(telegram_id):
         user_row = cursor.fetchone()
         
         if not user_row:
-            logger.info(f"❌ Користувача {telegram_id} не знайдено")
-            conn.close()
+            logger.info("❌ Користувача %s не знайдено", telegram_id)
+            _auth_cache.put(telegram_id, None, None, False, generation)
             return False
             
         phone = normalize_phone(user_row[0])
-        logger.info(f"✅ Телефон користувача: {phone}")
+        logger.debug("✅ Телефон користувача: %s", phone)
         
-        # Шукаємо точний збіг телефону
-        cursor.execute('SELECT id, first_name, last_name FROM clients WHERE phone = ?', (phone,))
+        # Шукаємо за NSN: 380671112233 у users має збігатися з 0671112233 у clients
+        cursor.execute('SELECT id, first_name, last_name FROM clients WHERE phone_nsn = ? LIMIT 1',
+                       (national_number(phone),))
         client_row = cursor.fetchone()
         
-        conn.close()
-        
         if client_row:
-            logger.info(f"✅ Знайдено клієнта: {client_row[1]} {client_row[2]}")
+            logger.info("✅ Знайдено клієнта: %s %s", client_row[1], client_row[2])
+            _auth_cache.put(telegram_id, phone, client_row[0], True, generation)
             return True
         else:
-            logger.info(f"❌ Клієнта з номером {phone} не знайдено")
+            logger.info("❌ Клієнта з номером %s не знайдено", phone)
+            _auth_cache.put(telegram_id, phone, None, False, generation)
             return False
             
     except Exception as e:
@@ -328,41 +611,39 @@ def get_user_info(telegram_id):
     """Отримує повну інформацію про користувача для діагностики"""
     logger.info(f"ℹ️  Отримання інформації про користувача: {telegram_id}")
     
-    with _lock:
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Інформація з таблиці users
-            cursor.execute('''
-                SELECT telegram_id, phone, username, first_name FROM users 
-                WHERE telegram_id = ?
-            ''', (telegram_id,))
-            user_row = cursor.fetchone()
-            
-            # Загальна кількість клієнтів
-            cursor.execute('SELECT COUNT(*) FROM clients')
-            clients_count = cursor.fetchone()[0]
-            
-            # Загальна кількість користувачів
-            cursor.execute('SELECT COUNT(*) FROM users')
-            users_count = cursor.fetchone()[0]
-            
-            conn.close()
-            
-            info = {
-                "user_in_db": user_row is not None,
-                "user_data": user_row,
-                "clients_count": clients_count,
-                "users_count": users_count
-            }
-            
-            logger.info(f"ℹ️  Інформація про користувача {telegram_id}: {info}")
-            return info
-            
-        except Exception as e:
-            logger.exception(f"❌ Помилка отримання інформації про користувача {telegram_id}: {e}")
-            return None
+    try:
+        conn = _db().connection()
+        cursor = conn.cursor()
+        
+        # Інформація з таблиці users
+        cursor.execute('''
+            SELECT telegram_id, phone, username, first_name FROM users 
+            WHERE telegram_id = ?
+        ''', (telegram_id,))
+        user_row = cursor.fetchone()
+        
+        # Загальна кількість клієнтів
+        cursor.execute('SELECT COUNT(*) FROM clients')
+        clients_count = cursor.fetchone()[0]
+        
+        # Загальна кількість користувачів
+        cursor.execute('SELECT COUNT(*) FROM users')
+        users_count = cursor.fetchone()[0]
+        
+        
+        info = {
+            "user_in_db": user_row is not None,
+            "user_data": user_row,
+            "clients_count": clients_count,
+            "users_count": users_count
+        }
+        
+        logger.info(f"ℹ️  Інформація про користувача {telegram_id}: {info}")
+        return info
+        
+    except Exception as e:
+        logger.exception(f"❌ Помилка отримання інформації про користувача {telegram_id}: {e}")
+        return None
 
 def add_test_client(telegram_id, phone):
     """Додає тестового клієнта для діагностики"""
@@ -370,8 +651,7 @@ def add_test_client(telegram_id, phone):
     
     try:
         # Отримуємо інформацію про користувача
-        with _lock:
-            conn = sqlite3.connect(DB_PATH)
+        with _db().transaction() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -386,92 +666,128 @@ def add_test_client(telegram_id, phone):
                 # Додаємо як клієнта
                 phone_norm = normalize_phone(phone)
                 cursor.execute('''
-                    INSERT OR REPLACE INTO clients (id, first_name, last_name, phone)
-                    VALUES (?, ?, ?, ?)
-                ''', (telegram_id, first_name, f"Test_{username}", phone_norm))
+                    INSERT OR REPLACE INTO clients (id, first_name, last_name, phone, phone_nsn)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (telegram_id, first_name, f"Test_{username}", phone_norm, national_number(phone_norm)))
                 
-                conn.commit()
                 logger.info(f"✅ Тестовий клієнт {telegram_id} додано")
             else:
                 logger.warning(f"⚠️  Користувача {telegram_id} не знайдено в таблиці users")
-                
-            conn.close()
+        _auth_cache.invalidate()
             
     except Exception as e:
         logger.exception(f"❌ Помилка додавання тестового клієнта: {e}")
         raise
 
+def _drop_shadow(conn):
+    conn.execute(f'DROP TABLE IF EXISTS {SHADOW_TABLE}')
+    conn.execute(f'DROP TABLE IF EXISTS {_HASH_TABLES[SHADOW_TABLE]}')
+
+def _create_shadow():
+    """Порожня тіньова таблиця clients_next з тією ж схемою та індексами, що й clients"""
+    with _db().transaction() as conn:
+        _drop_shadow(conn)
+        conn.execute(f'''
+            CREATE TABLE {SHADOW_TABLE} (
+                id TEXT PRIMARY KEY,
+                first_name TEXT,
+                last_name TEXT,
+                phone TEXT UNIQUE,
+                phone_nsn TEXT
+            )
+        ''')
+        conn.execute(f'''
+            CREATE TABLE {_HASH_TABLES[SHADOW_TABLE]} (
+                id TEXT PRIMARY KEY,
+                hash TEXT NOT NULL
+            )
+        ''')
+        # SQLite не перейменовує індекси - після кожної заміни ім'я NSN індексу чергується
+        taken = set(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'"))
+        index_name = next(name for name in _NSN_INDEX_NAMES if name not in taken)
+        conn.execute(f'CREATE INDEX {index_name} ON {SHADOW_TABLE}(phone_nsn)')
+
+def _validate_shadow():
+    """Перевірка тіньової таблиці перед заміною; повертає (ok, причина, нових, старих)"""
+    conn = _db().connection()
+    new_count = conn.execute(f'SELECT COUNT(*) FROM {SHADOW_TABLE}').fetchone()[0]
+    old_count = conn.execute('SELECT COUNT(*) FROM clients').fetchone()[0]
+    valid_phones = conn.execute(
+        f'SELECT COUNT(*) FROM {SHADOW_TABLE} WHERE length(phone_nsn) = 9'
+    ).fetchone()[0]
+
+    if new_count == 0:
+        return False, "Wlaunch не повернув жодного клієнта", new_count, old_count
+    if new_count < old_count * FULL_SYNC_MIN_RATIO:
+        return False, f"клієнтів {new_count} замість {old_count} (менше {FULL_SYNC_MIN_RATIO:.0%})", new_count, old_count
+    if valid_phones < new_count * FULL_SYNC_MIN_VALID_PHONES:
+        return False, f"лише {valid_phones} з {new_count} записів мають повний номер", new_count, old_count
+    return True, "", new_count, old_count
+
+def _swap_shadow():
+    """Атомарна заміна clients на clients_next - читачі бачать або старий, або новий набір"""
+    with _db().transaction() as conn:
+        conn.execute('DROP TABLE IF EXISTS clients_old')
+        conn.execute('DROP TABLE IF EXISTS client_sync_hashes_old')
+        conn.execute('ALTER TABLE clients RENAME TO clients_old')
+        conn.execute(f'ALTER TABLE {SHADOW_TABLE} RENAME TO clients')
+        conn.execute('ALTER TABLE client_sync_hashes RENAME TO client_sync_hashes_old')
+        conn.execute(f'ALTER TABLE {_HASH_TABLES[SHADOW_TABLE]} RENAME TO client_sync_hashes')
+    # Стару таблицю видаляємо окремою транзакцією - заміна тримає блокування мінімум часу
+    with _db().transaction() as conn:
+        conn.execute('DROP TABLE clients_old')
+        conn.execute('DROP TABLE client_sync_hashes_old')
+
 def force_full_sync():
-    """Примусова повна синхронізація з очищенням застарілих даних"""
+    """
+    Примусова повна синхронізація через тіньову таблицю
+
+    Клієнти завантажуються в clients_next, поки clients продовжує обслуговувати
+    авторизацію. Після перевірки кількості рядків і номерів таблиці
+    міняються місцями одним ALTER TABLE ... RENAME; якщо перевірка не пройдена,
+    clients лишається без змін.
+    """
     logger.info("🔄 ПРИМУСОВА ПОВНА СИНХРОНІЗАЦІЯ")
     
     try:
-        # Крок 1: Створюємо резервну таблицю
-        with _lock:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Створюємо backup поточних клієнтів
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS clients_backup AS 
-                SELECT * FROM clients WHERE 1=0
-            ''')
-            cursor.execute('DELETE FROM clients_backup')
-            cursor.execute('INSERT INTO clients_backup SELECT * FROM clients')
-            
-            # Очищуємо поточну таблицю
-            cursor.execute('DELETE FROM clients')
-            conn.commit()
-            conn.close()
-            
-            logger.info("🗑️ Стара таблиця clients очищена, створено backup")
+        # Крок 1: Порожня тіньова таблиця
+        _create_shadow()
         
-        # Крок 2: Завантажуємо свіжі дані
+        # Крок 2: Завантажуємо свіжі дані поруч з робочою таблицею
         from wlaunch_api import fetch_all_clients
-        new_count = fetch_all_clients()
+        fetch_all_clients(table=SHADOW_TABLE)
         
         # Крок 3: Перевіряємо результат
-        with _lock:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM clients')
-            current_count = cursor.fetchone()[0]
-            conn.close()
-        
-        if current_count > 0:
-            logger.info(f"✅ Повна синхронізація успішна: {current_count} клієнтів")
-            # Видаляємо backup
-            with _lock:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute('DROP TABLE clients_backup')
-                conn.commit()
-                conn.close()
-            return True
-        else:
-            # Щось пішло не так - відновлюємо з backup
-            logger.error("❌ Синхронізація не вдалася, відновлюємо з backup")
-            with _lock:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM clients')
-                cursor.execute('INSERT INTO clients SELECT * FROM clients_backup')
-                cursor.execute('DROP TABLE clients_backup')
-                conn.commit()
-                conn.close()
+        ok, reason, new_count, old_count = _validate_shadow()
+        if not ok:
+            logger.error(f"❌ Синхронізація не вдалася, clients без змін: {reason}")
+            with _db().transaction() as conn:
+                _drop_shadow(conn)
             return False
+        
+        # Крок 4: Атомарна заміна
+        started = time.time()
+        _swap_shadow()
+        _auth_cache.invalidate()
+        logger.info(f"✅ Повна синхронізація успішна: {new_count} клієнтів (було {old_count}), "
+                    f"заміна {(time.time() - started) * 1000:.1f}мс")
+        return True
             
     except Exception as e:
         logger.exception(f"❌ Критична помилка повної синхронізації: {e}")
+        try:
+            with _db().transaction() as conn:
+                _drop_shadow(conn)
+        except Exception:
+            pass
         return False
 
 def cleanup_duplicate_phones():
     """Очищення дублікатів номерів телефонів"""
     logger.info("🧹 Очищення дублікатів номерів")
     
-    with _lock:
-        try:
-            conn = sqlite3.connect(DB_PATH)
+    try:
+        with _db().transaction() as conn:
             cursor = conn.cursor()
             
             # Знаходимо дублікати
@@ -498,15 +814,13 @@ def cleanup_duplicate_phones():
                 
                 cleaned_count += cursor.rowcount
             
-            conn.commit()
-            conn.close()
-            
             logger.info(f"✅ Видалено {cleaned_count} дублікатів")
-            return cleaned_count
+        _auth_cache.invalidate()
+        return cleaned_count
             
-        except Exception as e:
-            logger.exception(f"❌ Помилка очищення дублікатів: {e}")
-            return 0
+    except Exception as e:
+        logger.exception(f"❌ Помилка очищення дублікатів: {e}")
+        return 0
 
 def sync_specific_client(client_id, phone):
     """Синхронізує конкретного клієнта з WLaunch API"""
@@ -1,7 +1,7 @@
 # utils.py
 
 import logging
-import requests
+import telegram_sender
 from config import TELEGRAM_TOKEN, ADMIN_USER_ID
 
 logger = logging.getLogger(__name__)
@@ -13,10 +13,8 @@ def send_error_to_admin(message, bot=None):
         except Exception as e:
             print(f"❌ Помилка надсилання повідомлення адміну через бота: {e}")
     else:
-        # fallback через Telegram API
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        payload = {"chat_id": ADMIN_USER_ID, "text": message}
+        # fallback через чергу відправки Telegram
         try:
-            requests.post(url, data=payload, timeout=10)
+            telegram_sender.send_message(ADMIN_USER_ID, message, parse_mode=None, token=TELEGRAM_TOKEN)
         except Exception as e:
             print(f"❌ Помилка надсилання повідомлення адміну: {e}")
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+webhook_server.py - HTTP endpoint для Zadarma NOTIFY_* подій без PHP
+
+Приймає POST від Zadarma напряму, перевіряє підпис, обробляє події бота
+в тому ж процесі (без PHP → shell → Python) і повертає IVR відповіді,
+які раніше будував webhooks/zadarma_webhook.php.
+
+Запуск:
+    python3 webhook_server.py --host 127.0.0.1 --port 8081
+"""
+
+import sys
+import json
+import hmac
+import base64
+import hashlib
+import logging
+import argparse
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+# Додаємо шлях до нашого проекту
+sys.path.append('/home/gomoncli/zadarma')
+
+from config import (
+    ZADARMA_API_SECRET,
+    ZADARMA_MAIN_PHONE,
+    HVIRTKA_NUMBER,
+    VOROTA_NUMBER
+)
+from webhook_worker import WebhookWorker, dispatch_event, _load_processor
+from logging_setup import setup_logging
+
+logger = logging.getLogger('webhook_server')
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8081
+SPOOL_DIR = '/home/gomoncli/zadarma/webhook_server_spool'
+MAX_WORKERS = 8             # Максимум одночасних запитів
+MAX_BODY_SIZE = 64 * 1024   # Zadarma надсилає невеликі форми
+VERIFY_SIGNATURE = True
+
+# Поля, з яких Zadarma будує підпис для кожного типу події
+SIGNATURE_FIELDS = {
+    'NOTIFY_START': ('caller_id', 'called_did', 'call_start'),
+    'NOTIFY_INTERNAL': ('caller_id', 'called_did', 'call_start'),
+    'NOTIFY_END': ('caller_id', 'called_did', 'call_start'),
+    'NOTIFY_IVR': ('caller_id', 'called_did', 'call_start'),
+    'NOTIFY_OUT_START': ('internal', 'destination', 'call_start'),
+    'NOTIFY_OUT_END': ('internal', 'destination', 'call_start'),
+    'NOTIFY_RECORD': ('pbx_call_id', 'call_id_with_rec'),
+}
+
+# IVR відповіді - ті самі, що будує webhooks/zadarma_webhook.php
+IVR_MAIN_MENU = {
+    'ivr_say': {
+        'text': 'Доброго дня! Ви дзвоните до системи контролю доступу. Натисніть 1 для відкриття воріт, 2 для відкриття хвіртки.',
+        'language': 'ua'
+    },
+    'wait_dtmf': {
+        'timeout': 10,
+        'max_digits': 1,
+        'attempts': 3,
+        'name': 'main_menu'
+    }
+}
+
+IVR_INVALID_CHOICE = {
+    'ivr_say': {
+        'text': 'Невірний вибір. Натисніть 1 для воріт або 2 для хвіртки.',
+        'language': 'ua'
+    },
+    'wait_dtmf': {
+        'timeout': 10,
+        'max_digits': 1,
+        'attempts': 2,
+        'name': 'main_menu'
+    }
+}
+
+IVR_ACTIONS = {
+    '1': {
+        'name': 'ворота',
+        'number': VOROTA_NUMBER,
+        'success': 'Відкриваємо ворота, зачекайте будь ласка. Ворота відкриваються.',
+        'failure': 'Вибачте, виникла технічна проблема з воротами. Спробуйте пізніше.'
+    },
+    '2': {
+        'name': 'хвіртку',
+        'number': HVIRTKA_NUMBER,
+        'success': 'Відкриваємо хвіртку, зачекайте будь ласка. Хвіртка відкривається.',
+        'failure': 'Вибачте, виникла технічна проблема з хвірткою. Спробуйте пізніше.'
+    }
+}
+
+
+def calculate_signature(webhook_data, secret=ZADARMA_API_SECRET):
+    """Підпис Zadarma: base64(hex(HMAC-SHA1(secret, поля події)))"""
+    fields = SIGNATURE_FIELDS.get(webhook_data.get('event', ''))
+    if not fields:
+        return None
+    data = ''.join(str(webhook_data.get(field, '')) for field in fields)
+    hex_digest = hmac.new(secret.encode('utf8'), data.encode('utf8'), hashlib.sha1).hexdigest()
+    return base64.b64encode(hex_digest.encode('utf8')).decode()
+
+
+def verify_signature(webhook_data, signature, secret=ZADARMA_API_SECRET):
+    """Перевіряє заголовок Signature від Zadarma"""
+    if not signature:
+        return False
+    expected = calculate_signature(webhook_data, secret)
+    if expected is None:
+        return False
+    return hmac.compare_digest(expected, signature)
+
+
+def parse_form(body):
+    """
+    Розбирає application/x-www-form-urlencoded так само, як PHP $_POST
+
+    Ключі виду wait_dtmf[digits] стають вкладеними словниками.
+    """
+    result = {}
+    for key, values in parse_qs(body, keep_blank_values=True).items():
+        value = values[-1]
+        if '[' in key and key.endswith(']'):
+            parent, child = key[:-1].split('[', 1)
+            nested = result.setdefault(parent, {})
+            if isinstance(nested, dict):
+                nested[child] = value
+        else:
+            result[key] = value
+    return result
+
+
+def is_bot_callback(webhook_data):
+    """Callback бота: дзвінок ВІД пристрою (хвіртка/ворота) НА номер клініки"""
+    caller = webhook_data.get('caller_id', '')
+    called = webhook_data.get('called_did', '')
+    from_device = HVIRTKA_NUMBER[-9:] in caller or VOROTA_NUMBER[-9:] in caller
+    return from_device and ZADARMA_MAIN_PHONE[-9:] in called
+
+
+def request_callback(to_number):
+    """Callback на пристрій для IVR меню"""
+    from zadarma_api_webhook import zadarma_api
+
+    try:
+        response = zadarma_api.call('/v1/request/callback/', {
+            'from': ZADARMA_MAIN_PHONE,
+            'to': to_number,
+        }, 'GET')
+        return json.loads(response.text).get('status') == 'success'
+    except Exception as e:
+        logger.exception(f"❌ Помилка IVR callback на {to_number}: {e}")
+        return False
+
+
+def handle_ivr(webhook_data):
+    """Обробка NOTIFY_IVR - вибір користувача в голосовому меню"""
+    caller_id = webhook_data.get('caller_id', 'Unknown')
+    wait_dtmf = webhook_data.get('wait_dtmf') or {}
+    digits = wait_dtmf.get('digits', '') if isinstance(wait_dtmf, dict) else ''
+
+    logger.info(f"☎️ IVR: {caller_id} натиснув '{digits}'")
+
+    action = IVR_ACTIONS.get(digits)
+    if not action:
+        return IVR_INVALID_CHOICE
+
+    success = request_callback(action['number'])
+    logger.info(f"{'✅' if success else '❌'} IVR: відкриття {action['name']} для {caller_id}")
+
+    return {
+        'ivr_say': {
+            'text': action['success'] if success else action['failure'],
+            'language': 'ua'
+        },
+        'hangup': True
+    }
+
+
+def handle_event(webhook_data, worker=None):
+    """
+    Маршрутизує подію та повертає JSON відповідь для Zadarma
+
+    Події бота (Telegram повідомлення, запис у call_tracking) ставляться
+    в чергу воркера - відповідь Zadarma не чекає на Telegram API.
+    Без воркера подія обробляється синхронно (для ручного виклику).
+    """
+    event = webhook_data.get('event', '')
+
+    if event == 'NOTIFY_IVR':
+        return handle_ivr(webhook_data)
+
+    if event in ('NOTIFY_START', 'NOTIFY_END', 'NOTIFY_INTERNAL'):
+        if worker is not None:
+            worker.submit(webhook_data)
+        else:
+            dispatch_event(webhook_data)
+
+        if event == 'NOTIFY_START' and not is_bot_callback(webhook_data):
+            # Вхідний дзвінок у клініку - показуємо голосове меню
+            return IVR_MAIN_MENU
+        return {'status': 'ok'}
+
+    logger.info(f"ℹ️ Подія {event} ігнорується")
+    return {'status': 'ok'}
+
+
+class ZadarmaWebhookHandler(BaseHTTPRequestHandler):
+    server_version = 'ZadarmaWebhook/1.0'
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        if 'zd_echo' in query:
+            # Перевірка webhook з кабінету Zadarma
+            body = query['zd_echo'][0].encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self._send_json({'status': 'active', 'message': 'Zadarma webhook server працює'})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            self._send_json({'error': 'Invalid Content-Length'}, 400)
+            return
+        if length < 0:
+            self._send_json({'error': 'Invalid Content-Length'}, 400)
+            return
+        if length > MAX_BODY_SIZE:
+            self._send_json({'error': 'Payload too large'}, 413)
+            return
+
+        raw_body = self.rfile.read(length).decode('utf-8', errors='replace')
+        if (self.headers.get('Content-Type') or '').startswith('application/json'):
+            try:
+                webhook_data = json.loads(raw_body)
+            except ValueError:
+                self._send_json({'error': 'Invalid JSON'}, 400)
+                return
+        else:
+            webhook_data = parse_form(raw_body)
+
+        if VERIFY_SIGNATURE and not verify_signature(webhook_data, self.headers.get('Signature')):
+            logger.warning(f"🚫 Невірний підпис для події {webhook_data.get('event', '')}")
+            self._send_json({'error': 'Invalid signature'}, 403)
+            return
+
+        try:
+            self._send_json(handle_event(webhook_data, self.server.worker))
+        except Exception as e:
+            logger.exception(f"❌ Помилка обробки webhook: {e}")
+            self._send_json({'status': 'error'}, 500)
+
+    def log_message(self, format, *args):
+        logger.info("🌐 %s - %s" % (self.address_string(), format % args))
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer з обмеженим пулом потоків замість потоку на кожен запит"""
+
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS, worker=None):
+        HTTPServer.__init__(self, server_address, handler_class)
+        # Фонова обробка подій бота (WebhookWorker), None - синхронно
+        self.worker = worker
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Якщо всі потоки зайняті - accept чекає, а не росте черга потоків
+        self.slots = threading.BoundedSemaphore(max_workers)
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        try:
+            self.executor.submit(self._process_request_thread, request, client_address)
+        except RuntimeError:
+            self.slots.release()
+            self.shutdown_request(request)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self.executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Zadarma webhook HTTP server')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+
+    setup_logging('/home/gomoncli/zadarma/webhook_server.log', console=True)
+
+    # Прогріваємо обробник (імпорт zadarma_api_webhook, CallTracker) до першого запиту
+    _load_processor()
+
+    # Воркер без Unix socket - лише черга, потоки обробки та spool при переповненні
+    worker = WebhookWorker(spool_dir=SPOOL_DIR)
+    worker.start(listen=False)
+
+    server = PooledHTTPServer((args.host, args.port), ZadarmaWebhookHandler, args.workers, worker)
+    logger.info(f"🚀 Webhook сервер слухає {args.host}:{args.port} ({args.workers} потоків)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        worker.stop()
+        logger.info("🛑 Webhook сервер зупинено")
+
+
+if __name__ == "__main__":
+    main()
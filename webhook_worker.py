@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+webhook_worker.py - Постійний процес обробки webhook подій Zadarma
+
+PHP webhook-и більше не запускають python3 на кожну подію NOTIFY_START/NOTIFY_END.
+Замість цього вони передають JSON через локальний Unix socket (або, якщо воркер
+недоступний, кладуть файл у spool директорію), а цей процес тримає прогріті
+config, модулі, з'єднання з БД та HTTP сесії.
+
+Запуск:
+    python3 webhook_worker.py            # запустити воркер
+    python3 webhook_worker.py --submit '{"event": "NOTIFY_END", ...}'
+"""
+
+import sys
+import os
+import json
+import time
+import queue
+import socket
+import logging
+import importlib.util
+import threading
+import socketserver
+
+# Додаємо шлях до нашого проекту
+sys.path.append('/home/gomoncli/zadarma')
+
+from logging_setup import setup_logging
+
+WORKER_DIR = '/home/gomoncli/zadarma'
+SOCKET_PATH = os.path.join(WORKER_DIR, 'webhook_worker.sock')
+SPOOL_DIR = os.path.join(WORKER_DIR, 'webhook_spool')
+PID_FILE = os.path.join(WORKER_DIR, 'webhook_worker.pid')
+LOG_FILE = os.path.join(WORKER_DIR, 'webhook_processor.log')
+
+QUEUE_SIZE = 1000          # Максимум подій в черзі
+PROCESSING_THREADS = 4     # Потоки обробки подій
+SPOOL_POLL_INTERVAL = 1.0  # Як часто перевіряти spool директорію (секунди)
+MAX_EVENT_SIZE = 64 * 1024 # Максимальний розмір однієї події (байт)
+SPOOL_DIR_MODE = 0o777     # PHP пише в spool від іншого користувача на shared hosting
+STOP_TIMEOUT = 5.0         # Скільки чекати події, що вже обробляються, при зупинці (секунди)
+
+logger = logging.getLogger('webhook_worker')
+
+# Події, які обробляє бот
+BOT_EVENTS = ('NOTIFY_START', 'NOTIFY_END', 'NOTIFY_INTERNAL')
+
+_processor = None
+
+
+def _load_processor():
+    """Імпортує обробник один раз - далі він живе в пам'яті процесу"""
+    global _processor
+    if _processor is None:
+        from zadarma_api_webhook import process_webhook_call_status
+        _processor = process_webhook_call_status
+        logger.info("✅ Обробник zadarma_api_webhook завантажено")
+    return _processor
+
+
+def _log_call_result(webhook_data):
+    """Як раніше process_webhook.py: лише логування результату дзвінка"""
+    from process_webhook import process_call_result
+    success = process_call_result(webhook_data)
+    return {"success": success, "message": "Call result logged"}
+
+
+def _simple_webhook(webhook_data):
+    """Як раніше simple_webhook.py (zadarma_webhook.php)"""
+    global _simple_webhook_module
+    if _simple_webhook_module is None:
+        # На сервері simple_webhook.py лежить у корені проекту, в репозиторії - у webhooks/
+        for path in (os.path.join(WORKER_DIR, 'simple_webhook.py'),
+                     os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webhooks', 'simple_webhook.py')):
+            if os.path.exists(path):
+                spec = importlib.util.spec_from_file_location('simple_webhook', path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                _simple_webhook_module = module
+                break
+        else:
+            raise ImportError("simple_webhook.py не знайдено")
+    _simple_webhook_module.process_webhook_data(webhook_data)
+    return {"success": True, "message": "Processed by simple_webhook"}
+
+
+_simple_webhook_module = None
+
+# Обробник за PHP endpoint-ом, що передав подію (поле _source) - поведінка
+# кожного endpoint-а така сама, як до переходу на воркер
+SOURCE_ROUTES = {
+    'telegram_webhook': _log_call_result,      # раніше process_webhook.py
+    'zadarma_ivr_webhook': _log_call_result,   # раніше process_webhook.py
+    'zadarma_webhook': _simple_webhook,        # раніше simple_webhook.py
+}
+
+
+def dispatch_event(webhook_data):
+    """
+    Обробляє одну webhook подію в поточному процесі
+
+    Події з полем _source обробляються тим самим кодом, що й до воркера;
+    без _source (webhook_server.py, --submit) - process_webhook_call_status.
+
+    Returns:
+        dict: результат обробки у форматі process_webhook_call_status
+    """
+    source = webhook_data.get('_source')
+    if source is not None:
+        webhook_data = dict(webhook_data)
+        del webhook_data['_source']
+        route = SOURCE_ROUTES.get(source)
+        if route is None:
+            logger.warning(f"⚠️ Невідоме джерело події: {source}")
+            return {"success": False, "message": f"Unknown source {source}"}
+        return route(webhook_data)
+
+    event = webhook_data.get('event', '')
+
+    if event in ('NOTIFY_START', 'NOTIFY_END'):
+        return _load_processor()(webhook_data)
+
+    if event == 'NOTIFY_INTERNAL':
+        internal = webhook_data.get('internal', '')
+        logger.info(f"📞 INTERNAL: {webhook_data.get('caller_id', '')} -> {internal}")
+        return {"success": True, "message": "Internal call logged"}
+
+    logger.info(f"ℹ️ Подія {event} ігнорується")
+    return {"success": True, "message": f"Event {event} ignored"}
+
+
+class WebhookWorker:
+    """Приймає події з socket/spool і обробляє їх пулом потоків"""
+
+    def __init__(self, socket_path=SOCKET_PATH, spool_dir=SPOOL_DIR,
+                 threads=PROCESSING_THREADS, queue_size=QUEUE_SIZE):
+        self.socket_path = socket_path
+        self.spool_dir = spool_dir
+        self.threads = threads
+        self.events = queue.Queue(maxsize=queue_size)
+        self.server = None
+        self.running = False
+        self.stopping = False
+        self.stats = {'received': 0, 'processed': 0, 'failed': 0, 'spooled': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    # === ПРИЙОМ ПОДІЙ ===
+
+    def submit(self, webhook_data, spool_path=None):
+        """Ставить подію в чергу; якщо черга повна або воркер зупиняється - відкладає в spool"""
+        if self.stopping:
+            self._respool(webhook_data, spool_path)
+            return False
+        try:
+            self.events.put_nowait((webhook_data, spool_path))
+            self._count('received')
+            return True
+        except queue.Full:
+            logger.warning("⚠️ Черга подій переповнена, зберігаємо подію в spool")
+            self._respool(webhook_data, spool_path)
+            return False
+
+    def _respool(self, webhook_data, spool_path):
+        """Повертає необроблену подію в spool - її підхопить цей або наступний процес"""
+        if spool_path is None:
+            write_spool_file(webhook_data, self.spool_dir)
+            self._count('spooled')
+        else:
+            # Файл залишиться в spool і буде підхоплений пізніше
+            os.rename(spool_path, spool_path[:-len('.work')] + '.json')
+
+    def _make_handler(self):
+        worker = self
+
+        class EventHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    # Обмежуємо саме читання - занадто довгий рядок не потрапляє в пам'ять цілком
+                    raw_line = self.rfile.readline(MAX_EVENT_SIZE + 1)
+                    if not raw_line:
+                        break
+                    if len(raw_line) > MAX_EVENT_SIZE:
+                        logger.error(f"❌ Подія більша за {MAX_EVENT_SIZE} байт, пропускаємо")
+                        while raw_line and not raw_line.endswith(b'\n'):
+                            raw_line = self.rfile.readline(MAX_EVENT_SIZE + 1)
+                        continue
+                    line = raw_line.strip()
+                    if not line:
+                        continue
+                    try:
+                        webhook_data = json.loads(line.decode('utf-8'))
+                    except (ValueError, UnicodeDecodeError) as e:
+                        logger.error(f"❌ Некоректний JSON з socket: {e}")
+                        continue
+                    worker.submit(webhook_data)
+
+        return EventHandler
+
+    def _start_socket_server(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, self._make_handler())
+        server.daemon_threads = True
+        # PHP працює від іншого користувача на shared hosting
+        os.chmod(self.socket_path, 0o666)
+
+        thread = threading.Thread(target=server.serve_forever, name='webhook-socket')
+        thread.daemon = True
+        thread.start()
+
+        self.server = server
+        logger.info(f"🔌 Слухаємо Unix socket: {self.socket_path}")
+
+    def _scan_spool(self):
+        """Забирає файли з spool директорії в чергу"""
+        try:
+            names = sorted(os.listdir(self.spool_dir))
+        except OSError as e:
+            logger.error(f"❌ Не вдалося прочитати spool директорію: {e}")
+            return
+
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            work_path = path[:-len('.json')] + '.work'
+            try:
+                # rename атомарний - файл не буде оброблено двічі
+                os.rename(path, work_path)
+            except OSError:
+                continue
+
+            try:
+                with open(work_path, 'r', encoding='utf-8') as f:
+                    webhook_data = json.loads(f.read())
+            except (OSError, ValueError) as e:
+                logger.error(f"❌ Пошкоджений spool файл {name}: {e}")
+                os.rename(work_path, work_path + '.bad')
+                continue
+
+            if not self.submit(webhook_data, spool_path=work_path):
+                break
+
+    def _recover_spool(self):
+        """Повертає в чергу файли, які не встигли обробитись до перезапуску"""
+        for name in os.listdir(self.spool_dir):
+            if name.endswith('.work'):
+                path = os.path.join(self.spool_dir, name)
+                os.rename(path, path[:-len('.work')] + '.json')
+                logger.info(f"♻️ Відновлено необроблену подію: {name}")
+
+    def _spool_loop(self):
+        while self.running:
+            self._scan_spool()
+            time.sleep(SPOOL_POLL_INTERVAL)
+
+    # === ОБРОБКА ПОДІЙ ===
+
+    def _process_loop(self):
+        while True:
+            webhook_data, spool_path = self.events.get()
+            try:
+                started = time.time()
+                result = dispatch_event(webhook_data)
+                elapsed_ms = (time.time() - started) * 1000
+                self._count('processed')
+                logger.info(f"✅ Подія {webhook_data.get('event', '')} оброблена за {elapsed_ms:.0f}мс: {result}")
+            except Exception as e:
+                self._count('failed')
+                logger.exception(f"❌ Помилка обробки події: {e}")
+            finally:
+                if spool_path:
+                    try:
+                        os.remove(spool_path)
+                    except OSError:
+                        pass
+                self.events.task_done()
+
+    def _drain_to_spool(self):
+        """Забирає з черги події, які ще не почали оброблятись, і повертає їх у spool"""
+        count = 0
+        while True:
+            try:
+                webhook_data, spool_path = self.events.get_nowait()
+            except queue.Empty:
+                return count
+            try:
+                self._respool(webhook_data, spool_path)
+                count += 1
+            except OSError as e:
+                logger.error(f"❌ Не вдалося зберегти подію в spool при зупинці: {e}; {webhook_data}")
+            finally:
+                self.events.task_done()
+
+    def _wait_in_flight(self, timeout):
+        """Дає подіям, які вже обробляються, завершитись"""
+        deadline = time.time() + timeout
+        with self.events.all_tasks_done:
+            while self.events.unfinished_tasks:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    logger.warning(f"⚠️ {self.events.unfinished_tasks} подій не завершились за {timeout} с")
+                    return False
+                self.events.all_tasks_done.wait(remaining)
+        return True
+
+    def start(self, listen=True):
+        """
+        listen=False - без Unix socket (події надходять через submit(),
+        напр. з webhook_server.py)
+        """
+        ensure_spool_dir(self.spool_dir)
+        self.running = True
+        self.stopping = False
+
+        # Прогріваємо модулі, config та з'єднання до першої події
+        _load_processor()
+
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._process_loop, name=f'webhook-worker-{i}')
+            thread.daemon = True
+            thread.start()
+
+        self._recover_spool()
+        if listen:
+            self._start_socket_server()
+
+        thread = threading.Thread(target=self._spool_loop, name='webhook-spool')
+        thread.daemon = True
+        thread.start()
+
+        logger.info(f"🚀 Webhook воркер запущено ({self.threads} потоків обробки)")
+
+    def stop(self):
+        """
+        Зупиняє прийом подій і не губить уже прийняті
+
+        PHP вважає подію переданою, щойно записав її в socket, тож події з
+        черги, які не встигли обробитись, повертаються в spool (.json) і
+        будуть оброблені після перезапуску.
+        """
+        self.running = False
+        self.stopping = True
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+        respooled = self._drain_to_spool()
+        if respooled:
+            logger.warning(f"💾 {respooled} необроблених подій повернуто в spool")
+        self._wait_in_flight(STOP_TIMEOUT)
+
+        logger.info(f"🛑 Webhook воркер зупинено. Статистика: {self.stats}")
+        if _processor is not None:
+            from zadarma_api_webhook import get_correlation_stats
+            logger.info(f"📊 Зіставлення webhook-ів з дзвінками: {get_correlation_stats()}")
+
+
+def ensure_spool_dir(spool_dir=SPOOL_DIR):
+    """Створює spool директорію з правами на запис для PHP (umask процесу не враховується)"""
+    os.makedirs(spool_dir, exist_ok=True)
+    try:
+        os.chmod(spool_dir, SPOOL_DIR_MODE)
+    except OSError as e:
+        # Директорію створив інший користувач - права виставляє він
+        logger.debug("chmod %s: %s", spool_dir, e)
+
+
+def write_spool_file(webhook_data, spool_dir=SPOOL_DIR):
+    """Атомарно записує подію у spool директорію (tmp + rename)"""
+    if not os.path.isdir(spool_dir):
+        ensure_spool_dir(spool_dir)
+    name = '{:.6f}_{}_{}'.format(time.time(), os.getpid(), threading.get_ident())
+    tmp_path = os.path.join(spool_dir, name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(webhook_data, ensure_ascii=False))
+    os.rename(tmp_path, os.path.join(spool_dir, name + '.json'))
+    return name
+
+
+def submit_event(webhook_data, socket_path=SOCKET_PATH, spool_dir=SPOOL_DIR, timeout=0.2):
+    """
+    Передає подію воркеру без очікування результату
+
+    Returns:
+        str: 'socket' або 'spool' - яким шляхом подію передано
+    """
+    payload = (json.dumps(webhook_data, ensure_ascii=False) + '\n').encode('utf-8')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+        sock.sendall(payload)
+        return 'socket'
+    except OSError as e:
+        logger.warning(f"⚠️ Воркер недоступний через socket ({e}), пишемо в spool")
+        write_spool_file(webhook_data, spool_dir)
+        return 'spool'
+    finally:
+        sock.close()
+
+
+def main():
+    setup_logging(LOG_FILE, console=True)
+
+    if len(sys.argv) > 2 and sys.argv[1] == '--submit':
+        print(submit_event(json.loads(sys.argv[2])))
+        return 0
+
+    worker = WebhookWorker()
+
+    import signal
+    stop_event = threading.Event()
+
+    def signal_handler(signum, frame):
+        logger.info(f"📡 Отримано сигнал {signum}, завершуємо роботу...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, signal_handler)
+    signal.signal(signal.SIGINT, signal_handler)
+
+    with open(PID_FILE, 'w') as f:
+        f.write(str(os.getpid()))
+
+    try:
+        worker.start()
+        while not stop_event.is_set():
+            stop_event.wait(1)
+    finally:
+        worker.stop()
+        if os.path.exists(PID_FILE):
+            os.remove(PID_FILE)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
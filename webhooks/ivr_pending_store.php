@@ -0,0 +1,105 @@
+<?php
+/**
+ * ivr_pending_store.php - Сховище очікуваних IVR дзвінків (SQLite)
+ *
+ * Замість /tmp/pending_ivr_calls.json: спільна з ivr_calls.py таблиця
+ * pending_ivr_calls з індексом за NSN номера, атомарною зміною статусу
+ * і видаленням записів старших за IVR_CALL_TTL.
+ */
+
+define('PENDING_IVR_DB', '/home/gomoncli/zadarma/pending_ivr_calls.db');
+define('IVR_MATCH_WINDOW', 120);     // 2 хвилини
+define('IVR_CALL_TTL', 24 * 3600);   // доба історії для діагностики
+
+/**
+ * Останні 9 цифр номера - як phone_utils.national_number у Python
+ */
+function ivrNationalNumber($phone) {
+    $digits = preg_replace('/[^\d]/', '', (string)$phone);
+    return substr($digits, -9);
+}
+
+function ivrPendingDb() {
+    static $db = null;
+    if ($db === null) {
+        $db = new PDO('sqlite:' . PENDING_IVR_DB);
+        $db->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+        $db->setAttribute(PDO::ATTR_DEFAULT_FETCH_MODE, PDO::FETCH_ASSOC);
+        $db->exec('PRAGMA busy_timeout = 5000');
+        $db->exec('PRAGMA journal_mode = WAL');
+        $db->exec('PRAGMA synchronous = NORMAL');
+        $db->exec("CREATE TABLE IF NOT EXISTS pending_ivr_calls (
+            call_id TEXT PRIMARY KEY,
+            target_number TEXT,
+            target_nsn TEXT,
+            caller_id TEXT,
+            action_type TEXT,
+            timestamp INTEGER,
+            status TEXT DEFAULT 'pending',
+            completed_at INTEGER
+        )");
+        $db->exec('CREATE INDEX IF NOT EXISTS idx_pending_ivr_match
+                   ON pending_ivr_calls(target_nsn, status, timestamp)');
+        $db->exec('CREATE INDEX IF NOT EXISTS idx_pending_ivr_time ON pending_ivr_calls(timestamp)');
+    }
+    return $db;
+}
+
+/**
+ * Реєструє дзвінок у статусі pending і прибирає прострочені записи
+ */
+function savePendingCall($callId, $targetNumber, $callerId, $actionType, $timestamp = null) {
+    try {
+        $db = ivrPendingDb();
+        $now = time();
+        $db->exec('BEGIN IMMEDIATE');
+        $db->prepare('DELETE FROM pending_ivr_calls WHERE timestamp < ?')->execute([$now - IVR_CALL_TTL]);
+        $db->prepare("INSERT OR REPLACE INTO pending_ivr_calls
+                      (call_id, target_number, target_nsn, caller_id, action_type, timestamp, status)
+                      VALUES (?, ?, ?, ?, ?, ?, 'pending')")
+           ->execute([$callId, $targetNumber, ivrNationalNumber($targetNumber), $callerId, $actionType,
+                      $timestamp === null ? $now : (int)$timestamp]);
+        $db->exec('COMMIT');
+        return true;
+    } catch (Exception $e) {
+        if (isset($db) && $db->inTransaction()) {
+            $db->exec('ROLLBACK');
+        }
+        error_log('savePendingCall: ' . $e->getMessage());
+        return false;
+    }
+}
+
+/**
+ * Найновіший pending дзвінок на номер (будь-який формат) за останні $window секунд
+ */
+function getPendingCallByTarget($targetNumber, $window = IVR_MATCH_WINDOW) {
+    try {
+        $stmt = ivrPendingDb()->prepare("SELECT call_id, target_number, caller_id, action_type, timestamp, status, completed_at
+                                         FROM pending_ivr_calls
+                                         WHERE target_nsn = ? AND status = 'pending' AND timestamp >= ?
+                                         ORDER BY timestamp DESC LIMIT 1");
+        $stmt->execute([ivrNationalNumber($targetNumber), time() - $window]);
+        $call = $stmt->fetch();
+        return $call ?: null;
+    } catch (Exception $e) {
+        error_log('getPendingCallByTarget: ' . $e->getMessage());
+        return null;
+    }
+}
+
+/**
+ * Закриває pending дзвінок; false якщо його вже закрив інший обробник
+ */
+function updatePendingCallStatus($callId, $status) {
+    try {
+        $stmt = ivrPendingDb()->prepare("UPDATE pending_ivr_calls SET status = ?, completed_at = ?
+                                         WHERE call_id = ? AND status = 'pending'");
+        $stmt->execute([$status, time(), $callId]);
+        return $stmt->rowCount() > 0;
+    } catch (Exception $e) {
+        error_log('updatePendingCallStatus: ' . $e->getMessage());
+        return false;
+    }
+}
+?>
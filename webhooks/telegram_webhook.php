@@ -4,6 +4,7 @@
  */
 
 header('Content-Type: application/json');
+require_once __DIR__ . '/worker_handoff.php';
 
 function writeLog($message) {
     $timestamp = date('Y-m-d H:i:s');
@@ -46,25 +47,15 @@ try {
     if (in_array($event, ['NOTIFY_START', 'NOTIFY_END', 'NOTIFY_INTERNAL'])) {
         writeLog("📞 Processing Telegram integration event: $event");
         
-        $pythonScript = '/home/gomoncli/zadarma/process_webhook.py';
-        $jsonData = escapeshellarg($input);
+        // Неблокуюча передача у webhook_worker.py
+        $via = handOffToWorker($webhookData, 'telegram_webhook');
         
-        $command = "cd /home/gomoncli/zadarma && /usr/bin/python3 $pythonScript $jsonData 2>&1";
-        
-        writeLog("🐍 Executing Python: $command");
-        
-        $output = shell_exec($command);
-        $exitCode = shell_exec("echo $?");
-        
-        writeLog("📤 Python output: " . ($output ?: 'No output'));
-        writeLog("📊 Exit code: " . ($exitCode ?: 'Unknown'));
-        
-        if (trim($exitCode) == "0") {
-            writeLog("✅ Python script executed successfully");
-            echo json_encode(['status' => 'success', 'message' => 'Processed by Python']);
+        if ($via) {
+            writeLog("✅ Event handed off to worker ($via)");
+            echo json_encode(['status' => 'success', 'message' => "Queued for Python worker ($via)"]);
         } else {
-            writeLog("❌ Python script failed with exit code: " . $exitCode);
-            echo json_encode(['status' => 'error', 'message' => 'Python processing failed']);
+            writeLog("❌ Worker handoff failed (socket and spool unavailable)");
+            echo json_encode(['status' => 'error', 'message' => 'Python worker unavailable']);
         }
     } else {
         writeLog("ℹ️ Event $event not processed for Telegram integration");
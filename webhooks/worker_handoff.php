@@ -0,0 +1,51 @@
+<?php
+/**
+ * worker_handoff.php - Неблокуюча передача webhook подій у Python воркер
+ *
+ * Замість запуску python3 на кожну подію пишемо JSON рядок у Unix socket
+ * webhook_worker.py. Якщо воркер недоступний - кладемо подію у spool
+ * директорію, звідки воркер забере її після старту.
+ */
+
+define('WORKER_SOCKET', '/home/gomoncli/zadarma/webhook_worker.sock');
+define('WORKER_SPOOL_DIR', '/home/gomoncli/zadarma/webhook_spool');
+
+/**
+ * $source - назва endpoint-а; воркер обробляє подію тим самим кодом,
+ * який цей endpoint запускав раніше (див. SOURCE_ROUTES у webhook_worker.py)
+ *
+ * Повертає 'socket', 'spool' або false, якщо подію передати не вдалося
+ */
+function handOffToWorker($data, $source = null) {
+    if ($source !== null) {
+        $data['_source'] = $source;
+    }
+    $payload = json_encode($data, JSON_UNESCAPED_UNICODE) . "\n";
+
+    // 1. Unix socket - воркер приймає подію і одразу відпускає PHP
+    $sock = @stream_socket_client('unix://' . WORKER_SOCKET, $errno, $errstr, 0.2);
+    if ($sock) {
+        stream_set_timeout($sock, 0, 200000);
+        $written = @fwrite($sock, $payload);
+        fclose($sock);
+        if ($written === strlen($payload)) {
+            return 'socket';
+        }
+    }
+
+    // 2. Spool директорія - атомарний запис через tmp + rename
+    if (!is_dir(WORKER_SPOOL_DIR)) {
+        @mkdir(WORKER_SPOOL_DIR, 0777, true);
+        // mkdir враховує umask - воркер (інший користувач) має забирати файли звідси
+        @chmod(WORKER_SPOOL_DIR, 0777);
+    }
+    $name = sprintf('%.6f_%d_%d', microtime(true), getmypid(), mt_rand());
+    $tmpPath = WORKER_SPOOL_DIR . "/$name.tmp";
+    if (@file_put_contents($tmpPath, $payload, LOCK_EX) !== false &&
+        @rename($tmpPath, WORKER_SPOOL_DIR . "/$name.json")) {
+        return 'spool';
+    }
+
+    return false;
+}
+?>
@@ -1,6 +1,8 @@
 <?php
 // ОНОВЛЕНА СИСТЕМА з IVR + Telegram Bot Support
 header('Content-Type: application/json; charset=utf-8');
+require_once __DIR__ . '/worker_handoff.php';
+require_once __DIR__ . '/ivr_pending_store.php';
 
 if (isset($_GET['zd_echo'])) {
     exit($_GET['zd_echo']);
@@ -112,25 +114,14 @@ function handleTelegramBotEvent($data) {
     $pbxCallId = $data['pbx_call_id'] ?? '';
     $disposition = $data['disposition'] ?? '';
     
-    // Викликаємо Python скрипт для обробки
+    // Передаємо подію у webhook_worker.py без очікування обробки
     if (in_array($event, ['NOTIFY_START', 'NOTIFY_END'])) {
-        $pythonScript = '/home/gomoncli/zadarma/process_webhook.py';
-        $jsonData = escapeshellarg(json_encode($data));
+        $via = handOffToWorker($data, 'zadarma_ivr_webhook');
         
-        $command = "cd /home/gomoncli/zadarma && python3 $pythonScript $jsonData 2>&1";
-        
-        writeLog("🐍 Executing Python: $command");
-        
-        $output = shell_exec($command);
-        $exitCode = shell_exec("echo $?");
-        
-        writeLog("📤 Python output: " . ($output ?: 'No output'));
-        writeLog("📊 Python exit code: " . ($exitCode ?: 'Unknown'));
-        
-        if ($exitCode == 0) {
-            writeLog("✅ Telegram bot event processed successfully");
+        if ($via) {
+            writeLog("✅ Telegram bot event handed off to worker ($via)");
         } else {
-            writeLog("❌ Telegram bot event processing failed");
+            writeLog("❌ Worker handoff failed (socket and spool unavailable)");
         }
     }
     
@@ -154,12 +145,18 @@ function handleCorrectSource($internal, $caller_id) {
                 writeLog("🏠 ХВІРТКА");
                 $success = makeCallback($target, $config, $caller_id);
                 writeLog($success ? "✅ Хвіртка відкрита" : "❌ Помилка хвіртки");
+                if ($success) {
+                    trackPendingCall($target, $caller_id, 'hvirtka');
+                }
                 break;
 
             case 'open_gate':
                 writeLog("🚪 ВОРОТА");
                 $success = makeCallback($target, $config, $caller_id);
                 writeLog($success ? "✅ Ворота відкриті" : "❌ Помилка воріт");
+                if ($success) {
+                    trackPendingCall($target, $caller_id, 'vorota');
+                }
                 break;
 
             case 'send_sms':
@@ -178,6 +175,16 @@ function handleCorrectSource($internal, $caller_id) {
     echo json_encode(['status' => 'ok']);
 }
 
+// Запам'ятовуємо callback, щоб NOTIFY_END знайшов його за номером
+function trackPendingCall($target, $caller_id, $action_type) {
+    $call_id = 'ivr_' . time() . '_' . mt_rand(1000, 9999);
+    if (savePendingCall($call_id, $target, $caller_id, $action_type)) {
+        writeLog("📝 Pending IVR дзвінок $call_id збережено");
+    } else {
+        writeLog("❌ Не вдалося зберегти pending IVR дзвінок");
+    }
+}
+
 function sendSMSFlyFinal($phone, $message, $config) {
     writeLog("📱 SMS-Fly FINAL: з правильним відправником");
 
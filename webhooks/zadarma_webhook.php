@@ -54,15 +54,12 @@ function isBotCallback($data) {
 if (($data['event'] ?? '') === 'NOTIFY_END' && isBotCallback($data)) {
     error_log("ROUTING TO PYTHON BOT");
     
-    $json = escapeshellarg(json_encode($data));
-    $command = "cd /home/gomoncli/zadarma && /usr/bin/python3 simple_webhook.py $json 2>&1";
-    exec($command, $output, $returnCode);
-    
-    $result = implode("\n", $output);
-    error_log("Python result (code $returnCode): $result");
+    require_once __DIR__ . '/worker_handoff.php';
+    $via = handOffToWorker($data, 'zadarma_webhook');
+    error_log("Worker handoff: " . ($via ?: 'FAILED'));
     
     header('Content-Type: application/json');
-    echo json_encode(['status' => 'bot_processed', 'result' => $result]);
+    echo json_encode(['status' => $via ? 'bot_queued' : 'bot_failed', 'via' => $via]);
     exit; // ВАЖЛИВО: припинити виконання, щоб IVR код не виконувався
 }
 
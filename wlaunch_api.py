@@ -2,7 +2,8 @@
 import requests
 import logging
 from config import WLAUNCH_API_KEY, COMPANY_ID
-from user_db import add_or_update_client
+from user_db import bulk_upsert_clients
+from json_stream import JSONArrayStream, STREAM_CHUNK_SIZE
 
 logger = logging.getLogger("wlaunch_api")
 
@@ -15,8 +16,28 @@ HEADERS = {
     "Accept": "application/json"
 }
 
-def fetch_all_clients():
-    """Отримує клієнтів з Wlaunch API - ВИПРАВЛЕНО за офіційною документацією"""
+def _iter_telegram_clients(telegram_contacts, branch_name):
+    """Telegram контакти філії як записи клієнтів (chat_id як client_id)"""
+    for contact in telegram_contacts:
+        chat_id = contact.get("chat_id")
+        phone = contact.get("phone")
+        
+        if chat_id and phone:
+            yield {
+                "id": chat_id,
+                "first_name": "Клієнт",  # Ім'я не передається в API
+                "last_name": f"від {branch_name}",
+                "phone": phone
+            }
+        else:
+            logger.warning(f"⚠️ Пропущено контакт без chat_id або phone: {contact}")
+
+def fetch_all_clients(table="clients"):
+    """
+    Отримує клієнтів з Wlaunch API - ВИПРАВЛЕНО за офіційною документацією
+
+    table - таблиця для запису (user_db.force_full_sync передає тіньову clients_next)
+    """
     logger.info("🔄 Початок синхронізації клієнтів з Wlaunch...")
     
     try:
@@ -30,53 +51,35 @@ def fetch_all_clients():
             "size": 100
         }
         
-        response = requests.get(branches_url, headers=HEADERS, params=branches_params, timeout=15)
-        response.raise_for_status()
-        branches_data = response.json()
-        
-        logger.info(f"📋 Знайдено {len(branches_data.get('content', []))} філій")
-        
         total_clients = 0
+        total_branches = 0
         
-        # Обробляємо кожну філію
-        for branch in branches_data.get("content", []):
-            branch_id = branch.get("id")
-            branch_name = branch.get("name")
-            
-            logger.info(f"🏢 Обробляємо філію: {branch_name} ({branch_id})")
-            
-            # Отримуємо клієнтів з notification_settings цієї філії
-            notification_settings = branch.get("notification_settings", {})
-            telegram_contacts = notification_settings.get("telegram", [])
+        with requests.get(branches_url, headers=HEADERS, params=branches_params, timeout=15, stream=True) as response:
+            response.raise_for_status()
             
-            logger.info(f"📱 Знайдено {len(telegram_contacts)} Telegram контактів")
-            
-            # Додаємо кожен Telegram контакт як клієнта
-            for contact in telegram_contacts:
+            # Філії розбираються з потоку по одній - вся відповідь не тримається в пам'яті
+            for branch in JSONArrayStream(response.iter_content(STREAM_CHUNK_SIZE), "content"):
+                total_branches += 1
+                branch_id = branch.get("id")
+                branch_name = branch.get("name")
+                
+                logger.info(f"🏢 Обробляємо філію: {branch_name} ({branch_id})")
+                
+                # Отримуємо клієнтів з notification_settings цієї філії
+                telegram_contacts = branch.get("notification_settings", {}).get("telegram", [])
+                logger.info(f"📱 Знайдено {len(telegram_contacts)} Telegram контактів")
+                
+                clients = list(_iter_telegram_clients(telegram_contacts, branch_name))
                 try:
-                    chat_id = contact.get("chat_id")
-                    phone = contact.get("phone")
-                    
-                    if chat_id and phone:
-                        # Використовуємо chat_id як client_id
-                        add_or_update_client(
-                            client_id=chat_id,
-                            first_name="Клієнт",  # Ім'я не передається в API
-                            last_name=f"від {branch_name}",
-                            phone=phone
-                        )
-                        total_clients += 1
-                        
-                        logger.info(f"✅ Додано клієнта: {chat_id} ({phone})")
-                    else:
-                        logger.warning(f"⚠️ Пропущено контакт без chat_id або phone: {contact}")
-                        
+                    bulk_upsert_clients(clients, table)
+                    total_clients += len(clients)
                 except Exception as e:
-                    logger.error(f"❌ Помилка обробки контакту {contact}: {e}")
-            
-            # Також можна спробувати отримати записи (appointments) для більшої інформації
-            # але це потребує додаткових параметрів часу
-            
+                    logger.error(f"❌ Помилка збереження контактів філії {branch_name}: {e}")
+                
+                # Також можна спробувати отримати записи (appointments) для більшої інформації
+                # але це потребує додаткових параметрів часу
+        
+        logger.info(f"📋 Оброблено {total_branches} філій")
         logger.info(f"✅ Синхронізація завершена. Оброблено {total_clients} клієнтів")
         return total_clients
         
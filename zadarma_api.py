@@ -1,117 +1,54 @@
 # zadarma_api.py - Enhanced version with call status tracking
 import logging
-import hashlib
-import hmac
-import base64
-import requests
 import json
 import time
 import threading
-from urllib.parse import urlencode
-from collections import OrderedDict
-from datetime import datetime
 from config import (
     ZADARMA_API_KEY,
     ZADARMA_API_SECRET,
     ZADARMA_MAIN_PHONE,
     ADMIN_USER_ID,
-    TELEGRAM_TOKEN,
     format_phone_for_zadarma,
     validate_phone_number
 )
+from zadarma_client import ZadarmaAPI
+from call_poller import CallStatusPoller
+from call_coalescing import target_locks, COALESCE_WINDOW
+from phone_utils import national_number
+import telegram_sender
 
 logger = logging.getLogger(__name__)
 
-class ZadarmaAPI:
-    def __init__(self, key, secret, is_sandbox=False):
-        self.key = key
-        self.secret = secret
-        self.is_sandbox = is_sandbox
-        self.__url_api = 'https://api.zadarma.com'
-        if is_sandbox:
-            self.__url_api = 'https://api-sandbox.zadarma.com'
-
-    def call(self, method, params={}, request_type='GET', format='json', is_auth=True):
-        """
-        Function for send API request - точна копія з GitHub
-        """
-        logger.info(f"📡 Zadarma API call: {method}, params: {params}")
-        
-        request_type = request_type.upper()
-        if request_type not in ['GET', 'POST', 'PUT', 'DELETE']:
-            request_type = 'GET'
-        
-        params['format'] = format
-        auth_str = None
-        
-        # Сортуємо параметри та створюємо query string
-        params_string = urlencode(OrderedDict(sorted(params.items())))
-        logger.info(f"🔐 Params string: {params_string}")
-
-        if is_auth:
-            auth_str = self.__get_auth_string_for_header(method, params_string)
-            logger.info(f"🔐 Auth header: {auth_str}")
-
-        url = self.__url_api + method
-        logger.info(f"🌐 Request URL: {url}")
-
-        try:
-            if request_type == 'GET':
-                if params_string:
-                    url += '?' + params_string
-                result = requests.get(url, headers={'Authorization': auth_str}, timeout=10)
-            elif request_type == 'POST':
-                result = requests.post(url, headers={'Authorization': auth_str}, data=params, timeout=10)
-            elif request_type == 'PUT':
-                result = requests.put(url, headers={'Authorization': auth_str}, data=params, timeout=10)
-            elif request_type == 'DELETE':
-                result = requests.delete(url, headers={'Authorization': auth_str}, data=params, timeout=10)
-
-            logger.info(f"📡 Response status: {result.status_code}")
-            logger.info(f"📡 Response: {result.text}")
-            
-            return result
-            
-        except requests.exceptions.Timeout:
-            logger.error("❌ Таймаут запиту до Zadarma API")
-            raise
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Помилка запиту до Zadarma API: {e}")
-            raise
-
-    def __get_auth_string_for_header(self, method, params_string):
-        """
-        Офіційний алгоритм авторизації з GitHub
-        """
-        # Крок 1: створюємо рядок для підпису
-        data = method + params_string + hashlib.md5(params_string.encode('utf8')).hexdigest()
-        logger.debug(f"🔐 String to sign: {data}")
-        
-        # Крок 2: HMAC SHA1
-        hmac_h = hmac.new(self.secret.encode('utf8'), data.encode('utf8'), hashlib.sha1)
-        
-        # Крок 3: ВАЖЛИВО! Спочатку hexdigest, потім base64
-        hex_digest = hmac_h.hexdigest()
-        logger.debug(f"🔐 HMAC hex digest: {hex_digest}")
-        
-        bts = bytes(hex_digest, 'utf8')
-        signature = base64.b64encode(bts).decode()
-        logger.debug(f"🔐 Final signature: {signature}")
-        
-        # Крок 4: формуємо заголовок авторизації
-        auth = self.key + ':' + signature
-        return auth
-
 # Глобальний екземпляр API
 zadarma_api = ZadarmaAPI(ZADARMA_API_KEY, ZADARMA_API_SECRET)
 
+def fetch_statistics_calls(start, end):
+    """Один запит /v1/statistics/ за вікно [start, end] - список записів дзвінків"""
+    response = zadarma_api.call('/v1/statistics/', {'start': start, 'end': end}, 'GET')
+    result = json.loads(response.text)
+    if result.get('status') != 'success':
+        raise ValueError(f"Статистика недоступна: {result.get('message', result)}")
+    return result.get('calls', [])
+
+def is_our_call(pending, record):
+    """Запис статистики належить нашому callback дзвінку на target_number"""
+    return (record.get('to') == pending['target_number'] and
+            record.get('from') == ZADARMA_MAIN_PHONE)
+
 class CallStatusTracker:
     """Клас для відстеження статусу дзвінків"""
-    
+
     def __init__(self):
         self.active_calls = {}
         self.call_history = []
-        
+        self._lock = threading.Lock()
+        # Один планувальник на всі дзвінки замість потоку на кожен дзвінок
+        self.poller = CallStatusPoller(
+            fetch_statistics_calls, is_our_call,
+            on_result=self._handle_disposition,
+            on_timeout=self._handle_call_timeout
+        )
+
     def register_call(self, call_id, user_id, chat_id, action_type, target_number):
         """Реєструє новий дзвінок для відстеження"""
         call_info = {
@@ -121,79 +58,58 @@ class CallStatusTracker:
             'action_type': action_type,  # 'hvirtka' або 'vorota'
             'target_number': target_number,
             'start_time': time.time(),
-            'status': 'initiated'
+            'status': 'initiated',
+            'subscribers': []  # chat_id тих, хто приєднався до цього дзвінка
         }
-        
-        self.active_calls[call_id] = call_info
+
+        with self._lock:
+            self.active_calls[call_id] = call_info
         logger.info(f"📋 Зареєстровано дзвінок для відстеження: {call_id}")
-        
-        # Запускаємо моніторинг в окремому потоці
-        thread = threading.Thread(target=self._monitor_call, args=(call_id,))
-        thread.daemon = True
-        thread.start()
-        
-    def _monitor_call(self, call_id):
-        """Моніторить статус конкретного дзвінка"""
-        if call_id not in self.active_calls:
-            logger.warning(f"⚠️ Дзвінок {call_id} не знайдено для моніторингу")
-            return
-            
-        call_info = self.active_calls[call_id]
-        max_wait_time = 30  # 30 секунд максимум
-        check_interval = 3   # Перевіряти кожні 3 секунди
-        
-        logger.info(f"🔍 Почато моніторинг дзвінка {call_id}")
-        start_time = time.time()
-        
-        while time.time() - start_time < max_wait_time:
-            try:
-                # Отримуємо статистику дзвінка
-                response = zadarma_api.call(f'/v1/statistics/', 
-                                          {'start': call_info['start_time'], 'end': time.time()}, 
-                                          'GET')
-                result = json.loads(response.text)
-                
-                if result.get('status') == 'success':
-                    # Шукаємо наш дзвінок в статистиці
-                    calls = result.get('calls', [])
-                    our_call = None
-                    
-                    for call in calls:
-                        if (call.get('to') == call_info['target_number'] and 
-                            call.get('from') == ZADARMA_MAIN_PHONE):
-                            our_call = call
-                            break
-                    
-                    if our_call:
-                        disposition = our_call.get('disposition', '')
-                        call_status = our_call.get('status', '')
-                        
-                        logger.info(f"📞 Статус дзвінка {call_id}: {call_status}, disposition: {disposition}")
-                        
-                        if disposition == 'rejected':
-                            # ✅ УСПІХ: Дзвінок скинуто після гудків - ворота/хвіртка відкриються!
-                            self._handle_call_rejected(call_id)
-                            return
-                        elif disposition in ['busy', 'failed', 'no-answer', 'cancel']:
-                            # ❌ НЕВДАЧА: Дзвінок не дійшов або номер зайнятий
-                            self._handle_call_failed(call_id, disposition)
-                            return
-                        elif disposition == 'answered':
-                            # ⚠️ ПРОБЛЕМА: Дзвінок прийнято замість скидання - система працює неправильно
-                            self._handle_call_answered(call_id)
-                            return
-                
-            except Exception as e:
-                logger.error(f"❌ Помилка перевірки статусу дзвінка {call_id}: {e}")
-            
-            time.sleep(check_interval)
-        
-        # Таймаут - статус невизначений
-        self._handle_call_timeout(call_id)
-        
+
+        self.poller.add(call_id, target_number, call_info['start_time'])
+
+    def join(self, target_number, chat_id, window=COALESCE_WINDOW):
+        """
+        Приєднує chat_id до активного дзвінка на target_number (не старшого
+        за window секунд); повертає call_id дзвінка або None
+        """
+        nsn = national_number(target_number)
+        with self._lock:
+            candidates = [c for c in self.active_calls.values()
+                          if national_number(c['target_number']) == nsn and time.time() - c['start_time'] < window]
+            if not candidates:
+                return None
+            call_info = max(candidates, key=lambda c: c['start_time'])
+            if chat_id != call_info['chat_id'] and chat_id not in call_info['subscribers']:
+                call_info['subscribers'].append(chat_id)
+            return call_info['call_id']
+
+    def _notify(self, call_info, message):
+        """Результат дзвінка - ініціатору і всім, хто приєднався"""
+        for chat_id in [call_info['chat_id']] + call_info.get('subscribers', []):
+            send_telegram_message(chat_id, message)
+
+    def _handle_disposition(self, call_id, disposition):
+        """Маршрутизує фінальний disposition у відповідний обробник"""
+        logger.info(f"📞 Статус дзвінка {call_id}: disposition: {disposition}")
+        if disposition == 'rejected':
+            # ✅ УСПІХ: Дзвінок скинуто після гудків - ворота/хвіртка відкриються!
+            self._handle_call_rejected(call_id)
+        elif disposition == 'answered':
+            # ⚠️ ПРОБЛЕМА: Дзвінок прийнято замість скидання - система працює неправильно
+            self._handle_call_answered(call_id)
+        else:
+            # ❌ НЕВДАЧА: Дзвінок не дійшов або номер зайнятий
+            self._handle_call_failed(call_id, disposition)
+
+    def _finish(self, call_id):
+        """Атомарно забирає дзвінок з активних (обробник виконується лише раз)"""
+        with self._lock:
+            return self.active_calls.pop(call_id, None)
+
     def _handle_call_rejected(self, call_id):
         """Обробляє успішно скинутий дзвінок - ЦЕ УСПІХ!"""
-        call_info = self.active_calls.get(call_id)
+        call_info = self._finish(call_id)
         if not call_info:
             return
             
@@ -203,18 +119,17 @@ class CallStatusTracker:
         action_name = "хвіртку" if call_info['action_type'] == 'hvirtka' else "ворота"
         success_message = f"✅ {action_name.capitalize()} буде відчинено за кілька секунд."
         
-        send_telegram_message(call_info['chat_id'], success_message)
+        self._notify(call_info, success_message)
         
         # Переносимо в історію та видаляємо з активних
         call_info['status'] = 'success'
         call_info['disposition'] = 'rejected'
         call_info['end_time'] = time.time()
         self.call_history.append(call_info)
-        del self.active_calls[call_id]
         
     def _handle_call_failed(self, call_id, disposition):
         """Обробляє невдалий дзвінок - ворота НЕ відкриються"""
-        call_info = self.active_calls.get(call_id)
+        call_info = self._finish(call_id)
         if not call_info:
             return
             
@@ -234,18 +149,17 @@ class CallStatusTracker:
         
         error_message += f"\n\nСпробуйте ще раз або зателефонуйте нам за номером <a href=\"tel:+380733103110\">+380733103110</a>"
         
-        send_telegram_message(call_info['chat_id'], error_message)
+        self._notify(call_info, error_message)
         
         # Переносимо в історію
         call_info['status'] = 'failed'
         call_info['disposition'] = disposition
         call_info['end_time'] = time.time()
         self.call_history.append(call_info)
-        del self.active_calls[call_id]
         
     def _handle_call_answered(self, call_id):
         """Обробляє прийнятий дзвінок - це ПРОБЛЕМА в налаштуваннях!"""
-        call_info = self.active_calls.get(call_id)
+        call_info = self._finish(call_id)
         if not call_info:
             return
             
@@ -258,7 +172,7 @@ class CallStatusTracker:
             f"Зверніться до підтримки: <a href=\"tel:+380733103110\">+380733103110</a>"
         )
         
-        send_telegram_message(call_info['chat_id'], warning_message)
+        self._notify(call_info, warning_message)
         
         # Сповіщаємо адміна про проблему в налаштуваннях
         admin_alert = f"🚨 ПРОБЛЕМА НАЛАШТУВАННЯ: Дзвінок на {action_name} ({call_info['target_number']}) було ПРИЙНЯТО замість скидання! Перевірте налаштування пристрою."
@@ -269,11 +183,10 @@ class CallStatusTracker:
         call_info['disposition'] = 'answered'
         call_info['end_time'] = time.time()
         self.call_history.append(call_info)
-        del self.active_calls[call_id]
         
     def _handle_call_timeout(self, call_id):
         """Обробляє таймаут перевірки статусу - невизначений результат"""
-        call_info = self.active_calls.get(call_id)
+        call_info = self._finish(call_id)
         if not call_info:
             return
             
@@ -286,35 +199,19 @@ class CallStatusTracker:
             f"При проблемах телефонуйте: <a href=\"tel:+380733103110\">+380733103110</a>"
         )
         
-        send_telegram_message(call_info['chat_id'], timeout_message)
+        self._notify(call_info, timeout_message)
         
         # Переносимо в історію
         call_info['status'] = 'timeout'
         call_info['end_time'] = time.time()
         self.call_history.append(call_info)
-        del self.active_calls[call_id]
 
 # Глобальний трекер статусу дзвінків
 call_tracker = CallStatusTracker()
 
 def send_telegram_message(chat_id, message):
-    """Відправляє повідомлення в Telegram з HTML форматуванням"""
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": chat_id, 
-        "text": message,
-        "parse_mode": "HTML",
-        "disable_web_page_preview": True
-    }
-    
-    try:
-        response = requests.post(url, data=payload, timeout=10)
-        if response.status_code == 200:
-            logger.info(f"📤 Повідомлення відправлено в чат {chat_id}")
-        else:
-            logger.error(f"❌ Помилка відправки повідомлення (код {response.status_code})")
-    except Exception as e:
-        logger.error(f"❌ Помилка надсилання повідомлення: {e}")
+    """Ставить повідомлення з HTML форматуванням у чергу відправки Telegram"""
+    return telegram_sender.send_message(chat_id, message)
 
 def send_error_to_admin(message):
     """Відправляє повідомлення про помилку адміну"""
@@ -332,6 +229,7 @@ def make_zadarma_call_with_tracking(to_number: str, user_id: int, chat_id: int,
         
     Returns:
         dict: результат з полями success, call_id, message
+              (joined - call_id дзвінка, до якого приєднався запит)
     """
     logger.info(f"📞 Робимо дзвінок з відстеженням на номер: {to_number}")
     
@@ -349,6 +247,35 @@ def make_zadarma_call_with_tracking(to_number: str, user_id: int, chat_id: int,
     from_number = ZADARMA_MAIN_PHONE
     logger.info(f"📞 Використовуємо FROM номер: {from_number}")
     
+    # Поки callback на номер ще без результату - приєднуємося до нього
+    with target_locks.lock(formatted_to):
+        joined = _join_in_flight(formatted_to, chat_id)
+        if joined:
+            return joined
+        target_locks.count('callbacks')
+        return _request_callback(formatted_to, from_number, user_id, chat_id, action_type)
+
+def _join_in_flight(formatted_to, chat_id):
+    leader_id = call_tracker.join(formatted_to, chat_id)
+    if leader_id is None:
+        return None
+    target_locks.count('joined')
+    logger.info(f"🔗 Чат {chat_id} приєднано до дзвінка {leader_id} на {formatted_to}")
+    return {
+        "success": True,
+        "call_id": leader_id,
+        "joined": leader_id,
+        "message": "Дзвінок на цей номер вже виконується - результат прийде і вам"
+    }
+
+def join_call_in_flight(to_number, user_id, chat_id, action_type):
+    """Приєднує запит до дзвінка, що вже виконується на to_number; None - дзвінка немає"""
+    formatted_to = format_phone_for_zadarma(to_number)
+    with target_locks.lock(formatted_to):
+        return _join_in_flight(formatted_to, chat_id)
+
+def _request_callback(formatted_to, from_number, user_id, chat_id, action_type):
+    """Запит /v1/request/callback/ з реєстрацією дзвінка для опитування статусу"""
     try:
         params = {
             "from": from_number,
@@ -1,162 +1,154 @@
 # zadarma_api_webhook.py - Версія без поллінгу, працює з webhook-ами
 import logging
-import hashlib
-import hmac
-import base64
-import requests
 import json
 import time
-import sqlite3
-import os
-from urllib.parse import urlencode
-from collections import OrderedDict
-from datetime import datetime
+import queue
+import atexit
+import threading
 from config import (
     ZADARMA_API_KEY,
     ZADARMA_API_SECRET,
     ZADARMA_MAIN_PHONE,
     ADMIN_USER_ID,
-    TELEGRAM_TOKEN,
     format_phone_for_zadarma,
     validate_phone_number
 )
+import telegram_sender
+from zadarma_client import ZadarmaAPI
+from phone_utils import national_number, ensure_nsn_column
+from db_pool import get_pool
+from pending_calls import PendingCallIndex, PENDING_TTL, MATCHABLE_STATUSES
+from call_coalescing import target_locks, subscriber_chats, COALESCE_WINDOW
 
 logger = logging.getLogger(__name__)
 
-class ZadarmaAPI:
-    def __init__(self, key, secret, is_sandbox=False):
-        self.key = key
-        self.secret = secret
-        self.is_sandbox = is_sandbox
-        self.__url_api = 'https://api.zadarma.com'
-        if is_sandbox:
-            self.__url_api = 'https://api-sandbox.zadarma.com'
+# Глобальний екземпляр API
+zadarma_api = ZadarmaAPI(ZADARMA_API_KEY, ZADARMA_API_SECRET)
 
-    def call(self, method, params={}, request_type='GET', format='json', is_auth=True):
-        """
-        Function for send API request - точна копія з GitHub
-        """
-        logger.info(f"📡 Zadarma API call: {method}, params: {params}")
-        
-        request_type = request_type.upper()
-        if request_type not in ['GET', 'POST', 'PUT', 'DELETE']:
-            request_type = 'GET'
-        
-        params['format'] = format
-        auth_str = None
-        
-        # Сортуємо параметри та створюємо query string
-        params_string = urlencode(OrderedDict(sorted(params.items())))
-        logger.info(f"🔐 Params string: {params_string}")
+CALL_TRACKING_DB = "/home/gomoncli/zadarma/call_tracking.db"
 
-        if is_auth:
-            auth_str = self.__get_auth_string_for_header(method, params_string)
-            logger.info(f"🔐 Auth header: {auth_str}")
+_CALL_COLUMNS = "call_id, user_id, chat_id, action_type, target_number, start_time, status, pbx_call_id, joined_to"
+_CALL_KEYS = ('call_id', 'user_id', 'chat_id', 'action_type', 'target_number', 'start_time', 'status', 'pbx_call_id',
+              'joined_to')
 
-        url = self.__url_api + method
-        logger.info(f"🌐 Request URL: {url}")
+# Статуси дзвінка, до якого можна приєднатися: callback ще запитується або вже дзвонить
+COALESCE_STATUSES = ('initiated', 'api_success')
 
-        try:
-            if request_type == 'GET':
-                if params_string:
-                    url += '?' + params_string
-                result = requests.get(url, headers={'Authorization': auth_str}, timeout=10)
-            elif request_type == 'POST':
-                result = requests.post(url, headers={'Authorization': auth_str}, data=params, timeout=10)
-            elif request_type == 'PUT':
-                result = requests.put(url, headers={'Authorization': auth_str}, data=params, timeout=10)
-            elif request_type == 'DELETE':
-                result = requests.delete(url, headers={'Authorization': auth_str}, data=params, timeout=10)
-
-            logger.info(f"📡 Response status: {result.status_code}")
-            logger.info(f"📡 Response: {result.text}")
-            
-            return result
-            
-        except requests.exceptions.Timeout:
-            logger.error("❌ Таймаут запиту до Zadarma API")
-            raise
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Помилка запиту до Zadarma API: {e}")
-            raise
-
-    def __get_auth_string_for_header(self, method, params_string):
-        """
-        Офіційний алгоритм авторизації з GitHub
-        """
-        # Крок 1: створюємо рядок для підпису
-        data = method + params_string + hashlib.md5(params_string.encode('utf8')).hexdigest()
-        logger.debug(f"🔐 String to sign: {data}")
-        
-        # Крок 2: HMAC SHA1
-        hmac_h = hmac.new(self.secret.encode('utf8'), data.encode('utf8'), hashlib.sha1)
-        
-        # Крок 3: ВАЖЛИВО! Спочатку hexdigest, потім base64
-        hex_digest = hmac_h.hexdigest()
-        logger.debug(f"🔐 HMAC hex digest: {hex_digest}")
-        
-        bts = bytes(hex_digest, 'utf8')
-        signature = base64.b64encode(bts).decode()
-        logger.debug(f"🔐 Final signature: {signature}")
-        
-        # Крок 4: форуємо заголовок авторизації
-        auth = self.key + ':' + signature
-        return auth
+WRITE_BATCH = 100      # записів журналу за одну транзакцію
+FLUSH_TIMEOUT = 5      # секунд на дозапис журналу при виході
+
+
+def _call_row(row):
+    return {
+        'call_id': row[0],
+        'user_id': row[1],
+        'chat_id': row[2],
+        'action_type': row[3],
+        'target_number': row[4],
+        'start_time': row[5],
+        'timestamp': row[5],  # старі споживачі читають час як timestamp
+        'status': row[6],
+        'pbx_call_id': row[7],
+        'joined_to': row[8]  # call_id дзвінка, до результату якого приєднався цей запит
+    }
+
+
+def _public_call(call):
+    """Дзвінок з індексу у форматі рядка БД (без службових полів)"""
+    result = {key: call.get(key) for key in _CALL_KEYS}
+    result['timestamp'] = result['start_time']
+    return result
 
-# Глобальний екземпляр API
-zadarma_api = ZadarmaAPI(ZADARMA_API_KEY, ZADARMA_API_SECRET)
 
 class CallTracker:
-    """Клас для відстеження дзвінків через SQLite базу даних"""
+    """
+    Клас для відстеження дзвінків через SQLite базу даних
+
+    Постійні з'єднання db_pool (WAL, з'єднання на потік) замість
+    sqlite3.connect() на кожен виклик; запити - константні рядки,
+    тож sqlite3 повторно використовує підготовлені statement-и.
+
+    Webhook зіставляється з дзвінком через індекс у пам'яті (pending_calls):
+    pbx_call_id або NSN номера - одне звернення до словника. Таблиця
+    call_tracking - журнал, який фоновий потік дописує пакетами (write-behind);
+    з нього індекс відновлюється після рестарту і підтягує дзвінки, записані
+    іншим процесом (бот реєструє, webhook_worker зіставляє) - перевірка
+    PRAGMA data_version коштує один запит без читання таблиці.
+    """
     
-    def __init__(self):
-        self.db_path = "/home/gomoncli/zadarma/call_tracking.db"
+    def __init__(self, db_path=CALL_TRACKING_DB, pending_ttl=PENDING_TTL):
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self.pending = PendingCallIndex(pending_ttl)
+        self._writes = queue.Queue()
+        self._dirty = {}  # call_id -> кількість ще не записаних змін
+        self._dirty_cond = threading.Condition()
+        self._writer = None
+        self._data_version = threading.local()
         self.init_db()
+        self._refresh_pending(force=True)
+        atexit.register(self.flush, FLUSH_TIMEOUT)
         
     def init_db(self):
         """Ініціалізує базу даних для відстеження дзвінків"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS call_tracking (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    call_id TEXT UNIQUE,
-                    user_id INTEGER,
-                    chat_id INTEGER,
-                    action_type TEXT,
-                    target_number TEXT,
-                    start_time INTEGER,
-                    status TEXT DEFAULT 'initiated',
-                    pbx_call_id TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            with self.pool.transaction() as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS call_tracking (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        call_id TEXT UNIQUE,
+                        user_id INTEGER,
+                        chat_id INTEGER,
+                        action_type TEXT,
+                        target_number TEXT,
+                        start_time INTEGER,
+                        status TEXT DEFAULT 'initiated',
+                        pbx_call_id TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        target_nsn TEXT,
+                        joined_to TEXT
+                    )
+                ''')
+                columns = [row[1] for row in conn.execute('PRAGMA table_info(call_tracking)')]
+                if 'joined_to' not in columns:
+                    conn.execute('ALTER TABLE call_tracking ADD COLUMN joined_to TEXT')
+                ensure_nsn_column(conn, 'call_tracking', 'target_number', 'target_nsn', 'idx_call_tracking_target_nsn')
+                # Пошук webhook-а (номер + статус + час) - одна проба складеного індексу
+                conn.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_call_tracking_match
+                    ON call_tracking(target_nsn, status, start_time)
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_call_tracking_pbx ON call_tracking(pbx_call_id)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_call_tracking_start ON call_tracking(start_time)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_call_tracking_joined ON call_tracking(joined_to)')
             logger.info("✅ База даних для відстеження дзвінків ініціалізована")
             
         except Exception as e:
             logger.error(f"❌ Помилка ініціалізації бази даних: {e}")
     
-    def register_call(self, call_id, user_id, chat_id, action_type, target_number):
-        """Реєструє новий дзвінок для відстеження"""
+    def register_call(self, call_id, user_id, chat_id, action_type, target_number, joined_to=None):
+        """
+        Реєструє новий дзвінок для відстеження
+
+        joined_to - call_id дзвінка, до якого приєднався запит (статус 'joined',
+        власного callback-а немає - результат розсилається з NOTIFY_END ініціатора)
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+            start_time = int(time.time())
+            status = 'joined' if joined_to else 'initiated'
+            self.pending.add({
+                'call_id': call_id, 'user_id': user_id, 'chat_id': chat_id, 'action_type': action_type,
+                'target_number': target_number, 'start_time': start_time, 'status': status,
+                'joined_to': joined_to
+            })
+            self._log_write(call_id, '''
                 INSERT OR REPLACE INTO call_tracking 
-                (call_id, user_id, chat_id, action_type, target_number, start_time, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (call_id, user_id, chat_id, action_type, target_number, int(time.time()), 'initiated'))
+                (call_id, user_id, chat_id, action_type, target_number, target_nsn, start_time, status, joined_to)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (call_id, user_id, chat_id, action_type, target_number, national_number(target_number),
+                  start_time, status, joined_to))
             
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"📋 Зареєстровано дзвінок для відстеження: {call_id}")
+            logger.info("📋 Зареєстровано дзвінок для відстеження: %s", call_id)
             
         except Exception as e:
             logger.error(f"❌ Помилка реєстрації дзвінка: {e}")
@@ -164,110 +156,218 @@ class CallTracker:
     def update_call_status(self, call_id, status, pbx_call_id=None):
         """Оновлює статус дзвінка"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
+            self.pending.update(call_id, status, pbx_call_id)
             if pbx_call_id:
-                cursor.execute('''
+                self._log_write(call_id, '''
                     UPDATE call_tracking 
                     SET status = ?, pbx_call_id = ?
                     WHERE call_id = ?
                 ''', (status, pbx_call_id, call_id))
             else:
-                cursor.execute('''
+                self._log_write(call_id, '''
                     UPDATE call_tracking 
                     SET status = ?
                     WHERE call_id = ?
                 ''', (status, call_id))
             
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"📝 Оновлено статус дзвінка {call_id}: {status}")
+            logger.info("📝 Оновлено статус дзвінка %s: %s", call_id, status)
             
         except Exception as e:
             logger.error(f"❌ Помилка оновлення статусу дзвінка: {e}")
     
+    def _log_write(self, call_id, sql, params):
+        """Ставить запис журналу в чергу фонового записувача"""
+        with self._dirty_cond:
+            self._dirty[call_id] = self._dirty.get(call_id, 0) + 1
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._writer_loop, name='call-tracking-writer')
+                self._writer.daemon = True
+                self._writer.start()
+        self._writes.put((call_id, sql, params))
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self.pool.transaction() as conn:
+                    for _, sql, params in batch:
+                        conn.execute(sql, params)
+            except Exception as e:
+                logger.error(f"❌ Помилка запису журналу дзвінків ({len(batch)} змін): {e}")
+            finally:
+                with self._dirty_cond:
+                    for call_id, _, _ in batch:
+                        left = self._dirty.get(call_id, 1) - 1
+                        if left > 0:
+                            self._dirty[call_id] = left
+                        else:
+                            self._dirty.pop(call_id, None)
+                    self._dirty_cond.notify_all()
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """Чекає, поки черга журналу буде записана в БД; False - не встигли"""
+        with self._dirty_cond:
+            return self._dirty_cond.wait_for(lambda: not self._dirty, timeout)
+
+    def _refresh_pending(self, force=False):
+        """Підтягує в індекс свіжі дзвінки з журналу, якщо БД змінював хтось інший"""
+        try:
+            conn = self.pool.connection()
+            version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if not force and version == getattr(self._data_version, 'value', None):
+                return
+            self._data_version.value = version
+            rows = conn.execute(f'''
+                SELECT {_CALL_COLUMNS}
+                FROM call_tracking
+                WHERE start_time > ?
+            ''', (int(time.time()) - self.pending.ttl,)).fetchall()
+            with self._dirty_cond:
+                unsaved = set(self._dirty)
+            self.pending.merge([_call_row(row) for row in rows], skip=unsaved)
+        except Exception as e:
+            logger.error(f"❌ Помилка оновлення індексу дзвінків: {e}")
+
     def get_call_by_pbx_id(self, pbx_call_id):
-        """Отримує дані дзвінка по PBX call ID"""
+        """Отримує дані дзвінка по PBX call ID (індекс у пам'яті, для старих дзвінків - БД)"""
+        self._refresh_pending()
+        call = self.pending.by_pbx_id(pbx_call_id)
+        if call:
+            return _public_call(call)
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT call_id, user_id, chat_id, action_type, target_number, start_time, status
+            row = self.pool.connection().execute(f'''
+                SELECT {_CALL_COLUMNS}
                 FROM call_tracking 
                 WHERE pbx_call_id = ?
                 ORDER BY created_at DESC
                 LIMIT 1
-            ''', (pbx_call_id,))
+            ''', (pbx_call_id,)).fetchone()
+            return _call_row(row) if row else None
             
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result:
-                return {
-                    'call_id': result[0],
-                    'user_id': result[1], 
-                    'chat_id': result[2],
-                    'action_type': result[3],
-                    'target_number': result[4],
-                    'start_time': result[5],
-                    'status': result[6]
-                }
+        except Exception as e:
+            logger.error(f"❌ Помилка отримання дзвінка по PBX ID: {e}")
             return None
+
+    def get_call_by_target_and_time(self, target_number, start_time_window=60, statuses=MATCHABLE_STATUSES):
+        """
+        Отримує дані дзвінка по номеру телефону (будь-який формат) і часовому вікну
+
+        Вікно в межах життя індексу - пошук у пам'яті, ширше - один прохід
+        по idx_call_tracking_match.
+        """
+        if start_time_window <= self.pending.ttl:
+            self._refresh_pending()
+            call = self.pending.by_target(target_number, start_time_window, statuses)
+            return _public_call(call) if call else None
+        try:
+            time_start = int(time.time()) - start_time_window
+            placeholders = ', '.join('?' * len(statuses))
+            row = self.pool.connection().execute(f'''
+                SELECT {_CALL_COLUMNS}
+                FROM call_tracking
+                WHERE target_nsn = ? AND status IN ({placeholders}) AND start_time > ?
+                ORDER BY start_time DESC
+                LIMIT 1
+            ''', (national_number(target_number),) + tuple(statuses) + (time_start,)).fetchone()
+            return _call_row(row) if row else None
             
         except Exception as e:
-            logger.error(f"❌ Помилка отримання дзвінка по PBX ID: {e}")
+            logger.error(f"❌ Помилка отримання дзвінка по номеру і часу: {e}")
             return None
 
-    def get_call_by_target_and_time(self, target_number, start_time_window=60):
-        """Отримує дані дзвінка по номеру телефону і часовому вікну"""
+    def get_joined_calls(self, call_id):
+        """Запити, що приєдналися до дзвінка call_id (для розсилки результату)"""
+        self.flush()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            rows = self.pool.connection().execute(f'''
+                SELECT {_CALL_COLUMNS}
+                FROM call_tracking
+                WHERE joined_to = ?
+                ORDER BY start_time
+            ''', (call_id,)).fetchall()
+            return [_call_row(row) for row in rows]
+
+        except Exception as e:
+            logger.error(f"❌ Помилка отримання приєднаних запитів: {e}")
+            return []
+
+    def get_recent_calls(self, time_window_seconds=300):
+        """
+        Отримує всі дзвінки за останній період
+        
+        Args:
+            time_window_seconds: Вікно часу в секундах (за замовчуванням 5 хвилин)
+        
+        Returns:
+            list: Список дзвінків, новіші першими
+        """
+        self.flush()
+        try:
+            cutoff_time = int(time.time()) - time_window_seconds
+            rows = self.pool.connection().execute(f'''
+                SELECT {_CALL_COLUMNS}
+                FROM call_tracking 
+                WHERE start_time > ?
+                ORDER BY start_time DESC
+            ''', (cutoff_time,)).fetchall()
+            return [_call_row(row) for row in rows]
             
-            current_time = int(time.time())
-            time_start = current_time - start_time_window
+        except Exception as e:
+            logger.error(f"❌ Помилка отримання нещодавніх дзвінків: {e}")
+            return []
+
+    def get_call_statistics(self, days=7):
+        """Статистика відстежених дзвінків за вказаний період"""
+        self.flush()
+        try:
+            cutoff_time = int(time.time()) - days * 24 * 3600
+            rows = self.pool.connection().execute('''
+                SELECT status, action_type, COUNT(*) as count
+                FROM call_tracking 
+                WHERE start_time > ?
+                GROUP BY status, action_type
+                ORDER BY count DESC
+            ''', (cutoff_time,)).fetchall()
+            
+            stats = {
+                'total_calls': 0,
+                'success_rate': 0,
+                'by_status': {},
+                'by_action': {'hvirtka': 0, 'vorota': 0},
+                'period_days': days
+            }
             
-            query = "SELECT call_id, user_id, chat_id, action_type, target_number, start_time, status FROM call_tracking WHERE target_number = ? AND start_time > ? AND status = 'api_success' ORDER BY start_time DESC LIMIT 1"
-            cursor.execute(query, (target_number, time_start))
+            for status, action_type, count in rows:
+                stats['total_calls'] += count
+                stats['by_status'][status] = stats['by_status'].get(status, 0) + count
+                if action_type in stats['by_action']:
+                    stats['by_action'][action_type] += count
             
-            result = cursor.fetchone()
-            conn.close()
+            success_count = stats['by_status'].get('success', 0)
+            if stats['total_calls'] > 0:
+                stats['success_rate'] = round((success_count / stats['total_calls']) * 100, 1)
             
-            if result:
-                return {
-                    'call_id': result[0],
-                    'user_id': result[1], 
-                    'chat_id': result[2],
-                    'action_type': result[3],
-                    'target_number': result[4],
-                    'start_time': result[5],
-                    'status': result[6]
-                }
-            return None
+            return stats
             
         except Exception as e:
-            logger.error(f"❌ Помилка отримання дзвінка по номеру і часу: {e}")
+            logger.error(f"❌ Помилка отримання статистики: {e}")
             return None
     
     def cleanup_old_calls(self, hours=24):
         """Очищує старі записи дзвінків"""
+        self.flush()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             cutoff_time = int(time.time()) - (hours * 3600)
-            
-            cursor.execute('''
-                DELETE FROM call_tracking 
-                WHERE start_time < ?
-            ''', (cutoff_time,))
-            
-            deleted_count = cursor.rowcount
-            conn.commit()
-            conn.close()
+            with self.pool.transaction() as conn:
+                deleted_count = conn.execute('''
+                    DELETE FROM call_tracking 
+                    WHERE start_time < ?
+                ''', (cutoff_time,)).rowcount
             
             if deleted_count > 0:
                 logger.info(f"🧹 Очищено {deleted_count} старих записів дзвінків")
@@ -277,146 +377,15 @@ class CallTracker:
 
 # Глобальний трекер
 call_tracker = CallTracker()
-    # Додайте ці методи в клас CallTracker в файлі zadarma_api_webhook.py
 
-def get_recent_calls(self, time_window_seconds=300):
-    """
-    Отримує всі дзвінки за останній період
-    
-    Args:
-        time_window_seconds: Вікно часу в секундах (за замовчуванням 5 хвилин)
-    
-    Returns:
-        list: Список дзвінків
+def send_telegram_message(chat_id, message):
     """
-    try:
-        current_time = time.time()
-        cutoff_time = current_time - time_window_seconds
-        
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT call_id, chat_id, target_number, action_type, timestamp, status, pbx_call_id
-            FROM call_tracking 
-            WHERE timestamp > ?
-            ORDER BY timestamp DESC
-        """, (cutoff_time,))
-        
-        calls = []
-        for row in cursor.fetchall():
-            calls.append({
-                'call_id': row[0],
-                'chat_id': row[1], 
-                'target_number': row[2],
-                'action_type': row[3],
-                'timestamp': row[4],
-                'status': row[5],
-                'pbx_call_id': row[6]
-            })
-        
-        return calls
-        
-    except Exception as e:
-        logger.error(f"❌ Помилка отримання нещодавніх дзвінків: {e}")
-        return []
+    Ставить повідомлення в чергу telegram_sender і одразу повертається
 
-def get_call_by_target_and_time(self, target_number, time_window_seconds=120):
-    """
-    Покращена функція пошуку дзвінка по номеру та часу
-    
-    Args:
-        target_number: Цільовий номер телефону
-        time_window_seconds: Вікно часу для пошуку
-    
-    Returns:
-        dict або None: Дані дзвінка
+    Повтори, 429 retry_after та ліміти чату виконує фоновий відправник,
+    тому webhook_worker не блокується на мережі.
     """
-    try:
-        current_time = time.time()
-        cutoff_time = current_time - time_window_seconds
-        
-        cursor = self.conn.cursor()
-        
-        # Шукаємо по точній відповідності
-        cursor.execute("""
-            SELECT call_id, chat_id, target_number, action_type, timestamp, status, pbx_call_id
-            FROM call_tracking 
-            WHERE target_number = ? AND timestamp > ? AND status IN ('pending', 'api_success')
-            ORDER BY timestamp DESC
-            LIMIT 1
-        """, (target_number, cutoff_time))
-        
-        row = cursor.fetchone()
-        if row:
-            return {
-                'call_id': row[0],
-                'chat_id': row[1],
-                'target_number': row[2], 
-                'action_type': row[3],
-                'timestamp': row[4],
-                'status': row[5],
-                'pbx_call_id': row[6]
-            }
-        
-        # Якщо не знайдено точної відповідності, шукаємо по частковій
-        # Нормалізуємо номер для пошуку
-        normalized_target = target_number.lstrip('0').lstrip('38')
-        
-        cursor.execute("""
-            SELECT call_id, chat_id, target_number, action_type, timestamp, status, pbx_call_id
-            FROM call_tracking 
-            WHERE (target_number LIKE ? OR target_number LIKE ?) 
-            AND timestamp > ? AND status IN ('pending', 'api_success')
-            ORDER BY timestamp DESC
-            LIMIT 1
-        """, (f'%{normalized_target}', f'%{target_number}%', cutoff_time))
-        
-        row = cursor.fetchone()
-        if row:
-            return {
-                'call_id': row[0],
-                'chat_id': row[1],
-                'target_number': row[2],
-                'action_type': row[3], 
-                'timestamp': row[4],
-                'status': row[5],
-                'pbx_call_id': row[6]
-            }
-        
-        return None
-        
-    except Exception as e:
-        logger.error(f"❌ Помилка пошуку дзвінка по номеру {target_number}: {e}")
-        return None
-
-def send_telegram_message(chat_id, message):
-    """Відправляє повідомлення в Telegram з HTML форматуванням та retry логікою"""
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": chat_id, 
-        "text": message,
-        "parse_mode": "HTML",
-        "disable_web_page_preview": True
-    }
-    
-    # Спробуємо 3 рази з паузами
-    for attempt in range(3):
-        try:
-            response = requests.post(url, data=payload, timeout=15)
-            if response.status_code == 200:
-                logger.info(f"📤 Повідомлення відправлено в чат {chat_id}")
-                return True
-            else:
-                logger.warning(f"⚠️ Помилка відправки (спроба {attempt + 1}): код {response.status_code}")
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-            logger.warning(f"⚠️ Мережева помилка відправки (спроба {attempt + 1}): {e}")
-            if attempt < 2:  # Пауза тільки між спробами
-                time.sleep(2)
-        except Exception as e:
-            logger.error(f"❌ Критична помилка надсилання повідомлення: {e}")
-            break
-    
-    logger.error(f"❌ Не вдалося відправити повідомлення після 3 спроб")
-    return False
+    return telegram_sender.send_message(chat_id, message)
 
 def send_error_to_admin(message):
     """Відправляє повідомлення про помилку адміну"""
@@ -434,8 +403,12 @@ def make_zadarma_call_with_tracking(to_number: str, user_id: int, chat_id: int,
         
     Returns:
         dict: результат з полями success, call_id, message
+              (joined - call_id дзвінка, до якого приєднався запит)
+
+    Поки на номер вже йде callback (COALESCE_WINDOW без NOTIFY_END), новий
+    запит не робить власного, а приєднується - результат прийде всім.
     """
-    logger.info(f"📞 Робимо дзвінок з відстеженням на номер: {to_number}")
+    logger.info("📞 Робимо дзвінок з відстеженням на номер: %s", to_number)
     
     # Валідація номеру
     if not validate_phone_number(to_number):
@@ -445,12 +418,60 @@ def make_zadarma_call_with_tracking(to_number: str, user_id: int, chat_id: int,
     
     # Форматуємо номер призначення
     formatted_to = format_phone_for_zadarma(to_number)
-    logger.info(f"📞 Відформатований номер TO: {formatted_to}")
+    logger.debug("📞 Відформатований номер TO: %s", formatted_to)
     
     # Використовуємо основний номер
     from_number = ZADARMA_MAIN_PHONE
-    logger.info(f"📞 Використовуємо FROM номер: {from_number}")
+    logger.debug("📞 Використовуємо FROM номер: %s", from_number)
     
+    # Перевірка "чи вже є дзвінок" і запит callback - під локом номера,
+    # тож одночасні запити не зроблять два callback-и
+    with target_locks.lock(formatted_to):
+        joined = _join_in_flight(formatted_to, user_id, chat_id, action_type)
+        if joined:
+            return joined
+        target_locks.count('callbacks')
+        return _request_callback(formatted_to, from_number, user_id, chat_id, action_type)
+
+
+def _join_in_flight(formatted_to, user_id, chat_id, action_type):
+    """Приєднує запит до дзвінка на той самий номер, якщо він ще без результату"""
+    leader = call_tracker.get_call_by_target_and_time(formatted_to, COALESCE_WINDOW, COALESCE_STATUSES)
+    if leader is None:
+        return None
+
+    joined = {
+        "success": True,
+        "call_id": leader['call_id'],
+        "joined": leader['call_id'],
+        "message": "Дзвінок на цей номер вже виконується - результат прийде і вам"
+    }
+    subscribed = [leader] + call_tracker.get_joined_calls(leader['call_id'])
+    if chat_id in [call['chat_id'] for call in subscribed]:
+        return joined  # цей чат уже отримає результат
+
+    call_id = f"{user_id}_{int(time.time())}_j"
+    call_tracker.register_call(call_id, user_id, chat_id, action_type, formatted_to, joined_to=leader['call_id'])
+    target_locks.count('joined')
+    logger.info("🔗 Запит %s приєднано до дзвінка %s на %s", call_id, leader['call_id'], formatted_to)
+    joined['call_id'] = call_id
+    return joined
+
+
+def join_call_in_flight(to_number, user_id, chat_id, action_type):
+    """
+    Приєднує запит до дзвінка, що вже виконується на to_number, без нового callback-а
+
+    Для обробників команд: ліміт пристрою відмовив би користувачу, хоча
+    результат поточного дзвінка відповідає і на його запит. None - дзвінка немає.
+    """
+    formatted_to = format_phone_for_zadarma(to_number)
+    with target_locks.lock(formatted_to):
+        return _join_in_flight(formatted_to, user_id, chat_id, action_type)
+
+
+def _request_callback(formatted_to, from_number, user_id, chat_id, action_type):
+    """Запит /v1/request/callback/ з реєстрацією дзвінка для webhook-а"""
     try:
         params = {
             "from": from_number,
@@ -476,26 +497,18 @@ def make_zadarma_call_with_tracking(to_number: str, user_id: int, chat_id: int,
             call_tracker.update_call_status(call_id, 'failed')
             return {"success": False, "message": error_msg}
         
-        logger.info("🔍 CRITICAL: Before status check")
-        logger.info("🔍 CRITICAL: result type: " + str(type(result)))
-        logger.info("🔍 CRITICAL: result content: " + str(result))
-        status_val = result.get("status")
-        logger.info("🔍 CRITICAL: status value: " + str(status_val))
+        logger.debug("🔍 Відповідь callback: %s", result)
         if result.get("status") == "success":
-            logger.info(f"✅ Успішний запит дзвінка з {from_number} на {formatted_to}")
-            logger.info(f"📋 Повна відповідь: {result}")
-            logger.info('🔍 DEBUG: Before API time processing')
+            logger.info("✅ Успішний запит дзвінка з %s на %s", from_number, formatted_to)
             
             # Отримуємо time з відповіді API (якщо є)
             api_time = result.get('time')
             if api_time:
                 # Можемо використати цей час для кращого відстеження
-                logger.info(f"📅 API час: {api_time}")
+                logger.debug("📅 API час: %s", api_time)
             
             # Оновлюємо статус в базі
-            logger.info('🔍 DEBUG: Before update_call_status')
             call_tracker.update_call_status(call_id, 'api_success')
-            logger.info('🔍 DEBUG: After update_call_status')
             
             return {
                 "success": True, 
@@ -519,6 +532,72 @@ def make_zadarma_call_with_tracking(to_number: str, user_id: int, chat_id: int,
             pass
         return {"success": False, "message": error_msg}
 
+# Номери з webhook, в яких може бути цільовий номер дзвінка
+WEBHOOK_NUMBER_FIELDS = ('destination', 'called_did', 'caller_id')
+FUZZY_MATCH_WINDOW = 120  # секунд - вікно пошуку за номером, якщо pbx_call_id невідомий
+
+_correlation_lock = threading.Lock()
+_correlation_stats = {'start_linked': 0, 'start_unmatched': 0, 'exact': 0, 'fuzzy': 0, 'unmatched': 0}
+
+
+def _count_correlation(key):
+    with _correlation_lock:
+        _correlation_stats[key] += 1
+
+
+def get_correlation_stats():
+    """
+    Лічильники зіставлення webhook-ів з дзвінками
+
+    exact - NOTIFY_END знайдено за pbx_call_id (прив'язаним на NOTIFY_START),
+    fuzzy - лише за номером і часом; exact_ratio - частка точних серед знайдених
+    """
+    with _correlation_lock:
+        stats = dict(_correlation_stats)
+    matched = stats['exact'] + stats['fuzzy']
+    stats['exact_ratio'] = round(stats['exact'] / matched, 3) if matched else None
+    return stats
+
+
+def _find_call_by_numbers(webhook_data, window=FUZZY_MATCH_WINDOW):
+    """Очікуваний дзвінок за будь-яким номером з webhook (NSN) - по одному зверненню до індексу"""
+    for field in WEBHOOK_NUMBER_FIELDS:
+        number = webhook_data.get(field, '')
+        if national_number(number):
+            call_data = call_tracker.get_call_by_target_and_time(number, window)
+            if call_data:
+                return call_data
+    return None
+
+
+def link_call_start(webhook_data):
+    """
+    NOTIFY_START: прив'язує pbx_call_id до очікуваного дзвінка
+
+    Після цього NOTIFY_END знаходить дзвінок одним пошуком за pbx_call_id.
+    Статус не змінюється - дзвінок і далі доступний для пошуку за номером.
+    """
+    pbx_call_id = webhook_data.get('pbx_call_id', '')
+    if not pbx_call_id:
+        return None
+    if call_tracker.get_call_by_pbx_id(pbx_call_id):
+        return None  # вже прив'язано (повторний START)
+
+    call_data = _find_call_by_numbers(webhook_data)
+    if call_data is None:
+        _count_correlation('start_unmatched')
+        return None
+    if call_data.get('pbx_call_id'):
+        logger.warning(f"⚠️ Дзвінок {call_data['call_id']} вже прив'язано до {call_data['pbx_call_id']}, "
+                       f"START {pbx_call_id} пропущено")
+        return None
+
+    call_tracker.update_call_status(call_data['call_id'], call_data['status'], pbx_call_id)
+    _count_correlation('start_linked')
+    logger.info(f"🔗 START: PBX ID {pbx_call_id} прив'язано до дзвінка {call_data['call_id']}")
+    return call_data
+
+
 def process_webhook_call_status(webhook_data):
     """
     Обробляє webhook події від Zadarma про статус дзвінків
@@ -533,32 +612,24 @@ def process_webhook_call_status(webhook_data):
         logger.info(f"🔔 Webhook подія: {event}, PBX ID: {pbx_call_id}, Disposition: {disposition}")
         
         if event == 'NOTIFY_END':
-            # Спочатку шукаємо по PBX ID
-            call_data = call_tracker.get_call_by_pbx_id(pbx_call_id)
-            
-            # Якщо не знайдено, шукаємо по номеру телефону і часу
-            if not call_data:
-                # Визначаємо номер телефону з webhook даних
-                caller_id = webhook_data.get('caller_id', '')
-                called_did = webhook_data.get('called_did', '')
-                
-                # Нормалізуємо номери  
-                target_number = None
-                if '0637442017' in caller_id or '0637442017' in called_did:
-                    target_number = '0637442017'
-                elif '0930063585' in caller_id or '0930063585' in called_did:
-                    target_number = '0930063585'
-                
-                if target_number:
-                    call_data = call_tracker.get_call_by_target_and_time(target_number, 120)
-                    if call_data:
-                        logger.info(f"📞 Знайдено дзвінок по номеру {target_number}: {call_data['call_id']}")
+            # Спочатку шукаємо по PBX ID (прив'язаному на NOTIFY_START)
+            call_data = call_tracker.get_call_by_pbx_id(pbx_call_id) if pbx_call_id else None
+            if call_data:
+                _count_correlation('exact')
+            else:
+                # START не прийшов або не зіставився - шукаємо по номеру телефону і часу
+                call_data = _find_call_by_numbers(webhook_data)
+                if call_data:
+                    _count_correlation('fuzzy')
+                    logger.info(f"📞 Знайдено дзвінок по номеру: {call_data['call_id']}")
+                else:
+                    _count_correlation('unmatched')
+            logger.info(f"📊 Зіставлення webhook-ів: {get_correlation_stats()}")
             
             if call_data:
                 logger.info(f"📞 Знайдено відстежуваний дзвінок: {call_data['call_id']}")
                 
                 action_name = "хвіртку" if call_data['action_type'] == 'hvirtka' else "ворота"
-                chat_id = call_data['chat_id']
                 
                 # Аналізуємо результат дзвінка
                 if disposition == 'cancel' and duration > 0:
@@ -599,22 +670,27 @@ def process_webhook_call_status(webhook_data):
                     status = 'failed'
                     logger.warning(f"❌ FAILED: {action_name} - {disposition}")
                 
-                # Відправляємо результат користувачу
-                send_telegram_message(chat_id, message)
+                # Відправляємо результат ініціатору і всім, хто приєднався до дзвінка
+                joined_calls = call_tracker.get_joined_calls(call_data['call_id'])
+                chats = subscriber_chats(call_data, joined_calls)
+                for subscriber in chats:
+                    send_telegram_message(subscriber, message)
                 
                 # Оновлюємо статус в базі
                 call_tracker.update_call_status(call_data['call_id'], status, pbx_call_id)
+                for joined in joined_calls:
+                    if joined['status'] == 'joined':
+                        call_tracker.update_call_status(joined['call_id'], status)
                 
-                logger.info(f"📤 Результат відправлено користувачу: {status}")
+                logger.info(f"📤 Результат відправлено {len(chats)} користувачам: {status}")
                 
                 return {"success": True, "status": status, "message": message}
             else:
                 logger.info(f"ℹ️ Дзвінок {pbx_call_id} не відстежується нашою системою")
                 
         elif event == 'NOTIFY_START':
-            # Для початку дзвінка можемо оновити PBX call ID якщо знаходимо відповідний дзвінок
-            # Поки що просто логуємо
             logger.info(f"📞 START: PBX ID {pbx_call_id}")
+            link_call_start(webhook_data)
         
         return {"success": True, "message": "Webhook processed"}
         
@@ -701,56 +777,5 @@ def start_cleanup_scheduler():
 # Ініціалізація при імпорті
 if __name__ != "__main__":
     start_cleanup_scheduler()
-def get_call_statistics(days=7):
-    """
-    Отримує статистику дзвінків за вказаний період
-    """
-    try:
-        import time
-        current_time = time.time()
-        cutoff_time = current_time - (days * 24 * 3600)
-        
-        cursor = call_tracker.conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                status,
-                action_type,
-                COUNT(*) as count
-            FROM call_tracking 
-            WHERE timestamp > ?
-            GROUP BY status, action_type
-            ORDER BY count DESC
-        """, (cutoff_time,))
-        
-        stats = {
-            'total_calls': 0,
-            'success_rate': 0,
-            'by_status': {},
-            'by_action': {'hvirtka': 0, 'vorota': 0},
-            'period_days': days
-        }
-        
-        for row in cursor.fetchall():
-            status, action_type, count = row
-            stats['total_calls'] += count
-            
-            if status not in stats['by_status']:
-                stats['by_status'][status] = 0
-            stats['by_status'][status] += count
-            
-            if action_type in stats['by_action']:
-                stats['by_action'][action_type] += count
-        
-        success_count = stats['by_status'].get('success', 0)
-        if stats['total_calls'] > 0:
-            stats['success_rate'] = round((success_count / stats['total_calls']) * 100, 1)
-        
-        return stats
-        
-    except Exception as e:
-        logger.error(f"❌ Помилка отримання статистики: {e}")
-        return None
-
 # ВИПРАВЛЕННЯ 2025-08-06: Змінено логіку успішності дзвінків
 # Успіх тепер = duration > 0 (були гудки) AND disposition = 'cancel' (скинули)
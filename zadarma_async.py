@@ -0,0 +1,241 @@
+# zadarma_async.py - Asyncio клієнт Zadarma API з пулом keep-alive з'єднань
+"""
+AsyncZadarmaAPI - асинхронна пара до ZadarmaAPI (той самий підпис
+build_auth_header). Кілька запитів до Zadarma (баланс, статистика,
+callback) виконуються одночасно в одному потоці замість потоку на запит.
+
+HTTP/1.1 клієнт побудований на asyncio streams: aiohttp немає в
+requirements.txt і на хостингу з Python 3.6 його не встановити, а
+для api.zadarma.com вистачає GET/POST з Content-Length/chunked.
+
+    api = AsyncZadarmaAPI(ZADARMA_API_KEY, ZADARMA_API_SECRET)
+    balance, stats = loop.run_until_complete(asyncio.gather(
+        api.balance(), api.statistics(start, end)))
+"""
+
+import ssl
+import json
+import time
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+from http_session import DEFAULT_POOL_SIZE, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from zadarma_client import build_params_string, build_auth_header, is_idempotent
+
+logger = logging.getLogger(__name__)
+
+MAX_RESPONSE_SIZE = 10 * 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class AsyncResponse:
+    """Відповідь у форматі, схожому на requests.Response"""
+
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = body
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncHTTPPool:
+    """
+    Пул keep-alive з'єднань до одного хоста
+
+    Не більше max_connections одночасних з'єднань; вільні з'єднання
+    повертаються в пул і використовуються наступними запитами.
+    """
+
+    def __init__(self, base_url, max_connections=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self._idle = []
+        self._semaphore = None
+        self.stats = {'requests': 0, 'connections_opened': 0, 'reused': 0}
+
+    def _host_header(self):
+        default_port = 443 if self.scheme == 'https' else 80
+        return self.host if self.port == default_port else f"{self.host}:{self.port}"
+
+    async def _open(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self._ssl),
+            self.connect_timeout
+        )
+        self.stats['connections_opened'] += 1
+        return reader, writer
+
+    async def request(self, method, path, headers=None, body=b'', idempotent=True):
+        """
+        idempotent=False - запит не повторюється, якщо з'єднання обірвалось
+        після відправки (сервер міг його вже виконати)
+        """
+        if self._semaphore is None:
+            # Семафор створюється в циклі подій, який виконує запити
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+
+        async with self._semaphore:
+            self.stats['requests'] += 1
+            conn = self._take_idle()
+            if conn is not None:
+                self.stats['reused'] += 1
+                try:
+                    return await self._send(conn, method, path, headers, body)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not idempotent:
+                        raise
+                    # Сервер закрив неактивне з'єднання - повторюємо на новому
+                    logger.debug(f"🔌 Keep-alive з'єднання з {self.host} закрите сервером, відкриваємо нове")
+            conn = await self._open()
+            return await self._send(conn, method, path, headers, body)
+
+    def _take_idle(self):
+        """Вільне з'єднання, яке сервер ще не закрив (None - відкривати нове)"""
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if reader.at_eof() or writer.transport.is_closing():
+                # Закриття вже отримано - запит по ньому навіть не відправляємо
+                writer.close()
+                continue
+            return reader, writer
+        return None
+
+    async def _send(self, conn, method, path, headers, body):
+        reader, writer = conn
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self._host_header()}",
+                 "Connection: keep-alive", f"Content-Length: {len(body)}"]
+        for name, value in (headers or {}).items():
+            if value is not None:
+                lines.append(f"{name}: {value}")
+        try:
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+            status, response_headers, response_body = await asyncio.wait_for(
+                self._read_response(reader), self.read_timeout)
+        except BaseException:
+            writer.close()
+            raise
+
+        if response_headers.get('connection', '').lower() == 'close':
+            writer.close()
+        else:
+            self._idle.append(conn)
+        return AsyncResponse(status, response_headers, response_body)
+
+    async def _read_response(self, reader):
+        status_line = await reader.readuntil(b'\r\n')
+        status = int(status_line.split(b' ', 2)[1])
+
+        headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readuntil(b'\r\n')
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            # Без довжини тіло триває до закриття з'єднання - read() повертає
+            # лише те, що вже надійшло, тож читаємо до EOF
+            chunks = []
+            size = 0
+            while True:
+                chunk = await reader.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_RESPONSE_SIZE:
+                    raise ValueError(f"Відповідь {self.host} більша за {MAX_RESPONSE_SIZE} байт")
+                chunks.append(chunk)
+            body = b''.join(chunks)
+            headers['connection'] = 'close'
+        return status, headers, body
+
+    def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+class AsyncZadarmaAPI:
+    def __init__(self, key, secret, is_sandbox=False, max_connections=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 base_url=None):
+        self.key = key
+        self.secret = secret
+        self.is_sandbox = is_sandbox
+        if base_url is None:
+            base_url = 'https://api-sandbox.zadarma.com' if is_sandbox else 'https://api.zadarma.com'
+        self.pool = AsyncHTTPPool(base_url, max_connections, connect_timeout, read_timeout)
+
+    async def call(self, method, params=None, request_type='GET', format='json', is_auth=True):
+        """Асинхронний аналог ZadarmaAPI.call - повертає AsyncResponse"""
+        request_type = request_type.upper()
+        if request_type not in ['GET', 'POST', 'PUT', 'DELETE']:
+            request_type = 'GET'
+
+        params = dict(params or {})
+        params['format'] = format
+        params_string = build_params_string(params)
+        headers = {}
+        if is_auth:
+            headers['Authorization'] = build_auth_header(self.key, self.secret, method, params_string)
+
+        # callback не повторюємо після відправки - інакше другий дзвінок на пристрій
+        idempotent = is_idempotent(method, request_type)
+        started = time.time()
+        if request_type == 'GET':
+            path = method + ('?' + params_string if params_string else '')
+            response = await self.pool.request('GET', path, headers, idempotent=idempotent)
+        else:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            response = await self.pool.request(request_type, method, headers, params_string.encode('utf-8'),
+                                               idempotent=idempotent)
+
+        logger.debug(f"📡 Zadarma async {method}: {response.status_code} за {time.time() - started:.3f}с")
+        return response
+
+    async def _call_json(self, method, params=None):
+        response = await self.call(method, params, 'GET')
+        return response.json()
+
+    async def callback(self, from_number, to_number):
+        return await self._call_json('/v1/request/callback/', {'from': from_number, 'to': to_number})
+
+    async def statistics(self, start, end):
+        return await self._call_json('/v1/statistics/', {'start': start, 'end': end})
+
+    async def pbx_statistics(self, start, end):
+        return await self._call_json('/v1/statistics/pbx/', {'start': start, 'end': end})
+
+    async def balance(self):
+        return await self._call_json('/v1/info/balance/')
+
+    def close(self):
+        self.pool.close()
@@ -2,34 +2,19 @@
 import logging
 import time
 from telegram import ChatAction
-from zadarma_api_webhook import make_zadarma_call_with_tracking, send_error_to_admin
+from zadarma_api_webhook import make_zadarma_call_with_tracking, join_call_in_flight, send_error_to_admin
 from config import HVIRTKA_NUMBER, VOROTA_NUMBER
+from rate_limiter import call_limiter, rejection_message
 
 logger = logging.getLogger(__name__)
 
-# Rate limiting для запобігання спаму
-user_last_call = {}
-CALL_COOLDOWN = 10  # секунд між дзвінками
-
-def check_rate_limit(user_id):
-    """Перевіряє чи може користувач зробити дзвінок (rate limiting)"""
-    current_time = time.time()
-    last_call_time = user_last_call.get(user_id, 0)
-    
-    if current_time - last_call_time < CALL_COOLDOWN:
-        remaining = CALL_COOLDOWN - (current_time - last_call_time)
-        return False, remaining
-    
-    user_last_call[user_id] = current_time
-    return True, 0
-
 def handle_gate_command(bot, update):
     """Покращений обробник команди відкриття воріт"""
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
     username = update.effective_user.username or "без_username"
     
-    logger.info(f"🚪 /vorota викликано користувачем: {user_id} (@{username})")
+    logger.info("🚪 /vorota викликано користувачем: %s (@%s)", user_id, username)
     
     # 🔒 ПЕРЕВІРКА АВТОРИЗАЦІЇ
     from user_db import is_authorized_user_simple
@@ -42,14 +27,24 @@ def handle_gate_command(bot, update):
         logger.warning(f"❌ НЕАВТОРИЗОВАНИЙ користувач {user_id} спробував відкрити ворота!")
         return
     
+    # 🔗 Дзвінок на цей пристрій вже виконується - приєднуємося до його результату
+    joined = join_call_in_flight(VOROTA_NUMBER, user_id, chat_id, "vorota")
+    if joined:
+        bot.send_message(
+            chat_id=chat_id,
+            text="🔑 Ворота вже відчиняються за іншим запитом - результат прийде і вам."
+        )
+        logger.info(f"🔗 Користувач {user_id} приєднався до дзвінка {joined['joined']}")
+        return
+    
     # 🕐 ПЕРЕВІРКА RATE LIMITING
-    can_call, remaining = check_rate_limit(user_id)
-    if not can_call:
+    decision = call_limiter.acquire(user_id, VOROTA_NUMBER)
+    if not decision.allowed:
         bot.send_message(
             chat_id=chat_id,
-            text=f"⏳ Зачекайте {int(remaining)} секунд перед наступним дзвінком"
+            text=rejection_message(decision)
         )
-        logger.info(f"⏳ Rate limit для користувача {user_id}: залишилось {remaining:.1f} сек")
+        logger.info(f"⏳ Rate limit ({decision.reason}) для користувача {user_id}: залишилось {decision.retry_after:.1f} сек")
         return
     
     # Змінна для збереження повідомлення що буде оновлюватися
@@ -65,7 +60,7 @@ def handle_gate_command(bot, update):
             text="🔑 Підбираємо ключі…"
         )
         
-        logger.info(f"📞 Ініціюємо дзвінок на ворота: {VOROTA_NUMBER}")
+        logger.debug("📞 Ініціюємо дзвінок на ворота: %s", VOROTA_NUMBER)
         
         # Робимо дзвінок з відстеженням статусу
         call_result = make_zadarma_call_with_tracking(
@@ -82,7 +77,7 @@ def handle_gate_command(bot, update):
                 text="Відкриття воріт ініційовано... 🌆 Очікуйте, будь ласка, світловий сигнал.\n\n⏳ Це може зайняти до 30 секунд."
             )
             
-            logger.info(f"✅ Дзвінок на ворота успішно ініційовано для користувача {user_id}")
+            logger.info("✅ Дзвінок на ворота успішно ініційовано для користувача %s", user_id)
             
             # Система відстеження автоматично відправить фінальне повідомлення
             # коли дзвінок буде скинуто або завершиться з помилкою
@@ -128,6 +123,9 @@ def handle_gate_command(bot, update):
         
         # Повідомляємо адміну про критичну помилку
         send_error_to_admin(f"Критична помилка в handle_gate_command від користувача {user_id}: {str(e)}")
+    finally:
+        # Запит callback завершено - пристрій вільний для наступного дзвінка
+        call_limiter.release(VOROTA_NUMBER)
 
 def handle_door_command(bot, update):
     """Покращений обробник команди відкриття хвіртки"""
@@ -135,7 +133,7 @@ def handle_door_command(bot, update):
     user_id = update.effective_user.id
     username = update.effective_user.username or "без_username"
     
-    logger.info(f"🚪 /hvirtka викликано користувачем: {user_id} (@{username})")
+    logger.info("🚪 /hvirtka викликано користувачем: %s (@%s)", user_id, username)
     
     # 🔒 ПЕРЕВІРКА АВТОРИЗАЦІЇ
     from user_db import is_authorized_user_simple
@@ -148,14 +146,24 @@ def handle_door_command(bot, update):
         logger.warning(f"❌ НЕАВТОРИЗОВАНИЙ користувач {user_id} спробував відкрити хвіртку!")
         return
     
+    # 🔗 Дзвінок на цей пристрій вже виконується - приєднуємося до його результату
+    joined = join_call_in_flight(HVIRTKA_NUMBER, user_id, chat_id, "hvirtka")
+    if joined:
+        bot.send_message(
+            chat_id=chat_id,
+            text="🔑 Хвіртка вже відчиняється за іншим запитом - результат прийде і вам."
+        )
+        logger.info(f"🔗 Користувач {user_id} приєднався до дзвінка {joined['joined']}")
+        return
+    
     # 🕐 ПЕРЕВІРКА RATE LIMITING
-    can_call, remaining = check_rate_limit(user_id)
-    if not can_call:
+    decision = call_limiter.acquire(user_id, HVIRTKA_NUMBER)
+    if not decision.allowed:
         bot.send_message(
             chat_id=chat_id,
-            text=f"⏳ Зачекайте {int(remaining)} секунд перед наступним дзвінком"
+            text=rejection_message(decision)
         )
-        logger.info(f"⏳ Rate limit для користувача {user_id}: залишилось {remaining:.1f} сек")
+        logger.info(f"⏳ Rate limit ({decision.reason}) для користувача {user_id}: залишилось {decision.retry_after:.1f} сек")
         return
     
     # Змінна для збереження повідомлення що буде оновлюватися
@@ -171,7 +179,7 @@ def handle_door_command(bot, update):
             text="🔑 Підбираємо ключі…"
         )
         
-        logger.info(f"📞 Ініціюємо дзвінок на хвіртку: {HVIRTKA_NUMBER}")
+        logger.debug("📞 Ініціюємо дзвінок на хвіртку: %s", HVIRTKA_NUMBER)
         
         # Робимо дзвінок з відстеженням статусу
         call_result = make_zadarma_call_with_tracking(
@@ -188,7 +196,7 @@ def handle_door_command(bot, update):
                 text="Відкриття хвіртки ініційовано... 📢 Очікуйте, будь-ласка, звуковий сигнал.\n\n⏳ Це може зайняти до 30 секунд."
             )
             
-            logger.info(f"✅ Дзвінок на хвіртку успішно ініційовано для користувача {user_id}")
+            logger.info("✅ Дзвінок на хвіртку успішно ініційовано для користувача %s", user_id)
             
             # Система відстеження автоматично відправить фінальне повідомлення
             
@@ -233,6 +241,9 @@ def handle_door_command(bot, update):
         
         # Повідомляємо адміну про критичну помилку
         send_error_to_admin(f"Критична помилка в handle_door_command від користувача {user_id}: {str(e)}")
+    finally:
+        # Запит callback завершено - пристрій вільний для наступного дзвінка
+        call_limiter.release(HVIRTKA_NUMBER)
 
 # Додаткові функції для адміністрування
 
@@ -250,6 +261,7 @@ def get_call_stats_for_admin():
         'active_calls': active_count,
         'total_history': history_count,
         'recent_calls': recent_calls,
+        'rate_limiter': call_limiter.stats(),
         'current_time': time.time()
     }
     
@@ -261,6 +273,13 @@ def format_call_stats_message(stats):
     message += f"🔄 Активних дзвінків: {stats['active_calls']}\n"
     message += f"📋 Всього в історії: {stats['total_history']}\n\n"
     
+    limiter = stats.get('rate_limiter')
+    if limiter:
+        rejected = limiter['rejected_user'] + limiter['rejected_target'] + limiter['rejected_in_flight']
+        message += f"🚦 Ліміт дзвінків: дозволено {limiter['allowed']}, відхилено {rejected} "
+        message += f"(користувач {limiter['rejected_user']}, пристрій {limiter['rejected_target']}, "
+        message += f"одночасні {limiter['rejected_in_flight']})\n\n"
+    
     if stats['recent_calls']:
         message += "<b>Останні 10 дзвінків:</b>\n"
         for call in stats['recent_calls']:
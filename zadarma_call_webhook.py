@@ -5,31 +5,16 @@ from telegram import ChatAction
 
 # Вибираємо правильний імпорт залежно від доступного модуля
 try:
-    from zadarma_api_webhook import make_zadarma_call_with_tracking, send_error_to_admin
+    from zadarma_api_webhook import make_zadarma_call_with_tracking, join_call_in_flight, send_error_to_admin
     logger = logging.getLogger(__name__)
     logger.info("✅ Використовуємо zadarma_api_webhook (нова версія)")
 except ImportError:
     logger = logging.getLogger(__name__)
     logger.warning("⚠️ zadarma_api_webhook недоступний, використовуємо стару версію")
-    from zadarma_api import make_zadarma_call_with_tracking, send_error_to_admin
+    from zadarma_api import make_zadarma_call_with_tracking, join_call_in_flight, send_error_to_admin
 
 from config import HVIRTKA_NUMBER, VOROTA_NUMBER
-
-# Rate limiting для запобігання спаму
-user_last_call = {}
-CALL_COOLDOWN = 10  # секунд між дзвінками
-
-def check_rate_limit(user_id):
-    """Перевіряє чи може користувач зробити дзвінок (rate limiting)"""
-    current_time = time.time()
-    last_call_time = user_last_call.get(user_id, 0)
-    
-    if current_time - last_call_time < CALL_COOLDOWN:
-        remaining = CALL_COOLDOWN - (current_time - last_call_time)
-        return False, remaining
-    
-    user_last_call[user_id] = current_time
-    return True, 0
+from rate_limiter import call_limiter, rejection_message
 
 def handle_gate_command(bot, update):
     """Обробник команди відкриття воріт - WEBHOOK версія"""
@@ -50,14 +35,24 @@ def handle_gate_command(bot, update):
         logger.warning(f"❌ НЕАВТОРИЗОВАНИЙ користувач {user_id} спробував відкрити ворота!")
         return
     
+    # 🔗 Дзвінок на цей пристрій вже виконується - приєднуємося до його результату
+    joined = join_call_in_flight(VOROTA_NUMBER, user_id, chat_id, "vorota")
+    if joined:
+        bot.send_message(
+            chat_id=chat_id,
+            text="🔑 Ворота вже відчиняються за іншим запитом - результат прийде і вам."
+        )
+        logger.info(f"🔗 Користувач {user_id} приєднався до дзвінка {joined['joined']}")
+        return
+    
     # 🕐 ПЕРЕВІРКА RATE LIMITING
-    can_call, remaining = check_rate_limit(user_id)
-    if not can_call:
+    decision = call_limiter.acquire(user_id, VOROTA_NUMBER)
+    if not decision.allowed:
         bot.send_message(
             chat_id=chat_id,
-            text=f"⏳ Зачекайте {int(remaining)} секунд перед наступним дзвінком"
+            text=rejection_message(decision)
         )
-        logger.info(f"⏳ Rate limit для користувача {user_id}: залишилось {remaining:.1f} сек")
+        logger.info(f"⏳ Rate limit ({decision.reason}) для користувача {user_id}: залишилось {decision.retry_after:.1f} сек")
         return
     
     # Змінна для збереження повідомлення що буде оновлюватися
@@ -138,6 +133,9 @@ def handle_gate_command(bot, update):
         
         # Повідомляємо адміну про критичну помилку
         send_error_to_admin(f"Критична помилка в handle_gate_command від користувача {user_id}: {str(e)}")
+    finally:
+        # Запит callback завершено - пристрій вільний для наступного дзвінка
+        call_limiter.release(VOROTA_NUMBER)
 
 def handle_door_command(bot, update):
     """Обробник команди відкриття хвіртки - WEBHOOK версія"""
@@ -158,14 +156,24 @@ def handle_door_command(bot, update):
         logger.warning(f"❌ НЕАВТОРИЗОВАНИЙ користувач {user_id} спробував відкрити хвіртку!")
         return
     
+    # 🔗 Дзвінок на цей пристрій вже виконується - приєднуємося до його результату
+    joined = join_call_in_flight(HVIRTKA_NUMBER, user_id, chat_id, "hvirtka")
+    if joined:
+        bot.send_message(
+            chat_id=chat_id,
+            text="🔑 Хвіртка вже відчиняється за іншим запитом - результат прийде і вам."
+        )
+        logger.info(f"🔗 Користувач {user_id} приєднався до дзвінка {joined['joined']}")
+        return
+    
     # 🕐 ПЕРЕВІРКА RATE LIMITING
-    can_call, remaining = check_rate_limit(user_id)
-    if not can_call:
+    decision = call_limiter.acquire(user_id, HVIRTKA_NUMBER)
+    if not decision.allowed:
         bot.send_message(
             chat_id=chat_id,
-            text=f"⏳ Зачекайте {int(remaining)} секунд перед наступним дзвінком"
+            text=rejection_message(decision)
         )
-        logger.info(f"⏳ Rate limit для користувача {user_id}: залишилось {remaining:.1f} сек")
+        logger.info(f"⏳ Rate limit ({decision.reason}) для користувача {user_id}: залишилось {decision.retry_after:.1f} сек")
         return
     
     # Змінна для збереження повідомлення що буде оновлюватися
@@ -245,6 +253,9 @@ def handle_door_command(bot, update):
         
         # Повідомляємо адміну про критичну помилку
         send_error_to_admin(f"Критична помилка в handle_door_command від користувача {user_id}: {str(e)}")
+    finally:
+        # Запит callback завершено - пристрій вільний для наступного дзвінка
+        call_limiter.release(HVIRTKA_NUMBER)
 
 # Додаткові функції для адміністрування
 
@@ -252,11 +263,10 @@ def get_call_stats_for_admin():
     """Отримує статистику дзвінків для адміна з бази даних"""
     try:
         from zadarma_api_webhook import call_tracker
-        import sqlite3
         
-        # Підключаємося до бази даних відстеження
-        conn = sqlite3.connect(call_tracker.db_path)
-        cursor = conn.cursor()
+        # Постійне з'єднання трекера (WAL) замість нового підключення
+        call_tracker.flush()
+        cursor = call_tracker.pool.connection().cursor()
         
         # Отримуємо статистику
         cursor.execute('''
@@ -280,7 +290,6 @@ def get_call_stats_for_admin():
         ''')
         
         recent_calls = cursor.fetchall()
-        conn.close()
         
         stats = {
             'total_calls': stats_row[0] if stats_row else 0,
@@ -288,6 +297,7 @@ def get_call_stats_for_admin():
             'successful_calls': stats_row[2] if stats_row else 0,
             'failed_calls': stats_row[3] if stats_row else 0,
             'recent_calls': recent_calls,
+            'rate_limiter': call_limiter.stats(),
             'current_time': time.time()
         }
         
@@ -328,6 +338,13 @@ def format_call_stats_message(stats):
     message += f"✅ Успішних: {stats['successful_calls']}\n"
     message += f"❌ Невдалих: {stats['failed_calls']}\n\n"
     
+    limiter = stats.get('rate_limiter')
+    if limiter:
+        rejected = limiter['rejected_user'] + limiter['rejected_target'] + limiter['rejected_in_flight']
+        message += f"🚦 Ліміт дзвінків: дозволено {limiter['allowed']}, відхилено {rejected} "
+        message += f"(користувач {limiter['rejected_user']}, пристрій {limiter['rejected_target']}, "
+        message += f"одночасні {limiter['rejected_in_flight']})\n\n"
+    
     if stats['recent_calls']:
         message += "<b>Останні 10 дзвінків:</b>\n"
         for call in stats['recent_calls']:
@@ -0,0 +1,259 @@
+# zadarma_client.py - Спільний клієнт Zadarma API для zadarma_api.py та zadarma_api_webhook.py
+import time
+import random
+import logging
+import hashlib
+import hmac
+import base64
+import threading
+import functools
+import requests
+from urllib.parse import urlencode
+from collections import OrderedDict
+from http_session import (
+    create_session,
+    warm_up,
+    start_keepalive,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT
+)
+from circuit_breaker import BreakerRegistry, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+RETRY_ATTEMPTS = 3            # спроб для ідемпотентних запитів
+RETRY_BASE_DELAY = 0.5        # секунд - база експоненційної паузи
+RETRY_MAX_DELAY = 4.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+HEALTH_PROBE_METHOD = '/v1/info/balance/'
+HEALTH_PROBE_INTERVAL = 15    # секунд між пробами, поки запобіжник відкритий
+
+# Запити з побічним ефектом: повтор після відправки = другий дзвінок на пристрій.
+# Повторюємо їх лише коли з'єднання не встановилось (запит точно не пішов).
+NON_IDEMPOTENT_METHODS = ('/v1/request/callback/',)
+
+SIGNATURE_CACHE_SIZE = 256    # підписів (method, params) у LRU кеші RequestSigner
+
+BREAKER_STATE_FILE = '/home/gomoncli/zadarma/zadarma_breaker.json'
+
+# Спільні запобіжники всіх клієнтів процесу (і, через файл, інших процесів)
+zadarma_breakers = BreakerRegistry(BREAKER_STATE_FILE)
+
+
+def is_idempotent(method, request_type):
+    return request_type == 'GET' and method not in NON_IDEMPOTENT_METHODS
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Експоненційна пауза з повним jitter - клієнти не повторюють синхронно"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def build_params_string(params):
+    """Відсортований query string - саме його підписує Zadarma (urlencode за один прохід)"""
+    return urlencode(sorted(params.items()))
+
+
+class RequestSigner:
+    """
+    Підпис запитів за офіційним алгоритмом Zadarma:
+    base64(hex(HMAC-SHA1(secret, method + params + md5(params))))
+
+    Ключ HMAC готується один раз (шаблон копіюється на кожен запит), а
+    заголовки для однакових (method, params) - наприклад, баланс для
+    health probe чи повторне /vorota - беруться з невеликого LRU кешу.
+    """
+
+    def __init__(self, key, secret, cache_size=SIGNATURE_CACHE_SIZE):
+        self.key = key
+        self._prefix = key + ':'
+        self._template = hmac.new(secret.encode('utf8'), digestmod=hashlib.sha1)
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sign(self, method, params_string):
+        """Значення заголовка Authorization ('key:signature')"""
+        cache_key = (method, params_string)
+        with self._lock:
+            header = self._cache.get(cache_key)
+            if header is not None:
+                self._cache.move_to_end(cache_key)
+                return header
+
+        data = method + params_string + hashlib.md5(params_string.encode('utf8')).hexdigest()
+        logger.debug("🔐 String to sign: %s", data)
+        mac = self._template.copy()
+        mac.update(data.encode('utf8'))
+        # ВАЖЛИВО! Спочатку hexdigest, потім base64
+        header = self._prefix + base64.b64encode(mac.hexdigest().encode('utf8')).decode()
+
+        with self._lock:
+            self._cache[cache_key] = header
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return header
+
+
+@functools.lru_cache(maxsize=8)
+def get_signer(key, secret):
+    """Спільний RequestSigner для пари ключів (AsyncZadarmaAPI і build_auth_header)"""
+    return RequestSigner(key, secret)
+
+
+def build_auth_header(key, secret, method, params_string):
+    """
+    Офіційний алгоритм авторизації з GitHub
+    (спільний для ZadarmaAPI та AsyncZadarmaAPI)
+    """
+    return get_signer(key, secret).sign(method, params_string)
+
+
+class ZadarmaAPI:
+    def __init__(self, key, secret, is_sandbox=False, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 retry_attempts=RETRY_ATTEMPTS, breakers=None):
+        self.key = key
+        self.secret = secret
+        self.signer = RequestSigner(key, secret)
+        self.is_sandbox = is_sandbox
+        self.__url_api = 'https://api.zadarma.com'
+        if is_sandbox:
+            self.__url_api = 'https://api-sandbox.zadarma.com'
+        # Keep-alive пул: повторні запити не платять за DNS + TCP + TLS
+        self.session = create_session(pool_size)
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry_attempts = retry_attempts
+        self.breakers = breakers if breakers is not None else zadarma_breakers
+        self._sleep = time.sleep
+        self._probe_thread = None
+
+    def warm_up(self, keepalive=False):
+        """Відкриває з'єднання з api.zadarma.com до першого дзвінка"""
+        result = warm_up(self.session, self.__url_api + '/', self.timeout)
+        if keepalive:
+            start_keepalive(self.session, self.__url_api + '/')
+        return result
+
+    def call(self, method, params={}, request_type='GET', format='json', is_auth=True):
+        """
+        Function for send API request - точна копія з GitHub
+
+        Поверх оригіналу: повтори з jitter backoff для ідемпотентних запитів
+        (callback - лише якщо з'єднання не встановилось) і запобіжник на
+        endpoint - поки він відкритий, CircuitOpenError без звернення до API.
+        """
+        logger.info("📡 Zadarma API call: %s, params: %s", method, params)
+        
+        request_type = request_type.upper()
+        if request_type not in ['GET', 'POST', 'PUT', 'DELETE']:
+            request_type = 'GET'
+        
+        params['format'] = format
+        auth_str = None
+        
+        # Сортуємо параметри та створюємо query string
+        params_string = build_params_string(params)
+        logger.debug("🔐 Params string: %s", params_string)
+
+        # Заголовок авторизації не логуємо - це робочий підпис ключа API
+        if is_auth:
+            auth_str = self.__get_auth_string_for_header(method, params_string)
+
+        url = self.__url_api + method
+        logger.debug("🌐 Request URL: %s", url)
+        if request_type == 'GET' and params_string:
+            url += '?' + params_string
+
+        # Запобіжник endpoint-а: поки Zadarma лежить - відмова без таймауту
+        breaker = self.breakers.get(method)
+        if not breaker.allow():
+            error = CircuitOpenError(method, breaker.retry_after())
+            logger.warning("⛔ %s", error)
+            raise error
+
+        idempotent = is_idempotent(method, request_type)
+        attempt = 0
+        while True:
+            try:
+                result = self._send(request_type, url, params, auth_str)
+            except requests.exceptions.RequestException as e:
+                # ConnectTimeout - запит не відправлено, повтор безпечний навіть для callback
+                retryable = idempotent or isinstance(e, requests.exceptions.ConnectTimeout)
+                if retryable and attempt + 1 < self.retry_attempts:
+                    delay = backoff_delay(attempt)
+                    logger.warning("🔁 Zadarma %s: %s - повтор через %.2fс", method, e, delay)
+                    self._sleep(delay)
+                    attempt += 1
+                    continue
+                breaker.record_failure()
+                if isinstance(e, requests.exceptions.Timeout):
+                    logger.error("❌ Таймаут запиту до Zadarma API")
+                else:
+                    logger.error("❌ Помилка запиту до Zadarma API: %s", e)
+                raise
+
+            if result.status_code in RETRY_STATUSES and idempotent and attempt + 1 < self.retry_attempts:
+                delay = backoff_delay(attempt)
+                logger.warning("🔁 Zadarma %s: HTTP %s - повтор через %.2fс", method, result.status_code, delay)
+                self._sleep(delay)
+                attempt += 1
+                continue
+
+            # 5xx - endpoint несправний; 4xx означає, що Zadarma відповідає
+            if result.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            logger.info("📡 Response status: %s", result.status_code)
+            logger.debug("📡 Response: %s", result.text)
+            return result
+
+    def _send(self, request_type, url, params, auth_str):
+        if request_type == 'GET':
+            return self.session.get(url, headers={'Authorization': auth_str}, timeout=self.timeout)
+        return self.session.request(request_type, url, headers={'Authorization': auth_str},
+                                    data=params, timeout=self.timeout)
+
+    def health_probe(self):
+        """
+        Пробний запит балансу в обхід запобіжників; успіх закриває всі
+
+        Повертає True, якщо Zadarma відповідає (будь-який статус < 500).
+        """
+        params_string = build_params_string({'format': 'json'})
+        url = self.__url_api + HEALTH_PROBE_METHOD + '?' + params_string
+        auth_str = self.__get_auth_string_for_header(HEALTH_PROBE_METHOD, params_string)
+        try:
+            healthy = self._send('GET', url, None, auth_str).status_code < 500
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"⚠️ Health probe Zadarma: {e}")
+            healthy = False
+        if healthy and self.breakers.any_open():
+            logger.info("✅ Health probe: Zadarma API доступне - запобіжники закрито")
+            self.breakers.close_all()
+        return healthy
+
+    def start_health_probe(self, interval=HEALTH_PROBE_INTERVAL):
+        """Фоновий потік: поки якийсь запобіжник відкритий - періодичний health probe"""
+        if self._probe_thread is not None and self._probe_thread.is_alive():
+            return self._probe_thread
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                if self.breakers.any_open():
+                    self.health_probe()
+
+        self._probe_thread = threading.Thread(target=loop, name='zadarma-health-probe')
+        self._probe_thread.daemon = True
+        self._probe_thread.start()
+        return self._probe_thread
+
+    def breaker_status(self):
+        """Стан запобіжників для /status і api_monitor"""
+        return self.breakers.snapshot()
+
+    def __get_auth_string_for_header(self, method, params_string):
+        return self.signer.sign(method, params_string)